@@ -39,6 +39,7 @@ from app.api.v1 import (
     analytics,
     conversations_export,
     admin_retention,
+    scheduler_jobs,
     fb_admin,
     staff,
     tenants,
@@ -85,6 +86,7 @@ api_router.include_router(booking_callback.router, prefix="/booking", tags=["外
 api_router.include_router(analytics.router, prefix="/analytics", tags=["數據洞察"])
 api_router.include_router(conversations_export.router, prefix="", tags=["對話紀錄匯出"])
 api_router.include_router(admin_retention.router, prefix="/admin/retention", tags=["訪客資料保留"])
+api_router.include_router(scheduler_jobs.router, prefix="/admin/scheduler", tags=["排程任務"])
 api_router.include_router(staff.router, prefix="/staff", tags=["員工帳號管理"])
 api_router.include_router(tenants.router, prefix="/tenants", tags=["組織管理"])
 api_router.include_router(webchat_sites.router, prefix="/webchat_sites", tags=["官網彈窗站點"])
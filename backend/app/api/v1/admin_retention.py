@@ -15,7 +15,7 @@ POST /admin/retention/run-guest-cleanup
 
 清理流程：
 1. 刪 webchat 訪客 thread 中 created_at < cutoff 的 messages
-2. 對殘存訊息的 thread：更新 last_message_at 為剩餘訊息最大時間
+2. 對殘存訊息的 thread：更新 last_message_at 為剩餘訊息最大時間（對話摘要一併重建）
 3. 對清空的 thread：連同 thread + member shell + 標籤一併刪除
 
 驗證：X-Cron-Token header 必須等於 settings.CRON_TOKEN（若未設定則 fallback 到 SECRET_KEY）
@@ -36,6 +36,7 @@ from app.database import get_db
 from app.models.conversation import ConversationMessage, ConversationThread
 from app.models.member import Member
 from app.models.tag import MemberInteractionTag, MemberTag
+from app.services.thread_summary import rebuild_thread_summaries
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -124,6 +125,9 @@ async def run_guest_cleanup(
             )
             updated_threads += 1
 
+    # 對話摘要：殘存的 thread 依剩餘訊息重建，清空的 thread 摘要一併刪除
+    await rebuild_thread_summaries(db, thread_ids)
+
     # 5. 對清空的 thread：刪 thread + member shell + 標籤
     deleted_threads = 0
     deleted_members = 0
@@ -95,7 +95,7 @@ async def ai_confirm_room(payload: AiConfirmRoomRequest):
             status_code=422,
             detail={"error_code": "NO_ROOMS_SELECTED", "message": "請至少選擇一個房型與間數"},
         )
-    return chatbot_service.confirm_rooms(
+    return await chatbot_service.confirm_rooms(
         browser_key=payload.line_uid,
         rooms=rooms,
     )
@@ -104,7 +104,7 @@ async def ai_confirm_room(payload: AiConfirmRoomRequest):
 @router.post("/booking-save", response_model=BookingSaveOutSchema)
 async def ai_booking_save(payload: AiBookingSaveRequest):
     """儲存訂房 — 用 line_uid 作為 session key"""
-    return chatbot_service.booking_save(
+    return await chatbot_service.booking_save(
         browser_key=payload.line_uid,
         member_name=payload.member_name,
         member_phone=payload.member_phone,
@@ -117,4 +117,4 @@ async def ai_booking_save(payload: AiBookingSaveRequest):
 @router.post("/session/reset", response_model=SessionResetOutSchema)
 async def ai_session_reset(payload: AiSessionResetRequest):
     """重置 session — 用 line_uid 作為 session key"""
-    return chatbot_service.reset(payload.line_uid)
+    return await chatbot_service.reset(payload.line_uid)
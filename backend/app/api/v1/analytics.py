@@ -8,18 +8,22 @@
 - GET /analytics/new-members — 新增會員數（預設 source=line，未來可擴充 fb/webchat/all）
 - GET /analytics/time-slot-insights — 時段洞察 heatmap（每日 × 4hr 時段的不重複觸發標籤會員數）
 
-DB 時區：MySQL server timezone = Asia/Taipei，created_at 為台灣時間（見 CLAUDE.md）。
+DB 時區：created_at 一律存 UTC；日界線以營運時區（OPERATING_TZ）為準。
+每日趨勢 / 新增會員 / 時段洞察讀彙總表（app/services/analytics_rollup.py，背景每
+ANALYTICS_ROLLUP_REFRESH_SECONDS 秒重算），待處理對話讀 conversation_thread_summary；
+原始資料查詢一律換成 UTC 區間比對 created_at，才用得到索引。
 """
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, Query
 from pydantic import BaseModel
-from sqlalchemy import text
+from sqlalchemy import DateTime, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
-from app.core.timezone import OPERATING_TZ_SQL, to_utc_iso
+from app.core.timezone import OPERATING_TZ, OPERATING_TZ_SQL, to_utc_iso
+from app.services.analytics_rollup import local_today, utc_bounds
 
 router = APIRouter()
 
@@ -39,7 +43,7 @@ class DailyCoverageSchema(BaseModel):
 class UnansweredQuestionSchema(BaseModel):
     message_id: str
     thread_id: str
-    question: str  # 觸發答不出的使用者問題（AI 前一筆 user 訊息）
+    question: str  # 觸發答不出的使用者問題（AI 回覆的 reply_to_message_id）
     ai_reply: str  # AI 的答不出回覆內容
     platform: Optional[str] = None
     created_at: str  # ISO 格式
@@ -69,6 +73,11 @@ def _parse_date(s: Optional[str], default: date) -> date:
         return default
 
 
+def _local_to_utc(dt: datetime) -> datetime:
+    """營運時區 naive → UTC naive（直接比對 DB 欄位用）"""
+    return dt.replace(tzinfo=OPERATING_TZ).astimezone(timezone.utc).replace(tzinfo=None)
+
+
 def _coverage(total: int, unanswered: int) -> float:
     if total <= 0:
         return 0.0
@@ -80,6 +89,23 @@ def _scope_active(line_channel_id: Optional[str], tenant_id: Optional[int]) -> b
     return tenant_id is not None or bool(line_channel_id)
 
 
+def _thread_member_scope(thread_col: str, line_channel_id: Optional[str], tenant_id: Optional[int]):
+    """對話 thread → 會員的範圍過濾：回傳 (join_sql, filter_sql, params)。
+
+    LINE 端 thread_id = line_uid、Webchat 端 thread_id = webchat_uid；
+    分兩個 LEFT JOIN 各走唯一索引（OR JOIN 無法用索引），過濾比對兩者 COALESCE。
+    """
+    if not _scope_active(line_channel_id, tenant_id):
+        return "", "", {}
+    join = (
+        f" LEFT JOIN members ml ON ml.line_uid = {thread_col}"
+        f" LEFT JOIN members mw ON mw.webchat_uid = {thread_col}"
+    )
+    if tenant_id is not None:
+        return join, " AND COALESCE(ml.tenant_id, mw.tenant_id) = :scope_val", {"scope_val": tenant_id}
+    return join, " AND COALESCE(ml.line_channel_id, mw.line_channel_id) = :scope_val", {"scope_val": line_channel_id}
+
+
 def _scope_filter(alias: str, channel_col: str, line_channel_id: Optional[str],
                   tenant_id: Optional[int], key: str = "scope_val"):
     """組織重構：回傳 (filter_sql, params)。
@@ -116,9 +142,10 @@ async def get_ai_coverage(
 
     未解訊息：unanswered=1（由 chatbot_service 的 mark_unanswerable tool 標記）
 
-    多 OA 隔離：line_channel_id 提供時，透過 thread_id → members.line_channel_id 過濾。
+    多 OA 隔離：每日統計以彙總表上（重算時由 thread_id → members 帶入）的 tenant_id / line_channel_id 過濾；
+    未解 top N 直接查原始訊息，透過 thread_id → members 過濾。
     """
-    today = date.today()
+    today = local_today()
     end = _parse_date(end_date, today)
     start = _parse_date(start_date, end - timedelta(days=29))
 
@@ -126,40 +153,21 @@ async def get_ai_coverage(
     if start > end:
         start, end = end, start
 
-    # 查詢區間：含 end 當天整天，所以用 [start 00:00, end+1 00:00)
-    start_dt = datetime.combine(start, datetime.min.time())
-    end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time())
-
-    # 多 OA 隔離：透過 thread_id → members.line_uid / webchat_uid → line_channel_id 過濾
-    # 為避免 conversation_messages.created_at vs members.created_at 欄位 ambiguous，全部加 cm. 前綴
-    # JOIN 條件兼顧 LINE / Webchat：LINE 端 thread_id=line_uid，Webchat 端 thread_id=webchat_uid
-    scoped = _scope_active(line_channel_id, tenant_id)
-    daily_join = (
-        " JOIN members mem ON mem.line_uid = cm.thread_id OR mem.webchat_uid = cm.thread_id"
-        if scoped else ""
-    )
-    daily_filter, daily_scope = _scope_filter("mem", "line_channel_id", line_channel_id, tenant_id)
-    daily_params = {"start_dt": start_dt, "end_dt": end_dt, **daily_scope}
-
-    # 1. 每日統計
-    # created_at 存 UTC；每日趨勢的日界線是營運時區，故換到 OPERATING_TZ 再切 DATE，
-    # 否則台北凌晨(=前一日 UTC)的訊息會被算到前一天。
-    lt = f"CONVERT_TZ(cm.created_at, '+00:00', '{OPERATING_TZ_SQL}')"
+    # 1. 每日統計：讀每小時彙總（已依營運時區切日，並帶會員的組織 / 分館）
+    daily_filter, daily_scope = _scope_filter("r", "line_channel_id", line_channel_id, tenant_id)
     daily_sql = text(f"""
-        SELECT DATE({lt}) AS d,
-               COUNT(*) AS total,
-               SUM(CASE WHEN cm.unanswered = 1 THEN 1 ELSE 0 END) AS unanswered
-        FROM conversation_messages cm
-        {daily_join}
-        WHERE cm.message_source = 'gpt'
-          AND cm.direction = 'outgoing'
-          AND {lt} >= :start_dt
-          AND {lt} < :end_dt
+        SELECT r.bucket_date AS d,
+               SUM(r.message_count) AS total,
+               SUM(r.unanswered_count) AS unanswered
+        FROM analytics_message_hourly r
+        WHERE r.message_source = 'gpt'
+          AND r.direction = 'outgoing'
+          AND r.bucket_date >= :start AND r.bucket_date <= :end
           {daily_filter}
-        GROUP BY DATE({lt})
-        ORDER BY DATE({lt})
+        GROUP BY r.bucket_date
+        ORDER BY r.bucket_date
     """)
-    daily_rows = (await db.execute(daily_sql, daily_params)).all()
+    daily_rows = (await db.execute(daily_sql, {"start": start, "end": end, **daily_scope})).all()
 
     daily: List[DailyCoverageSchema] = []
     total_sum = 0
@@ -177,13 +185,11 @@ async def get_ai_coverage(
             coverage_rate=_coverage(t, u),
         ))
 
-    # 2. 未解 top N：取每筆未解訊息 + 前一筆 user 訊息（= 觸發問題）
-    #    用 LEFT JOIN 找同 thread 最近一筆 created_at 更早的 user/incoming 訊息
-    top_join = (
-        " JOIN members mem2 ON mem2.line_uid = m.thread_id OR mem2.webchat_uid = m.thread_id"
-        if scoped else ""
-    )
-    top_filter, top_scope = _scope_filter("mem2", "line_channel_id", line_channel_id, tenant_id)
+    # 2. 未解 top N：取每筆未解訊息 + 觸發問題
+    #    觸發問題在寫入 AI 回覆時就記在 reply_to_message_id，直接以主鍵取回（不再逐筆跑相關子查詢）
+    # 營運時區的日界線換成 UTC 區間，直接比對 created_at（走 unanswered + created_at 索引）
+    start_dt, end_dt = utc_bounds(start, end)
+    top_join, top_filter, top_scope = _thread_member_scope("m.thread_id", line_channel_id, tenant_id)
     top_params = {"start_dt": start_dt, "end_dt": end_dt, "top_n": top_n, **top_scope}
 
     top_sql = text(f"""
@@ -192,26 +198,19 @@ async def get_ai_coverage(
                m.content AS ai_reply,
                m.platform AS platform,
                m.created_at AS created_at,
-               (
-                   SELECT u.content
-                   FROM conversation_messages u
-                   WHERE u.thread_id = m.thread_id
-                     AND u.direction = 'incoming'
-                     AND u.created_at <= m.created_at
-                   ORDER BY u.created_at DESC
-                   LIMIT 1
-               ) AS question
+               q.content AS question
         FROM conversation_messages m
+        LEFT JOIN conversation_messages q ON q.id = m.reply_to_message_id
         {top_join}
-        WHERE m.message_source = 'gpt'
+        WHERE m.unanswered = 1
+          AND m.message_source = 'gpt'
           AND m.direction = 'outgoing'
-          AND m.unanswered = 1
-          AND CONVERT_TZ(m.created_at, '+00:00', '{OPERATING_TZ_SQL}') >= :start_dt
-          AND CONVERT_TZ(m.created_at, '+00:00', '{OPERATING_TZ_SQL}') < :end_dt
+          AND m.created_at >= :start_dt
+          AND m.created_at < :end_dt
           {top_filter}
         ORDER BY m.created_at DESC
         LIMIT :top_n
-    """)
+    """).columns(created_at=DateTime)
     top_rows = (await db.execute(top_sql, top_params)).all()
 
     top_unanswered = [
@@ -268,14 +267,14 @@ async def get_completed_orders(
 
     多 OA 隔離：line_channel_id 提供時透過 JOIN members 過濾。
     """
-    today = date.today()
+    today = local_today()
     end = _parse_date(end_date, today)
     start = _parse_date(start_date, end - timedelta(days=29))
     if start > end:
         start, end = end, start
 
-    start_dt = datetime.combine(start, datetime.min.time())
-    end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    # 營運時區的日界線換成 UTC 區間，直接比對 paid_at
+    start_dt, end_dt = utc_bounds(start, end)
 
     # 組織/多 OA 隔離：JOIN members 過濾
     scoped = _scope_active(line_channel_id, tenant_id)
@@ -289,7 +288,7 @@ async def get_completed_orders(
         SELECT DATE({lt}) AS d, COUNT(*) AS n
         FROM bookings b
         {member_join}
-        WHERE {lt} >= :start_dt AND {lt} < :end_dt
+        WHERE b.paid_at >= :start_dt AND b.paid_at < :end_dt
           {member_filter}
         GROUP BY DATE({lt})
         ORDER BY DATE({lt})
@@ -346,58 +345,69 @@ async def get_pending_conversations(
     依「待處理時間」倒序，最新的在前。
 
     多 OA 隔離：line_channel_id 提供時透過 members.line_channel_id 過濾。
+
+    「最後一筆（排除群發）」直接讀 conversation_thread_summary（寫入訊息時增量維護），
+    不再對 conversation_messages 全歷史 GROUP BY thread_id。
     """
-    # 組織/多 OA 隔離：透過 LEFT JOIN 後的 members 表過濾
-    member_filter, scope_params = _scope_filter("mem", "line_channel_id", line_channel_id, tenant_id)
+    # platform: 包含 Webchat，讓 widget 訪客的 unanswered 對話也納入（摘要表的 NULL platform 已視為 LINE）
+    # 群發不是回覆：摘要的 last_non_broadcast_* 已排除群發，不會把待處理對話洗掉
+    pending_where = """
+        s.platform IN ('LINE', 'Webchat')
+          AND (s.last_non_broadcast_direction = 'incoming'
+               OR (s.last_non_broadcast_direction = 'outgoing'
+                   AND s.last_non_broadcast_source = 'gpt'
+                   AND s.last_unanswered = 1))
+    """
+    # thread_id 對 LINE 是 line_uid，對 Webchat 是 webchat_uid（=browser_key），分兩個 LEFT JOIN
+    member_join = (
+        " LEFT JOIN members ml ON ml.line_uid = s.thread_id"
+        " LEFT JOIN members mw ON mw.webchat_uid = s.thread_id"
+    )
+    _, member_filter, scope_params = _thread_member_scope("s.thread_id", line_channel_id, tenant_id)
     params = {"lim": limit, **scope_params}
 
-    # platform: 包含 Webchat，讓 widget 訪客的 unanswered 對話也納入
-    # JOIN: thread_id 對 LINE 是 line_uid，對 Webchat 是 webchat_uid（=browser_key），都要試
     sql = text(f"""
-        WITH last_msg AS (
-            SELECT thread_id, MAX(created_at) AS max_ts
-            FROM conversation_messages
-            WHERE (platform IN ('LINE', 'Webchat') OR platform IS NULL)
-              -- 排除群發：群發不是回覆，不能讓它把「最後一筆是 incoming」的待處理對話洗掉
-              AND (message_source IS NULL OR message_source != 'broadcast')
-            GROUP BY thread_id
-        ),
-        pending AS (
-            SELECT m.thread_id, m.created_at AS pending_since, m.direction,
-                   m.message_source, m.unanswered
-            FROM conversation_messages m
-            JOIN last_msg lm
-              ON m.thread_id = lm.thread_id AND m.created_at = lm.max_ts
-            WHERE m.direction = 'incoming'
-               OR (m.direction = 'outgoing'
-                   AND m.message_source = 'gpt'
-                   AND m.unanswered = 1)
-        )
-        SELECT p.thread_id, p.pending_since, p.direction, p.unanswered,
+        SELECT s.thread_id,
+               s.last_non_broadcast_at AS pending_since,
+               s.last_non_broadcast_direction AS direction,
+               s.last_unanswered AS unanswered,
                (SELECT q.content FROM conversation_messages q
-                WHERE q.thread_id = p.thread_id AND q.direction = 'incoming'
+                WHERE q.thread_id = s.thread_id AND q.direction = 'incoming'
                 ORDER BY q.created_at DESC LIMIT 1) AS question,
                (SELECT q.created_at FROM conversation_messages q
-                WHERE q.thread_id = p.thread_id AND q.direction = 'incoming'
+                WHERE q.thread_id = s.thread_id AND q.direction = 'incoming'
                 ORDER BY q.created_at DESC LIMIT 1) AS question_at,
-               mem.id AS member_id,
-               mem.line_display_name,
-               mem.name AS real_name,
-               mem.line_avatar
-        FROM pending p
-        LEFT JOIN members mem
-          ON mem.line_uid = p.thread_id OR mem.webchat_uid = p.thread_id
-        WHERE 1=1{member_filter}
-        ORDER BY p.pending_since DESC
+               ml.id AS line_member_id,
+               ml.line_display_name AS line_display_name,
+               ml.name AS line_real_name,
+               ml.line_avatar AS line_avatar,
+               mw.id AS webchat_member_id,
+               mw.line_display_name AS webchat_display_name,
+               mw.name AS webchat_real_name,
+               mw.line_avatar AS webchat_avatar
+        FROM conversation_thread_summary s
+        {member_join}
+        WHERE {pending_where}
+          {member_filter}
+        ORDER BY s.last_non_broadcast_at DESC
         LIMIT :lim
-    """)
+    """).columns(question_at=DateTime)
     rows = (await db.execute(sql, params)).all()
 
     items: List[PendingConversationSchema] = []
     for r in rows:
         reason = "ai_unanswered" if (r.direction == "outgoing" and r.unanswered) else "no_reply"
+        # LINE 會員優先，其次 Webchat 會員
+        if r.line_member_id is not None:
+            member_id, nickname, real_name, avatar = (
+                r.line_member_id, r.line_display_name, r.line_real_name, r.line_avatar,
+            )
+        else:
+            member_id, nickname, real_name, avatar = (
+                r.webchat_member_id, r.webchat_display_name, r.webchat_real_name, r.webchat_avatar,
+            )
         # 顯示會員暱稱（LINE profile display name），fallback 才用手動填入的姓名
-        display_name = r.line_display_name or r.real_name or "未命名會員"
+        display_name = nickname or real_name or "未命名會員"
         question = (r.question or "").strip()
         # JSON payload（postback / sticker / image 等）→ 顯示簡化描述，避免 UI 塞爛字串
         if question.startswith("{"):
@@ -415,40 +425,22 @@ async def get_pending_conversations(
                 question = "（系統事件）"
         items.append(PendingConversationSchema(
             thread_id=str(r.thread_id),
-            member_id=r.member_id,
+            member_id=member_id,
             display_name=display_name,
-            avatar_url=r.line_avatar,
+            avatar_url=avatar,
             question=question[:300],
             question_at=to_utc_iso(r.question_at) or "",
             reason=reason,
         ))
 
-    # total = 符合條件的總筆數（不受 limit 影響）
-    # 組織/多 OA 隔離：透過 JOIN members 過濾（LINE / Webchat 都要 JOIN）
-    total_member_filter, total_params = _scope_filter("mem2", "line_channel_id", line_channel_id, tenant_id)
-    total_join = (
-        " LEFT JOIN members mem2 ON mem2.line_uid = m.thread_id OR mem2.webchat_uid = m.thread_id"
-        if _scope_active(line_channel_id, tenant_id) else ""
-    )
+    # total = 符合條件的總筆數（不受 limit 影響）；沒有指定範圍時不需要 JOIN members
+    total_join, total_filter, total_params = _thread_member_scope("s.thread_id", line_channel_id, tenant_id)
     total_sql = text(f"""
-        WITH last_msg AS (
-            SELECT thread_id, MAX(created_at) AS max_ts
-            FROM conversation_messages
-            WHERE (platform IN ('LINE', 'Webchat') OR platform IS NULL)
-              -- 排除群發：與上方待處理對話清單的 last_msg 條件一致
-              AND (message_source IS NULL OR message_source != 'broadcast')
-            GROUP BY thread_id
-        )
         SELECT COUNT(*)
-        FROM conversation_messages m
-        JOIN last_msg lm
-          ON m.thread_id = lm.thread_id AND m.created_at = lm.max_ts
+        FROM conversation_thread_summary s
         {total_join}
-        WHERE (m.direction = 'incoming'
-           OR (m.direction = 'outgoing'
-               AND m.message_source = 'gpt'
-               AND m.unanswered = 1))
-          {total_member_filter}
+        WHERE {pending_where}
+          {total_filter}
     """)
     total_row = (await db.execute(total_sql, total_params)).first()
     total = int(total_row[0]) if total_row else len(items)
@@ -474,16 +466,12 @@ class NewMembersResponseSchema(BaseModel):
     daily: List[DailyMemberSchema]
 
 
-# source → WHERE 子句（未來新增 fb 彈窗、webchat 會員註冊流程時直接擴充這裡）
+# source → 彙總表 analytics_member_daily 的渠道旗標（未來新增 fb 彈窗、webchat 會員註冊流程時直接擴充這裡）
 _MEMBER_SOURCE_WHERE = {
-    "line": "line_uid IS NOT NULL AND line_uid <> ''",
-    "fb": "fb_customer_id IS NOT NULL AND fb_customer_id <> ''",
-    "webchat": "webchat_uid IS NOT NULL AND webchat_uid <> ''",
-    "all": (
-        "(line_uid IS NOT NULL AND line_uid <> '')"
-        " OR (fb_customer_id IS NOT NULL AND fb_customer_id <> '')"
-        " OR (webchat_uid IS NOT NULL AND webchat_uid <> '')"
-    ),
+    "line": "r.has_line = 1",
+    "fb": "r.has_fb = 1",
+    "webchat": "r.has_webchat = 1",
+    "all": "(r.has_line = 1 OR r.has_fb = 1 OR r.has_webchat = 1)",
 }
 
 
@@ -503,8 +491,10 @@ async def get_new_members(
     - source=webchat：Webchat 會員（預留，目前沒有註冊流程）
     - source=all：以上任一渠道
     - line_channel_id：多 OA 隔離，提供時只算該分館的新增會員
+
+    讀新增會員每日彙總（依 members.created_at 的營運時區日期）；已定案日期的渠道 / 分館為當時的會員資料。
     """
-    today = date.today()
+    today = local_today()
     end = _parse_date(end_date, today)
     start = _parse_date(start_date, end - timedelta(days=29))
     if start > end:
@@ -516,32 +506,18 @@ async def get_new_members(
         where = _MEMBER_SOURCE_WHERE["line"]
         source = "line"
 
-    start_dt = datetime.combine(start, datetime.min.time())
-    end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time())
-
-    # 組織/多 OA 隔離：members 表直接過濾（tenant_id 優先，支援無 LINE 組織）
-    params = {"start_dt": start_dt, "end_dt": end_dt}
-    if tenant_id is not None:
-        channel_id_filter = " AND tenant_id = :scope_val"
-        params["scope_val"] = tenant_id
-    elif line_channel_id:
-        channel_id_filter = " AND line_channel_id = :scope_val"
-        params["scope_val"] = line_channel_id
-    else:
-        channel_id_filter = ""
-
-    # created_at 存 UTC；每日新增會員趨勢日界線用營運時區，否則跨午夜歸錯日。
-    lt = f"CONVERT_TZ(created_at, '+00:00', '{OPERATING_TZ_SQL}')"
+    # 組織/多 OA 隔離：彙總表直接過濾（tenant_id 優先，支援無 LINE 組織）
+    channel_id_filter, scope_params = _scope_filter("r", "line_channel_id", line_channel_id, tenant_id)
     daily_sql = text(f"""
-        SELECT DATE({lt}) AS d, COUNT(*) AS n
-        FROM members
+        SELECT r.bucket_date AS d, SUM(r.new_members) AS n
+        FROM analytics_member_daily r
         WHERE ({where})
-          AND {lt} >= :start_dt AND {lt} < :end_dt
+          AND r.bucket_date >= :start AND r.bucket_date <= :end
           {channel_id_filter}
-        GROUP BY DATE({lt})
-        ORDER BY DATE({lt})
+        GROUP BY r.bucket_date
+        ORDER BY r.bucket_date
     """)
-    rows = (await db.execute(daily_sql, params)).all()
+    rows = (await db.execute(daily_sql, {"start": start, "end": end, **scope_params})).all()
 
     daily: List[DailyMemberSchema] = []
     total = 0
@@ -585,6 +561,11 @@ _CHANNEL_WHERE = {
 
 _WEEKDAY_ZH = ["一", "二", "三", "四", "五", "六", "日"]
 
+# 營運時區小時 → 4hr 時段 index 0..5（MySQL / SQLite 通用，不依賴整數除法語意）
+_BLOCK_SQL = "CASE " + " ".join(
+    f"WHEN r.bucket_hour < {(i + 1) * 4} THEN {i}" for i in range(5)
+) + " ELSE 5 END"
+
 
 @router.get("/time-slot-insights", response_model=TimeSlotInsightsResponseSchema)
 async def get_time_slot_insights(
@@ -599,40 +580,36 @@ async def get_time_slot_insights(
     資料來源 tag_trigger_logs（AI 自動打標 / 點擊 / 手動）。
 
     多 OA 隔離：line_channel_id 提供時，使用 tag_trigger_logs.channel_id 直接過濾。
+
+    讀標籤觸發每小時彙總（已依營運時區切日 / 小時，保留 member_id 以計算不重複人數）。
     """
     where_clause = _CHANNEL_WHERE.get(channel) or _CHANNEL_WHERE["line"]
     if channel not in _CHANNEL_WHERE:
         channel = "line"
 
-    today = date.today()
+    today = local_today()
     # 預設 end_date = 今天，7 天區間含今天（today-6 ~ today）
     end = _parse_date(end_date, today)
     start = end - timedelta(days=6)
 
-    start_dt = datetime.combine(start, datetime.min.time())
-    end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time())
-
-    # 組織/多 OA 隔離：tag_trigger_logs 直接過濾（tenant_id 優先，支援無 LINE 組織）
-    channel_id_filter, scope_params = _scope_filter("t", "channel_id", line_channel_id, tenant_id)
-    base_params = {"start_dt": start_dt, "end_dt": end_dt, **scope_params}
+    # 組織/多 OA 隔離：彙總表保留 tag_trigger_logs 的 tenant_id / channel_id，直接過濾
+    channel_id_filter, scope_params = _scope_filter("r", "channel_id", line_channel_id, tenant_id)
+    base_params = {"start": start, "end": end, **scope_params}
 
     # 每個（日期、4hr 時段）算 COUNT(DISTINCT member_id）
     # 只算「用戶端真實互動」：對話 (INTERACTION) / 點擊 (CLICK) / 轉單 (CONVERSION)
     # 管理員手動加標籤 (MANUAL) 排除，避免熱圖跟互動旅程明細數字對不起來
-    # triggered_at 存 UTC；時段熱圖是營運時區視圖，日界線/時段一律換到 OPERATING_TZ 再切。
-    # 直接用 UTC 的 DATE()/HOUR() 會讓格子偏 8 小時（落到錯的日/時段）。
-    lt = f"CONVERT_TZ(t.triggered_at, '+00:00', '{OPERATING_TZ_SQL}')"
     sql = text(f"""
-        SELECT DATE({lt}) AS d,
-               FLOOR(HOUR({lt}) / 4) AS block,
-               COUNT(DISTINCT t.member_id) AS n
-        FROM tag_trigger_logs t
-        JOIN members m ON m.id = t.member_id
-        WHERE {lt} >= :start_dt AND {lt} < :end_dt
-          AND t.trigger_source IN ('INTERACTION', 'CLICK', 'CONVERSION')
+        SELECT r.bucket_date AS d,
+               {_BLOCK_SQL} AS block,
+               COUNT(DISTINCT r.member_id) AS n
+        FROM analytics_tag_activity_hourly r
+        JOIN members m ON m.id = r.member_id
+        WHERE r.bucket_date >= :start AND r.bucket_date <= :end
+          AND r.trigger_source IN ('INTERACTION', 'CLICK', 'CONVERSION')
           AND ({where_clause})
           {channel_id_filter}
-        GROUP BY DATE({lt}), FLOOR(HOUR({lt}) / 4)
+        GROUP BY r.bucket_date, {_BLOCK_SQL}
     """)
     rows = (await db.execute(sql, base_params)).all()
 
@@ -651,11 +628,11 @@ async def get_time_slot_insights(
 
     # 7 天總不重複會員數（不論時段）— 同樣只算真實互動
     total_sql = text(f"""
-        SELECT COUNT(DISTINCT t.member_id) AS n
-        FROM tag_trigger_logs t
-        JOIN members m ON m.id = t.member_id
-        WHERE {lt} >= :start_dt AND {lt} < :end_dt
-          AND t.trigger_source IN ('INTERACTION', 'CLICK', 'CONVERSION')
+        SELECT COUNT(DISTINCT r.member_id) AS n
+        FROM analytics_tag_activity_hourly r
+        JOIN members m ON m.id = r.member_id
+        WHERE r.bucket_date >= :start AND r.bucket_date <= :end
+          AND r.trigger_source IN ('INTERACTION', 'CLICK', 'CONVERSION')
           AND ({where_clause})
           {channel_id_filter}
     """)
@@ -729,11 +706,11 @@ async def get_time_slot_detail(
     if channel not in _CHANNEL_WHERE:
         channel = "line"
 
-    today = date.today()
+    today = local_today()
     end = _parse_date(end_date, today)
     start = end - timedelta(days=6)
 
-    # 決定 scope（單格或全 7 天）
+    # 決定 scope（單格或全 7 天）；時間皆為營運時區 naive
     if cell_date and cell_block is not None:
         d = _parse_date(cell_date, end)
         block_start = datetime.combine(d, datetime.min.time()) + timedelta(hours=cell_block * 4)
@@ -752,11 +729,9 @@ async def get_time_slot_detail(
 
     # 組織/多 OA 隔離：tag_trigger_logs 直接過濾（tenant_id 優先，支援無 LINE 組織）
     channel_id_filter, scope_params = _scope_filter("t", "channel_id", line_channel_id, tenant_id)
-    base_params = {"start_dt": scope_start, "end_dt": scope_end, **scope_params}
-
     # triggered_at 存 UTC；scope（單格 4hr / 全 7 天）的日界線是營運時區，
-    # 故比對前把 triggered_at 換到 OPERATING_TZ，與 heatmap 切格邏輯一致（否則偏 8 小時）。
-    lt = f"CONVERT_TZ(t.triggered_at, '+00:00', '{OPERATING_TZ_SQL}')"
+    # 故把 scope 換成 UTC 區間再比對 triggered_at（走索引），與 heatmap 切格邏輯一致（否則偏 8 小時）。
+    base_params = {"start_dt": _local_to_utc(scope_start), "end_dt": _local_to_utc(scope_end), **scope_params}
     # 一次撈出三類 source 的 (tag_name, trigger_source, event_count, last_triggered_at)
     # 用 COUNT(*) 不去重 member，讓「同會員同房型訂 3 間 → conversion=3」符合規格
     sql = text(f"""
@@ -766,7 +741,7 @@ async def get_time_slot_detail(
                MAX(t.triggered_at) AS last_at
         FROM tag_trigger_logs t
         JOIN members m ON m.id = t.member_id
-        WHERE {lt} >= :start_dt AND {lt} < :end_dt
+        WHERE t.triggered_at >= :start_dt AND t.triggered_at < :end_dt
           AND t.trigger_source IN ('INTERACTION', 'CLICK', 'CONVERSION')
           AND t.tag_name <> ''
           AND ({where_clause})
@@ -820,7 +795,7 @@ async def get_time_slot_detail(
         SELECT COUNT(DISTINCT t.member_id) AS n
         FROM tag_trigger_logs t
         JOIN members m ON m.id = t.member_id
-        WHERE {lt} >= :start_dt AND {lt} < :end_dt
+        WHERE t.triggered_at >= :start_dt AND t.triggered_at < :end_dt
           AND t.trigger_source IN ('INTERACTION', 'CLICK', 'CONVERSION')
           AND ({where_clause})
           {channel_id_filter}
@@ -14,6 +14,7 @@ from app.models.auto_response_message import AutoResponseMessage
 from app.models.line_channel import LineChannel
 from app.schemas.common import SuccessResponse
 from app.clients.fb_message_client import FbMessageClient
+from app.clients.line_app_client import LineAppClient
 from pydantic import BaseModel, conlist
 from typing import Optional, List, Sequence, Dict, Any, Union
 
@@ -854,6 +855,7 @@ async def create_auto_response(
         await _detect_and_mark_duplicate_keywords(db)
         await db.commit()
 
+    await LineAppClient().invalidate_auto_responses()
     return SuccessResponse(data={"id": auto_response.id}, message="創建成功")
 
 
@@ -1017,6 +1019,7 @@ async def update_auto_response(
         await _detect_and_mark_duplicate_keywords(db)
         await db.commit()
 
+    await LineAppClient().invalidate_auto_responses()
     return SuccessResponse(data={"id": auto_response.id}, message="更新成功")
 
 
@@ -1085,6 +1088,7 @@ async def _delete_local_auto_response(
         await _detect_and_mark_duplicate_keywords(db)
         await db.commit()
 
+    await LineAppClient().invalidate_auto_responses()
     return SuccessResponse(message="刪除成功")
 
 
@@ -1194,6 +1198,7 @@ async def toggle_auto_response(
         await _detect_and_mark_duplicate_keywords(db)
         await db.commit()
 
+    await LineAppClient().invalidate_auto_responses()
     return SuccessResponse(message="狀態更新成功")
 
 
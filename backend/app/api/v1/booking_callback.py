@@ -18,49 +18,14 @@ import httpx
 
 from app.config import settings
 from app.database import get_db
+from app.services.booking_token_store import booking_token_store
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from fastapi import Depends
 
-import secrets
-import time
-
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-# ---------------------------------------------------------------------------
-# Booking Token Store (line_uid ↔ token, 1 小時有效, 用完即棄)
-# ---------------------------------------------------------------------------
-_TOKEN_STORE: dict = {}  # {token: {"line_uid": str, "ts": float}}
-_TOKEN_TTL = 3600  # 1 hour
-
-
-def _generate_booking_token(line_uid: str, booking_data: Optional[dict] = None) -> str:
-    """生成短效 token 對應 line_uid + 訂房資料"""
-    now = time.time()
-    expired = [k for k, v in _TOKEN_STORE.items() if now - v["ts"] > _TOKEN_TTL]
-    for k in expired:
-        del _TOKEN_STORE[k]
-
-    token = secrets.token_urlsafe(24)
-    _TOKEN_STORE[token] = {"line_uid": line_uid, "ts": now, "data": booking_data or {}}
-    return token
-
-
-def _resolve_booking_token(token: str, consume: bool = True) -> Optional[dict]:
-    """用 token 取回完整資料 {line_uid, data}。consume=True 時用完即刪"""
-    if consume:
-        entry = _TOKEN_STORE.pop(token, None)
-    else:
-        entry = _TOKEN_STORE.get(token)
-    if not entry:
-        return None
-    if time.time() - entry["ts"] > _TOKEN_TTL:
-        if token in _TOKEN_STORE:
-            del _TOKEN_STORE[token]
-        return None
-    return entry
-
 # ---------------------------------------------------------------------------
 # 房型代碼 → 中文名稱對照表
 # ---------------------------------------------------------------------------
@@ -520,7 +485,7 @@ async def generate_token(data: GenerateTokenRequest, db: AsyncSession = Depends(
         "checkout": data.checkout,
         "member": member_info,
     }
-    token = _generate_booking_token(data.line_uid, booking_data)
+    token = await booking_token_store.issue(data.line_uid, booking_data)
     return {"ok": True, "token": token}
 
 @router.get("/token-data")
@@ -528,7 +493,7 @@ async def get_token_data(token: str = ""):
     """表單頁面呼叫：用 token 取回房型資料（不消耗 token）"""
     if not token:
         return {"ok": False, "message": "missing token"}
-    entry = _resolve_booking_token(token, consume=False)
+    entry = await booking_token_store.peek(token)
     if not entry:
         return {"ok": False, "message": "expired"}
     return {"ok": True, "data": entry["data"]}
@@ -555,7 +520,7 @@ async def track_room_click(data: RoomClickTrackRequest):
     if not data.token or not data.roomtype:
         return {"ok": False, "message": "missing token or roomtype"}
 
-    entry = _resolve_booking_token(data.token, consume=False)
+    entry = await booking_token_store.peek(data.token)
     if not entry:
         return {"ok": False, "message": "expired"}
 
@@ -565,8 +530,8 @@ async def track_room_click(data: RoomClickTrackRequest):
 
     # Dedup per-token：同一個 booking token（= 同一次房卡輪播 instance）
     # 內再次點擊同一房型就不重複寫。跨 token 點同房型則會累加。
-    clicked_roomtypes = entry.setdefault("clicked_roomtypes", set())
-    if data.roomtype in clicked_roomtypes:
+    # 先在 token store 佔位（多 worker 同時點擊只有一個寫入），DB 寫入失敗再撤回
+    if not await booking_token_store.claim_click(data.token, data.roomtype):
         logger.info(
             f"[track-room-click] skipped dup (same token): tag={data.roomtype}, "
             f"token={data.token[:8]}..."
@@ -586,6 +551,7 @@ async def track_room_click(data: RoomClickTrackRequest):
                 {"uid": line_uid},
             )).first()
             if not row:
+                await booking_token_store.release_click(data.token, data.roomtype)
                 return {"ok": False, "message": "member not found"}
             member_id = row.id
             member_channel_id = row.line_channel_id  # 多 OA 隔離：寫進 tag_trigger_logs，trigger 會據此推導 tenant_id
@@ -640,9 +606,6 @@ async def track_room_click(data: RoomClickTrackRequest):
                 )
             await db.commit()
 
-        # DB 寫入成功才把 roomtype 加進 token 的 clicked 集合（下次同 token 同房型就會去重）
-        clicked_roomtypes.add(data.roomtype)
-
         logger.info(
             f"[track-room-click] wrote: member_id={member_id}, "
             f"tag={tag_name}, token={data.token[:8]}..."
@@ -650,6 +613,7 @@ async def track_room_click(data: RoomClickTrackRequest):
         return {"ok": True}
     except Exception:
         logger.exception("[track-room-click] failed")
+        await booking_token_store.release_click(data.token, data.roomtype)
         return {"ok": False, "message": "internal error"}
 
 
@@ -660,10 +624,10 @@ async def booking_submit(data: BookingSubmitRequest):
     驗證 token → 打閎運訂房 API → 取得付款 URL → 回傳給前端跳轉。
     同時將姓名/電話/email 存到會員資料，下次訂房自動帶入。
     """
-    import requests as _requests
+    from app.clients.http_pool import BOOKING_API, http_pool
 
-    # 用 token 取回 line_uid（consume=True，用完即棄）
-    entry = _resolve_booking_token(data.token, consume=True)
+    # 用 token 取回 line_uid（用完即棄）
+    entry = await booking_token_store.consume(data.token)
     if not entry:
         return {"ok": False, "message": "連結已過期，請重新從 LINE 開啟訂房"}
     line_uid = entry["line_uid"]
@@ -721,12 +685,12 @@ async def booking_submit(data: BookingSubmitRequest):
     }
 
     try:
-        resp = _requests.post(
+        resp = await http_pool.post(
+            BOOKING_API,
             api_url,
             json=payload,
             headers={"Content-Type": "application/json", "Api-Key": api_key},
-            allow_redirects=False,
-            timeout=15,
+            follow_redirects=False,
         )
 
         if resp.status_code == 302:
@@ -13,7 +13,7 @@ from app.database import get_db
 from app.models.member import Member
 from app.models.fb_channel import FbChannel
 from app.schemas.common import SuccessResponse
-from app.services.chatroom_service import ChatroomService
+from app.services.chatroom_service import ChatroomService, decode_message_cursor
 from app.clients.fb_message_client import FbMessageClient
 import json
 
@@ -136,17 +136,19 @@ class ChatMessage(BaseModel):
 class ChatMessagesResponse(BaseModel):
     """聊天消息列表響應"""
     messages: List[ChatMessage]
-    total: int
+    total: Optional[int] = None  # 游標分頁不做 COUNT，為 None
     page: int
     page_size: int
     has_more: bool
+    next_cursor: Optional[str] = None  # 帶回 before 參數以載入更早的訊息
 
 
 @router.get("/members/{member_id}/chat-messages", response_model=SuccessResponse)
 async def get_chat_messages(
     member_id: int,
-    page: int = Query(1, ge=1, description="頁碼"),
+    page: int = Query(1, ge=1, description="頁碼（舊版分頁；往前翻請改用 before）"),
     page_size: int = Query(50, ge=1, le=100, description="每頁筆數"),
+    before: Optional[str] = Query(None, description="游標：上一頁回傳的 next_cursor"),
     platform: Optional[str] = Query(None, description="渠道：LINE/Facebook/Webchat"),
     jwt_token: Optional[str] = Query(None, description="FB 渠道需要的 JWT token"),
     db: AsyncSession = Depends(get_db),
@@ -156,12 +158,16 @@ async def get_chat_messages(
 
     從 conversation_messages 表查詢該會員的歷史對話
     透過 member.line_uid 作為 thread_id 查詢
-    按 created_at 降序排列（最新在前）
+    按 created_at 降序取出、每頁內由舊到新
+
+    分頁：第一頁不帶 before，之後帶上一頁的 next_cursor 當 before（游標分頁，不做 COUNT，
+    翻多深都一樣快）。仍帶 page>1 的舊呼叫端走 OFFSET 分頁並回傳 total。
 
     Args:
         member_id: 會員 ID
         page: 頁碼（預設 1）
         page_size: 每頁筆數（預設 50，最大 100）
+        before: 游標（上一頁的 next_cursor）
         db: 數據庫 session
 
     Returns:
@@ -242,7 +248,16 @@ async def get_chat_messages(
             )
 
         # LINE/Webchat：從本地資料庫獲取
-        result = await chatroom_service.get_messages(member, resolved_platform, page, page_size)
+        if before or page == 1:
+            try:
+                cursor = decode_message_cursor(before) if before else None
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            result = await chatroom_service.get_messages_before(
+                member, resolved_platform, page_size, before=cursor
+            )
+        else:
+            result = await chatroom_service.get_messages(member, resolved_platform, page, page_size)
 
         messages = []
         for record in result["messages"]:
@@ -263,15 +278,16 @@ async def get_chat_messages(
                 flexMessage=record.get("flexMessage"),
             ))
 
-        logger.info(f"✅ 成功獲取 {len(messages)} 筆聊天紀錄（共 {result['total']} 筆）")
+        logger.info(f"✅ 成功獲取 {len(messages)} 筆聊天紀錄（has_more={result['has_more']}）")
 
         return SuccessResponse(
             data=ChatMessagesResponse(
                 messages=messages,
-                total=result["total"],
+                total=result.get("total"),
                 page=page,
                 page_size=page_size,
-                has_more=result["has_more"]
+                has_more=result["has_more"],
+                next_cursor=result.get("next_cursor"),
             ).model_dump()
         )
 
@@ -5,16 +5,19 @@ Website chatbot booking API.
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
 from datetime import datetime
 from app.core.timezone import ensure_utc, OPERATING_TZ
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.api.v1.auth import get_current_user
+from app.database import AsyncSessionLocal, get_db
 from app.models.chatbot_booking import FaqPmsConnection
 from app.schemas.chatbot import (BookingSaveInSchema, BookingSaveOutSchema,
                                  ChatbotMessageInSchema,
@@ -26,7 +29,8 @@ from app.schemas.chatbot import (BookingSaveInSchema, BookingSaveOutSchema,
 from app.services.chatbot_service import (chatbot_service, init_pms_from_db,
                                           set_pms_enabled)
 from app.services.pms_chatbot_client import pms_enabled as pms_configured
-from app.services.pms_chatbot_client import query_pms, query_pms_all_roomtypes
+from app.services.pms_chatbot_client import (pms_metrics, query_pms,
+                                             query_pms_all_roomtypes)
 
 logger = logging.getLogger(__name__)
 
@@ -157,6 +161,12 @@ async def get_pms_status(
     }
 
 
+@router.get("/pms-metrics", dependencies=[Depends(get_current_user)])
+async def get_pms_metrics():
+    """PMS 房況快取命中率與上游延遲（後台登入後才能看）"""
+    return pms_metrics()
+
+
 @router.put("/pms-status")
 async def update_pms_status(
     body: dict,
@@ -213,11 +223,8 @@ async def get_pms_rooms(
     try:
         today = date.today()
         tomorrow = today + timedelta(days=1)
-        result = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: query_pms_all_roomtypes(
-                today.isoformat(), tomorrow.isoformat(), hotelcode
-            ),
+        result = await query_pms_all_roomtypes(
+            today.isoformat(), tomorrow.isoformat(), hotelcode
         )
         rooms = []
         for room in result.get("room", []):
@@ -270,9 +277,7 @@ async def validate_pms_room_code(
         return {"valid": True, "message": "此 LINE 館別未接 PMS，跳過檢核"}
 
     try:
-        result = await asyncio.get_event_loop().run_in_executor(
-            None, lambda: query_pms("2026-01-01", "2026-01-02", None, 2, hotelcode)
-        )
+        result = await query_pms("2026-01-01", "2026-01-02", None, 2, hotelcode)
         pms_codes = {r["roomtype"] for r in result.get("room", [])}
         if room_code in pms_codes:
             return {"valid": True, "message": f"房型代碼 {room_code} 有效"}
@@ -325,6 +330,74 @@ async def chatbot_message(
         raise HTTPException(status_code=503, detail=f"PMS 查詢失敗：{exc}") from exc
 
 
+# 串流中的對話：使用者關掉視窗也讓對話跑完（寫入對話紀錄 / 貼標），保留參照避免被回收
+_stream_tasks: set = set()
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/message/stream")
+async def chatbot_message_stream(payload: ChatbotMessageInSchema) -> StreamingResponse:
+    """
+    /message 的串流版（SSE），事件依序為：
+
+    - tool：{"name", "status": "start" | "done"}，AI 呼叫的工具（查空房 / 查 FAQ…）
+    - reply_delta：{"text"}，AI 回覆片段
+    - reply_reset：{}，先前的片段作廢（AI 接著改呼叫工具）
+    - done：ChatbotMessageOutSchema（房卡 / reply_type / booking_context；reply 以此為準）
+    - error：{"detail"}
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def on_event(event: str, data: dict) -> None:
+        await queue.put((event, data))
+
+    async def run() -> None:
+        # 自己開 session：yield 型 dependency 的 session 在回應開始串流前就會關閉
+        async with AsyncSessionLocal() as db:
+            try:
+                out = await chatbot_service.handle_message(
+                    browser_key=payload.browser_key,
+                    message=payload.message,
+                    hotel_id=payload.hotel_id,
+                    db=db,
+                    test_mode=payload.test_mode,
+                    site_id=payload.site_id,
+                    site_name=payload.site_name,
+                    admin_test=payload.admin_test,
+                    line_channel_id=payload.line_channel_id,
+                    on_event=on_event,
+                )
+                await db.commit()
+                await queue.put(("done", out.model_dump(mode="json")))
+            except Exception as exc:
+                await db.rollback()
+                logger.exception("[chatbot] streaming message failed")
+                detail = str(exc) if isinstance(exc, ValueError) else f"PMS 查詢失敗：{exc}"
+                await queue.put(("error", {"detail": detail}))
+
+    async def event_stream():
+        task = asyncio.create_task(run())
+        _stream_tasks.add(task)
+        task.add_done_callback(_stream_tasks.discard)
+        while True:
+            event, data = await queue.get()
+            yield _sse(event, data)
+            if event in ("done", "error"):
+                break
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # nginx 不緩衝 SSE
+        },
+    )
+
+
 @router.get("/rooms", response_model=ChatbotRoomsOutSchema)
 async def chatbot_rooms(
     browser_key: str = Query(...),
@@ -382,7 +455,7 @@ async def chatbot_confirm_room(payload: ConfirmRoomInSchema) -> ConfirmRoomOutSc
             },
         )
 
-    return chatbot_service.confirm_rooms(
+    return await chatbot_service.confirm_rooms(
         browser_key=payload.browser_key,
         rooms=rooms,
     )
@@ -390,13 +463,13 @@ async def chatbot_confirm_room(payload: ConfirmRoomInSchema) -> ConfirmRoomOutSc
 
 @router.post("/session/reset", response_model=SessionResetOutSchema)
 async def chatbot_session_reset(payload: SessionResetInSchema) -> SessionResetOutSchema:
-    return chatbot_service.reset(payload.browser_key)
+    return await chatbot_service.reset(payload.browser_key)
 
 
 @router.post("/booking-save", response_model=BookingSaveOutSchema)
 async def chatbot_booking_save(payload: BookingSaveInSchema) -> BookingSaveOutSchema:
     """POST /chatbot/booking-save — validate + persist booking."""
-    return chatbot_service.booking_save(
+    return await chatbot_service.booking_save(
         browser_key=payload.browser_key,
         member_name=payload.member_name,
         member_phone=payload.member_phone,
@@ -5,12 +5,21 @@ GET /conversations/export.csv
 產出 UTF-8 BOM 編碼的 CSV，欄位：
   thread_id / 渠道 / 身份 / 名稱 / 時間 / 角色 / 內容
 支援篩選：渠道、日期區間、會員/訪客、單一會員 ID。
+
+大量匯出：
+  - 以 server-side cursor 分批（_BATCH_SIZE 筆）讀取並輸出，記憶體用量固定
+  - gzip=true 輸出 .csv.gz
+  - limit 分段匯出：還有下一段時回應 header 帶 X-Export-Next-Cursor，
+    下一次請求以 cursor=<該值> 從上一段最後一筆之後接續（依 created_at, id 排序）
 """
 from __future__ import annotations
 
+import base64
 import csv
 import io
+import json
 import logging
+import zlib
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
@@ -20,7 +29,7 @@ from fastapi.responses import StreamingResponse
 from sqlalchemy import select, and_, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_db
+from app.database import AsyncSessionLocal, get_db
 from app.models.conversation import ConversationMessage, ConversationThread
 from app.models.member import Member
 
@@ -30,6 +39,10 @@ router = APIRouter()
 _VALID_CHANNELS = {"LINE", "Facebook", "Webchat"}
 _VALID_MEMBER_TYPES = {"all", "member", "guest"}
 
+# 每批從 DB 取回並寫出的筆數
+_BATCH_SIZE = 1000
+_CSV_HEADER = ["thread_id", "渠道", "身份", "名稱", "時間", "角色", "內容"]
+
 
 def _parse_date(label: str, value: Optional[str]) -> Optional[datetime]:
     """解析 YYYY-MM-DD，回傳 naive datetime（台灣時間，與 DB 慣例一致）"""
@@ -68,6 +81,73 @@ def _identity_label(member: Optional[Member]) -> tuple[str, str]:
     return ("會員", member.name or member.line_display_name or member.fb_customer_name or member.webchat_name or f"member#{member.id}")
 
 
+def _encode_cursor(created_at: datetime, message_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), message_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(token: str) -> tuple[datetime, str]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(message_id)
+    except (ValueError, TypeError) as exc:
+        raise HTTPException(status_code=400, detail="cursor 格式錯誤") from exc
+
+
+def _csv_row(msg: ConversationMessage, thread: ConversationThread, member: Optional[Member]) -> list:
+    identity, display_name = _identity_label(member)
+    created = msg.created_at
+    # created_at 是 DB naive UTC → 轉營運時區再格式化（CSV 輸出台北牆鐘）
+    time_str = ensure_utc(created).astimezone(OPERATING_TZ).strftime("%Y-%m-%d %H:%M:%S") if created else ""
+    role = _format_role(msg.direction, msg.message_source)
+    content = msg.content or ""
+    # 房卡訊息以 [房型卡片] 標示，避免 JSON 塞爆 Excel 一格
+    if msg.message_type == "room_cards":
+        content = "[房型卡片]"
+    return [
+        thread.id,
+        msg.platform or "",
+        identity,
+        display_name,
+        time_str,
+        role,
+        content,
+    ]
+
+
+async def _iter_csv(stmt, compress: bool):
+    """
+    以 server-side cursor 串流查詢結果，每 _BATCH_SIZE 筆輸出一次。
+    自己開 session：yield 型 dependency 的 session 在回應開始串流前就會關閉。
+    """
+    gz = zlib.compressobj(wbits=31) if compress else None  # wbits=31 → gzip 格式
+
+    def emit(text: str) -> bytes:
+        data = text.encode("utf-8")
+        return gz.compress(data) if gz else data
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # UTF-8 BOM 讓 Excel 正確解 UTF-8 中文
+    buf.write("\ufeff")
+    writer.writerow(_CSV_HEADER)
+    yield emit(buf.getvalue())
+    buf.seek(0); buf.truncate(0)
+
+    async with AsyncSessionLocal() as session:
+        result = await session.stream(stmt.execution_options(yield_per=_BATCH_SIZE))
+        async for partition in result.partitions():
+            writer.writerows(_csv_row(msg, thread, member) for msg, thread, member in partition)
+            chunk = emit(buf.getvalue())
+            buf.seek(0); buf.truncate(0)
+            if chunk:
+                yield chunk
+
+    if gz:
+        yield gz.flush()
+
+
 @router.get("/conversations/export.csv")
 async def export_conversations(
     channel: Optional[str] = Query(None, description="LINE / Facebook / Webchat（不填=全部）"),
@@ -75,6 +155,9 @@ async def export_conversations(
     date_to: Optional[str] = Query(None, description="結束日期 YYYY-MM-DD（含）"),
     member_type: str = Query("all", pattern="^(all|member|guest)$"),
     member_id: Optional[int] = Query(None, description="僅匯出特定會員/訪客"),
+    gzip: bool = Query(False, description="以 gzip 壓縮輸出（.csv.gz）"),
+    limit: Optional[int] = Query(None, ge=1, description="本次最多匯出筆數（分段匯出）"),
+    cursor: Optional[str] = Query(None, description="接續上一段的 X-Export-Next-Cursor"),
     db: AsyncSession = Depends(get_db),
 ):
     """匯出對話紀錄為 CSV"""
@@ -86,13 +169,9 @@ async def export_conversations(
     # date_to 含當日 → +1 天再用 < 比較
     dt_exclusive = dt + timedelta(days=1) if dt else None
 
+    after = _decode_cursor(cursor) if cursor else None
+
     # 組查詢條件
-    stmt = (
-        select(ConversationMessage, ConversationThread, Member)
-        .join(ConversationThread, ConversationMessage.thread_id == ConversationThread.id)
-        .outerjoin(Member, ConversationThread.member_id == Member.id)
-        .order_by(ConversationMessage.created_at.asc())
-    )
     conds = []
     if channel:
         conds.append(ConversationMessage.platform == channel)
@@ -106,58 +185,48 @@ async def export_conversations(
         conds.append(and_(Member.id.isnot(None), Member.is_guest == True))  # noqa: E712
     if member_id is not None:
         conds.append(Member.id == member_id)
-    if conds:
-        stmt = stmt.where(and_(*conds))
-
+    if after:
+        after_ts, after_id = after
+        conds.append(or_(
+            ConversationMessage.created_at > after_ts,
+            and_(ConversationMessage.created_at == after_ts, ConversationMessage.id > after_id),
+        ))
     # 排除群發
-    stmt = stmt.where(or_(
+    conds.append(or_(
         ConversationMessage.message_source != "broadcast",
         ConversationMessage.message_source.is_(None),
     ))
 
-    result = await db.execute(stmt)
-    rows = result.all()
-
-    # 串流輸出 CSV
-    def _iter_csv():
-        buf = io.StringIO()
-        # UTF-8 BOM 讓 Excel 正確解 UTF-8 中文
-        buf.write("﻿")
-        writer = csv.writer(buf)
-        writer.writerow(["thread_id", "渠道", "身份", "名稱", "時間", "角色", "內容"])
-        yield buf.getvalue()
-        buf.seek(0); buf.truncate(0)
-
-        for msg, thread, member in rows:
-            identity, display_name = _identity_label(member)
-            created = msg.created_at
-            # created_at 是 DB naive UTC → 轉營運時區再格式化（CSV 輸出台北牆鐘）
-            time_str = ensure_utc(created).astimezone(OPERATING_TZ).strftime("%Y-%m-%d %H:%M:%S") if created else ""
-            role = _format_role(msg.direction, msg.message_source)
-            content = msg.content or ""
-            # 房卡訊息以 [房型卡片] 標示，避免 JSON 塞爆 Excel 一格
-            if msg.message_type == "room_cards":
-                content = "[房型卡片]"
-            writer.writerow([
-                thread.id,
-                msg.platform or "",
-                identity,
-                display_name,
-                time_str,
-                role,
-                content,
-            ])
-            yield buf.getvalue()
-            buf.seek(0); buf.truncate(0)
+    def _filtered(*columns):
+        return (
+            select(*columns)
+            .join(ConversationThread, ConversationMessage.thread_id == ConversationThread.id)
+            .outerjoin(Member, ConversationThread.member_id == Member.id)
+            .where(and_(*conds))
+            # id 當第二排序鍵，同一秒多筆訊息時 cursor 接續也不重不漏
+            .order_by(ConversationMessage.created_at.asc(), ConversationMessage.id.asc())
+        )
+
+    stmt = _filtered(ConversationMessage, ConversationThread, Member)
+    headers = {}
+    if limit:
+        stmt = stmt.limit(limit)
+        # 只取本段最後一筆與下一筆的 key：有下一筆才給 cursor
+        boundary = (await db.execute(
+            _filtered(ConversationMessage.created_at, ConversationMessage.id)
+            .offset(limit - 1)
+            .limit(2)
+        )).all()
+        if len(boundary) == 2:
+            headers["X-Export-Next-Cursor"] = _encode_cursor(*boundary[0])
 
     # 檔名帶時間戳，避免重複下載互蓋
     now_str = datetime.now(OPERATING_TZ).strftime("%Y%m%d_%H%M%S")
-    filename = f"conversations_{now_str}.csv"
+    filename = f"conversations_{now_str}.csv" + (".gz" if gzip else "")
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
 
     return StreamingResponse(
-        _iter_csv(),
-        media_type="text/csv; charset=utf-8",
-        headers={
-            "Content-Disposition": f'attachment; filename="{filename}"',
-        },
+        _iter_csv(stmt, gzip),
+        media_type="application/gzip" if gzip else "text/csv; charset=utf-8",
+        headers=headers,
     )
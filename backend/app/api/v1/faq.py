@@ -2,7 +2,6 @@
 FAQ 知識庫管理 API
 """
 
-import asyncio
 import csv
 import io
 import json
@@ -29,6 +28,7 @@ from app.schemas.faq import (AiTestChatRequestSchema, AiTokenUsageUpdateSchema,
                              FaqRuleToggleSchema, FaqRuleUpdateSchema)
 from app.services.chatbot_service import chatbot_service as ai_chatbot
 from app.services.faq_service import FaqService
+from app.services.token_ledger import token_ledger
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -750,11 +750,8 @@ async def _test_pms_connection_impl(
             effective_hotelcode = existing.hotelcode
 
     try:
-        result = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: query_pms(
-                "2026-01-01", "2026-01-02", None, 2, effective_hotelcode
-            ),
+        result = await query_pms(
+            "2026-01-01", "2026-01-02", None, 2, effective_hotelcode, use_cache=False
         )
         room_count = len(result.get("room", []))
         return True, f"連線成功，取得 {room_count} 種房型資料", room_count
@@ -952,9 +949,11 @@ async def get_token_usage(
             },
         }
 
-    remaining = max(0, usage.total_quota - usage.used_amount)
+    # 加上本 worker 尚未寫回的扣量
+    used_amount = usage.used_amount + token_ledger.pending_for(usage.id)
+    remaining = max(0, usage.total_quota - used_amount)
     usage_percent = (
-        round(usage.used_amount / usage.total_quota * 100, 1)
+        round(used_amount / usage.total_quota * 100, 1)
         if usage.total_quota > 0
         else 0
     )
@@ -967,7 +966,7 @@ async def get_token_usage(
             "industry_id": usage.industry_id,
             "channel_id": usage.channel_id,
             "total_quota": usage.total_quota,
-            "used_amount": usage.used_amount,
+            "used_amount": used_amount,
             "remaining": remaining,
             "usage_percent": usage_percent,
         },
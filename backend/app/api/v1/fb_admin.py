@@ -5,6 +5,7 @@ FB Admin proxy — 後端代打 api-youth-tycg/firm_login，
 import httpx
 from fastapi import APIRouter, HTTPException
 
+from app.clients.http_pool import FB_API, http_pool
 from app.config import settings
 
 router = APIRouter()
@@ -24,15 +25,16 @@ async def fb_firm_login_proxy():
         raise HTTPException(status_code=500, detail="FB_FIRM_PASSWORD 未設定")
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{fb_api_base}/api/v1/admin/firm_login",
-                json={
-                    "account": settings.FB_FIRM_ACCOUNT,
-                    "password": settings.FB_FIRM_PASSWORD,
-                },
-                headers={"Content-Type": "application/json"},
-            )
+        response = await http_pool.post(
+            FB_API,
+            f"{fb_api_base}/api/v1/admin/firm_login",
+            json={
+                "account": settings.FB_FIRM_ACCOUNT,
+                "password": settings.FB_FIRM_PASSWORD,
+            },
+            headers={"Content-Type": "application/json"},
+            timeout=10.0,
+        )
     except httpx.RequestError as e:
         raise HTTPException(status_code=502, detail=f"無法連接 FB API: {e}") from e
 
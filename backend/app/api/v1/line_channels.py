@@ -7,8 +7,10 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from typing import Optional, List
 import logging
-import requests
 
+import httpx
+
+from app.clients.http_pool import LINE_APP, http_pool
 from app.database import get_db
 from app.models.line_channel import LineChannel
 from app.models.user import User, UserRole
@@ -38,7 +40,7 @@ def _has_value(value: Optional[str]) -> bool:
     return bool(value and value.strip())
 
 
-def fetch_bot_info_from_line(channel_access_token: str) -> dict:
+async def fetch_bot_info_from_line(channel_access_token: str) -> dict:
     """
     調用 Flask line_app 的 /api/bot/basic-id 端點獲取 LINE Bot 資訊
 
@@ -54,10 +56,11 @@ def fetch_bot_info_from_line(channel_access_token: str) -> dict:
         from app.config import settings
         flask_url = f"{settings.LINE_APP_URL}/api/bot/basic-id"
 
-        response = requests.post(
+        response = await http_pool.post(
+            LINE_APP,
             flask_url,
             json={"channel_access_token": channel_access_token},
-            timeout=10
+            timeout=10.0,
         )
 
         if response.status_code == 200:
@@ -72,13 +75,13 @@ def fetch_bot_info_from_line(channel_access_token: str) -> dict:
         logger.warning(f"⚠️ 無法獲取 Bot 資訊: status={response.status_code}, response={response.text[:200]}")
         return result
 
-    except requests.exceptions.ConnectionError as e:
+    except httpx.ConnectError as e:
         logger.error(f"❌ 無法連接到 Flask line_app (port 3001): {str(e)}")
         return result
-    except requests.exceptions.Timeout as e:
+    except httpx.TimeoutException as e:
         logger.error(f"❌ 請求 Flask line_app 超時: {str(e)}")
         return result
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"❌ 請求 Bot 資訊時發生網路錯誤: {str(e)}")
         return result
     except Exception as e:
@@ -86,6 +89,23 @@ def fetch_bot_info_from_line(channel_access_token: str) -> dict:
         return result
 
 
+async def notify_line_app_channel_changed(line_channel_id: Optional[str] = None) -> None:
+    """
+    通知 line_app 清掉該頻道快取的憑證 / MessagingApi / WebhookHandler
+    （line_channel_id 為 None 表示全部清空；失敗只記 log，line_app 仍會在 TTL 到期後重抓）
+    """
+    try:
+        from app.config import settings
+        await http_pool.post(
+            LINE_APP,
+            f"{settings.LINE_APP_URL}/api/line_channels/invalidate_cache",
+            json={"channel_id": line_channel_id},
+            timeout=3.0,
+        )
+    except httpx.HTTPError as e:
+        logger.warning(f"⚠️ 通知 line_app 清除頻道快取失敗: {e}")
+
+
 def _collect_missing_fields(channel: LineChannel) -> List[str]:
     """檢查頻道設定缺少哪些必填欄位"""
 
@@ -223,7 +243,7 @@ async def create_channel(
 
         # 自動獲取 Basic ID + Channel Name
         if data.channel_access_token:
-            bot_info = fetch_bot_info_from_line(data.channel_access_token)
+            bot_info = await fetch_bot_info_from_line(data.channel_access_token)
             if bot_info["basic_id"]:
                 channel.basic_id = bot_info["basic_id"]
             if bot_info["display_name"]:
@@ -301,6 +321,7 @@ async def create_channel(
 
         await db.commit()
         await db.refresh(channel)
+        await notify_line_app_channel_changed(channel.channel_id)
 
         logger.info(
             f"✅ 創建 LINE 頻道設定: ID={channel.id}, channel_id={channel.channel_id}, "
@@ -344,17 +365,22 @@ async def update_channel(
         # 🆕 當 token 更新時，自動重新獲取 Basic ID + Channel Name
         if "channel_access_token" in update_data:
             new_token = update_data["channel_access_token"]
-            bot_info = fetch_bot_info_from_line(new_token)
+            bot_info = await fetch_bot_info_from_line(new_token)
             if bot_info["basic_id"]:
                 update_data["basic_id"] = bot_info["basic_id"]
             if bot_info["display_name"]:
                 update_data["channel_name"] = bot_info["display_name"]
 
+        old_line_channel_id = channel.channel_id
         for field, value in update_data.items():
             setattr(channel, field, value)
 
         await db.commit()
         await db.refresh(channel)
+        # channel_id 本身被改掉時舊 key 也要清，直接全部失效
+        await notify_line_app_channel_changed(
+            channel.channel_id if channel.channel_id == old_line_channel_id else None
+        )
 
         logger.info(f"✅ 更新 LINE 頻道設定: ID={channel_id}, 更新欄位={list(update_data.keys())}")
         return channel
@@ -388,8 +414,10 @@ async def delete_channel(
             raise HTTPException(status_code=404, detail="頻道設定不存在")
 
         # 刪除設定
+        line_channel_id = channel.channel_id
         await db.delete(channel)
         await db.commit()
+        await notify_line_app_channel_changed(line_channel_id)
 
         logger.info(f"✅ 刪除 LINE 頻道設定: ID={channel_id}")
         return SuccessResponse(message="頻道設定已重置")
@@ -423,11 +451,8 @@ async def test_hotelcode(data: dict):
         )
 
     try:
-        import asyncio
-
-        result = await asyncio.get_event_loop().run_in_executor(
-            None,
-            lambda: query_pms("2026-01-01", "2026-01-02", None, 2, hotelcode),
+        result = await query_pms(
+            "2026-01-01", "2026-01-02", None, 2, hotelcode, use_cache=False
         )
         room_count = len(result.get("room") or [])
         if room_count == 0:
@@ -516,10 +541,11 @@ async def get_basic_id(data: dict):
     from app.config import settings
     try:
         flask_url = f"{settings.LINE_APP_URL}/api/bot/basic-id"
-        response = requests.post(
+        response = await http_pool.post(
+            LINE_APP,
             flask_url,
             json={"channel_access_token": token},
-            timeout=10,
+            timeout=10.0,
         )
         return response.json()
     except Exception as e:
@@ -14,6 +14,7 @@ from app.database import get_db
 from app.models.member import Member
 from app.models.conversation import ConversationMessage
 from app.services.chatroom_service import ChatroomService
+from app.services.thread_summary import record_messages
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -100,6 +101,9 @@ async def notify_new_message(
                 created_at=created_at_local,
             )
             db.add(msg)
+            # 只有 backend 補寫的訊息才計入摘要；line_app 已寫入的訊息由 line_app 計入
+            await db.flush()
+            await record_messages(db, [msg])
 
         thread.last_message_at = msg.created_at
 
@@ -9,7 +9,7 @@ from app.database import get_db
 from app.models.member import Member
 from app.models.tag import MemberTag, MemberInteractionTag
 from app.models.user import User
-from app.models.conversation import ConversationMessage
+from app.models.conversation import ConversationMessage, ConversationThreadSummary
 from app.models.line_channel import LineChannel
 from app.models.fb_channel import FbChannel
 from app.schemas.member import (
@@ -36,6 +36,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 from app.services.chatroom_service import ChatroomService
+from app.services.member_search import member_search_filter
 from app.api.v1.chat_messages import _extract_fb_template_text
 from app.core.timezone import to_utc_iso, now_utc
 
@@ -43,6 +44,15 @@ from app.websocket_manager import manager
 router = APIRouter()
 
 
+def _apply_member_scope(query, tenant_id: Optional[int], line_channel_id: Optional[str]):
+    """組織隔離：tenant_id 提供時優先（支援無 LINE 組織）；否則退回 line_channel_id"""
+    if tenant_id is not None:
+        return query.where(Member.tenant_id == tenant_id)
+    if line_channel_id:
+        return query.where(Member.line_channel_id == line_channel_id)
+    return query
+
+
 @router.get("", response_model=SuccessResponse)
 async def get_members(
     params: MemberSearchParams = Depends(),
@@ -70,24 +80,11 @@ async def get_members(
     elif member_type == "guest":
         query = query.where(Member.is_guest == True)  # noqa: E712
 
-    # 搜索條件（已在 Schema 層驗證和清理）
+    # 搜索條件（已在 Schema 層驗證和清理）：MySQL 走 ngram 全文索引，依相關度排序
+    search_score = None
     if params.search:
-        # 使用 escape 參數防止 LIKE 通配符注入
-        # params.search 已經過 InputValidator.sanitize_search_input() 驗證
-        from app.utils.validators import InputValidator
-
-        # 轉義 LIKE 特殊字符
-        escaped_search = InputValidator.escape_like_pattern(params.search)
-        search_pattern = f"%{escaped_search}%"
-
-        query = query.where(
-            or_(
-                Member.name.like(search_pattern, escape='\\'),
-                Member.email.like(search_pattern, escape='\\'),
-                Member.phone.like(search_pattern, escape='\\'),
-                Member.line_display_name.like(search_pattern, escape='\\'),
-            )
-        )
+        search_condition, search_score = member_search_filter(params.search, db.get_bind().dialect.name)
+        query = query.where(search_condition)
 
     # 來源篩選
     if params.join_source:
@@ -105,10 +102,7 @@ async def get_members(
         query = query.join(MemberTag).where(and_(*tag_conditions))
 
     # 組織隔離：tenant_id 提供時優先（支援無 LINE 組織）；否則退回 line_channel_id
-    if tenant_id is not None:
-        query = query.where(Member.tenant_id == tenant_id)
-    elif line_channel_id:
-        query = query.where(Member.line_channel_id == line_channel_id)
+    query = _apply_member_scope(query, tenant_id, line_channel_id)
 
     # 取得所有啟用中的 LINE channel_id
     active_line_channel_ids_result = await db.execute(
@@ -144,12 +138,15 @@ async def get_members(
         )
 
     # 排序 (MySQL 兼容版本)
-    if params.sort_by == "last_interaction_at":
+    sort_by = params.sort_by or ("relevance" if search_score is not None else "last_interaction_at")
+    if sort_by == "relevance" and search_score is not None:
+        query = query.order_by(search_score.desc(), Member.last_interaction_at.desc(), Member.id.desc())
+    elif sort_by == "last_interaction_at":
         if params.order == "desc":
             query = query.order_by(Member.last_interaction_at.desc())
         else:
             query = query.order_by(Member.last_interaction_at.asc())
-    elif params.sort_by == "created_at":
+    elif sort_by == "created_at":
         if params.order == "desc":
             query = query.order_by(Member.created_at.desc())
         else:
@@ -181,78 +178,46 @@ async def get_members(
     # 同步收集 webchat_uid，讓訪客 / 已加入會員的 webchat 也能顯示最後互動時間與紅點
     member_webchat_uids = [m.webchat_uid for m in members if m.webchat_uid]
     all_lookup_uids = list({*member_line_uids, *member_webchat_uids})
+    unread_counts: Dict[str, int] = {}  # {thread_id: 未讀 incoming 數}
 
     if all_lookup_uids:
-        # conversation_messages 的 thread_id = platform_uid (line_uid 或 webchat_uid)
-        platform_filter = or_(
-            ConversationMessage.platform == 'LINE',
-            ConversationMessage.platform == 'Webchat',
-            ConversationMessage.platform.is_(None),
-        )
-
-        # (1) 最後聊天時間：含群發 —— 依需求群發也算一次互動，故不過濾 message_source
-        time_subq = (
-            select(
-                ConversationMessage.thread_id,
-                func.max(ConversationMessage.created_at).label('max_created_at')
-            )
-            .where(
-                ConversationMessage.thread_id.in_(all_lookup_uids),
-                platform_filter,
-            )
-            .group_by(ConversationMessage.thread_id)
-        ).subquery()
-
-        time_result = await db.execute(
-            select(time_subq.c.thread_id, time_subq.c.max_created_at)
-        )
-        for thread_id, max_created_at in time_result:
-            last_chat_times[thread_id] = max_created_at
-
-        # (2) 藍點（未回覆判斷）：排除群發
-        # 避免一次群發把所有等待中的藍點清掉、也避免群發蓋掉「最後一筆是 incoming」的判斷
-        blue_subq = (
-            select(
-                ConversationMessage.thread_id,
-                func.max(ConversationMessage.created_at).label('max_created_at')
-            )
-            .where(
-                ConversationMessage.thread_id.in_(all_lookup_uids),
-                platform_filter,
-                or_(
-                    ConversationMessage.message_source != 'broadcast',
-                    ConversationMessage.message_source.is_(None),
-                ),
-            )
-            .group_by(ConversationMessage.thread_id)
-        ).subquery()
-
-        chat_result = await db.execute(
-            select(
-                ConversationMessage.thread_id,
-                ConversationMessage.created_at,
-                ConversationMessage.direction,
-                ConversationMessage.message_source,
-                ConversationMessage.unanswered,
+        # 對話摘要（conversation_thread_summary，寫入訊息時增量維護）：一次主鍵查詢取代對全歷史 GROUP BY
+        # thread_id = platform_uid (line_uid 或 webchat_uid)；platform 為 NULL 的舊訊息在摘要中記為 LINE
+        summary_result = await db.execute(
+            select(ConversationThreadSummary).where(
+                ConversationThreadSummary.thread_id.in_(all_lookup_uids),
+                ConversationThreadSummary.platform.in_(["LINE", "Webchat"]),
             )
-            .join(blue_subq, and_(
-                ConversationMessage.thread_id == blue_subq.c.thread_id,
-                ConversationMessage.created_at == blue_subq.c.max_created_at
-            ))
         )
-
-        for thread_id, created_at, direction, message_source, unanswered in chat_result:
+        last_non_broadcast = {}
+        for summary in summary_result.scalars():
+            tid = summary.thread_id
+            # (1) 最後聊天時間：含群發 —— 依需求群發也算一次互動
+            if summary.last_message_at and (
+                tid not in last_chat_times or summary.last_message_at > last_chat_times[tid]
+            ):
+                last_chat_times[tid] = summary.last_message_at
+            unread_counts[tid] = unread_counts.get(tid, 0) + (summary.unread_count or 0)
+            # (2) 藍點（未回覆判斷）：看最後一則非群發訊息
+            # 避免一次群發把所有等待中的藍點清掉、也避免群發蓋掉「最後一筆是 incoming」的判斷
+            if summary.last_non_broadcast_at and (
+                tid not in last_non_broadcast
+                or summary.last_non_broadcast_at > last_non_broadcast[tid].last_non_broadcast_at
+            ):
+                last_non_broadcast[tid] = summary
+
+        for thread_id, summary in last_non_broadcast.items():
             # 亮藍點的條件：
             # (a) 最後一筆是 incoming（使用者訊息尚未被回覆）
             # (b) 最後一筆是 AI 回覆但被標記 unanswered=1（mark_unanswerable 觸發）→ 需人工介入
-            is_user_waiting = direction == 'incoming'
+            is_user_waiting = summary.last_non_broadcast_direction == 'incoming'
             is_ai_failed = (
-                direction == 'outgoing'
-                and message_source == 'gpt'
-                and bool(unanswered)
+                summary.last_non_broadcast_direction == 'outgoing'
+                and summary.last_non_broadcast_source == 'gpt'
+                and bool(summary.last_unanswered)
             )
             if is_user_waiting or is_ai_failed:
-                unanswered_members[thread_id] = created_at
+                unanswered_members[thread_id] = summary.last_non_broadcast_at
 
     # 多 OA：建立 channel_id -> channel_name 映射，依會員實際所屬 OA 顯示
     line_channels_map_res = await db.execute(
@@ -299,6 +264,8 @@ async def get_members(
         if lookup_uid and lookup_uid in last_chat_times:
             member_dict["last_interaction_at"] = to_utc_iso(last_chat_times[lookup_uid])
 
+        member_dict["unread_count"] = unread_counts.get(lookup_uid, 0) if lookup_uid else 0
+
         # 添加未回覆狀態
         if lookup_uid and lookup_uid in unanswered_members:
             member_dict["is_unanswered"] = True
@@ -369,6 +336,57 @@ async def get_member_count(
     return SuccessResponse(data={"count": count or 0})
 
 
+@router.get("/suggest", response_model=SuccessResponse)
+async def suggest_members(
+    q: str = Query(..., min_length=1, max_length=100, description="輸入中的關鍵字（姓名 / Email / 手機片段）"),
+    limit: int = Query(8, ge=1, le=20),
+    line_channel_id: Optional[str] = Query(None, description="特定 LINE OA channel_id（多分館隔離用）"),
+    tenant_id: Optional[int] = Query(None, description="特定組織 ID（組織隔離；提供時優先於 line_channel_id）"),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    搜尋框即時建議（typeahead）
+
+    與會員列表共用 ngram 全文索引與隔離規則；開頭即命中的排前面，不做分頁也不計總數。
+    """
+    from app.utils.validators import InputValidator
+
+    try:
+        search = InputValidator.sanitize_search_input(q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not search:
+        return SuccessResponse(data={"items": []})
+
+    condition, score = member_search_filter(search, db.get_bind().dialect.name)
+    query = _apply_member_scope(select(Member).where(condition), tenant_id, line_channel_id)
+    # 與列表相同：未啟用 LINE 帳號的會員不顯示
+    query = query.where(
+        or_(
+            Member.line_uid.is_(None),
+            Member.line_channel_id.in_(
+                select(LineChannel.channel_id).where(LineChannel.is_active == True)  # noqa: E712
+            ),
+        )
+    )
+    query = query.order_by(score.desc(), Member.last_interaction_at.desc(), Member.id.desc()).limit(limit)
+
+    members = (await db.execute(query)).scalars().all()
+    items = [
+        {
+            "id": m.id,
+            "name": m.name,
+            "line_display_name": m.line_display_name,
+            "avatar": m.line_avatar or m.fb_avatar or m.webchat_avatar,
+            "email": m.email,
+            "phone": m.phone,
+            "is_guest": bool(m.is_guest),
+        }
+        for m in members
+    ]
+    return SuccessResponse(data={"items": items})
+
+
 def _validate_platform(platform: Optional[str]) -> Optional[str]:
     """Validate and normalize platform parameter."""
     if not platform:
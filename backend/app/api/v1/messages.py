@@ -274,7 +274,7 @@ async def send_message(
         logger.info(f"✅ 發送完成：成功 {sent_count}，失敗 {failed_count}")
 
         return MessageSendResponse(
-            message="發送成功",
+            message="已開始發送" if result.get("job_id") else "發送成功",
             sent_count=sent_count,
             failed_count=failed_count,
             errors=result.get("errors")
@@ -0,0 +1,38 @@
+"""
+排程任務狀態
+=============================
+GET /admin/scheduler/jobs
+
+列出 DB 排程任務（scheduled_jobs）與各狀態數量，供確認多 worker 下的認領 / 重試 / 補跑情形。
+- status：只列出此狀態（pending/running/succeeded/failed/canceled/expired），不帶則列全部（最近更新優先）
+- limit：筆數上限
+
+驗證：與 /admin/retention 相同，X-Cron-Token header（含 worker 主機名稱與錯誤訊息，不對外公開）
+"""
+from __future__ import annotations
+
+from typing import Optional
+
+from fastapi import APIRouter, Header, Query
+
+from app.api.v1.admin_retention import _verify_token
+from app.services.scheduler import scheduler
+
+router = APIRouter()
+
+_STATUSES = "^(pending|running|succeeded|failed|canceled|expired)$"
+
+
+@router.get("/jobs")
+async def list_scheduled_jobs(
+    status: Optional[str] = Query(None, pattern=_STATUSES),
+    limit: int = Query(100, ge=1, le=500),
+    x_cron_token: str | None = Header(None, alias="X-Cron-Token"),
+):
+    """排程任務列表 + 各狀態數量"""
+    _verify_token(x_cron_token)
+    return {
+        "worker_id": scheduler.worker_id,
+        "counts": await scheduler.get_job_counts(),
+        "jobs": await scheduler.get_scheduled_jobs(status=status, limit=limit),
+    }
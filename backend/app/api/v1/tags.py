@@ -482,16 +482,19 @@ async def get_tag_history(
 
 @router.get("/trends", response_model=SuccessResponse)
 async def get_tag_trends(
-    days: int = 7,
+    days: int = Query(7, ge=1, le=366, description="天數（營運時區，含今天）"),
     db: AsyncSession = Depends(get_db),
     # current_user: User = Depends(get_current_user),  # 暫時移除認證，開發階段使用
 ):
     """獲取標籤觸發趨勢資料（用於圖表展示）
 
-    從 TagTriggerLog 和 MemberTagRelation 表中統計實際資料。
+    讀數據洞察彙總表（營運時區日 × 標籤）：互動標籤取 analytics_tag_trigger_daily 的觸發次數 / 不重複會員數，
+    會員標籤取 analytics_member_tag_daily 的新貼標數；整張圖兩次查詢，不隨天數增加。
     """
-    from datetime import datetime, timedelta, timezone
-    from sqlalchemy import and_, distinct
+    from datetime import timedelta
+
+    from app.models.analytics_rollup import AnalyticsMemberTagDaily, AnalyticsTagTriggerDaily
+    from app.services.analytics_rollup import local_today
 
     # 獲取前10個最活躍的標籤（MySQL 不支持 NULLS LAST，使用 COALESCE 處理）
     member_tags_result = await db.execute(
@@ -523,70 +526,59 @@ async def get_tag_trends(
             "type": "interaction",
         })
 
+    today = local_today()
+    start = today - timedelta(days=days - 1)
+
+    # 互動標籤：(日期, tag_id) → (觸發次數, 不重複會員數)
+    trigger_stats = {}
+    interaction_ids = [t["id"] for t in all_tags if t["type"] == "interaction"]
+    if interaction_ids:
+        rows = await db.execute(
+            select(
+                AnalyticsTagTriggerDaily.bucket_date,
+                AnalyticsTagTriggerDaily.tag_id,
+                AnalyticsTagTriggerDaily.trigger_count,
+                AnalyticsTagTriggerDaily.member_count,
+            ).where(
+                AnalyticsTagTriggerDaily.tag_id.in_(interaction_ids),
+                AnalyticsTagTriggerDaily.bucket_date >= start,
+                AnalyticsTagTriggerDaily.bucket_date <= today,
+            )
+        )
+        trigger_stats = {(r.bucket_date, r.tag_id): (r.trigger_count, r.member_count) for r in rows}
+
+    # 會員標籤：(日期, 標籤名稱) → 當天新增的貼標數
+    tagged_stats = {}
+    member_names = list({t["tag_name"] for t in all_tags if t["type"] == "member"})
+    if member_names:
+        rows = await db.execute(
+            select(
+                AnalyticsMemberTagDaily.bucket_date,
+                AnalyticsMemberTagDaily.tag_name,
+                AnalyticsMemberTagDaily.tagged_count,
+            ).where(
+                AnalyticsMemberTagDaily.tag_name.in_(member_names),
+                AnalyticsMemberTagDaily.bucket_date >= start,
+                AnalyticsMemberTagDaily.bucket_date <= today,
+            )
+        )
+        tagged_stats = {(r.bucket_date, r.tag_name): r.tagged_count for r in rows}
+
     # 生成趨勢資料
     trends = []
-    today = datetime.now(OPERATING_TZ).date()
+    for i in range(days):
+        date = start + timedelta(days=i)
+        trend_item = {"date": date.strftime("%m/%d")}
 
-    for i in range(days - 1, -1, -1):
-        date = today - timedelta(days=i)
-        date_str = date.strftime("%m/%d")
-
-        # 設定日期範圍（當天00:00到23:59）
-        date_start = datetime.combine(date, datetime.min.time())
-        date_end = datetime.combine(date, datetime.max.time())
-
-        trend_item = {"date": date_str}
-
-        # 統計每個標籤的真實資料
         for tag in all_tags:
             if tag['type'] == 'interaction':
-                # 互動標籤：統計觸發次數和不重複會員數
-                trigger_count_result = await db.execute(
-                    select(func.count())
-                    .select_from(TagTriggerLog)
-                    .where(
-                        and_(
-                            TagTriggerLog.tag_id == tag['id'],
-                            TagTriggerLog.triggered_at >= date_start,
-                            TagTriggerLog.triggered_at <= date_end
-                        )
-                    )
-                )
-                trigger_count = trigger_count_result.scalar() or 0
-
-                member_count_result = await db.execute(
-                    select(func.count(distinct(TagTriggerLog.member_id)))
-                    .select_from(TagTriggerLog)
-                    .where(
-                        and_(
-                            TagTriggerLog.tag_id == tag['id'],
-                            TagTriggerLog.triggered_at >= date_start,
-                            TagTriggerLog.triggered_at <= date_end
-                        )
-                    )
-                )
-                member_count = member_count_result.scalar() or 0
-
+                trigger_count, member_count = trigger_stats.get((date, tag['id']), (0, 0))
                 trend_item[f"{tag['tag_name']}_trigger"] = trigger_count
                 trend_item[f"{tag['tag_name']}_member"] = member_count
             else:
-                # 會員標籤：統計當天新增的會員數（使用新的單表設計）
-                member_count_result = await db.execute(
-                    select(func.count())
-                    .select_from(MemberTag)
-                    .where(
-                        and_(
-                            MemberTag.tag_name == tag['tag_name'],
-                            MemberTag.tagged_at >= date_start,
-                            MemberTag.tagged_at <= date_end
-                        )
-                    )
-                )
-                member_count = member_count_result.scalar() or 0
-
                 # 會員標籤沒有觸發次數概念，設為0
                 trend_item[f"{tag['tag_name']}_trigger"] = 0
-                trend_item[f"{tag['tag_name']}_member"] = member_count
+                trend_item[f"{tag['tag_name']}_member"] = tagged_stats.get((date, tag['tag_name']), 0)
 
         trends.append(trend_item)
 
@@ -3,14 +3,13 @@ Image Upload API Endpoint
 上傳圖片接口
 """
 import uuid
-from datetime import datetime, timezone
-from io import BytesIO
+from datetime import datetime
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse
 from pathlib import Path
-from PIL import Image
 
 from app.config import settings
+from app.services.image_pipeline import process_upload, public_urls
 
 router = APIRouter()
 
@@ -47,9 +46,15 @@ async def upload_image(file: UploadFile = File(...)):
             "code": 200,
             "message": "上傳成功",
             "data": {
-                "url": "{PUBLIC_BASE}/uploads/20250128_abc12345.jpg",
-                "filename": "20250128_abc12345.jpg",
-                "size": 123456
+                "url": "{PUBLIC_BASE}/uploads/{hash}.jpg",
+                "webp_url": "{PUBLIC_BASE}/uploads/{hash}.webp",
+                "variants": [
+                    {"width": 240, "url": ".../{hash}_w240.jpg", "webp_url": ".../{hash}_w240.webp"},
+                    ...
+                ],
+                "filename": "{hash}.jpg",
+                "size": 123456,
+                "deduplicated": false
             }
         }
     """
@@ -79,58 +84,23 @@ async def upload_image(file: UploadFile = File(...)):
         if file_size == 0:
             raise HTTPException(status_code=400, detail="文件爲空")
 
-        # 4. 圖片處理
+        # 4. 圖片處理（process pool 內縮放 / 編碼，以內容 hash 命名，同圖重複上傳直接沿用）
         try:
-            # 讀取圖片
-            img = Image.open(BytesIO(contents))
-
-            # 確保為 RGB 模式 (處理 RGBA、灰階等)
-            if img.mode != 'RGB':
-                img = img.convert('RGB')
-
-            # 等比縮放至寬度上限 1200px
-            MAX_WIDTH = 1200
-            if img.width > MAX_WIDTH:
-                ratio = MAX_WIDTH / img.width
-                new_height = int(img.height * ratio)
-                img = img.resize((MAX_WIDTH, new_height), Image.LANCZOS)
-
-            # 保存為 JPEG（前端已裁切，不需要再裁切）
-            output = BytesIO()
-            img.save(output, format='JPEG', quality=95, optimize=True)
-            output.seek(0)
-            contents = output.read()
-            file_size = len(contents)
-
+            manifest = await process_upload(contents)
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"圖片處理失敗：{str(e)}")
 
-        # 5. 生成唯一文件名 (強制使用 .jpg)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        unique_filename = f"{timestamp}_{unique_id}.jpg"
-        file_path = settings.upload_dir_path / unique_filename
-
-        # 6. 確保上傳目錄存在
-        settings.upload_dir_path.mkdir(parents=True, exist_ok=True)
-
-        # 7. 保存文件
-        with open(file_path, "wb") as f:
-            f.write(contents)
-
-        # 8. 生成訪問URL
-        file_url = settings.get_public_url(unique_filename)
-
-        # 9. 返回成功響應
+        # 5. 返回成功響應（url 為主圖 JPEG；另附 WebP 與各寬度縮圖）
         return JSONResponse(
             status_code=200,
             content={
                 "code": 200,
                 "message": "上傳成功",
                 "data": {
-                    "url": file_url,
-                    "filename": unique_filename,
-                    "size": file_size
+                    **public_urls(manifest),
+                    "filename": manifest["jpg"],
+                    "size": manifest["size"],
+                    "deduplicated": manifest["deduplicated"],
                 }
             }
         )
@@ -0,0 +1,214 @@
+"""
+對外 HTTP 連線池
+每個上游服務（FB Meta Page 服務 / line_app / 閎運訂房 API / Facebook Graph）各一個
+長駐的 httpx.AsyncClient，連線 keep-alive 重複使用，不必每次呼叫都重做 DNS + TCP/TLS 握手。
+各上游有自己的逾時與同時請求數上限，並統計呼叫數 / 錯誤數 / 延遲（GET /health/upstreams）。
+
+應用啟動時 open() 建立、關閉時 aclose() 釋放；腳本 / 測試未呼叫 open() 時第一次請求才建立，
+event loop 換掉時（測試）會重建。
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:  # HTTP/2 需要 h2 套件（httpx[http2]）；沒裝就維持 HTTP/1.1
+    import h2  # noqa: F401
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+FB_API = "fb_api"
+LINE_APP = "line_app"
+BOOKING_API = "booking_api"
+FACEBOOK_GRAPH = "facebook_graph"
+
+
+@dataclass(frozen=True)
+class UpstreamSpec:
+    timeout: float
+    max_concurrency: int
+    # HTTP/2 只在 TLS 上協商；line_app 是內網明文 HTTP，不必開
+    http2: bool = True
+
+
+def _specs() -> dict[str, UpstreamSpec]:
+    # 建立 client 時才讀 settings（測試可 monkeypatch）
+    return {
+        FB_API: UpstreamSpec(settings.FB_API_TIMEOUT_SECONDS, settings.FB_API_MAX_CONCURRENCY),
+        LINE_APP: UpstreamSpec(
+            settings.LINE_APP_TIMEOUT_SECONDS, settings.LINE_APP_MAX_CONCURRENCY, http2=False
+        ),
+        BOOKING_API: UpstreamSpec(settings.BOOKING_API_TIMEOUT_SECONDS, settings.BOOKING_API_MAX_CONCURRENCY),
+        FACEBOOK_GRAPH: UpstreamSpec(
+            settings.FACEBOOK_GRAPH_TIMEOUT_SECONDS, settings.FACEBOOK_GRAPH_MAX_CONCURRENCY
+        ),
+    }
+
+
+class _UpstreamStats:
+    """單一上游的呼叫統計（跨 client 重建保留）"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self._latencies: deque[float] = deque(maxlen=500)
+
+    def record(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def snapshot(self) -> dict[str, Any]:
+        lat = sorted(self._latencies)
+
+        def pct(p: float) -> Optional[float]:
+            if not lat:
+                return None
+            return round(lat[min(len(lat) - 1, int(len(lat) * p))] * 1000, 1)
+
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.calls, 4) if self.calls else None,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "latency_ms_p50": pct(0.5),
+            "latency_ms_p95": pct(0.95),
+            "latency_ms_max": round(lat[-1] * 1000, 1) if lat else None,
+        }
+
+
+class _Upstream:
+    """綁定在某個 event loop 上的 client + 併發上限"""
+
+    def __init__(self, spec: UpstreamSpec, loop: asyncio.AbstractEventLoop) -> None:
+        self.spec = spec
+        self.loop = loop
+        self.http2 = spec.http2 and settings.HTTP2_ENABLED and HTTP2_AVAILABLE
+        self.semaphore = asyncio.Semaphore(spec.max_concurrency)
+        self.client = httpx.AsyncClient(
+            timeout=spec.timeout,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=spec.max_concurrency,
+                max_keepalive_connections=spec.max_concurrency,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+            ),
+        )
+
+
+class HttpPool:
+    """依上游名稱共用的 httpx.AsyncClient"""
+
+    def __init__(self) -> None:
+        self._upstreams: dict[str, _Upstream] = {}
+        self._stats: dict[str, _UpstreamStats] = {}
+
+    def _get(self, name: str) -> _Upstream:
+        loop = asyncio.get_running_loop()
+        upstream = self._upstreams.get(name)
+        if upstream is None or upstream.client.is_closed or upstream.loop is not loop:
+            specs = _specs()
+            if name not in specs:
+                raise KeyError(f"未知的上游服務: {name}")
+            upstream = _Upstream(specs[name], loop)
+            self._upstreams[name] = upstream
+        return upstream
+
+    def _stats_for(self, name: str) -> _UpstreamStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = _UpstreamStats()
+        return stats
+
+    def open(self) -> None:
+        """啟動時先建立所有上游的 client（需在 event loop 內呼叫）"""
+        for name in _specs():
+            self._get(name)
+        logger.info(
+            f"Outbound HTTP pool ready: {sorted(self._upstreams)} "
+            f"(http2={'on' if settings.HTTP2_ENABLED and HTTP2_AVAILABLE else 'off'})"
+        )
+
+    async def aclose(self) -> None:
+        """應用關閉時釋放所有連線"""
+        upstreams, self._upstreams = self._upstreams, {}
+        for upstream in upstreams.values():
+            if not upstream.client.is_closed:
+                await upstream.client.aclose()
+
+    async def request(self, name: str, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """
+        對上游 name 發送請求（kwargs 同 httpx.AsyncClient.request，可用 timeout= 覆寫單次逾時）
+
+        同時請求數超過上限時排隊等待；連線錯誤 / 逾時與 5xx 都記為錯誤，
+        例外照常往外拋，由呼叫端決定如何處理。
+        """
+        upstream = self._get(name)
+        stats = self._stats_for(name)
+
+        stats.waiting += 1
+        try:
+            await upstream.semaphore.acquire()
+        finally:
+            stats.waiting -= 1
+
+        stats.calls += 1
+        stats.in_flight += 1
+        started = time.perf_counter()
+        try:
+            response = await upstream.client.request(method, url, **kwargs)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.record(time.perf_counter() - started)
+            stats.in_flight -= 1
+            upstream.semaphore.release()
+
+        if response.status_code >= 500:
+            stats.errors += 1
+        return response
+
+    async def get(self, name: str, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request(name, "GET", url, **kwargs)
+
+    async def post(self, name: str, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request(name, "POST", url, **kwargs)
+
+    async def put(self, name: str, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request(name, "PUT", url, **kwargs)
+
+    async def patch(self, name: str, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request(name, "PATCH", url, **kwargs)
+
+    async def delete(self, name: str, url: str, **kwargs: Any) -> httpx.Response:
+        return await self.request(name, "DELETE", url, **kwargs)
+
+    def metrics(self) -> dict[str, Any]:
+        """各上游的呼叫數 / 錯誤率 / 延遲（給監控 / 健康檢查端點用）"""
+        result = {}
+        for name, spec in _specs().items():
+            upstream = self._upstreams.get(name)
+            result[name] = {
+                "timeout_seconds": spec.timeout,
+                "max_concurrency": spec.max_concurrency,
+                "http2": upstream.http2 if upstream else None,
+                **self._stats_for(name).snapshot(),
+            }
+        return result
+
+
+http_pool = HttpPool()
@@ -1,10 +1,11 @@
 """
 line_app HTTP 客戶端
-用于 Backend 通過 HTTP 調用 line_app 服務
+用于 Backend 通過 HTTP 調用 line_app 服務（走共用連線池 http_pool）
 """
 import httpx
 from typing import Dict, List, Optional, Any
 import logging
+from app.clients.http_pool import LINE_APP, http_pool
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -20,7 +21,6 @@ class LineAppClient:
             base_url: line_app 服務地址 (默認從 settings 讀取)
         """
         self.base_url = base_url or settings.LINE_APP_URL
-        self.timeout = httpx.Timeout(300.0)  # 5分鍾超時
         logger.info(f"LineAppClient initialized with base_url: {base_url}")
 
     async def health_check(self) -> Dict[str, Any]:
@@ -30,10 +30,45 @@ class LineAppClient:
         Returns:
             {"status": "ok", "service": "line_app"}
         """
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{self.base_url}/api/v1/health")
-            response.raise_for_status()
-            return response.json()
+        response = await http_pool.get(LINE_APP, f"{self.base_url}/api/v1/health", timeout=5.0)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _broadcast_payload(
+        flex_message_json: dict,
+        target_audience: str,
+        include_tags: Optional[List[str]],
+        exclude_tags: Optional[List[str]],
+        alt_text: str,
+        notification_message: Optional[str],
+        campaign_id: Optional[int],
+        title: Optional[str],
+        interaction_tags: Optional[List[str]],
+        channel_id: Optional[str],
+    ) -> Dict[str, Any]:
+        payload = {
+            "flex_message_json": flex_message_json,
+            "target_audience": target_audience,
+            "alt_text": alt_text,
+            "type": "FlexMessage",  # 添加類型字段，line_app 需要用此字段查找模板
+        }
+
+        if include_tags:
+            payload["include_tags"] = include_tags
+        if exclude_tags:
+            payload["exclude_tags"] = exclude_tags
+        if notification_message:
+            payload["notification_message"] = notification_message
+        if campaign_id:
+            payload["campaign_id"] = campaign_id
+        if title:
+            payload["title"] = title
+        if interaction_tags:
+            payload["interaction_tags"] = interaction_tags
+        if channel_id:
+            payload["channel_id"] = channel_id
+        return payload
 
     async def broadcast_message(
         self,
@@ -71,41 +106,90 @@ class LineAppClient:
                 "errors": List[dict]
             }
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            payload = {
-                "flex_message_json": flex_message_json,
-                "target_audience": target_audience,
-                "alt_text": alt_text,
-                "type": "FlexMessage",  # 添加類型字段，line_app 需要用此字段查找模板
-            }
+        payload = self._broadcast_payload(
+            flex_message_json, target_audience, include_tags, exclude_tags, alt_text,
+            notification_message, campaign_id, title, interaction_tags, channel_id,
+        )
+        logger.info(f"Sending broadcast via HTTP to {self.base_url}/api/v1/messages/broadcast")
+        logger.debug(f"Payload: target_audience={target_audience}, include_tags={include_tags}, exclude_tags={exclude_tags}, campaign_id={campaign_id}")
+
+        response = await http_pool.post(
+            LINE_APP,
+            f"{self.base_url}/api/v1/messages/broadcast",
+            json=payload
+        )
+        response.raise_for_status()
+        result = response.json()
+
+        logger.info(f"Broadcast result: ok={result.get('ok')}, sent={result.get('sent')}, failed={result.get('failed')}")
+        return result
+
+    async def submit_broadcast_job(
+        self,
+        flex_message_json: dict,
+        target_audience: str,
+        include_tags: Optional[List[str]] = None,
+        exclude_tags: Optional[List[str]] = None,
+        alt_text: str = "新訊息",
+        notification_message: Optional[str] = None,
+        campaign_id: Optional[int] = None,
+        title: Optional[str] = None,
+        interaction_tags: Optional[List[str]] = None,
+        channel_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        送出非同步群發工作（參數同 broadcast_message）
 
-            if include_tags:
-                payload["include_tags"] = include_tags
-            if exclude_tags:
-                payload["exclude_tags"] = exclude_tags
-            if notification_message:
-                payload["notification_message"] = notification_message
-            if campaign_id:
-                payload["campaign_id"] = campaign_id
-            if title:
-                payload["title"] = title
-            if interaction_tags:
-                payload["interaction_tags"] = interaction_tags
-            if channel_id:
-                payload["channel_id"] = channel_id
-
-            logger.info(f"Sending broadcast via HTTP to {self.base_url}/api/v1/messages/broadcast")
-            logger.debug(f"Payload: target_audience={target_audience}, include_tags={include_tags}, exclude_tags={exclude_tags}, campaign_id={campaign_id}")
-
-            response = await client.post(
-                f"{self.base_url}/api/v1/messages/broadcast",
-                json=payload
-            )
-            response.raise_for_status()
-            result = response.json()
+        line_app 選好收件人、建立工作後立即回傳，實際發送在背景進行；
+        進度用 get_broadcast_job(job_id) 查詢。
+
+        Returns:
+            {
+                "ok": bool,
+                "job_id": str,
+                "status": "queued" | "running" | "done" | "failed",
+                "total": int,
+                "sent": int,
+                "failed": int,
+                "remaining": int
+            }
+            沒有符合的收件人時 ok=False、無 job_id，並帶 error
+        """
+        payload = self._broadcast_payload(
+            flex_message_json, target_audience, include_tags, exclude_tags, alt_text,
+            notification_message, campaign_id, title, interaction_tags, channel_id,
+        )
+        logger.info(f"Submitting broadcast job to {self.base_url}/api/v1/messages/broadcast_jobs")
+
+        response = await http_pool.post(
+            LINE_APP,
+            f"{self.base_url}/api/v1/messages/broadcast_jobs",
+            json=payload
+        )
+        response.raise_for_status()
+        result = response.json()
+
+        logger.info(
+            f"Broadcast job submitted: ok={result.get('ok')}, job_id={result.get('job_id')}, "
+            f"total={result.get('total')}"
+        )
+        return result
+
+    async def get_broadcast_job(self, job_id: str) -> Dict[str, Any]:
+        """
+        查詢群發工作進度
 
-            logger.info(f"Broadcast result: ok={result.get('ok')}, sent={result.get('sent')}, failed={result.get('failed')}")
-            return result
+        Returns:
+            {"ok", "job_id", "status", "total", "sent", "failed", "remaining",
+             "chunks", "chunks_done", "errors"}
+        """
+        response = await http_pool.get(
+            LINE_APP,
+            f"{self.base_url}/api/v1/messages/broadcast_jobs/{job_id}",
+            timeout=10.0,
+        )
+        response.raise_for_status()
+        return response.json()
 
     async def send_message(
         self,
@@ -122,21 +206,21 @@ class LineAppClient:
         Returns:
             {"ok": bool, "sent": int}
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            logger.info(f"Sending single message to user {user_id}")
-
-            response = await client.post(
-                f"{self.base_url}/api/v1/messages/send",
-                json={
-                    "user_id": user_id,
-                    "messages": messages
-                }
-            )
-            response.raise_for_status()
-            result = response.json()
+        logger.info(f"Sending single message to user {user_id}")
+
+        response = await http_pool.post(
+            LINE_APP,
+            f"{self.base_url}/api/v1/messages/send",
+            json={
+                "user_id": user_id,
+                "messages": messages
+            }
+        )
+        response.raise_for_status()
+        result = response.json()
 
-            logger.info(f"Send result: ok={result.get('ok')}")
-            return result
+        logger.info(f"Send result: ok={result.get('ok')}")
+        return result
 
     async def get_quota_status(self) -> Dict[str, Any]:
         """
@@ -150,12 +234,13 @@ class LineAppClient:
                 "remaining": int
             }
         """
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(
-                f"{self.base_url}/api/v1/quota/status"
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await http_pool.get(
+            LINE_APP,
+            f"{self.base_url}/api/v1/quota/status",
+            timeout=5.0,
+        )
+        response.raise_for_status()
+        return response.json()
 
     async def preflight_check(
         self,
@@ -175,18 +260,19 @@ class LineAppClient:
                 "needed": int
             }
         """
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            logger.info(f"Preflight check for {estimated_count} recipients")
+        logger.info(f"Preflight check for {estimated_count} recipients")
 
-            response = await client.post(
-                f"{self.base_url}/api/v1/quota/preflight",
-                json={"estimated_count": estimated_count}
-            )
-            response.raise_for_status()
-            result = response.json()
+        response = await http_pool.post(
+            LINE_APP,
+            f"{self.base_url}/api/v1/quota/preflight",
+            json={"estimated_count": estimated_count},
+            timeout=5.0,
+        )
+        response.raise_for_status()
+        result = response.json()
 
-            logger.info(f"Preflight result: status={result.get('status')}, remaining={result.get('remaining')}")
-            return result
+        logger.info(f"Preflight result: status={result.get('status')}, remaining={result.get('remaining')}")
+        return result
 
     async def send_chat_message(
         self,
@@ -207,18 +293,18 @@ class LineAppClient:
                 "thread_id": str
             }
         """
-        async with httpx.AsyncClient(timeout=self.timeout) as client:
-            logger.info(f"Sending chat message to {line_uid}")
+        logger.info(f"Sending chat message to {line_uid}")
 
-            response = await client.post(
-                f"{self.base_url}/api/v1/chat/send",
-                json={"line_uid": line_uid, "text": text}
-            )
-            response.raise_for_status()
-            result = response.json()
+        response = await http_pool.post(
+            LINE_APP,
+            f"{self.base_url}/api/v1/chat/send",
+            json={"line_uid": line_uid, "text": text}
+        )
+        response.raise_for_status()
+        result = response.json()
 
-            logger.info(f"Chat message sent: ok={result.get('ok')}, message_id={result.get('message_id')}")
-            return result
+        logger.info(f"Chat message sent: ok={result.get('ok')}, message_id={result.get('message_id')}")
+        return result
 
     async def mark_chat_read(
         self,
@@ -236,15 +322,33 @@ class LineAppClient:
                 "marked_count": int
             }
         """
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            logger.info(f"Marking chat as read for {line_uid}")
+        logger.info(f"Marking chat as read for {line_uid}")
+
+        response = await http_pool.put(
+            LINE_APP,
+            f"{self.base_url}/api/v1/chat/mark-read",
+            json={"line_uid": line_uid},
+            timeout=5.0,
+        )
+        response.raise_for_status()
+        result = response.json()
+
+        logger.info(f"Chat marked as read: ok={result.get('ok')}, count={result.get('marked_count')}")
+        return result
+
+    async def invalidate_auto_responses(self) -> bool:
+        """
+        通知 line_app 重建自動回應規則索引（失敗只記 log，line_app 仍會在 TTL 到期後重載）
 
-            response = await client.put(
-                f"{self.base_url}/api/v1/chat/mark-read",
-                json={"line_uid": line_uid}
+        Returns:
+            是否通知成功
+        """
+        try:
+            response = await http_pool.post(
+                LINE_APP, f"{self.base_url}/api/auto_responses/invalidate_cache", timeout=3.0
             )
             response.raise_for_status()
-            result = response.json()
-
-            logger.info(f"Chat marked as read: ok={result.get('ok')}, count={result.get('marked_count')}")
-            return result
+            return True
+        except httpx.HTTPError as e:
+            logger.warning(f"Failed to invalidate line_app auto-response index: {e}")
+            return False
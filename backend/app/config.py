@@ -57,6 +57,16 @@ class Settings(BaseSettings):
     PMS_HOTELCODE: str = ""
     PMS_BOOKING_BASE_URL: str = ""
     BOOKING_SOURCE: str = "AI_bot"
+    PMS_TIMEOUT_SECONDS: float = 20.0
+    PMS_MAX_CONNECTIONS: int = 20
+    # 房況快取秒數（同館別 / 同日期 / 同人數的查詢在此期間內共用結果；0 = 不快取）
+    PMS_CACHE_TTL_SECONDS: int = 60
+    # FAQ 知識庫索引最長存活秒數（同程序內 FAQ 異動會立即失效，這是多 worker 的保底）
+    KB_INDEX_TTL_SECONDS: int = 300
+
+    # AI 訂房對話 session：memory = 程序內（單一 worker）；db = chatbot_session_states 表（多 worker 共用）
+    CHATBOT_SESSION_STORE: str = "memory"
+    CHATBOT_SESSION_TTL_SECONDS: int = 60 * 20  # 閒置超過此秒數的 session 視為過期
 
     # 外部訂房 API（閎運訂房系統）
     BOOKING_API_URL: str = ""
@@ -64,6 +74,9 @@ class Settings(BaseSettings):
     BOOKING_HOTEL_CODE: str = ""
     BOOKING_HOTEL_ID: str = ""
     BOOKING_CALLBACK_API_KEY: str = ""
+    # LINE 房卡訂房連結 token：memory = 程序內（單一 worker）；db = booking_tokens 表（多 worker 共用）
+    BOOKING_TOKEN_STORE: str = "memory"
+    BOOKING_TOKEN_TTL_SECONDS: int = 3600
 
     # 文件存儲配置
     UPLOAD_DIR: str = "uploads"
@@ -73,6 +86,8 @@ class Settings(BaseSettings):
 
     # LINE App 服務 URL
     LINE_APP_URL: str = "http://localhost:3001"
+    # 群發工作進度輪詢間隔秒數（line_app 背景發送，backend 定期回寫 messages 進度）
+    BROADCAST_JOB_POLL_SECONDS: float = 3.0
 
     # Facebook API (外部 Meta Page 服務)
     FB_API_URL: str = "https://api-youth-tycg.star-bit.io"
@@ -89,6 +104,11 @@ class Settings(BaseSettings):
     # 測試用：啟用 1 元測試房 TT 的假庫存注入（PMS availability 回 data=[] 時補上）
     TEST_ROOM_TT_ENABLED: str = "0"
 
+    # 上傳圖片處理（process pool 內縮放；主圖寬度上限 + 額外產生的縮圖寬度，皆附 WebP）
+    IMAGE_MAX_WIDTH: int = 1200
+    IMAGE_VARIANT_WIDTHS: str = "240,480,800"
+    IMAGE_PROCESS_WORKERS: int = 2
+
     # 路由配置
     UPLOAD_ROUTE_PREFIX: str = "/uploads"
 
@@ -99,9 +119,45 @@ class Settings(BaseSettings):
     # 預設用 SECRET_KEY 衍生，部署時可在 .env 用 CRON_TOKEN 覆寫
     CRON_TOKEN: str = ""
 
+    # 排程群發（DB 任務表 + 租約，多 worker 只會有一個執行同一任務）
+    SCHEDULER_POLL_SECONDS: float = 5.0  # 掃描到期任務的間隔
+    SCHEDULER_LEASE_SECONDS: int = 300  # 認領後的租約長度；worker 當掉時逾時由其他 worker 接手
+    SCHEDULER_MAX_ATTEMPTS: int = 3  # 發送例外時的最多執行次數
+    SCHEDULER_RETRY_BASE_SECONDS: int = 60  # 重試間隔基數：60s、120s、240s…
+    SCHEDULER_RETRY_MAX_SECONDS: int = 3600
+    # 停機期間錯過的排程：超過原定時間此秒數內仍補發，超過則改回草稿（0 = 一律改回草稿）
+    SCHEDULER_CATCHUP_GRACE_SECONDS: int = 3600
+
     # 訪客資料保留天數（webchat 匿名訪客最後訊息超過此天數則整組刪除）
     GUEST_RETENTION_DAYS: int = 7
 
+    # 會員搜尋：FULLTEXT(ngram) 索引的 token 長度，需與 MySQL ngram_token_size 一致（比此短的關鍵字退回 LIKE）
+    MEMBER_SEARCH_NGRAM_SIZE: int = 2
+
+    # 互動統計（輪播卡片點擊 / 互動標籤觸發）增量寫回間隔秒數；0 = 隨點擊的交易即時寫入
+    TRACKING_STATS_FLUSH_SECONDS: float = 5.0
+
+    # AI Token 用量：扣量累積後定期原子遞增寫回（0 = 在對話的交易內即時寫入）；額度檢查快取秒數
+    AI_TOKEN_FLUSH_SECONDS: float = 5.0
+    AI_TOKEN_QUOTA_CACHE_SECONDS: float = 30.0
+
+    # 數據洞察彙總表（營運時區日 / 小時 bucket）
+    ANALYTICS_ROLLUP_REFRESH_SECONDS: float = 300.0  # 背景重算間隔；0 = 停用（改用 scripts/rebuild_analytics_rollups.py）
+    ANALYTICS_ROLLUP_BATCH_DAYS: int = 7  # 每個交易重算的天數
+    ANALYTICS_ROLLUP_SETTLE_SECONDS: int = 3600  # 一天結束後再過此秒數才定案，不再重算
+
+    # 對外 HTTP 連線池（每個上游一組長駐連線；逾時秒數 / 同時請求數上限，超過上限的請求排隊）
+    HTTP2_ENABLED: bool = True  # 需安裝 h2（httpx[http2]），未安裝時自動使用 HTTP/1.1
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    FB_API_TIMEOUT_SECONDS: float = 30.0
+    FB_API_MAX_CONCURRENCY: int = 20
+    LINE_APP_TIMEOUT_SECONDS: float = 300.0  # 同步群發要等 line_app 全部送完
+    LINE_APP_MAX_CONCURRENCY: int = 20
+    BOOKING_API_TIMEOUT_SECONDS: float = 15.0
+    BOOKING_API_MAX_CONCURRENCY: int = 10
+    FACEBOOK_GRAPH_TIMEOUT_SECONDS: float = 10.0
+    FACEBOOK_GRAPH_MAX_CONCURRENCY: int = 10
+
     @property
     def DATABASE_URL(self) -> str:
         """由共享的 DB_* 組合 backend 使用的連線字串。"""
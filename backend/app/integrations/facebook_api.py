@@ -8,8 +8,9 @@ from dataclasses import dataclass
 import logging
 from typing import Any
 
-import requests
+import httpx
 
+from app.clients.http_pool import FACEBOOK_GRAPH, http_pool
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -41,7 +42,9 @@ def _extract_error(payload: Any) -> tuple[int | None, str | None]:
     return (int(code) if isinstance(code, int) else None, message if isinstance(message, str) else None)
 
 
-def verify_page_access_token(page_id: str, page_access_token: str, timeout: int = 10) -> FacebookVerifyResult:
+async def verify_page_access_token(
+    page_id: str, page_access_token: str, timeout: float | None = None
+) -> FacebookVerifyResult:
     """
     Verify page access token by fetching page info.
 
@@ -51,12 +54,13 @@ def verify_page_access_token(page_id: str, page_access_token: str, timeout: int
     """
 
     try:
-        response = requests.get(
+        response = await http_pool.get(
+            FACEBOOK_GRAPH,
             _graph_url(f"/{page_id}"),
             params={"fields": "id,name", "access_token": page_access_token},
-            timeout=timeout,
+            **({"timeout": timeout} if timeout is not None else {}),
         )
-    except requests.exceptions.RequestException as exc:
+    except httpx.HTTPError as exc:
         logger.error("Facebook Graph API request failed: %s", exc)
         return FacebookVerifyResult(is_valid=False, error_message="無法連線至 Facebook Graph API")
 
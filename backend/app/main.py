@@ -6,11 +6,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, RedirectResponse
 from fastapi.exceptions import RequestValidationError
 from fastapi.staticfiles import StaticFiles
-import httpx
+from app.clients.http_pool import LINE_APP, http_pool
 from app.config import settings
 from app.database import close_db
 from app.api.v1 import api_router
 from app.core.exceptions import AppException
+from app.services.booking_token_store import booking_token_store
 from app.services.scheduler import scheduler
 from datetime import datetime, timezone
 import logging
@@ -59,7 +60,7 @@ async def startup_event():
         await scheduler.restore_scheduled_jobs()
 
         # 顯示已排程的任務
-        jobs = scheduler.get_scheduled_jobs()
+        jobs = await scheduler.get_scheduled_jobs()
         if jobs:
             logger.info(f"📅 Found {len(jobs)} scheduled jobs:")
             for job in jobs:
@@ -92,6 +93,24 @@ async def startup_event():
     except Exception as e:
         logger.error(f"❌ Failed to init PMS status: {e}")
 
+    # 對外 HTTP 連線池（FB / line_app / 訂房 API / Facebook Graph）
+    http_pool.open()
+
+    # 互動統計增量定期寫回
+    from app.services.interaction_stats import interaction_stats
+
+    interaction_stats.start()
+
+    # AI Token 扣量定期寫回
+    from app.services.token_ledger import token_ledger
+
+    token_ledger.start()
+
+    # 數據洞察彙總表定期重算
+    from app.services.analytics_rollup import analytics_rollup_worker
+
+    analytics_rollup_worker.start()
+
     logger.info("✅ Application started successfully")
 
 
@@ -108,6 +127,60 @@ async def shutdown_event():
     except Exception as e:
         logger.error(f"❌ Failed to shutdown scheduler: {e}")
 
+    # 寫回尚未 flush 的互動統計
+    try:
+        from app.services.interaction_stats import interaction_stats
+
+        await interaction_stats.stop()
+    except Exception as e:
+        logger.error(f"❌ Failed to flush interaction stats: {e}")
+
+    # 寫回尚未 flush 的 AI Token 扣量
+    try:
+        from app.services.token_ledger import token_ledger
+
+        await token_ledger.stop()
+    except Exception as e:
+        logger.error(f"❌ Failed to flush AI token usage: {e}")
+
+    # 停止數據洞察彙總重算
+    try:
+        from app.services.analytics_rollup import analytics_rollup_worker
+
+        await analytics_rollup_worker.stop()
+    except Exception as e:
+        logger.error(f"❌ Failed to stop analytics rollup worker: {e}")
+
+    # 停止群發進度追蹤（line_app 工作結束時仍會自行寫入最終狀態）
+    try:
+        from app.services.broadcast_job_tracker import broadcast_job_tracker
+
+        await broadcast_job_tracker.stop()
+    except Exception as e:
+        logger.error(f"❌ Failed to stop broadcast job tracker: {e}")
+
+    # 關閉圖片處理 process pool
+    try:
+        from app.services.image_pipeline import shutdown_image_pool
+
+        shutdown_image_pool()
+    except Exception as e:
+        logger.error(f"❌ Failed to shutdown image process pool: {e}")
+
+    # 關閉 PMS 連線池
+    try:
+        from app.services.pms_chatbot_client import close_pms_client
+
+        await close_pms_client()
+    except Exception as e:
+        logger.error(f"❌ Failed to close PMS client: {e}")
+
+    # 關閉對外 HTTP 連線池
+    try:
+        await http_pool.aclose()
+    except Exception as e:
+        logger.error(f"❌ Failed to close outbound HTTP pool: {e}")
+
     # 關閉資料庫連接
     await close_db()
     logger.info("✅ Application shut down successfully")
@@ -175,6 +248,18 @@ async def health_check():
     }
 
 
+@app.get("/health/upstreams")
+async def upstream_health():
+    """對外 HTTP 上游的呼叫數 / 錯誤率 / 延遲"""
+    return http_pool.metrics()
+
+
+@app.get("/health/booking-tokens")
+async def booking_token_health():
+    """LINE 房卡訂房 token 的發出 / 命中 / 過期統計（本 worker）"""
+    return booking_token_store.metrics()
+
+
 # 註冊 API 路由
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
@@ -183,11 +268,12 @@ app.include_router(api_router, prefix=settings.API_V1_STR)
 async def track_redirect(request: Request):
     """轉發點擊追蹤到 line_app 的 /__track"""
     query_string = str(request.query_params)
-    async with httpx.AsyncClient(timeout=10) as client:
-        resp = await client.get(
-            f"http://localhost:3001/__track?{query_string}",
-            follow_redirects=False
-        )
+    resp = await http_pool.get(
+        LINE_APP,
+        f"http://localhost:3001/__track?{query_string}",
+        follow_redirects=False,
+        timeout=10.0,
+    )
     # line_app 的 __track 回傳 302 redirect，直接轉發
     if resp.status_code in (301, 302):
         return RedirectResponse(url=resp.headers.get("location", "/"), status_code=resp.status_code)
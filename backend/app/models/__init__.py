@@ -16,6 +16,7 @@ from app.models.consumption_record import ConsumptionRecord
 from app.models.pms_integration import PMSIntegration
 from app.models.tag_trigger_log import TagTriggerLog
 from app.models.tag_rule import TagRule
+from app.models.scheduled_job import ScheduledJob
 from app.models.admin import Admin, Role, Permission, AdminRole, RolePermission
 from app.models.tracking import (
     ComponentInteractionLog,
@@ -27,9 +28,17 @@ from app.models.line_friend import LineFriend
 from app.models.user_channel import UserChannel
 from app.models.webchat_site import WebchatSiteChannel
 from app.models.fb_channel import FbChannel
-from app.models.conversation import ConversationThread, ConversationMessage
-from app.models.chatbot_booking import ChatbotSession, FaqPmsConnection, BookingRecord
-from app.models.booking import Booking
+from app.models.conversation import ConversationThread, ConversationMessage, ConversationThreadSummary
+from app.models.chatbot_booking import ChatbotSession, ChatbotSessionStateRecord, FaqPmsConnection, BookingRecord
+from app.models.booking import Booking, BookingToken
+from app.models.analytics_rollup import (
+    AnalyticsMessageHourly,
+    AnalyticsMemberDaily,
+    AnalyticsTagActivityHourly,
+    AnalyticsTagTriggerDaily,
+    AnalyticsMemberTagDaily,
+    AnalyticsRollupState,
+)
 from app.models.faq import (
     Industry,
     FaqCategory,
@@ -60,6 +69,7 @@ __all__ = [
     "PMSIntegration",
     "TagTriggerLog",
     "TagRule",
+    "ScheduledJob",
     "Admin",
     "Role",
     "Permission",
@@ -75,10 +85,19 @@ __all__ = [
     "FbChannel",
     "ConversationThread",
     "ConversationMessage",
+    "ConversationThreadSummary",
     "ChatbotSession",
+    "ChatbotSessionStateRecord",
     "FaqPmsConnection",
     "BookingRecord",
     "Booking",
+    "BookingToken",
+    "AnalyticsMessageHourly",
+    "AnalyticsMemberDaily",
+    "AnalyticsTagActivityHourly",
+    "AnalyticsTagTriggerDaily",
+    "AnalyticsMemberTagDaily",
+    "AnalyticsRollupState",
     "Industry",
     "FaqCategory",
     "FaqCategoryField",
@@ -0,0 +1,140 @@
+"""
+數據洞察彙總表（analytics rollups）
+由 app/services/analytics_rollup.py 從原始資料增量重算，數據洞察 API 直接讀這些表：
+
+- analytics_message_hourly：conversation_messages 每（營運時區日、時、組織、分館、平台、來源、方向）的訊息數
+- analytics_member_daily：members 每（營運時區日、組織、分館、渠道組合）的新增會員數
+- analytics_tag_activity_hourly：tag_trigger_logs 每（營運時區日、時、會員、組織、頻道、來源）的觸發次數
+  （保留 member_id：時段洞察要算不重複會員數，不能先加總）
+- analytics_tag_trigger_daily：tag_trigger_logs 每（營運時區日、標籤 ID）的觸發次數與不重複會員數（標籤趨勢圖）
+- analytics_member_tag_daily：member_tags 每（營運時區日、標籤名稱）的新貼標筆數（標籤趨勢圖）
+- analytics_rollup_state：各彙總表的水位線（已定案的最後一天）與重算租約
+
+維度欄位以 0 / '' 代表「無」，才能放進主鍵。
+"""
+from sqlalchemy import BigInteger, Boolean, Column, Date, DateTime, Index, Integer, SmallInteger, String
+
+from app.models.base import Base
+
+
+class AnalyticsMessageHourly(Base):
+    """對話訊息每小時彙總"""
+
+    __tablename__ = "analytics_message_hourly"
+    __table_args__ = (
+        Index("ix_analytics_message_hourly_date", "bucket_date"),
+        {"comment": "對話訊息每小時彙總（營運時區）"},
+    )
+
+    # 以維度組合為主鍵，不用 Base 的自增 id / created_at
+    id = None
+    created_at = None
+
+    bucket_date = Column(Date, primary_key=True, comment="日期（營運時區）")
+    bucket_hour = Column(SmallInteger, primary_key=True, autoincrement=False, comment="小時 0-23（營運時區）")
+    tenant_id = Column(BigInteger, primary_key=True, autoincrement=False, comment="會員所屬組織 ID（0 = 無對應會員）")
+    line_channel_id = Column(String(100), primary_key=True, comment="會員所屬 LINE channel_id（'' = 無）")
+    platform = Column(String(20), primary_key=True, comment="渠道類型：LINE / Facebook / Webchat（NULL 視為 LINE）")
+    message_source = Column(String(20), primary_key=True, comment="訊息來源（'' = 未標記）")
+    direction = Column(String(20), primary_key=True, comment="方向：incoming / outgoing")
+    message_count = Column(Integer, nullable=False, default=0, comment="訊息數")
+    unanswered_count = Column(Integer, nullable=False, default=0, comment="AI 答不出（unanswered=1）訊息數")
+    updated_at = Column(DateTime, nullable=True, comment="重算時間")
+
+
+class AnalyticsMemberDaily(Base):
+    """新增會員每日彙總"""
+
+    __tablename__ = "analytics_member_daily"
+    __table_args__ = (
+        Index("ix_analytics_member_daily_date", "bucket_date"),
+        {"comment": "新增會員每日彙總（營運時區）"},
+    )
+
+    id = None
+    created_at = None
+
+    bucket_date = Column(Date, primary_key=True, comment="日期（營運時區，依 members.created_at）")
+    tenant_id = Column(BigInteger, primary_key=True, autoincrement=False, comment="所屬組織 ID（0 = 無）")
+    line_channel_id = Column(String(100), primary_key=True, comment="LINE channel_id（'' = 無）")
+    has_line = Column(Boolean, primary_key=True, comment="有 line_uid")
+    has_fb = Column(Boolean, primary_key=True, comment="有 fb_customer_id")
+    has_webchat = Column(Boolean, primary_key=True, comment="有 webchat_uid")
+    new_members = Column(Integer, nullable=False, default=0, comment="新增會員數")
+    updated_at = Column(DateTime, nullable=True, comment="重算時間")
+
+
+class AnalyticsTagActivityHourly(Base):
+    """標籤觸發每小時彙總（保留會員維度）"""
+
+    __tablename__ = "analytics_tag_activity_hourly"
+    __table_args__ = (
+        Index("ix_analytics_tag_activity_hourly_date", "bucket_date", "bucket_hour"),
+        {"comment": "標籤觸發每小時彙總（營運時區）"},
+    )
+
+    id = None
+    created_at = None
+
+    bucket_date = Column(Date, primary_key=True, comment="日期（營運時區）")
+    bucket_hour = Column(SmallInteger, primary_key=True, autoincrement=False, comment="小時 0-23（營運時區）")
+    member_id = Column(BigInteger, primary_key=True, autoincrement=False, comment="會員ID")
+    tenant_id = Column(BigInteger, primary_key=True, autoincrement=False, comment="所屬組織 ID（0 = 無）")
+    channel_id = Column(String(100), primary_key=True, comment="頻道識別（'' = 無）")
+    trigger_source = Column(String(20), primary_key=True, comment="觸發來源（與 tag_trigger_logs 相同）")
+    event_count = Column(Integer, nullable=False, default=0, comment="觸發次數")
+    updated_at = Column(DateTime, nullable=True, comment="重算時間")
+
+
+class AnalyticsTagTriggerDaily(Base):
+    """標籤觸發每日彙總（依標籤）"""
+
+    __tablename__ = "analytics_tag_trigger_daily"
+    __table_args__ = (
+        Index("ix_analytics_tag_trigger_daily_tag", "tag_id", "bucket_date"),
+        {"comment": "標籤觸發每日彙總（營運時區）"},
+    )
+
+    id = None
+    created_at = None
+
+    bucket_date = Column(Date, primary_key=True, comment="日期（營運時區）")
+    tag_id = Column(BigInteger, primary_key=True, autoincrement=False, comment="標籤 ID（tag_trigger_logs.tag_id）")
+    trigger_count = Column(Integer, nullable=False, default=0, comment="觸發次數")
+    member_count = Column(Integer, nullable=False, default=0, comment="當日不重複觸發會員數")
+    updated_at = Column(DateTime, nullable=True, comment="重算時間")
+
+
+class AnalyticsMemberTagDaily(Base):
+    """會員貼標每日彙總（依標籤名稱）"""
+
+    __tablename__ = "analytics_member_tag_daily"
+    __table_args__ = (
+        Index("ix_analytics_member_tag_daily_tag", "tag_name", "bucket_date"),
+        {"comment": "會員貼標每日彙總（營運時區）"},
+    )
+
+    id = None
+    created_at = None
+
+    bucket_date = Column(Date, primary_key=True, comment="日期（營運時區，依 member_tags.tagged_at）")
+    tag_name = Column(String(20), primary_key=True, comment="標籤名稱")
+    tagged_count = Column(Integer, nullable=False, default=0, comment="新貼標筆數")
+    updated_at = Column(DateTime, nullable=True, comment="重算時間")
+
+
+class AnalyticsRollupState(Base):
+    """彙總表水位線與重算租約"""
+
+    __tablename__ = "analytics_rollup_state"
+    __table_args__ = ({"comment": "數據洞察彙總水位線"},)
+
+    id = None
+    created_at = None
+
+    name = Column(String(50), primary_key=True, comment="彙總表名稱")
+    complete_through = Column(Date, nullable=True, comment="已定案（不再重算）的最後一天（營運時區）")
+    locked_by = Column(String(100), comment="持有重算租約的 worker")
+    locked_until = Column(DateTime, comment="租約到期時間（UTC）")
+    refreshed_at = Column(DateTime, nullable=True, comment="最近一次重算完成時間（UTC）")
+    updated_at = Column(DateTime, nullable=True, comment="更新時間")
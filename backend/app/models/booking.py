@@ -50,3 +50,29 @@ class Booking(Base):
     )
 
     member = relationship("Member", foreign_keys=[member_id])
+
+
+class BookingToken(Base):
+    """LINE 房卡訂房連結的短效 token（BOOKING_TOKEN_STORE=db 時使用，多 worker 共用）"""
+
+    __tablename__ = "booking_tokens"
+    __table_args__ = (
+        Index("ix_booking_tokens_expires_at", "expires_at"),
+        {"comment": "訂房表單 token（line_uid + 房型資料，用完即棄）"},
+    )
+
+    # token 即主鍵；到期即刪，不會更新內容
+    id = None
+    updated_at = None
+
+    token = Column(String(64), primary_key=True, comment="訂房連結 token")
+    line_uid = Column(String(100), nullable=False, comment="LINE 使用者 UID")
+    data = Column(JSON, nullable=True, comment="表單預填資料：rooms / checkin / checkout / member")
+    clicked_roomtypes = Column(
+        String(500),
+        nullable=False,
+        default=",",
+        server_default=",",
+        comment="此 token 已記錄點擊的房型代碼（,WS,DS, 格式，房卡點擊去重用）",
+    )
+    expires_at = Column(DateTime, nullable=False, comment="過期時間（UTC）")
@@ -6,6 +6,8 @@ from sqlalchemy import (
     Column,
     String,
     BigInteger,
+    Integer,
+    LargeBinary,
     SmallInteger,
     Boolean,
     Date,
@@ -98,6 +100,30 @@ class ChatbotSession(Base):
     )
 
 
+class ChatbotSessionStateRecord(Base):
+    """訂房對話進行中的 session 狀態（多 worker 共用；CHATBOT_SESSION_STORE=db 時使用）"""
+
+    __tablename__ = "chatbot_session_states"
+    __table_args__ = (
+        Index("ix_chatbot_session_states_expires_at", "expires_at"),
+        {"comment": "AI 訂房對話 session 狀態（壓縮 JSON + 樂觀鎖版本）"},
+    )
+
+    # browser_key 即主鍵，不用 Base 的自增 id / created_at
+    id = None
+    created_at = None
+
+    browser_key = Column(
+        String(100), primary_key=True, comment="Session key：官網 browser_key / LINE line_uid"
+    )
+    version = Column(Integer, nullable=False, default=1, comment="樂觀鎖版本，每次寫回 +1")
+    payload = Column(
+        LargeBinary(length=16777215), nullable=False, comment="ChatbotSessionState（省略預設值的 JSON，zlib 壓縮）"
+    )
+    expires_at = Column(DateTime, nullable=False, comment="過期時間（UTC，最後寫回 + TTL）")
+    updated_at = Column(DateTime, nullable=True, comment="最後寫回時間（UTC）")
+
+
 class FaqPmsConnection(Base):
     """FAQ 與 PMS 即時房況串接設定表"""
 
@@ -12,6 +12,7 @@ from sqlalchemy import (
     BigInteger,
     Boolean,
     Column,
+    Integer,
     String,
     ForeignKey,
     DateTime,
@@ -88,6 +89,10 @@ class ConversationMessage(Base):
         Index("ix_conversation_messages_platform", "platform"),
         Index("ix_conversation_messages_created_at", "created_at"),
         Index("ix_conversation_messages_thread_created", "thread_id", "created_at"),
+        Index(
+            "ix_conversation_messages_thread_platform_created_id",
+            "thread_id", "platform", "created_at", "id",
+        ),
         Index("ix_conversation_messages_unanswered_created", "unanswered", "created_at"),
         {"comment": "對話訊息表"},
     )
@@ -138,6 +143,11 @@ class ConversationMessage(Base):
         server_default="0",
         comment="AI 是否答不出此訊息（mark_unanswerable tool 標記），僅 message_source=gpt 時有意義",
     )
+    reply_to_message_id = Column(
+        String(100),
+        nullable=True,
+        comment="自動回覆所回應的使用者訊息ID（寫入回覆時帶入；未解問題報表直接以主鍵取回觸發問題）",
+    )
     created_at = Column(
         DateTime, server_default=func.now(), nullable=True, comment="建立時間"
     )
@@ -146,3 +156,41 @@ class ConversationMessage(Base):
     # 關聯關係
     thread = relationship("ConversationThread", back_populates="messages")
     sender = relationship("User", foreign_keys=[sent_by])
+
+
+class ConversationThreadSummary(Base):
+    """對話摘要表（每個 thread + 渠道一筆）
+
+    由寫入訊息的各處增量維護（line_app conversation_service、ChatroomService.append_message、
+    line_notify、chatbot_service），會員列表的最後互動時間 / 藍點 / 未讀數直接讀這張表；
+    可用 scripts/rebuild_thread_summary.py 從 conversation_messages 重建。
+    """
+
+    __tablename__ = "conversation_thread_summary"
+    __table_args__ = (
+        Index("ix_conversation_thread_summary_last_message", "last_message_at"),
+        {"comment": "對話摘要表"},
+    )
+
+    # 以 (thread_id, platform) 為主鍵，不用 Base 的自增 id / created_at
+    id = None
+    created_at = None
+
+    thread_id = Column(String(150), primary_key=True, comment="對話串ID（= conversation_messages.thread_id）")
+    platform = Column(
+        String(20), primary_key=True, comment="渠道類型：LINE / Facebook / Webchat（訊息 platform 為 NULL 視為 LINE）"
+    )
+    last_message_at = Column(DateTime, nullable=True, comment="最後訊息時間（含群發）")
+    last_non_broadcast_at = Column(DateTime, nullable=True, comment="最後一則非群發訊息時間")
+    last_non_broadcast_direction = Column(
+        String(20), nullable=True, comment="最後一則非群發訊息方向：incoming/outgoing"
+    )
+    last_non_broadcast_source = Column(String(20), nullable=True, comment="最後一則非群發訊息來源")
+    last_unanswered = Column(
+        Boolean, nullable=False, default=False, server_default="0",
+        comment="最後一則非群發訊息是否為 AI 答不出（unanswered=1）",
+    )
+    unread_count = Column(
+        Integer, nullable=False, default=0, server_default="0", comment="未讀的 incoming 訊息數"
+    )
+    updated_at = Column(DateTime, nullable=True, comment="更新時間")
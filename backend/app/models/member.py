@@ -1,7 +1,7 @@
 """
 會員模型
 """
-from sqlalchemy import Column, String, Boolean, Date, DateTime, Text, BigInteger, Integer, ForeignKey
+from sqlalchemy import Column, String, Boolean, Date, DateTime, Text, BigInteger, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.models.base import Base
@@ -11,6 +11,15 @@ class Member(Base):
     """會員表"""
 
     __tablename__ = "members"
+    __table_args__ = (
+        # 會員搜尋（app/services/member_search.py）：ngram 全文索引，支援中文姓名 / 手機片段
+        Index(
+            "ft_members_search", "name", "email", "phone", "line_display_name",
+            mysql_prefix="FULLTEXT", mysql_with_parser="ngram",
+        ),
+        # 數據洞察彙總（app/services/analytics_rollup.py）依建立時間區間重算新增會員數
+        Index("ix_members_created_at", "created_at"),
+    )
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
 
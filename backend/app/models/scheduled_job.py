@@ -0,0 +1,34 @@
+"""
+排程任務模型（ScheduledJob）
+DB 持久化的排程佇列：多個 backend worker 共用，以 locked_by / locked_until 租約確保同一任務只被一個 worker 執行
+"""
+from sqlalchemy import Column, BigInteger, DateTime, Index, Integer, String, Text, UniqueConstraint
+from app.models.base import Base
+
+
+class ScheduledJob(Base):
+    """排程任務表"""
+
+    __tablename__ = "scheduled_jobs"
+    __table_args__ = (
+        UniqueConstraint("job_key", name="uq_scheduled_jobs_job_key"),
+        Index("ix_scheduled_jobs_status_run_at", "status", "run_at"),
+    )
+
+    job_key = Column(String(100), nullable=False, comment="任務識別（例：campaign_123）")
+    job_type = Column(String(50), nullable=False, comment="任務類型：campaign")
+    target_id = Column(BigInteger, nullable=False, comment="目標 ID（campaign → messages.id）")
+    scheduled_at = Column(DateTime, nullable=False, comment="原定執行時間（UTC，補跑寬限以此判斷）")
+    run_at = Column(DateTime, nullable=False, comment="下次執行時間（UTC，重試時往後延）")
+    status = Column(
+        String(20),
+        nullable=False,
+        default="pending",
+        comment="狀態：pending/running/succeeded/failed/canceled/expired",
+    )
+    attempts = Column(Integer, nullable=False, default=0, comment="已執行次數")
+    max_attempts = Column(Integer, nullable=False, default=3, comment="最多執行次數")
+    locked_by = Column(String(100), comment="持有租約的 worker")
+    locked_until = Column(DateTime, comment="租約到期時間（UTC）")
+    last_error = Column(Text, comment="最近一次錯誤")
+    finished_at = Column(DateTime, comment="結束時間（UTC）")
@@ -87,6 +87,8 @@ class MemberTag(Base):
         ),
         Index("ix_member_tags_tag_name", "tag_name"),
         Index("ix_member_tags_platform_channel", "platform", "channel_id"),
+        # 標籤趨勢彙總（app/services/analytics_rollup.py）依貼標時間區間重算
+        Index("ix_member_tags_tagged_at", "tagged_at"),
     )
 
 
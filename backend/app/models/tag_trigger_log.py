@@ -34,6 +34,8 @@ class TagTriggerLog(Base):
     __table_args__ = (
         Index("ix_tag_trigger_logs_member_triggered", "member_id", "triggered_at"),
         Index("ix_tag_trigger_logs_platform_channel", "platform", "channel_id"),
+        # 數據洞察彙總（app/services/analytics_rollup.py）依觸發時間區間重算
+        Index("ix_tag_trigger_logs_triggered_at", "triggered_at"),
     )
 
     id = Column(BigInteger, primary_key=True, autoincrement=True)
@@ -36,6 +36,9 @@ class ComponentInteractionLog(Base):
     __tablename__ = "component_interaction_logs"
     __table_args__ = (
         Index("ix_component_interaction_logs_platform_channel", "platform", "channel_id"),
+        # 互動統計增量：判斷某 line_id 是否第一次點該卡片 / 標籤
+        Index("ix_component_interaction_logs_carousel_line", "carousel_item_id", "line_id"),
+        Index("ix_component_interaction_logs_tag_line", "interaction_tag_id", "line_id"),
     )
 
     # 關聯維度
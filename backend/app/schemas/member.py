@@ -121,10 +121,10 @@ class MemberSearchParams(BaseModel):
         pattern="^(LINE|CRM|PMS|ERP|系統|Webchat)$",
         description="加入來源篩選"
     )
-    sort_by: str = Field(
-        "last_interaction_at",
-        pattern="^(last_interaction_at|created_at)$",
-        description="排序欄位"
+    sort_by: Optional[str] = Field(
+        None,
+        pattern="^(last_interaction_at|created_at|relevance)$",
+        description="排序欄位（未指定時：有搜索關鍵字依相關度，否則依最後互動時間）"
     )
     order: str = Field(
         "desc",
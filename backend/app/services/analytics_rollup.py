@@ -0,0 +1,408 @@
+"""
+數據洞察彙總（analytics rollups）
+=============================
+取代數據洞察 API 每次請求都對 conversation_messages / members / tag_trigger_logs 原始資料
+CONVERT_TZ 後 GROUP BY（WHERE 套函數用不到 created_at 索引，分館過濾還要 OR JOIN members）：
+
+- 以營運時區（OPERATING_TZ）的「日 / 小時」為 bucket，彙總表見 app/models/analytics_rollup.py
+- 原始資料一律用 UTC 的 created_at 區間查（走索引），先依 UTC 小時分組，再在 Python 換算成營運時區的日與小時
+  （營運時區為整點偏移，小時 bucket 換算不失真）
+- 水位線 analytics_rollup_state.complete_through：該日（含）以前已定案不再重算；
+  每次重算「水位線隔天 ~ 今天」，每 ANALYTICS_ROLLUP_BATCH_DAYS 天一個交易（刪掉該區間的 bucket 再整批寫入）
+- 一天結束後再過 ANALYTICS_ROLLUP_SETTLE_SECONDS 秒才定案，吸收跨午夜才寫入的資料
+- 背景 worker 每 ANALYTICS_ROLLUP_REFRESH_SECONDS 秒重算一次；多 worker 以 analytics_rollup_state 的租約互斥
+- 定案後的日期不會再反映原始資料的修改 / 刪除（例：訪客資料清理），需要時用 scripts/rebuild_analytics_rollups.py 重建
+- 標籤趨勢圖（/tags/trends）原本每天 × 每個標籤各跑一兩次 COUNT，改讀 tag_trigger_daily / member_tag_daily
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from sqlalchemy import and_, delete, insert, or_, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.timezone import OPERATING_TZ, now_utc
+from app.models.analytics_rollup import (
+    AnalyticsMemberDaily,
+    AnalyticsMemberTagDaily,
+    AnalyticsMessageHourly,
+    AnalyticsRollupState,
+    AnalyticsTagActivityHourly,
+    AnalyticsTagTriggerDaily,
+)
+
+logger = logging.getLogger(__name__)
+
+# 重算租約長度；每處理完一批日期就續約
+LEASE_SECONDS = 900
+
+MESSAGE_HOURLY = "message_hourly"
+MEMBER_DAILY = "member_daily"
+TAG_ACTIVITY_HOURLY = "tag_activity_hourly"
+TAG_TRIGGER_DAILY = "tag_trigger_daily"
+MEMBER_TAG_DAILY = "member_tag_daily"
+
+
+# ---------------------------------------------------------------------------
+# 時區換算
+# ---------------------------------------------------------------------------
+
+
+def local_today(now: Optional[datetime] = None) -> date:
+    """營運時區的今天（now 為 naive UTC）"""
+    now = now or now_utc()
+    return now.replace(tzinfo=timezone.utc).astimezone(OPERATING_TZ).date()
+
+
+def utc_bounds(start: date, end: date) -> Tuple[datetime, datetime]:
+    """營運時區日期區間 [start, end]（含）→ naive UTC 半開區間 [start 00:00, end+1 00:00)"""
+
+    def to_utc(d: date) -> datetime:
+        return datetime.combine(d, time.min, OPERATING_TZ).astimezone(timezone.utc).replace(tzinfo=None)
+
+    return to_utc(start), to_utc(end + timedelta(days=1))
+
+
+def _local_bucket(utc_hour: Any) -> Tuple[date, int]:
+    """UTC 整點（字串或 datetime）→ 營運時區的 (日期, 小時)"""
+    if not isinstance(utc_hour, datetime):
+        utc_hour = datetime.strptime(str(utc_hour), "%Y-%m-%d %H:%M:%S")
+    local = utc_hour.replace(tzinfo=timezone.utc).astimezone(OPERATING_TZ)
+    return local.date(), local.hour
+
+
+def _utc_hour_sql(dialect: str, col: str) -> str:
+    if dialect == "mysql":
+        return f"DATE_FORMAT({col}, '%Y-%m-%d %H:00:00')"
+    return f"strftime('%Y-%m-%d %H:00:00', {col})"
+
+
+# ---------------------------------------------------------------------------
+# 各彙總表的原始資料查詢
+# ---------------------------------------------------------------------------
+
+
+async def _aggregate_messages(db: AsyncSession, dialect: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    # 訊息歸屬的會員：LINE 端 thread_id = line_uid，Webchat 端 thread_id = webchat_uid；
+    # 分兩個 LEFT JOIN 各走唯一索引（OR JOIN 無法用索引）
+    sql = text(f"""
+        SELECT {_utc_hour_sql(dialect, 'cm.created_at')} AS h,
+               COALESCE(ml.tenant_id, mw.tenant_id, 0) AS tenant_id,
+               COALESCE(ml.line_channel_id, mw.line_channel_id, '') AS line_channel_id,
+               COALESCE(cm.platform, 'LINE') AS platform,
+               COALESCE(cm.message_source, '') AS message_source,
+               cm.direction AS direction,
+               COUNT(*) AS n,
+               SUM(CASE WHEN cm.unanswered = 1 THEN 1 ELSE 0 END) AS unanswered
+        FROM conversation_messages cm
+        LEFT JOIN members ml ON ml.line_uid = cm.thread_id
+        LEFT JOIN members mw ON mw.webchat_uid = cm.thread_id
+        WHERE cm.created_at >= :start AND cm.created_at < :end
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """)
+    rows: Dict[tuple, Dict[str, Any]] = {}
+    for r in await db.execute(sql, {"start": start, "end": end}):
+        d, hour = _local_bucket(r.h)
+        key = (d, hour, int(r.tenant_id), r.line_channel_id, r.platform, r.message_source, r.direction)
+        row = rows.setdefault(key, dict(zip(
+            ("bucket_date", "bucket_hour", "tenant_id", "line_channel_id", "platform", "message_source", "direction"),
+            key,
+        ), message_count=0, unanswered_count=0))
+        row["message_count"] += int(r.n or 0)
+        row["unanswered_count"] += int(r.unanswered or 0)
+    return list(rows.values())
+
+
+async def _aggregate_members(db: AsyncSession, dialect: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    sql = text(f"""
+        SELECT {_utc_hour_sql(dialect, 'created_at')} AS h,
+               COALESCE(tenant_id, 0) AS tenant_id,
+               COALESCE(line_channel_id, '') AS line_channel_id,
+               CASE WHEN line_uid IS NOT NULL AND line_uid <> '' THEN 1 ELSE 0 END AS has_line,
+               CASE WHEN fb_customer_id IS NOT NULL AND fb_customer_id <> '' THEN 1 ELSE 0 END AS has_fb,
+               CASE WHEN webchat_uid IS NOT NULL AND webchat_uid <> '' THEN 1 ELSE 0 END AS has_webchat,
+               COUNT(*) AS n
+        FROM members
+        WHERE created_at >= :start AND created_at < :end
+        GROUP BY 1, 2, 3, 4, 5, 6
+    """)
+    rows: Dict[tuple, Dict[str, Any]] = {}
+    for r in await db.execute(sql, {"start": start, "end": end}):
+        d, _ = _local_bucket(r.h)
+        key = (d, int(r.tenant_id), r.line_channel_id, bool(r.has_line), bool(r.has_fb), bool(r.has_webchat))
+        row = rows.setdefault(key, dict(zip(
+            ("bucket_date", "tenant_id", "line_channel_id", "has_line", "has_fb", "has_webchat"), key,
+        ), new_members=0))
+        row["new_members"] += int(r.n or 0)
+    return list(rows.values())
+
+
+async def _aggregate_tag_activity(db: AsyncSession, dialect: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    sql = text(f"""
+        SELECT {_utc_hour_sql(dialect, 't.triggered_at')} AS h,
+               t.member_id AS member_id,
+               COALESCE(t.tenant_id, 0) AS tenant_id,
+               COALESCE(t.channel_id, '') AS channel_id,
+               t.trigger_source AS trigger_source,
+               COUNT(*) AS n
+        FROM tag_trigger_logs t
+        WHERE t.triggered_at >= :start AND t.triggered_at < :end
+        GROUP BY 1, 2, 3, 4, 5
+    """)
+    rows: Dict[tuple, Dict[str, Any]] = {}
+    for r in await db.execute(sql, {"start": start, "end": end}):
+        d, hour = _local_bucket(r.h)
+        key = (d, hour, int(r.member_id), int(r.tenant_id), r.channel_id, r.trigger_source)
+        row = rows.setdefault(key, dict(zip(
+            ("bucket_date", "bucket_hour", "member_id", "tenant_id", "channel_id", "trigger_source"), key,
+        ), event_count=0))
+        row["event_count"] += int(r.n or 0)
+    return list(rows.values())
+
+
+async def _aggregate_tag_triggers(db: AsyncSession, dialect: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    # 不重複會員數不能由小時加總，先帶 member_id 分組，換算成營運時區日後在 Python 去重
+    sql = text(f"""
+        SELECT {_utc_hour_sql(dialect, 't.triggered_at')} AS h,
+               t.tag_id AS tag_id,
+               t.member_id AS member_id,
+               COUNT(*) AS n
+        FROM tag_trigger_logs t
+        WHERE t.triggered_at >= :start AND t.triggered_at < :end
+          AND t.tag_id IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+    rows: Dict[tuple, Dict[str, Any]] = {}
+    members: Dict[tuple, set] = {}
+    for r in await db.execute(sql, {"start": start, "end": end}):
+        d, _ = _local_bucket(r.h)
+        key = (d, int(r.tag_id))
+        row = rows.setdefault(key, {"bucket_date": d, "tag_id": key[1], "trigger_count": 0})
+        row["trigger_count"] += int(r.n or 0)
+        members.setdefault(key, set()).add(int(r.member_id))
+    for key, row in rows.items():
+        row["member_count"] = len(members[key])
+    return list(rows.values())
+
+
+async def _aggregate_member_tags(db: AsyncSession, dialect: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    sql = text(f"""
+        SELECT {_utc_hour_sql(dialect, 'tagged_at')} AS h,
+               tag_name,
+               COUNT(*) AS n
+        FROM member_tags
+        WHERE tagged_at >= :start AND tagged_at < :end
+        GROUP BY 1, 2
+    """)
+    rows: Dict[tuple, Dict[str, Any]] = {}
+    for r in await db.execute(sql, {"start": start, "end": end}):
+        d, _ = _local_bucket(r.h)
+        key = (d, r.tag_name)
+        row = rows.setdefault(key, {"bucket_date": d, "tag_name": r.tag_name, "tagged_count": 0})
+        row["tagged_count"] += int(r.n or 0)
+    return list(rows.values())
+
+
+@dataclass(frozen=True)
+class RollupSpec:
+    name: str
+    model: Type
+    source_table: str
+    time_col: str
+    aggregate: Callable
+
+
+ROLLUPS: Dict[str, RollupSpec] = {
+    spec.name: spec
+    for spec in (
+        RollupSpec(MESSAGE_HOURLY, AnalyticsMessageHourly, "conversation_messages", "created_at", _aggregate_messages),
+        RollupSpec(MEMBER_DAILY, AnalyticsMemberDaily, "members", "created_at", _aggregate_members),
+        RollupSpec(TAG_ACTIVITY_HOURLY, AnalyticsTagActivityHourly, "tag_trigger_logs", "triggered_at", _aggregate_tag_activity),
+        RollupSpec(TAG_TRIGGER_DAILY, AnalyticsTagTriggerDaily, "tag_trigger_logs", "triggered_at", _aggregate_tag_triggers),
+        RollupSpec(MEMBER_TAG_DAILY, AnalyticsMemberTagDaily, "member_tags", "tagged_at", _aggregate_member_tags),
+    )
+}
+
+
+# ---------------------------------------------------------------------------
+# 重算
+# ---------------------------------------------------------------------------
+
+
+async def recompute_days(db: AsyncSession, spec: RollupSpec, start: date, end: date) -> int:
+    """重算 [start, end]（營運時區，含）的 bucket，回傳寫入筆數；呼叫端負責 commit"""
+    utc_start, utc_end = utc_bounds(start, end)
+    rows = await spec.aggregate(db, db.get_bind().dialect.name, utc_start, utc_end)
+    model = spec.model
+    await db.execute(delete(model).where(model.bucket_date >= start, model.bucket_date <= end))
+    if rows:
+        refreshed = now_utc()
+        for row in rows:
+            row["updated_at"] = refreshed
+        await db.execute(insert(model), rows)
+    return len(rows)
+
+
+async def _earliest_day(db: AsyncSession, spec: RollupSpec) -> Optional[date]:
+    first = (await db.execute(text(f"SELECT MIN({spec.time_col}) FROM {spec.source_table}"))).scalar()
+    if first is None:
+        return None
+    if not isinstance(first, datetime):
+        first = datetime.fromisoformat(str(first))
+    return local_today(first)
+
+
+async def _ensure_state(db: AsyncSession, name: str) -> None:
+    if await db.get(AnalyticsRollupState, name) is not None:
+        return
+    db.add(AnalyticsRollupState(name=name))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()  # 其他 worker 同時建立
+
+
+def _lease_free(now: datetime):
+    return or_(AnalyticsRollupState.locked_until.is_(None), AnalyticsRollupState.locked_until < now)
+
+
+async def refresh_rollup(
+    db: AsyncSession,
+    name: str,
+    worker_id: str,
+    now: Optional[datetime] = None,
+) -> Optional[int]:
+    """
+    取得租約後，重算水位線隔天 ~ 今天，推進水位線；回傳重算的天數。
+    租約被其他 worker 持有時回傳 None。
+    """
+    spec = ROLLUPS[name]
+    now = now or now_utc()
+    await _ensure_state(db, name)
+    claimed = await db.execute(
+        update(AnalyticsRollupState)
+        .where(AnalyticsRollupState.name == name, _lease_free(now))
+        .values(locked_by=worker_id, locked_until=now + timedelta(seconds=LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if claimed.rowcount != 1:
+        return None
+
+    mine = and_(AnalyticsRollupState.name == name, AnalyticsRollupState.locked_by == worker_id)
+    try:
+        today = local_today(now)
+        # 當天結束後再過 settle 秒才定案
+        final_through = local_today(now - timedelta(seconds=settings.ANALYTICS_ROLLUP_SETTLE_SECONDS)) - timedelta(days=1)
+        watermark = (await db.execute(select(AnalyticsRollupState.complete_through).where(mine))).scalar()
+        start = watermark + timedelta(days=1) if watermark else (await _earliest_day(db, spec) or today)
+        batch_days = max(1, settings.ANALYTICS_ROLLUP_BATCH_DAYS)
+
+        days = 0
+        day = start
+        while day <= today:
+            chunk_end = min(day + timedelta(days=batch_days - 1), today)
+            await recompute_days(db, spec, day, chunk_end)
+            values: Dict[str, Any] = {"locked_until": now_utc() + timedelta(seconds=LEASE_SECONDS)}
+            if min(chunk_end, final_through) >= day:
+                values["complete_through"] = min(chunk_end, final_through)
+            await db.execute(
+                update(AnalyticsRollupState).where(mine).values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            days += (chunk_end - day).days + 1
+            day = chunk_end + timedelta(days=1)
+        return days
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.execute(
+            update(AnalyticsRollupState).where(mine)
+            .values(locked_by=None, locked_until=None, refreshed_at=now_utc())
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+
+async def reset_rollups(db: AsyncSession, names: Sequence[str], since: Optional[date] = None) -> None:
+    """
+    重建用：刪除 since（含）以後的 bucket 並把水位線退回 since 前一天；
+    since 為 None 時清空整張彙總表、從原始資料最早一天重算。之後呼叫 refresh_rollup 補回。
+    """
+    for name in names:
+        spec = ROLLUPS[name]
+        await _ensure_state(db, name)
+        stmt = delete(spec.model)
+        if since is not None:
+            stmt = stmt.where(spec.model.bucket_date >= since)
+        await db.execute(stmt)
+        await db.execute(
+            update(AnalyticsRollupState)
+            .where(AnalyticsRollupState.name == name)
+            .values(complete_through=since - timedelta(days=1) if since else None)
+            .execution_options(synchronize_session=False)
+        )
+    await db.commit()
+
+
+# ---------------------------------------------------------------------------
+# 背景 worker
+# ---------------------------------------------------------------------------
+
+
+class AnalyticsRollupWorker:
+    """每 ANALYTICS_ROLLUP_REFRESH_SECONDS 秒重算一次（0 = 停用，改由腳本 / 排程觸發）"""
+
+    def __init__(self) -> None:
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ANALYTICS_ROLLUP_REFRESH_SECONDS > 0
+
+    async def refresh(self, names: Optional[Sequence[str]] = None) -> Dict[str, Optional[int]]:
+        """依序重算各彙總表（各自一個 session），回傳 {名稱: 重算天數}；未取得租約或失敗為 None"""
+        from app.database import AsyncSessionLocal
+
+        results: Dict[str, Optional[int]] = {}
+        for name in names or ROLLUPS:
+            try:
+                async with AsyncSessionLocal() as db:
+                    results[name] = await refresh_rollup(db, name, self.worker_id)
+            except Exception:
+                logger.exception("Failed to refresh analytics rollup %s", name)
+                results[name] = None
+        return results
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(settings.ANALYTICS_ROLLUP_REFRESH_SECONDS)
+
+    def start(self) -> None:
+        if self.enabled and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+analytics_rollup_worker = AnalyticsRollupWorker()
@@ -0,0 +1,252 @@
+"""
+LINE 房卡訂房連結 token 儲存
+/booking/generate-token 發出 token（line_uid + 房型資料），LIFF 表單用 token 取回資料（/token-data、
+/track-room-click），提交訂房（/submit）時消耗。原本存在模組層級 dict，每次發 token 都整個掃一遍清過期，
+而且三個端點落在不同 worker 或重啟後 token 就失效。改為可替換的 store（BOOKING_TOKEN_STORE）：
+
+- memory（預設）：程序內 dict + 依到期時間排序的 heap，過期清除每筆 O(log n)
+- db：booking_tokens 表，多 worker 共用；expires_at 有索引，定期以範圍刪除清掉過期 token
+
+兩者都保證 consume 只成功一次（memory：dict.pop；db：DELETE 的 rowcount），
+並統計發出 / 命中 / 未命中 / 過期 / 消耗次數（GET /health/booking-tokens，各 worker 分別計算）。
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import secrets
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+
+from app.config import settings
+from app.core.timezone import now_utc
+from app.models.booking import BookingToken
+
+logger = logging.getLogger(__name__)
+
+_EVICT_INTERVAL = 60  # db：過期 token 每分鐘清一次
+
+
+class _TokenStats:
+    def __init__(self) -> None:
+        self.issued = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.consumed = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "issued": self.issued,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "consumed": self.consumed,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def _new_token() -> str:
+    return secrets.token_urlsafe(24)
+
+
+class InMemoryBookingTokenStore:
+    """程序內 token（單一 worker）
+
+    操作之間沒有 await，在同一個 event loop 內天然不可分割，不需要另外上鎖。
+    """
+
+    backend = "memory"
+
+    def __init__(self, ttl_seconds: int) -> None:
+        self._ttl = ttl_seconds
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # (到期時間, token)；已消耗的 token 留在 heap 裡，到期時略過
+        self._heap: List[Tuple[float, str]] = []
+        self.stats = _TokenStats()
+
+    def _expire(self, now: float) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, token = heapq.heappop(self._heap)
+            entry = self._entries.get(token)
+            if entry is not None and entry["expires_at"] == expires_at:
+                del self._entries[token]
+                self.stats.expired += 1
+
+    def _lookup(self, token: str) -> Optional[Dict[str, Any]]:
+        self._expire(time.time())
+        entry = self._entries.get(token)
+        if entry is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return entry
+
+    async def issue(self, line_uid: str, data: Optional[dict] = None) -> str:
+        now = time.time()
+        self._expire(now)
+        token = _new_token()
+        expires_at = now + self._ttl
+        self._entries[token] = {
+            "line_uid": line_uid,
+            "data": data or {},
+            "clicked": set(),
+            "expires_at": expires_at,
+        }
+        heapq.heappush(self._heap, (expires_at, token))
+        self.stats.issued += 1
+        return token
+
+    async def peek(self, token: str) -> Optional[Dict[str, Any]]:
+        entry = self._lookup(token)
+        if entry is None:
+            return None
+        return {"line_uid": entry["line_uid"], "data": entry["data"]}
+
+    async def consume(self, token: str) -> Optional[Dict[str, Any]]:
+        if self._lookup(token) is None:
+            return None
+        entry = self._entries.pop(token)
+        self.stats.consumed += 1
+        return {"line_uid": entry["line_uid"], "data": entry["data"]}
+
+    async def claim_click(self, token: str, roomtype: str) -> bool:
+        """記下 token 內第一次點擊此房型；已記錄過（或 token 已失效）回傳 False"""
+        entry = self._entries.get(token)
+        if entry is None or roomtype in entry["clicked"]:
+            return False
+        entry["clicked"].add(roomtype)
+        return True
+
+    async def release_click(self, token: str, roomtype: str) -> None:
+        """點擊寫入失敗時撤回 claim_click，下次點擊可重試"""
+        entry = self._entries.get(token)
+        if entry is not None:
+            entry["clicked"].discard(roomtype)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "active": len(self._entries), **self.stats.snapshot()}
+
+
+class DbBookingTokenStore:
+    """booking_tokens 表（多 worker 共用）"""
+
+    backend = "db"
+
+    def __init__(self, ttl_seconds: int, session_factory=None) -> None:
+        self._ttl = ttl_seconds
+        self._session_factory = session_factory
+        self._last_evict = 0.0
+        self.stats = _TokenStats()
+
+    def _sessions(self):
+        if self._session_factory is None:
+            from app.database import AsyncSessionLocal
+
+            self._session_factory = AsyncSessionLocal
+        return self._session_factory
+
+    async def _evict_expired(self, db) -> None:
+        if time.time() - self._last_evict < _EVICT_INTERVAL:
+            return
+        self._last_evict = time.time()
+        result = await db.execute(delete(BookingToken).where(BookingToken.expires_at <= now_utc()))
+        self.stats.expired += result.rowcount or 0
+
+    async def _lookup(self, db, token: str):
+        row = (await db.execute(
+            select(BookingToken.line_uid, BookingToken.data, BookingToken.expires_at)
+            .where(BookingToken.token == token)
+        )).first()
+        if row is None or row.expires_at <= now_utc():
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return row
+
+    async def issue(self, line_uid: str, data: Optional[dict] = None) -> str:
+        token = _new_token()
+        async with self._sessions()() as db:
+            await self._evict_expired(db)
+            db.add(BookingToken(
+                token=token,
+                line_uid=line_uid,
+                data=data or {},
+                expires_at=now_utc() + timedelta(seconds=self._ttl),
+            ))
+            await db.commit()
+        self.stats.issued += 1
+        return token
+
+    async def peek(self, token: str) -> Optional[Dict[str, Any]]:
+        async with self._sessions()() as db:
+            row = await self._lookup(db, token)
+        if row is None:
+            return None
+        return {"line_uid": row.line_uid, "data": row.data or {}}
+
+    async def consume(self, token: str) -> Optional[Dict[str, Any]]:
+        async with self._sessions()() as db:
+            row = await self._lookup(db, token)
+            if row is None:
+                return None
+            # 兩個 worker 同時提交同一個 token：只有 DELETE 到那一列的請求算數
+            result = await db.execute(
+                delete(BookingToken)
+                .where(BookingToken.token == token, BookingToken.expires_at > now_utc())
+            )
+            await db.commit()
+        if result.rowcount != 1:
+            return None
+        self.stats.consumed += 1
+        return {"line_uid": row.line_uid, "data": row.data or {}}
+
+    async def claim_click(self, token: str, roomtype: str) -> bool:
+        """記下 token 內第一次點擊此房型；已記錄過（或 token 已失效）回傳 False"""
+        async with self._sessions()() as db:
+            result = await db.execute(
+                update(BookingToken)
+                .where(
+                    BookingToken.token == token,
+                    BookingToken.expires_at > now_utc(),
+                    ~BookingToken.clicked_roomtypes.contains(f",{roomtype},", autoescape=True),
+                )
+                .values(clicked_roomtypes=BookingToken.clicked_roomtypes.concat(f"{roomtype},"))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        return result.rowcount == 1
+
+    async def release_click(self, token: str, roomtype: str) -> None:
+        """點擊寫入失敗時撤回 claim_click，下次點擊可重試"""
+        async with self._sessions()() as db:
+            await db.execute(
+                update(BookingToken)
+                .where(BookingToken.token == token)
+                .values(clicked_roomtypes=func.replace(
+                    BookingToken.clicked_roomtypes, f",{roomtype},", ","
+                ))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"backend": self.backend, **self.stats.snapshot()}
+
+
+def build_booking_token_store():
+    """依 BOOKING_TOKEN_STORE 建立 token store"""
+    kind = (settings.BOOKING_TOKEN_STORE or "memory").strip().lower()
+    ttl = settings.BOOKING_TOKEN_TTL_SECONDS
+    if kind == "memory":
+        return InMemoryBookingTokenStore(ttl)
+    if kind == "db":
+        return DbBookingTokenStore(ttl)
+    raise ValueError(f"未知的 BOOKING_TOKEN_STORE: {settings.BOOKING_TOKEN_STORE}")
+
+
+booking_token_store = build_booking_token_store()
@@ -0,0 +1,135 @@
+"""
+群發工作進度追蹤
+=============================
+LINE 群發改由 line_app 在背景分區塊送出（/api/v1/messages/broadcast_jobs），
+送出請求只等到「收件人已選好、工作已建立」就回傳，不再佔住 HTTP 請求與 DB session。
+
+- 每則訊息一個 asyncio task，每 BROADCAST_JOB_POLL_SECONDS 秒查一次 line_app 工作進度
+- 每次輪詢用自己的短 session 回寫 messages.send_count（發送中顯示實際已送人數）
+- 工作結束：成功 → 已發送、send_count 以 line_friends 目標人數為準（與同步群發一致）；
+  全部失敗 → 發送失敗並記錄錯誤摘要
+- backend 重啟而中斷追蹤時，line_app 工作結束時自己的 rollup 仍會寫入最終狀態
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.clients.line_app_client import LineAppClient
+from app.config import settings
+from app.core.timezone import now_utc
+from app.models.message import Message
+
+logger = logging.getLogger(__name__)
+
+_FINISHED = ("done", "failed")
+# 連續查詢失敗（line_app 暫時無回應）超過此次數就放棄追蹤
+_MAX_POLL_ERRORS = 20
+
+
+def apply_job_progress(message: Message, job: Dict[str, Any], target_count: int) -> bool:
+    """依工作進度更新 message；回傳工作是否已結束"""
+    status = job.get("status")
+    sent = int(job.get("sent") or 0)
+
+    if status not in _FINISHED:
+        message.send_status = "發送中"
+        message.send_count = sent
+        return False
+
+    if status == "done" and sent > 0:
+        message.send_status = "已發送"
+        message.send_count = target_count
+        message.send_time = now_utc()
+    else:
+        message.send_status = "發送失敗"
+        message.send_count = sent
+    errors = job.get("errors")
+    if errors:
+        message.failure_reason = "; ".join(errors)[:2000]
+    return True
+
+
+class BroadcastJobTracker:
+    """message_id → 追蹤中的 task"""
+
+    def __init__(self) -> None:
+        self._tasks: Dict[int, asyncio.Task] = {}
+
+    def track(
+        self,
+        message_id: int,
+        job_id: str,
+        target_count: int,
+        client: Optional[LineAppClient] = None,
+    ) -> None:
+        previous = self._tasks.get(message_id)
+        if previous and not previous.done():
+            previous.cancel()
+        task = asyncio.create_task(
+            self._poll(message_id, job_id, target_count, client or LineAppClient()),
+            name=f"broadcast-job-{message_id}",
+        )
+        self._tasks[message_id] = task
+        task.add_done_callback(lambda t: self._discard(message_id, t))
+
+    def _discard(self, message_id: int, task: asyncio.Task) -> None:
+        if self._tasks.get(message_id) is task:
+            del self._tasks[message_id]
+
+    async def _poll(self, message_id: int, job_id: str, target_count: int, client: LineAppClient) -> None:
+        errors = 0
+        while True:
+            await asyncio.sleep(settings.BROADCAST_JOB_POLL_SECONDS)
+            try:
+                job = await client.get_broadcast_job(job_id)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    logger.warning(f"⚠️ 群發工作不存在，停止追蹤: message_id={message_id}, job_id={job_id}")
+                    return
+                job = None
+            except Exception:
+                job = None
+            if job is None:
+                errors += 1
+                if errors >= _MAX_POLL_ERRORS:
+                    logger.error(f"❌ 群發工作進度查詢連續失敗，停止追蹤: message_id={message_id}, job_id={job_id}")
+                    return
+                continue
+            errors = 0
+
+            try:
+                if await self._apply(message_id, job, target_count):
+                    logger.info(
+                        f"✅ 群發工作結束: message_id={message_id}, job_id={job_id}, status={job.get('status')}, "
+                        f"sent={job.get('sent')}, failed={job.get('failed')}"
+                    )
+                    return
+            except Exception:
+                logger.exception(f"❌ 回寫群發進度失敗: message_id={message_id}, job_id={job_id}")
+
+    @staticmethod
+    async def _apply(message_id: int, job: Dict[str, Any], target_count: int) -> bool:
+        from app.database import AsyncSessionLocal
+
+        async with AsyncSessionLocal() as db:
+            message = await db.get(Message, message_id)
+            if message is None:
+                return True
+            finished = apply_job_progress(message, job, target_count)
+            await db.commit()
+            return finished
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+
+broadcast_job_tracker = BroadcastJobTracker()
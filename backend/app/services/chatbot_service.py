@@ -10,24 +10,24 @@ import json
 import logging
 import re
 import time
-from collections import deque
+from contextlib import nullcontext
 from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta
-from threading import Lock
-from typing import Any, Dict, List, Literal, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 from uuid import uuid4
 from app.core.timezone import OPERATING_TZ, now_utc
 
 from openai import AsyncOpenAI
+from openai.types.chat import (ChatCompletionMessage,
+                               ChatCompletionMessageToolCall)
+from openai.types.chat.chat_completion_message_tool_call import Function
 from sqlalchemy import func as sa_func
 from sqlalchemy import or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
 from app.config import settings
 from app.models.conversation import ConversationMessage, ConversationThread
-from app.models.faq import (AiTokenUsage, FaqCategory, FaqRule, FaqRuleTag,
-                            Industry)
+from app.models.faq import FaqCategory, FaqRule, FaqRuleTag
 from app.models.member import Member
 from app.models.tag import MemberInteractionTag, MemberTag
 from app.schemas.chatbot import (BookingContextSchema, ChatbotMessageOutSchema,
@@ -35,9 +35,14 @@ from app.schemas.chatbot import (BookingContextSchema, ChatbotMessageOutSchema,
                                  MemberFormDefinitionSchema,
                                  MemberFormFieldSchema, ReplyType,
                                  RoomCardSchema, SessionResetOutSchema)
+from app.services.chatbot_session_store import (ChatbotSessionState,
+                                                build_session_store)
+from app.services.kb_index import kb_index_registry
 from app.services.pms_chatbot_client import (build_booking_url, pms_enabled,
                                              query_pms,
                                              query_pms_all_roomtypes)
+from app.services.thread_summary import record_messages
+from app.services.token_ledger import token_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -47,7 +52,7 @@ logger = logging.getLogger(__name__)
 # ---------------------------------------------------------------------------
 
 
-def _call_booking_api(
+async def _call_booking_api(
     rooms: List[Dict[str, Any]],
     checkin: str,
     checkout: str,
@@ -57,7 +62,7 @@ def _call_booking_api(
     line_uid: str = "",
 ) -> Optional[str]:
     """呼叫外部訂房 API，回傳付款頁面 URL（從 302 Location header 取得）"""
-    import requests as _requests
+    from app.clients.http_pool import BOOKING_API, http_pool
 
     api_url = settings.BOOKING_API_URL
     api_key = settings.BOOKING_API_KEY
@@ -92,12 +97,12 @@ def _call_booking_api(
         "comments": f"line_uid:{line_uid}" if line_uid else "AI chatbot 訂房",
     }
 
-    resp = _requests.post(
+    resp = await http_pool.post(
+        BOOKING_API,
         api_url,
         json=payload,
         headers={"Content-Type": "application/json", "Api-Key": api_key},
-        allow_redirects=False,
-        timeout=15,
+        follow_redirects=False,
     )
 
     if resp.status_code == 302:
@@ -354,7 +359,7 @@ def _clean_price(value: Any) -> int:
 
 
 # ---------------------------------------------------------------------------
-# Knowledge base (KB) — read directly from DB
+# Knowledge base (KB) — in-memory index built from DB
 # ---------------------------------------------------------------------------
 
 _CATEGORY_NAME_MAP = {
@@ -373,8 +378,7 @@ async def _kb_search(
     test_mode: bool = False,
     line_channel_id: Optional[str] = None,
 ) -> dict:
-    from app.models.faq import FaqCategory, FaqRule
-
+    """FAQ 知識庫查詢（記憶體索引，見 kb_index.py）"""
     cat_name = _CATEGORY_NAME_MAP.get(category)
     if not cat_name:
         return {"ok": False, "error": "unknown category", "items": []}
@@ -384,74 +388,18 @@ async def _kb_search(
     if category == "booking_billing" and is_pms_enabled(line_channel_id):
         return {"ok": True, "category": category, "query": query, "items": []}
 
-    # 查詢啟用中的分類
-    cat_result = await db.execute(
-        select(FaqCategory).where(
-            FaqCategory.name == cat_name, FaqCategory.is_active == True
-        )  # noqa: E712
-    )
-    cat = cat_result.scalar_one_or_none()
-    if not cat:
-        return {"ok": True, "category": category, "query": query, "items": []}
-
-    # 測試模式：讀 draft + active；正式模式：只讀 active
-    allowed_statuses = ["draft", "active"] if test_mode else ["active"]
-
-    rule_query = select(FaqRule).where(
-        FaqRule.category_id == cat.id,
-        FaqRule.status.in_(allowed_statuses),
-        FaqRule.is_enabled_filter(),
-    )
-    # 多 OA 隔離：訊息來自特定 LINE OA 時，只用該 OA 的規則
-    if line_channel_id:
-        rule_query = rule_query.where(FaqRule.channel_id == line_channel_id)
-
-    rule_result = await db.execute(
-        rule_query.options(selectinload(FaqRule.tags)).order_by(FaqRule.created_at)
-    )
-    rules = rule_result.scalars().all()
-
-    rows = []
-    for rule in rules:
-        c = rule.content_json
-        if isinstance(c, str):
-            try:
-                c = json.loads(c)
-            except Exception:
-                c = {}
-        row = dict(c or {})
-        row["tags"] = [t.tag_name for t in (rule.tags or [])]
-        row["_rule_id"] = rule.id
-        rows.append(row)
-
     fields = _FACILITY_FIELDS if category == "facilities" else _ROOM_FIELDS
-    q = (query or "").strip().lower()
-
-    def _result(items):
-        rule_ids = [r["_rule_id"] for r in items if "_rule_id" in r]
-        return {
-            "ok": True,
-            "category": category,
-            "query": query,
-            "items": items,
-            "rule_ids": rule_ids,
-        }
-
-    if not q:
-        return _result(rows[:top_k])
-
-    tokens = [t for t in re.split(r"\s+", q) if t]
-    scored = []
-    for row in rows:
-        text_blob = " ".join(str(row.get(f, "")) for f in fields).lower()
-        score = sum(2 for t in tokens if t in text_blob) + (3 if q in text_blob else 0)
-        if score > 0:
-            scored.append((score, row))
-    scored.sort(key=lambda x: x[0], reverse=True)
-    # 沒命中就回空陣列（不再 fallback 回前 6 筆，避免誤貼不相關標籤）
-    # AI 看到空 items 會依系統提示詞回「沒有相關資料」並呼叫 mark_unanswerable
-    result_items = [r for _, r in scored[:top_k]]
-    return _result(result_items)
+    index = await kb_index_registry.get(
+        db, category, cat_name, fields, test_mode, line_channel_id
+    )
+    items = index.search(query, top_k)
+    return {
+        "ok": True,
+        "category": category,
+        "query": query,
+        "items": items,
+        "rule_ids": [r["_rule_id"] for r in items if "_rule_id" in r],
+    }
 
 
 # ---------------------------------------------------------------------------
@@ -832,6 +780,12 @@ _TOOLS_WITHOUT_PMS = [
     _MARK_UNANSWERABLE_TOOL,
 ]
 
+# 會改寫官網 session（選房 / 會員資料）的 tool：依 AI 給的順序逐一執行，其餘 tool 並行
+_ORDERED_TOOLS = frozenset({"confirm_room_selection", "save_member_info"})
+# 會寫 ctx.room_cards / 入住日期的 PMS tool：同一批內彼此依 AI 給的順序執行（與其他 tool 仍並行），
+# 房卡以最後一個呼叫為準，不會因為誰先查完而不同
+_ROOM_CARD_TOOLS = frozenset({"query_pms_availability", "query_pms_mixed_availability"})
+
 # 保險網：AI 回覆含以下任一字串時，即使沒呼叫 mark_unanswerable 也視為答不出
 # 這些是「契約化措辭」——對應 system prompt「無法回答的情境」要求 AI 必須輸出的固定句
 # 提示詞要求 AI 無法回答時必須使用這些詞彙，因此命中率接近 100%
@@ -847,6 +801,10 @@ _UNANSWERABLE_PHRASES = (
 )
 
 
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
 def _contains_unanswerable_phrase(reply: str) -> bool:
     if not reply:
         return False
@@ -1027,57 +985,6 @@ def _build_system_prompt_for(today: date, pms_on: bool) -> str:
 - 嚴禁提及「房卡」「下方房卡」這類系統術語"""
 
 
-# ---------------------------------------------------------------------------
-# Session TTL constants
-# ---------------------------------------------------------------------------
-
-_SESSION_TTL = 60 * 20  # 20 minutes
-_EVICT_INTERVAL = 60 * 10  # check every 10 minutes
-
-
-# ---------------------------------------------------------------------------
-# Session state
-# ---------------------------------------------------------------------------
-
-
-@dataclass
-class ChatbotSessionState:
-    browser_key: str
-    session_id: str = field(default_factory=lambda: str(uuid4()))
-    hotel_id: Optional[int] = None
-    intent_state: Literal["detecting", "confirmed", "none"] = "detecting"
-    turn_count: int = 0
-    booking_rooms: int = 1  # 間數 (spec: booking_rooms)
-    booking_adults: Optional[int] = None  # 每間人數
-    checkin_date: Optional[str] = None
-    checkout_date: Optional[str] = None
-    room_plan_requests: List[Dict[str, int]] = field(default_factory=list)
-    selected_rooms: List[Dict[str, Any]] = field(default_factory=list)
-    selected_room_type: Optional[str] = None
-    selected_room_count: Optional[int] = None
-    selected_room_name: Optional[str] = None
-    selected_room_source: Optional[str] = None
-    member_name: Optional[str] = None
-    member_phone: Optional[str] = None
-    member_email: Optional[str] = None
-    crm_member_id: Optional[int] = None
-    history: deque = field(default_factory=lambda: deque(maxlen=10))
-    last_room_cards: List[RoomCardSchema] = field(default_factory=list)
-    ts: float = field(default_factory=time.time)
-
-    @property
-    def checkin_date_obj(self) -> Optional[date]:
-        if not self.checkin_date:
-            return None
-        return datetime.strptime(self.checkin_date, "%Y-%m-%d").date()
-
-    @property
-    def checkout_date_obj(self) -> Optional[date]:
-        if not self.checkout_date:
-            return None
-        return datetime.strptime(self.checkout_date, "%Y-%m-%d").date()
-
-
 # ---------------------------------------------------------------------------
 # Tool calling context (shared between website chatbot & member chat)
 # ---------------------------------------------------------------------------
@@ -1105,8 +1012,20 @@ class ToolCallingContext:
     pms_called: bool = False
     unanswered: bool = False
     unanswered_reason: Optional[str] = None
+    # 每輪 LLM / tool 耗時：[{"turn", "step", "ms"}]，step 為 "llm" 或 tool 名稱
+    timings: List[Dict[str, Any]] = field(default_factory=list)
+    # AsyncSession 不能併發使用：同一輪並行執行的 tool 輪流以此鎖存取 ctx.db
+    db_lock: asyncio.Lock = field(default_factory=asyncio.Lock, repr=False)
     # 官網 session 參照（僅官網 chatbot 使用）
     _session: Optional[ChatbotSessionState] = field(default=None, repr=False)
+    # 串流事件接收端（官網 widget 串流端點）：await on_event(event, data)；None = 不串流
+    on_event: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = field(
+        default=None, repr=False
+    )
+
+    async def emit(self, event: str, data: Dict[str, Any]) -> None:
+        if self.on_event is not None:
+            await self.on_event(event, data)
 
 
 # ---------------------------------------------------------------------------
@@ -1116,11 +1035,9 @@ class ToolCallingContext:
 
 class ChatbotService:
     def __init__(self) -> None:
-        self._sessions: Dict[str, ChatbotSessionState] = {}
-        self._lock = Lock()
+        self._store = build_session_store()
         self._max_turns = 5
         self._openai: Optional[AsyncOpenAI] = None
-        self._last_evict: float = time.time()
 
     def _get_openai(self) -> AsyncOpenAI:
         if self._openai is None:
@@ -1134,40 +1051,43 @@ class ChatbotService:
     # Session management
     # ------------------------------------------------------------------
 
-    def _evict_stale_sessions(self) -> None:
-        """Evict sessions idle longer than _SESSION_TTL. Call inside self._lock."""
-        now = time.time()
-        if now - self._last_evict < _EVICT_INTERVAL:
-            return
-        cutoff = now - _SESSION_TTL
-        stale = [k for k, v in self._sessions.items() if v.ts < cutoff]
-        for k in stale:
-            del self._sessions[k]
-        self._last_evict = now
-
-    def get_or_create_session(
+    async def get_or_create_session(
         self,
         browser_key: str,
         hotel_id: Optional[int] = None,
     ) -> ChatbotSessionState:
-        with self._lock:
-            self._evict_stale_sessions()
-            session = self._sessions.get(browser_key)
-            if not session:
-                session = ChatbotSessionState(
-                    browser_key=browser_key, hotel_id=hotel_id
-                )
-                self._sessions[browser_key] = session
-            elif hotel_id is not None:
-                session.hotel_id = hotel_id
-            session.ts = time.time()
-            return session
+        session = await self._store.load(browser_key)
+        if not session:
+            session = ChatbotSessionState(browser_key=browser_key, hotel_id=hotel_id)
+        elif hotel_id is not None:
+            session.hotel_id = hotel_id
+        session.ts = time.time()
+        return session
 
-    def reset_session(self, browser_key: str) -> ChatbotSessionState:
-        with self._lock:
-            session = ChatbotSessionState(browser_key=browser_key)
-            self._sessions[browser_key] = session
-            return session
+    async def reset_session(
+        self,
+        browser_key: str,
+        current: Optional[ChatbotSessionState] = None,
+    ) -> ChatbotSessionState:
+        """重新開始對話；沿用 current 的版本號，寫回時覆蓋原本的 session"""
+        session = ChatbotSessionState(browser_key=browser_key)
+        if current is not None:
+            session.version = current.version
+        else:
+            existing = await self._store.load(browser_key)
+            if existing is not None:
+                session.version = existing.version
+        return session
+
+    async def save_session(self, session: ChatbotSessionState) -> bool:
+        """請求結束時寫回 session；同一使用者的另一個請求已先寫回時放棄本次變更"""
+        saved = await self._store.save(session)
+        if not saved:
+            logger.warning(
+                f"[chatbot] session {session.browser_key} was updated concurrently; "
+                f"keeping the earlier write"
+            )
+        return saved
 
     # ------------------------------------------------------------------
     # Main message handler (LLM-driven, spec 3.1–3.2)
@@ -1185,12 +1105,13 @@ class ChatbotService:
         site_name: Optional[str] = None,
         admin_test: bool = False,
         line_channel_id: Optional[str] = None,
+        on_event: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None,
     ) -> ChatbotMessageOutSchema:
-        session = self.get_or_create_session(browser_key, hotel_id)
+        session = await self.get_or_create_session(browser_key, hotel_id)
 
         # Spec 3.2: reset after 5 turns
         if session.turn_count >= self._max_turns:
-            session = self.reset_session(browser_key)
+            session = await self.reset_session(browser_key, session)
             if hotel_id is not None:
                 session.hotel_id = hotel_id
 
@@ -1254,6 +1175,7 @@ class ChatbotService:
             checkout_date=session.checkout_date,
             booking_adults=session.booking_adults,
             _session=session,
+            on_event=on_event,
         )
 
         # Call LLM with tool calling (if no deterministic reply needed)
@@ -1325,7 +1247,7 @@ class ChatbotService:
 
         session.history.append({"role": "assistant", "content": reply})
         reply_type = self._determine_reply_type(session, room_cards)
-        session.ts = time.time()
+        await self.save_session(session)
 
         # 把 widget 對話寫入 conversation_threads / conversation_messages
         # 不論是否已加入會員都記錄；非會員會建一筆 is_guest=1 的 Member
@@ -1567,6 +1489,7 @@ class ChatbotService:
         # 4. 寫入 bot 回覆（純文字）— +1ms 確保排在使用者訊息後
         # unanswered=ctx.unanswered：mark_unanswerable tool 觸發或保險網命中時為 True
         # 供 analytics「AI 未能回答」/ 行動建議統計，與 LINE 端 line_app/app.py:3187 對齊
+        # reply_to_message_id：回覆所對應的使用者訊息，未解問題報表直接以主鍵取回觸發問題
         bot_msg: Optional[ConversationMessage] = None
         if bot_reply:
             bot_msg = ConversationMessage(
@@ -1578,6 +1501,7 @@ class ChatbotService:
                 content=bot_reply,
                 message_source="gpt",
                 unanswered=unanswered,
+                reply_to_message_id=user_msg.id,
                 status="sent",
                 created_at=now + timedelta(milliseconds=1),
             )
@@ -1606,6 +1530,7 @@ class ChatbotService:
                     message_type="room_cards",
                     content=room_cards_payload,
                     message_source="gpt",
+                    reply_to_message_id=user_msg.id,
                     status="sent",
                     created_at=now + timedelta(milliseconds=2),
                 )
@@ -1613,6 +1538,8 @@ class ChatbotService:
             except Exception as exc:
                 logger.warning(f"[chatbot] serialize room_cards failed: {exc}")
 
+        await db.flush()
+        await record_messages(db, [user_msg, bot_msg, cards_msg])
         await db.commit()
 
         # 6. 推 SSE 通知後台聊天室即時更新（對齊 LINE：webchat 原本只靠 3 秒 polling）。
@@ -1668,39 +1595,10 @@ class ChatbotService:
         tokens_used: int,
         line_channel_id: Optional[str] = None,
     ) -> None:
-        """扣除 AiTokenUsage 額度（多 OA：按 channel_id 扣）"""
-        ind_result = await db.execute(
-            select(Industry).where(Industry.is_active == True).limit(1)  # noqa: E712
-        )
-        industry = ind_result.scalar_one_or_none()
-        if not industry:
-            return
-
-        # 未指定 channel_id 時用第一筆 LineChannel 作為 fallback（官網 chatbot 用）
-        if not line_channel_id:
-            from app.models.line_channel import LineChannel
-
-            lc_res = await db.execute(
-                select(LineChannel)
-                .where(LineChannel.is_active == True)
-                .order_by(LineChannel.id.asc())
-                .limit(1)  # noqa: E712
-            )
-            lc = lc_res.scalar_one_or_none()
-            if lc and lc.channel_id:
-                line_channel_id = lc.channel_id
-            else:
-                return  # 沒有任何 LineChannel → 不扣
-
-        usage_query = select(AiTokenUsage).where(
-            AiTokenUsage.industry_id == industry.id,
-            AiTokenUsage.channel_id == line_channel_id,
-        )
-        usage_result = await db.execute(usage_query)
-        token_usage = usage_result.scalar_one_or_none()
-        if token_usage:
-            token_usage.used_amount += tokens_used
-            await db.flush()
+        """扣除 AiTokenUsage 額度（多 OA：按 channel_id 扣；未指定時扣第一個 LINE 館別）"""
+        view = await token_ledger.quota(db, line_channel_id=line_channel_id, seed=False)
+        if view is not None:
+            await token_ledger.charge(db, view, tokens_used)
 
     # ------------------------------------------------------------------
     # Unified tool calling (shared by website chatbot & member chat)
@@ -1712,18 +1610,24 @@ class ChatbotService:
         """單一 tool calling 迴圈，官網 & 會員聊天室共用"""
         client = self._get_openai()
 
-        for _ in range(5):
+        for turn in range(1, 6):
             pms_called = False
-            resp = await client.chat.completions.create(
-                model=settings.OPENAI_MODEL,
-                messages=messages,
-                tools=_get_tools(ctx.line_channel_id),
-                tool_choice="auto",
-                timeout=30,
-            )
-            if resp.usage:
-                ctx.total_tokens_used += resp.usage.total_tokens
-            msg = resp.choices[0].message
+            t0 = time.perf_counter()
+            if ctx.on_event is not None:
+                msg, usage = await self._stream_completion(client, messages, ctx)
+            else:
+                resp = await client.chat.completions.create(
+                    model=settings.OPENAI_MODEL,
+                    messages=messages,
+                    tools=_get_tools(ctx.line_channel_id),
+                    tool_choice="auto",
+                    timeout=30,
+                )
+                msg, usage = resp.choices[0].message, resp.usage
+            llm_ms = _elapsed_ms(t0)
+            ctx.timings.append({"turn": turn, "step": "llm", "ms": llm_ms})
+            if usage:
+                ctx.total_tokens_used += usage.total_tokens
 
             if not msg.tool_calls:
                 reply = msg.content or ""
@@ -1738,17 +1642,33 @@ class ChatbotService:
             messages.append(msg)
             tool_names = [tc.function.name for tc in msg.tool_calls]
             logger.info(f"[tool_loop] AI called tools: {tool_names}")
+
+            calls: List[Tuple[str, Dict[str, Any], Any]] = []
             for tc in msg.tool_calls:
                 fn_name = tc.function.name
                 args = json.loads(tc.function.arguments)
-
                 if fn_name == "query_pms_availability" and pms_called:
-                    result: Any = {"error": "duplicate pms call suppressed"}
-                else:
-                    if fn_name == "query_pms_availability":
-                        pms_called = True
-                    result = await self._execute_tool(ctx, fn_name, args)
+                    calls.append(
+                        (fn_name, args, {"error": "duplicate pms call suppressed"})
+                    )
+                    continue
+                if fn_name == "query_pms_availability":
+                    pms_called = True
+                calls.append((fn_name, args, None))
+
+            t0 = time.perf_counter()
+            results = await self._run_tool_calls(ctx, calls, turn)
+            logger.info(
+                f"[tool_loop] turn {turn}: llm={llm_ms}ms "
+                f"tools={_elapsed_ms(t0)}ms "
+                + " ".join(
+                    f"{t['step']}={t['ms']}ms"
+                    for t in ctx.timings
+                    if t["turn"] == turn and t["step"] != "llm"
+                )
+            )
 
+            for tc, (fn_name, _, _), result in zip(msg.tool_calls, calls, results):
                 llm_result = self._clean_for_llm(result, fn_name, ctx.collect_rule_ids)
 
                 messages.append(
@@ -1763,19 +1683,139 @@ class ChatbotService:
         ctx.unanswered = True
         return "很抱歉，系統暫時無法回應，請稍後再試。"
 
+    async def _stream_completion(
+        self, client: AsyncOpenAI, messages: List[Dict[str, Any]], ctx: ToolCallingContext
+    ) -> Tuple[ChatCompletionMessage, Any]:
+        """串流呼叫 LLM：回覆片段即時送出 reply_delta，tool calls 收齊後組回一般 message"""
+        stream = await client.chat.completions.create(
+            model=settings.OPENAI_MODEL,
+            messages=messages,
+            tools=_get_tools(ctx.line_channel_id),
+            tool_choice="auto",
+            timeout=30,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        content: List[str] = []
+        tool_calls: Dict[int, Dict[str, str]] = {}
+        usage = None
+        async for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content.append(delta.content)
+                await ctx.emit("reply_delta", {"text": delta.content})
+            for tc in delta.tool_calls or []:
+                slot = tool_calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+                if tc.id:
+                    slot["id"] = tc.id
+                if tc.function and tc.function.name:
+                    slot["name"] += tc.function.name
+                if tc.function and tc.function.arguments:
+                    slot["arguments"] += tc.function.arguments
+
+        if tool_calls and content:
+            # 呼叫 tool 前的過場文字不是最終回覆，前端清掉重來
+            await ctx.emit("reply_reset", {})
+        msg = ChatCompletionMessage(
+            role="assistant",
+            content="".join(content) or None,
+            tool_calls=[
+                ChatCompletionMessageToolCall(
+                    id=slot["id"],
+                    type="function",
+                    function=Function(name=slot["name"], arguments=slot["arguments"]),
+                )
+                for _, slot in sorted(tool_calls.items())
+            ] or None,
+        )
+        return msg, usage
+
+    async def _run_tool_calls(
+        self,
+        ctx: ToolCallingContext,
+        calls: List[Tuple[str, Dict[str, Any], Any]],
+        turn: int,
+    ) -> List[Any]:
+        """執行同一則 AI 訊息裡的 tool calls，結果依原順序回傳
+
+        calls: [(fn_name, args, preset_result)]，preset_result 非 None 表示不執行直接回該結果。
+        互相獨立的 tool 並行執行；_ORDERED_TOOLS 會改 session 狀態，依 AI 給的順序
+        逐一執行，並作為並行批次的分界（前面的批次全部完成後才執行）。
+        批次內的 _ROOM_CARD_TOOLS 串成一條依序執行的鏈，整條鏈與其他 tool 並行。
+        """
+        results: List[Any] = [preset for _, _, preset in calls]
+        batch: List[int] = []
+
+        async def run_in_order(indexes: List[int]) -> List[Any]:
+            outs: List[Any] = []
+            for i in indexes:
+                try:
+                    outs.append(await self._timed_tool(ctx, *calls[i][:2], turn))
+                except Exception as exc:
+                    outs.append(exc)
+            return outs
+
+        async def flush() -> None:
+            if not batch:
+                return
+            chained = [i for i in batch if calls[i][0] in _ROOM_CARD_TOOLS]
+            parallel = [i for i in batch if calls[i][0] not in _ROOM_CARD_TOOLS]
+            *outs, chained_outs = await asyncio.gather(
+                *(self._timed_tool(ctx, *calls[i][:2], turn) for i in parallel),
+                run_in_order(chained),
+                return_exceptions=True,
+            )
+            if isinstance(chained_outs, BaseException):
+                raise chained_outs
+            # 等整批跑完才拋錯，避免還在用 ctx.db 的 tool 留在背景
+            done = sorted(zip(parallel + chained, outs + chained_outs), key=lambda pair: pair[0])
+            for i, out in done:
+                if isinstance(out, BaseException):
+                    raise out
+                results[i] = out
+            batch.clear()
+
+        for i, (fn_name, args, preset) in enumerate(calls):
+            if preset is not None:
+                continue
+            if fn_name in _ORDERED_TOOLS:
+                await flush()
+                results[i] = await self._timed_tool(ctx, fn_name, args, turn)
+            else:
+                batch.append(i)
+        await flush()
+        return results
+
+    async def _timed_tool(
+        self, ctx: ToolCallingContext, fn_name: str, args: Dict[str, Any], turn: int
+    ) -> Any:
+        await ctx.emit("tool", {"name": fn_name, "status": "start"})
+        t0 = time.perf_counter()
+        try:
+            return await self._execute_tool(ctx, fn_name, args)
+        finally:
+            ms = _elapsed_ms(t0)
+            ctx.timings.append({"turn": turn, "step": fn_name, "ms": ms})
+            await ctx.emit("tool", {"name": fn_name, "status": "done", "ms": ms})
+
     async def _execute_tool(
         self, ctx: ToolCallingContext, fn_name: str, args: Dict[str, Any]
     ) -> Any:
         """統一 tool executor，官網 & 會員聊天室共用"""
         if fn_name == "kb_search":
             if ctx.db is not None:
-                result = await _kb_search(
-                    ctx.db,
-                    args.get("category", ""),
-                    args.get("query", ""),
-                    test_mode=ctx.test_mode,
-                    line_channel_id=ctx.line_channel_id,
-                )
+                async with ctx.db_lock:
+                    result = await _kb_search(
+                        ctx.db,
+                        args.get("category", ""),
+                        args.get("query", ""),
+                        test_mode=ctx.test_mode,
+                        line_channel_id=ctx.line_channel_id,
+                    )
             else:
                 result = {
                     "ok": False,
@@ -1884,15 +1924,19 @@ class ChatbotService:
         # hotelcode 已是「依範圍（channel 或 tenant）解析、且該範圍 status='enabled'」的結果，
         # 故閘門只需再確認 env 憑證齊全（_PMS_CONFIGURED），不依賴 channel-keyed 的記憶體快取
         # （無 LINE 組織 channel_id=None，舊的 is_pms_enabled(None) 會誤判為「任一啟用」）。
-        hotelcode = await self._resolve_hotelcode(db, ctx.line_channel_id, ctx.tenant_id)
+        async with ctx.db_lock:
+            hotelcode = await self._resolve_hotelcode(
+                db, ctx.line_channel_id, ctx.tenant_id
+            )
 
         # PMS 未就緒（env 沒設好 / 此組織未啟用 / 無 hotelcode）→ FAQ KB fallback
         if not _PMS_CONFIGURED or not hotelcode:
-            cards = await _kb_fallback_rooms(
-                db,
-                housingcnt if housingcnt_specified else None,
-                line_channel_id=ctx.line_channel_id,
-            )
+            async with ctx.db_lock:
+                cards = await _kb_fallback_rooms(
+                    db,
+                    housingcnt if housingcnt_specified else None,
+                    line_channel_id=ctx.line_channel_id,
+                )
             if not cards:
                 return {
                     "source": "no_data",
@@ -1919,16 +1963,13 @@ class ChatbotService:
             # 未指定人數且未指定房型 → 用 query_pms_all_roomtypes（housingcnt 空字串）取全部房型；
             # 否則用 query_pms（會依 housingcnt 過濾）。hotelcode 已由上方 _resolve_hotelcode 取得。
             if not housingcnt_specified and not roomtype:
-                raw = await asyncio.to_thread(
-                    query_pms_all_roomtypes, startdate, enddate, hotelcode
-                )
+                raw = await query_pms_all_roomtypes(startdate, enddate, hotelcode)
                 logger.info(
                     f"[PMS] all-roomtypes query: {len(raw.get('room', []))} room types, "
                     f"startdate={startdate}, enddate={enddate}, hotelcode={hotelcode}"
                 )
             else:
-                raw = await asyncio.to_thread(
-                    query_pms,
+                raw = await query_pms(
                     startdate,
                     enddate,
                     roomtype,
@@ -1951,9 +1992,7 @@ class ChatbotService:
                 logger.info(
                     "[PMS] housingcnt=1 returned empty, retrying with housingcnt=2"
                 )
-                raw2 = await asyncio.to_thread(
-                    query_pms, startdate, enddate, roomtype, 2, hotelcode
-                )
+                raw2 = await query_pms(startdate, enddate, roomtype, 2, hotelcode)
                 _inject_tt_test_inventory(raw2, startdate, enddate)
                 availability = self._extract_availability(raw2, startdate, enddate)
                 cards = self._availability_to_room_cards(availability, 2)
@@ -1962,17 +2001,19 @@ class ChatbotService:
 
             if not cards:
                 # PMS returned empty → FAQ KB fallback
-                cards = await _kb_fallback_rooms(
-                    db,
-                    housingcnt if housingcnt_specified else None,
-                    line_channel_id=ctx.line_channel_id,
-                )
+                async with ctx.db_lock:
+                    cards = await _kb_fallback_rooms(
+                        db,
+                        housingcnt if housingcnt_specified else None,
+                        line_channel_id=ctx.line_channel_id,
+                    )
                 source_note = "faq_kb"
             else:
                 # Spec: PMS 資料為主，FAQ_KB 資料補充房型圖片與特色描述
-                cards = await _enrich_cards_with_kb(
-                    cards, db, line_channel_id=ctx.line_channel_id
-                )
+                async with ctx.db_lock:
+                    cards = await _enrich_cards_with_kb(
+                        cards, db, line_channel_id=ctx.line_channel_id
+                    )
                 source_note = "pms"
 
             result_dict: Dict[str, Any] = {
@@ -2000,11 +2041,12 @@ class ChatbotService:
             return result_dict, cards
 
         except Exception as exc:
-            cards = await _kb_fallback_rooms(
-                db,
-                housingcnt if housingcnt_specified else None,
-                line_channel_id=ctx.line_channel_id,
-            )
+            async with ctx.db_lock:
+                cards = await _kb_fallback_rooms(
+                    db,
+                    housingcnt if housingcnt_specified else None,
+                    line_channel_id=ctx.line_channel_id,
+                )
             if not cards:
                 return {
                     "source": "no_data",
@@ -2074,24 +2116,29 @@ class ChatbotService:
                 candidates_occ.add(occ)
 
         # 解析當前 LINE OA 的 hotelcode（per-channel PMS routing）
-        hotelcode = await self._resolve_hotelcode(
-            ctx.db if ctx else None,
-            ctx.line_channel_id if ctx else None,
-        )
+        async with ctx.db_lock if ctx else nullcontext():
+            hotelcode = await self._resolve_hotelcode(
+                ctx.db if ctx else None,
+                ctx.line_channel_id if ctx else None,
+            )
 
         inventory_cards: List[Dict[str, Any]] = []
-        for housingcnt in sorted(candidates_occ):
-            try:
-                raw = await asyncio.to_thread(
-                    query_pms, startdate, enddate, None, housingcnt, hotelcode
-                )
-                inventory_cards.extend(
-                    _inventory_cards_from_pms_raw(
-                        raw, startdate, enddate, occupancy_fallback=housingcnt
-                    )
-                )
-            except Exception:
+        occupancies = sorted(candidates_occ)
+        raws = await asyncio.gather(
+            *(
+                query_pms(startdate, enddate, None, housingcnt, hotelcode)
+                for housingcnt in occupancies
+            ),
+            return_exceptions=True,
+        )
+        for housingcnt, raw in zip(occupancies, raws):
+            if isinstance(raw, BaseException):
                 continue
+            inventory_cards.extend(
+                _inventory_cards_from_pms_raw(
+                    raw, startdate, enddate, occupancy_fallback=housingcnt
+                )
+            )
         inventory = _merge_room_inventory(inventory_cards)
 
         remaining = {
@@ -2180,9 +2227,10 @@ class ChatbotService:
             )
             if cards:
                 db = ctx.db
-                cards = await _enrich_cards_with_kb(
-                    cards, db, line_channel_id=ctx.line_channel_id
-                )
+                async with ctx.db_lock:
+                    cards = await _enrich_cards_with_kb(
+                        cards, db, line_channel_id=ctx.line_channel_id
+                    )
                 ctx.room_cards = cards
             if startdate:
                 ctx.checkin_date = startdate
@@ -2237,15 +2285,13 @@ class ChatbotService:
         adults: int,
         db: Optional[AsyncSession] = None,
     ) -> ChatbotRoomsOutSchema:
-        session = self.get_or_create_session(browser_key)
+        session = await self.get_or_create_session(browser_key)
         session.checkin_date = checkin_date
         session.checkout_date = checkout_date
         session.booking_adults = adults
 
         try:
-            raw = await asyncio.to_thread(
-                query_pms, checkin_date, checkout_date, None, adults
-            )
+            raw = await query_pms(checkin_date, checkout_date, None, adults)
             availability = self._extract_availability(raw, checkin_date, checkout_date)
             cards = self._availability_to_room_cards(availability, adults)
             if cards:
@@ -2260,13 +2306,14 @@ class ChatbotService:
             source = "faq_kb"
 
         session.last_room_cards = cards
+        await self.save_session(session)
         return ChatbotRoomsOutSchema(source=source, rooms=cards)
 
     # ------------------------------------------------------------------
     # Confirm room (POST /chatbot/confirm-room) — spec 3.4
     # ------------------------------------------------------------------
 
-    def confirm_room(
+    async def confirm_room(
         self,
         *,
         browser_key: str,
@@ -2276,7 +2323,7 @@ class ChatbotService:
         source: Optional[str] = None,
     ) -> ConfirmRoomOutSchema:
         """Legacy single-room confirm (backward compat)."""
-        return self.confirm_rooms(
+        return await self.confirm_rooms(
             browser_key=browser_key,
             rooms=[
                 {
@@ -2288,14 +2335,14 @@ class ChatbotService:
             ],
         )
 
-    def confirm_rooms(
+    async def confirm_rooms(
         self,
         *,
         browser_key: str,
         rooms: List[Dict[str, Any]],
     ) -> ConfirmRoomOutSchema:
         """Multi-room confirm — spec v0.6+."""
-        session = self.get_or_create_session(browser_key)
+        session = await self.get_or_create_session(browser_key)
         # Store all selected rooms
         session.selected_rooms = rooms
         # Also apply first room for backward compatibility
@@ -2318,6 +2365,7 @@ class ChatbotService:
             if (session.member_name or session.member_phone or session.member_email)
             else None
         )
+        await self.save_session(session)
 
         return ConfirmRoomOutSchema(
             session_id=session.session_id,
@@ -2331,7 +2379,7 @@ class ChatbotService:
     # Booking save (spec: POST /chatbot/booking-save)
     # ------------------------------------------------------------------
 
-    def booking_save(
+    async def booking_save(
         self,
         *,
         browser_key: str,
@@ -2345,7 +2393,7 @@ class ChatbotService:
         from app.schemas.chatbot import (BookingSavedDetailSchema,
                                          BookingSaveOutSchema)
 
-        session = self.get_or_create_session(browser_key)
+        session = await self.get_or_create_session(browser_key)
 
         # Merge: payload overrides session values
         name = member_name or session.member_name or ""
@@ -2451,7 +2499,7 @@ class ChatbotService:
         cart_url: Optional[str] = None
         # 呼叫外部訂房 API 取得付款 URL
         try:
-            cart_url = _call_booking_api(
+            cart_url = await _call_booking_api(
                 rooms=selected_rooms,
                 checkin=checkin,
                 checkout=checkout,
@@ -2718,6 +2766,7 @@ class ChatbotService:
         session.selected_rooms = []
         session.selected_room_type = None
         session.selected_room_count = None
+        await self.save_session(session)
 
         return BookingSaveOutSchema(
             ok=True,
@@ -2735,8 +2784,9 @@ class ChatbotService:
     # Session reset
     # ------------------------------------------------------------------
 
-    def reset(self, browser_key: str) -> SessionResetOutSchema:
-        session = self.reset_session(browser_key)
+    async def reset(self, browser_key: str) -> SessionResetOutSchema:
+        session = await self.reset_session(browser_key)
+        await self.save_session(session)
         return SessionResetOutSchema(ok=True, session_id=session.session_id)
 
     # ------------------------------------------------------------------
@@ -3159,11 +3209,11 @@ class ChatbotService:
 
         # 2. Booking session — 用 line_uid 追蹤訂房狀態（不影響對話歷史）
         session_key = line_uid or f"anon-{uuid4()}"
-        session = self.get_or_create_session(session_key)
+        session = await self.get_or_create_session(session_key)
 
         # 2.1 Turn count（同 handle_message — 5 輪後 reset）
         if session.turn_count >= self._max_turns:
-            session = self.reset_session(session_key)
+            session = await self.reset_session(session_key, session)
         session.turn_count += 1
 
         # 3. 對話歷史用記憶體 session（與 handle_message 統一，不從 DB 讀）
@@ -3274,16 +3324,16 @@ class ChatbotService:
         reply_type = self._determine_reply_type(session, room_cards)
 
         # Token deduction
-        if token_usage and ctx.total_tokens_used > 0:
-            token_usage.used_amount += ctx.total_tokens_used
-            await db.flush()
+        if token_usage:
+            await token_ledger.charge(db, token_usage, ctx.total_tokens_used)
 
         # 11. Auto-tagging（保留）
         referenced_rule_ids = list(ctx.referenced_rule_ids)
         auto_tags = await self._auto_tag_member(db, line_uid, referenced_rule_ids)
 
-        # 12. 更新 session 時間戳
-        session.ts = time.time()
+        # 12. 寫回 session（匿名 key 每次都不同，不必保存）
+        if line_uid:
+            await self.save_session(session)
 
         return ChatbotMessageOutSchema(
             session_id=session.session_id,
@@ -3326,13 +3376,8 @@ class ChatbotService:
         )
         reply = await self._unified_tool_loop(messages, ctx)
 
-        if (
-            token_usage
-            and not isinstance(token_usage, ChatbotMessageOutSchema)
-            and ctx.total_tokens_used > 0
-        ):
-            token_usage.used_amount += ctx.total_tokens_used
-            await db.flush()
+        if token_usage:
+            await token_ledger.charge(db, token_usage, ctx.total_tokens_used)
 
         return {
             "reply": reply,
@@ -3348,62 +3393,15 @@ class ChatbotService:
         check_exhausted: bool = True,
         line_channel_id: Optional[str] = None,
     ) -> Any:
-        """取得 token 額度。回傳 AiTokenUsage | None（無產業）| dict（額度用完 error）"""
-        if not industry_id:
-            ind_result = await db.execute(
-                select(Industry)
-                .where(Industry.is_active == True)
-                .limit(1)  # noqa: E712
-            )
-            industry = ind_result.scalar_one_or_none()
-            if not industry:
-                return None
-            industry_id = industry.id
-
-        # 未指定 channel_id 時用第一筆 LineChannel 作為 fallback（官網 chatbot）
-        if not line_channel_id:
-            from app.models.line_channel import LineChannel
-
-            lc_res = await db.execute(
-                select(LineChannel)
-                .where(LineChannel.is_active == True)
-                .order_by(LineChannel.id.asc())
-                .limit(1)  # noqa: E712
-            )
-            lc = lc_res.scalar_one_or_none()
-            if lc and lc.channel_id:
-                line_channel_id = lc.channel_id
-
-        usage_query = select(AiTokenUsage).where(
-            AiTokenUsage.industry_id == industry_id
+        """取得 token 額度。回傳 QuotaView | None（無產業）| ChatbotMessageOutSchema（額度用完 error）"""
+        token_usage = await token_ledger.quota(
+            db, industry_id=industry_id, line_channel_id=line_channel_id
         )
-        if line_channel_id:
-            usage_query = usage_query.where(AiTokenUsage.channel_id == line_channel_id)
-        usage_result = await db.execute(usage_query)
-        token_usage = usage_result.scalar_one_or_none()
-
-        # Lazy seed：新 LINE OA 第一次互動時自動建立 quota row（預設 10M）
-        # Phase E：讓 admin 不用先手動配置就能讓新 channel 即時運作
-        if token_usage is None and line_channel_id:
-            token_usage = AiTokenUsage(
-                industry_id=industry_id,
-                channel_id=line_channel_id,
-                total_quota=10_000_000,
-                used_amount=0,
+        if check_exhausted and token_usage and token_usage.exhausted:
+            return self._chat_error(
+                "AI Token 額度已用完，系統已降級至關鍵字回覆模式。",
+                token_exhausted=True,
             )
-            db.add(token_usage)
-            await db.flush()
-            logger.info(
-                f"[token-usage] auto-seeded default 10M quota for new channel: {line_channel_id}"
-            )
-
-        if check_exhausted and token_usage and token_usage.total_quota > 0:
-            if token_usage.used_amount >= token_usage.total_quota:
-                return self._chat_error(
-                    "AI Token 額度已用完，系統已降級至關鍵字回覆模式。",
-                    token_exhausted=True,
-                )
-
         return token_usage
 
     async def _get_conversation_history(
@@ -0,0 +1,259 @@
+"""
+AI 訂房對話 session 儲存
+ChatbotService 的 session（入住日期 / 房型需求 / 已選房型 / 對話歷史）原本只放在單一程序的 dict，
+多個 uvicorn worker 時請求落到別的 worker 就遺失。改為可替換的 store（CHATBOT_SESSION_STORE）：
+
+- memory（預設）：程序內 dict，與原本行為相同（取回的是同一個物件，寫回只更新時間戳）
+- db：chatbot_session_states 表，多 worker 共用
+  - payload：省略預設值 / 空值欄位的 JSON，再 zlib 壓縮
+  - expires_at：最後寫回 + CHATBOT_SESSION_TTL_SECONDS，過期視同新 session（沿用版本號），寫回時定期清除
+  - version：樂觀鎖。寫回時版本不符（同一使用者的另一個請求先寫回）就放棄這次寫入，保留先寫入者
+
+流程：請求開始 load → 在記憶體裡修改 → 請求結束 save。
+"""
+from __future__ import annotations
+
+import json
+import logging
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass, field, fields
+from datetime import date, datetime, timedelta
+from threading import Lock
+from typing import Any, Dict, List, Literal, Optional
+from uuid import uuid4
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.core.timezone import now_utc
+from app.models.chatbot_booking import ChatbotSessionStateRecord
+from app.schemas.chatbot import RoomCardSchema
+
+logger = logging.getLogger(__name__)
+
+_EVICT_INTERVAL = 60 * 10  # 過期 session 每 10 分鐘清一次
+_HISTORY_MAXLEN = 10
+
+
+# ---------------------------------------------------------------------------
+# Session state
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class ChatbotSessionState:
+    browser_key: str
+    session_id: str = field(default_factory=lambda: str(uuid4()))
+    hotel_id: Optional[int] = None
+    intent_state: Literal["detecting", "confirmed", "none"] = "detecting"
+    turn_count: int = 0
+    booking_rooms: int = 1  # 間數 (spec: booking_rooms)
+    booking_adults: Optional[int] = None  # 每間人數
+    checkin_date: Optional[str] = None
+    checkout_date: Optional[str] = None
+    room_plan_requests: List[Dict[str, int]] = field(default_factory=list)
+    selected_rooms: List[Dict[str, Any]] = field(default_factory=list)
+    selected_room_type: Optional[str] = None
+    selected_room_count: Optional[int] = None
+    selected_room_name: Optional[str] = None
+    selected_room_source: Optional[str] = None
+    member_name: Optional[str] = None
+    member_phone: Optional[str] = None
+    member_email: Optional[str] = None
+    crm_member_id: Optional[int] = None
+    history: deque = field(default_factory=lambda: deque(maxlen=_HISTORY_MAXLEN))
+    last_room_cards: List[RoomCardSchema] = field(default_factory=list)
+    ts: float = field(default_factory=time.time)
+    # 共用 store 的樂觀鎖版本（0 = 尚未寫入過）
+    version: int = field(default=0, repr=False, compare=False)
+
+    @property
+    def checkin_date_obj(self) -> Optional[date]:
+        if not self.checkin_date:
+            return None
+        return datetime.strptime(self.checkin_date, "%Y-%m-%d").date()
+
+    @property
+    def checkout_date_obj(self) -> Optional[date]:
+        if not self.checkout_date:
+            return None
+        return datetime.strptime(self.checkout_date, "%Y-%m-%d").date()
+
+
+# ---------------------------------------------------------------------------
+# 序列化
+# ---------------------------------------------------------------------------
+
+# browser_key 是主鍵、version / ts 由 store 欄位管理，不放進 payload
+_NOT_IN_PAYLOAD = {"browser_key", "version", "ts"}
+
+
+def dump_session(state: ChatbotSessionState) -> bytes:
+    """ChatbotSessionState → 壓縮 JSON（省略預設值與空值）"""
+    data: Dict[str, Any] = {}
+    for f in fields(state):
+        if f.name in _NOT_IN_PAYLOAD:
+            continue
+        value = getattr(state, f.name)
+        if f.name == "history":
+            value = list(value)
+        elif f.name == "last_room_cards":
+            value = [card.model_dump(exclude_none=True) for card in value]
+        if value is None or value == [] or (f.default is not None and value == f.default):
+            continue
+        data[f.name] = value
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def load_session(browser_key: str, payload: bytes, version: int) -> ChatbotSessionState:
+    """dump_session 的反向；不認得的欄位（舊版本寫入）直接略過"""
+    data = json.loads(zlib.decompress(payload).decode("utf-8"))
+    known = {f.name for f in fields(ChatbotSessionState)} - _NOT_IN_PAYLOAD
+    history = deque(data.pop("history", []), maxlen=_HISTORY_MAXLEN)
+    cards = [RoomCardSchema.model_validate(c) for c in data.pop("last_room_cards", [])]
+    return ChatbotSessionState(
+        browser_key=browser_key,
+        history=history,
+        last_room_cards=cards,
+        version=version,
+        **{k: v for k, v in data.items() if k in known},
+    )
+
+
+# ---------------------------------------------------------------------------
+# Stores
+# ---------------------------------------------------------------------------
+
+
+class InMemorySessionStore:
+    """程序內 session（單一 worker）"""
+
+    def __init__(self, ttl_seconds: int) -> None:
+        self._ttl = ttl_seconds
+        self._sessions: Dict[str, ChatbotSessionState] = {}
+        self._lock = Lock()
+        self._last_evict = time.time()
+
+    def _evict_stale_sessions(self, now: float) -> None:
+        """Evict sessions idle longer than TTL. Call inside self._lock."""
+        if now - self._last_evict < _EVICT_INTERVAL:
+            return
+        cutoff = now - self._ttl
+        for key in [k for k, v in self._sessions.items() if v.ts < cutoff]:
+            del self._sessions[key]
+        self._last_evict = now
+
+    async def load(self, browser_key: str) -> Optional[ChatbotSessionState]:
+        now = time.time()
+        with self._lock:
+            self._evict_stale_sessions(now)
+            session = self._sessions.get(browser_key)
+            if session is not None and session.ts < now - self._ttl:
+                del self._sessions[browser_key]
+                return None
+            return session
+
+    async def save(self, state: ChatbotSessionState) -> bool:
+        with self._lock:
+            state.ts = time.time()
+            state.version += 1
+            self._sessions[state.browser_key] = state
+            return True
+
+    async def delete(self, browser_key: str) -> None:
+        with self._lock:
+            self._sessions.pop(browser_key, None)
+
+
+class DbSessionStore:
+    """chatbot_session_states 表（多 worker 共用）"""
+
+    def __init__(self, ttl_seconds: int, session_factory=None) -> None:
+        self._ttl = ttl_seconds
+        self._session_factory = session_factory
+        self._last_evict = 0.0
+
+    def _sessions(self):
+        if self._session_factory is None:
+            from app.database import AsyncSessionLocal
+
+            self._session_factory = AsyncSessionLocal
+        return self._session_factory
+
+    async def load(self, browser_key: str) -> Optional[ChatbotSessionState]:
+        rec = ChatbotSessionStateRecord
+        async with self._sessions()() as db:
+            row = (await db.execute(
+                select(rec.version, rec.payload, rec.expires_at)
+                .where(rec.browser_key == browser_key)
+            )).first()
+        if row is None:
+            return None
+        if row.expires_at <= now_utc():
+            # 過期：內容作廢，但沿用版本號，仍持有舊版本的請求寫回時會被擋下
+            return ChatbotSessionState(browser_key=browser_key, version=row.version)
+        try:
+            return load_session(browser_key, row.payload, row.version)
+        except Exception as e:
+            # 壞掉的 payload 當作沒有 session；沿用版本號，下一次寫回可以覆蓋
+            logger.warning(f"[chatbot-session] failed to decode session {browser_key}: {e}")
+            return ChatbotSessionState(browser_key=browser_key, version=row.version)
+
+    async def save(self, state: ChatbotSessionState) -> bool:
+        """寫回；版本不符（被其他請求搶先寫回）回傳 False"""
+        rec = ChatbotSessionStateRecord
+        now = now_utc()
+        values = {
+            "version": state.version + 1,
+            "payload": dump_session(state),
+            "expires_at": now + timedelta(seconds=self._ttl),
+            "updated_at": now,
+        }
+        async with self._sessions()() as db:
+            result = await db.execute(
+                update(rec)
+                .where(rec.browser_key == state.browser_key, rec.version == state.version)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            saved = result.rowcount == 1
+            if not saved and state.version == 0:
+                try:
+                    await db.execute(insert(rec).values(browser_key=state.browser_key, **values))
+                    saved = True
+                except IntegrityError:
+                    await db.rollback()  # 另一個請求同時建立了同一個 session
+            if saved:
+                await self._evict_expired(db, now)
+                await db.commit()
+        if saved:
+            state.version += 1
+            state.ts = time.time()
+        return saved
+
+    async def _evict_expired(self, db, now: datetime) -> None:
+        if time.time() - self._last_evict < _EVICT_INTERVAL:
+            return
+        self._last_evict = time.time()
+        rec = ChatbotSessionStateRecord
+        await db.execute(delete(rec).where(rec.expires_at <= now))
+
+    async def delete(self, browser_key: str) -> None:
+        rec = ChatbotSessionStateRecord
+        async with self._sessions()() as db:
+            await db.execute(delete(rec).where(rec.browser_key == browser_key))
+            await db.commit()
+
+
+def build_session_store():
+    """依 CHATBOT_SESSION_STORE 建立 session store"""
+    kind = (settings.CHATBOT_SESSION_STORE or "memory").strip().lower()
+    ttl = settings.CHATBOT_SESSION_TTL_SECONDS
+    if kind == "memory":
+        return InMemorySessionStore(ttl)
+    if kind == "db":
+        return DbSessionStore(ttl)
+    raise ValueError(f"未知的 CHATBOT_SESSION_STORE: {settings.CHATBOT_SESSION_STORE}")
@@ -1,9 +1,12 @@
+import base64
+import binascii
 import json
 import logging
 import uuid
-from typing import Optional, Dict, Any
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
 
-from sqlalchemy import select, func
+from sqlalchemy import and_, or_, select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
@@ -12,10 +15,27 @@ from app.models.conversation import ConversationThread, ConversationMessage
 from app.models.message import Message
 from app.models.user import User
 from app.core.timezone import to_utc_iso, now_utc
+from app.services.thread_summary import record_messages
 
 logger = logging.getLogger(__name__)
 
 
+def encode_message_cursor(created_at: datetime, message_id: str) -> str:
+    """(created_at, id) → URL-safe 游標字串"""
+    raw = json.dumps([created_at.isoformat(), message_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_message_cursor(cursor: str) -> Tuple[datetime, str]:
+    """游標字串 → (created_at, id)；格式錯誤丟 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), str(message_id)
+    except (binascii.Error, TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("無效的 cursor") from e
+
+
 class ChatroomService:
     """
     多渠道聊天室服務
@@ -79,6 +99,7 @@ class ChatroomService:
         self.db.add(msg)
         thread.last_message_at = msg.created_at
         await self.db.flush()
+        await record_messages(self.db, [msg])
         return msg
 
     async def get_messages(
@@ -88,6 +109,7 @@ class ChatroomService:
         page: int,
         page_size: int,
     ) -> Dict[str, Any]:
+        """頁碼分頁（COUNT + OFFSET，越往前翻越慢）；新的呼叫端請改用 get_messages_before"""
         platform_uid = self._get_platform_uid(member, platform)
         # thread_id 直接用 platform_uid，透過 platform 欄位區分渠道
         thread_id = platform_uid
@@ -103,19 +125,78 @@ class ChatroomService:
         has_more = (offset + page_size) < total
 
         msg_stmt = (
+            self._thread_messages_stmt(thread_id, platform)
+            .limit(page_size)
+            .offset(offset)
+        )
+        result = await self.db.execute(msg_stmt)
+        records = list(reversed(result.scalars().all()))
+
+        return {
+            "messages": await self._serialize_messages(records),
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "has_more": has_more,
+        }
+
+    async def get_messages_before(
+        self,
+        member: Member,
+        platform: str,
+        limit: int,
+        before: Optional[Tuple[datetime, str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        游標分頁：取 (created_at, id) 早於 before 的 limit 筆（before=None → 最新一頁）
+
+        走 (thread_id, platform, created_at, id) 複合索引直接定位，不做 COUNT，
+        翻到多深每頁成本都一樣。回傳的 next_cursor 帶回 before 即可載入更早的訊息。
+        """
+        thread_id = self._get_platform_uid(member, platform)
+
+        stmt = self._thread_messages_stmt(thread_id, platform)
+        if before is not None:
+            before_at, before_id = before
+            stmt = stmt.where(
+                or_(
+                    ConversationMessage.created_at < before_at,
+                    and_(
+                        ConversationMessage.created_at == before_at,
+                        ConversationMessage.id < before_id,
+                    ),
+                )
+            )
+        # 多取一筆判斷是否還有更早的訊息
+        result = await self.db.execute(stmt.limit(limit + 1))
+        rows = result.scalars().all()
+        has_more = len(rows) > limit
+        records = list(reversed(rows[:limit]))
+
+        next_cursor = None
+        if has_more and records:
+            oldest = records[0]
+            next_cursor = encode_message_cursor(oldest.created_at, oldest.id)
+
+        return {
+            "messages": await self._serialize_messages(records),
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+        }
+
+    @staticmethod
+    def _thread_messages_stmt(thread_id: str, platform: str):
+        return (
             select(ConversationMessage)
             .options(selectinload(ConversationMessage.sender))
             .where(
                 ConversationMessage.thread_id == thread_id,
                 ConversationMessage.platform == platform,
             )
-            .order_by(ConversationMessage.created_at.desc())
-            .limit(page_size)
-            .offset(offset)
+            .order_by(ConversationMessage.created_at.desc(), ConversationMessage.id.desc())
         )
-        result = await self.db.execute(msg_stmt)
-        records = list(reversed(result.scalars().all()))
 
+    async def _serialize_messages(self, records: List[ConversationMessage]) -> List[Dict[str, Any]]:
         # 群發訊息（message_type=flex）只存參照，這裡一次撈回本頁所有
         # broadcast_message_id 對應的 messages.flex_message_json，避免 N+1
         broadcast_ids = {
@@ -178,13 +259,7 @@ class ChatroomService:
 
             messages.append(msg_dict)
 
-        return {
-            "messages": messages,
-            "total": total,
-            "page": page,
-            "page_size": page_size,
-            "has_more": has_more,
-        }
+        return messages
 
     async def open_session(self, member: Member) -> Dict[str, Any]:
         platforms = []
@@ -16,6 +16,7 @@ from app.models.chatbot_booking import FaqPmsConnection
 from app.models.faq import (AiTokenUsage, AiToneConfig, FaqCategory,
                             FaqCategoryField, FaqModuleAuth, FaqRule,
                             FaqRuleTag, Industry)
+from app.services.token_ledger import token_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -355,6 +356,7 @@ class FaqService:
         else:
             usage.total_quota = total_quota
         await db.flush()
+        token_ledger.invalidate()
         return usage
 
     # === 語氣設定 ===
@@ -694,8 +696,6 @@ class FaqService:
 
         Spec: faq_pms_realtime_connection.feature — 首次快照機制
         """
-        import asyncio
-
         from app.services.pms_chatbot_client import pms_enabled, query_pms
 
         if not pms_enabled():
@@ -710,9 +710,7 @@ class FaqService:
             tomorrow = (datetime.now(OPERATING_TZ) + timedelta(days=1)).strftime("%Y-%m-%d")
             day_after = (datetime.now(OPERATING_TZ) + timedelta(days=2)).strftime("%Y-%m-%d")
             # 用該 connection 的 hotelcode 打 PMS（per channel）；空時 fallback env
-            raw = await asyncio.to_thread(
-                query_pms, tomorrow, day_after, None, 2, conn.hotelcode
-            )
+            raw = await query_pms(tomorrow, day_after, None, 2, conn.hotelcode)
 
             rooms = raw.get("room", []) if isinstance(raw, dict) else []
             if not rooms:
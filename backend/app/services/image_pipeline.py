@@ -0,0 +1,183 @@
+"""
+上傳圖片處理管線
+
+- 解碼 / 轉 RGB / LANCZOS 縮放 / 編碼都在 process pool 執行，不阻塞 event loop（SSE / 聊天連線）
+- 以原始檔內容 hash（image_handler.get_file_hash）命名：同一張圖重複上傳直接沿用既有檔案，不再處理
+- 一次產出主圖（寬度 ≤ IMAGE_MAX_WIDTH）與 IMAGE_VARIANT_WIDTHS 各寬度的縮圖，每個尺寸都有 JPEG + WebP
+  - 主圖：{hash}.jpg / {hash}.webp
+  - 縮圖：{hash}_w{寬度}.jpg / {hash}_w{寬度}.webp（只產生比主圖窄的寬度）
+- 寫檔先寫暫存檔再 os.replace，同一張圖同時上傳也不會讀到寫一半的檔案
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+from app.config import settings
+from app.utils.image_handler import get_file_hash
+
+logger = logging.getLogger(__name__)
+
+JPEG_QUALITY = 95
+VARIANT_JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def variant_widths() -> Tuple[int, ...]:
+    return tuple(sorted({
+        int(w) for w in settings.IMAGE_VARIANT_WIDTHS.split(",") if w.strip().isdigit() and int(w) > 0
+    }))
+
+
+def _names(digest: str, width: Optional[int]) -> Tuple[str, str]:
+    stem = digest if width is None else f"{digest}_w{width}"
+    return f"{stem}.jpg", f"{stem}.webp"
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _encode(img: Image.Image, fmt: str, quality: int) -> bytes:
+    out = BytesIO()
+    if fmt == "JPEG":
+        img.save(out, format="JPEG", quality=quality, optimize=True)
+    else:
+        img.save(out, format="WEBP", quality=quality, method=4)
+    return out.getvalue()
+
+
+def render_variants(
+    contents: bytes,
+    digest: str,
+    upload_dir: str,
+    max_width: int,
+    widths: Sequence[int],
+) -> Dict[str, Any]:
+    """
+    在 worker process 內執行：解碼一次，依序縮出各尺寸並寫出 JPEG + WebP。
+    回傳 manifest（檔名 / 寬高 / 主圖大小），不回傳圖片內容以減少跨 process 傳輸。
+    """
+    img = Image.open(BytesIO(contents))
+    # 確保為 RGB 模式 (處理 RGBA、灰階等)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    # 等比縮放至寬度上限
+    if img.width > max_width:
+        img = img.resize((max_width, int(img.height * max_width / img.width)), Image.LANCZOS)
+
+    out_dir = Path(upload_dir)
+    main_jpg, main_webp = _names(digest, None)
+    main_bytes = _encode(img, "JPEG", JPEG_QUALITY)
+    _write_atomic(out_dir / main_jpg, main_bytes)
+    _write_atomic(out_dir / main_webp, _encode(img, "WEBP", WEBP_QUALITY))
+
+    variants = []
+    # 由大到小縮：每次從上一個尺寸縮，比每次都從主圖縮省時
+    source = img
+    for width in sorted((w for w in widths if w < img.width), reverse=True):
+        source = source.resize((width, max(1, int(source.height * width / source.width))), Image.LANCZOS)
+        jpg, webp = _names(digest, width)
+        _write_atomic(out_dir / jpg, _encode(source, "JPEG", VARIANT_JPEG_QUALITY))
+        _write_atomic(out_dir / webp, _encode(source, "WEBP", WEBP_QUALITY))
+        variants.append({"width": width, "height": source.height, "jpg": jpg, "webp": webp})
+
+    return {
+        "width": img.width,
+        "height": img.height,
+        "jpg": main_jpg,
+        "webp": main_webp,
+        "size": len(main_bytes),
+        "variants": sorted(variants, key=lambda v: v["width"]),
+    }
+
+
+def _existing_manifest(digest: str, upload_dir: Path, widths: Sequence[int]) -> Optional[Dict[str, Any]]:
+    """同一張圖已處理過 → 直接由檔案組 manifest；主圖或 WebP 缺檔則視為未處理"""
+    main_jpg, main_webp = _names(digest, None)
+    main_path = upload_dir / main_jpg
+    if not main_path.exists() or not (upload_dir / main_webp).exists():
+        return None
+    variants = []
+    for width in widths:
+        jpg, webp = _names(digest, width)
+        if (upload_dir / jpg).exists() and (upload_dir / webp).exists():
+            variants.append({"width": width, "jpg": jpg, "webp": webp})
+    return {
+        "jpg": main_jpg,
+        "webp": main_webp,
+        "size": main_path.stat().st_size,
+        "variants": variants,
+    }
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=max(1, settings.IMAGE_PROCESS_WORKERS))
+    return _pool
+
+
+async def process_upload(contents: bytes) -> Dict[str, Any]:
+    """
+    處理一張上傳圖片，回傳 manifest：
+        {"hash", "jpg", "webp", "size", "variants": [{"width", "jpg", "webp"}], "deduplicated"}
+    圖片無法解碼時丟出 PIL 的例外（由呼叫端轉成 400）
+    """
+    digest = get_file_hash(contents)
+    upload_dir = settings.upload_dir_path
+    widths = variant_widths()
+
+    existing = _existing_manifest(digest, upload_dir, widths)
+    if existing is not None:
+        return {"hash": digest, **existing, "deduplicated": True}
+
+    upload_dir.mkdir(parents=True, exist_ok=True)
+    loop = asyncio.get_running_loop()
+    manifest = await loop.run_in_executor(
+        _get_pool(),
+        render_variants,
+        contents,
+        digest,
+        str(upload_dir),
+        settings.IMAGE_MAX_WIDTH,
+        widths,
+    )
+    return {"hash": digest, **manifest, "deduplicated": False}
+
+
+def shutdown_image_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def public_urls(manifest: Dict[str, Any]) -> Dict[str, Any]:
+    """manifest → 回傳給前端的 URL（主圖 + 各寬度）"""
+    variants: List[Dict[str, Any]] = [
+        {
+            "width": v["width"],
+            "url": settings.get_public_url(v["jpg"]),
+            "webp_url": settings.get_public_url(v["webp"]),
+        }
+        for v in manifest["variants"]
+    ]
+    return {
+        "url": settings.get_public_url(manifest["jpg"]),
+        "webp_url": settings.get_public_url(manifest["webp"]),
+        "variants": variants,
+    }
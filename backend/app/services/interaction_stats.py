@@ -0,0 +1,178 @@
+"""
+互動統計增量計數
+=============================
+取代每次點擊都對 component_interaction_logs 全歷史跑 COUNT(*) / COUNT(DISTINCT line_id)：
+
+- 總次數：每次點擊 +1
+- 唯一人數：只在該 line_id 第一次點這個卡片 / 標籤時 +1
+  （以 (carousel_item_id, line_id) / (interaction_tag_id, line_id) 複合索引查是否已有紀錄）
+- 增量先累積在程序內，每 TRACKING_STATS_FLUSH_SECONDS 秒合併成「每個 item 一條」
+  UPDATE ... SET col = col + :n 寫回；原子遞增，多 worker 同時寫也不會互蓋
+- TRACKING_STATS_FLUSH_SECONDS=0 → 不緩衝，在點擊的同一個交易內寫入
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.timezone import now_utc
+from app.models.tag import InteractionTag
+from app.models.template import TemplateCarouselItem
+from app.models.tracking import ComponentInteractionLog
+
+logger = logging.getLogger(__name__)
+
+CAROUSEL_ITEM = "carousel_item"
+INTERACTION_TAG = "interaction_tag"
+
+# kind → (統計表, 總次數欄, 唯一人數欄, 最後時間欄, log 上的外鍵欄)
+_TARGETS = {
+    CAROUSEL_ITEM: (
+        TemplateCarouselItem,
+        "click_count",
+        "unique_click_count",
+        "last_clicked_at",
+        ComponentInteractionLog.carousel_item_id,
+    ),
+    INTERACTION_TAG: (
+        InteractionTag,
+        "trigger_count",
+        "trigger_member_count",
+        "last_triggered_at",
+        ComponentInteractionLog.interaction_tag_id,
+    ),
+}
+
+
+@dataclass
+class StatDelta:
+    kind: str
+    target_id: int
+    clicks: int
+    uniques: int
+    last_at: datetime
+
+
+async def build_delta(
+    db: AsyncSession,
+    kind: str,
+    target_id: int,
+    line_uid: str,
+    log_id: int,
+) -> StatDelta:
+    """剛寫入的 log 對統計的增量；log 須已 flush（以 id 排除自己）"""
+    fk_col = _TARGETS[kind][4]
+    seen_before = (
+        await db.execute(
+            select(ComponentInteractionLog.id)
+            .where(
+                fk_col == target_id,
+                ComponentInteractionLog.line_id == line_uid,
+                ComponentInteractionLog.id != log_id,
+            )
+            .limit(1)
+        )
+    ).first()
+    return StatDelta(kind, target_id, 1, 0 if seen_before else 1, now_utc())
+
+
+async def _apply(db: AsyncSession, deltas: Iterable[StatDelta]) -> None:
+    for d in deltas:
+        model, total_col, unique_col, last_col, _ = _TARGETS[d.kind]
+        total = getattr(model, total_col)
+        unique = getattr(model, unique_col)
+        last = getattr(model, last_col)
+        await db.execute(
+            update(model)
+            .where(model.id == d.target_id)
+            .values({
+                total_col: func.coalesce(total, 0) + d.clicks,
+                unique_col: func.coalesce(unique, 0) + d.uniques,
+                last_col: func.greatest(func.coalesce(last, d.last_at), d.last_at),
+            })
+            .execution_options(synchronize_session=False)
+        )
+
+
+class InteractionStatsBuffer:
+    """程序內累積統計增量，定期合併寫回"""
+
+    def __init__(self) -> None:
+        self._pending: Dict[Tuple[str, int], StatDelta] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flushed_rows = 0
+
+    @property
+    def buffered(self) -> bool:
+        return settings.TRACKING_STATS_FLUSH_SECONDS > 0
+
+    async def stage(self, db: AsyncSession, deltas: List[StatDelta]) -> None:
+        """commit 前呼叫：不緩衝時直接在同一交易內寫入"""
+        if deltas and not self.buffered:
+            await _apply(db, deltas)
+
+    def committed(self, deltas: List[StatDelta]) -> None:
+        """commit 成功後呼叫：緩衝模式下才累積，等下次 flush"""
+        if self.buffered:
+            self._merge(deltas)
+
+    def _merge(self, deltas: Iterable[StatDelta]) -> None:
+        for d in deltas:
+            key = (d.kind, d.target_id)
+            cur = self._pending.get(key)
+            if cur is None:
+                self._pending[key] = StatDelta(d.kind, d.target_id, d.clicks, d.uniques, d.last_at)
+            else:
+                cur.clicks += d.clicks
+                cur.uniques += d.uniques
+                cur.last_at = max(cur.last_at, d.last_at)
+
+    async def flush(self) -> int:
+        """把累積的增量寫回 DB，回傳寫入的 item 數；失敗時增量放回下次再試"""
+        if not self._pending:
+            return 0
+        from app.database import AsyncSessionLocal
+
+        batch, self._pending = self._pending, {}
+        try:
+            async with AsyncSessionLocal() as db:
+                # 依 key 排序寫入，多 worker 同時 flush 時鎖定順序一致，避免 deadlock
+                await _apply(db, [batch[k] for k in sorted(batch)])
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to flush interaction stats (%d items)", len(batch))
+            self._merge(batch.values())
+            return 0
+        self.flushes += 1
+        self.flushed_rows += len(batch)
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.TRACKING_STATS_FLUSH_SECONDS)
+            await self.flush()
+
+    def start(self) -> None:
+        if self.buffered and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+interaction_stats = InteractionStatsBuffer()
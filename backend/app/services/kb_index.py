@@ -0,0 +1,296 @@
+"""
+FAQ 知識庫記憶體索引（chatbot kb_search 工具用）
+
+- 以 (line_channel_id, category, test_mode) 為 key，第一次查詢時從 DB 建索引
+- 斷詞：英數字以詞為單位；中日韓文字取相鄰二字（bigram），不需斷詞字典；
+  不收單字，否則只共用一個字（「入住」vs「住客」）也算命中
+- 排序：BM25，整句完全出現在欄位文字中再加分（沿用舊版「整句命中」加權）
+- 門檻：問句先去掉「請問 / 可以 / 嗎」這類客套詞，文件至少要命中一半的詞，或整句 / 整個空白分隔詞
+  出現在欄位文字中才算命中；只共用常見詞的 FAQ 不回傳，AI 才會走 mark_unanswerable
+- FAQ 規則 / 標籤 / 分類異動在 commit 後自動讓相關 key 失效（SQLAlchemy session event），
+  kb_sync.sync_kb 也會標記在 commit 後整批失效（下次查詢時整份重建）；多 worker 時另有 KB_INDEX_TTL_SECONDS 保底
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+from app.config import settings
+from app.models.faq import FaqCategory, FaqRule, FaqRuleTag
+
+logger = logging.getLogger(__name__)
+
+# BM25 參數
+_K1 = 1.2
+_B = 0.75
+# 整句命中加分
+_PHRASE_BONUS = 3.0
+
+# 英數字詞 / 中日韓連續字元
+_TOKEN_RE = re.compile(
+    r"[a-z0-9]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]+"
+)
+_ASCII_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# 問句常見、但與 FAQ 內容無關的詞；查詢前先移除（長的在前，避免「可不可以」只去掉「可以」）
+_QUERY_STOPWORDS = sorted(
+    {
+        "請問", "请问", "可不可以", "可以", "能不能", "是否", "有沒有", "有没有",
+        "我想", "我要", "想要", "一下", "怎麼", "怎么", "如何", "什麼", "什么",
+        "你好", "您好", "謝謝", "谢谢", "嗎", "吗", "呢", "吧",
+    },
+    key=len,
+    reverse=True,
+)
+_QUERY_STOPWORDS_RE = re.compile("|".join(map(re.escape, _QUERY_STOPWORDS)))
+# 命中詞數至少要佔查詢詞數的比例
+_MIN_TOKEN_COVERAGE = 0.5
+
+# 失效全部 key 的標記
+_ALL = "*"
+
+_IndexKey = Tuple[Optional[str], str, bool]
+
+
+def tokenize(text: str) -> List[str]:
+    """英數字整詞；中日韓文字拆成 bigram（「游泳池」→ 游泳, 泳池），只有一個字的片段保留單字"""
+    tokens: List[str] = []
+    for run in _TOKEN_RE.findall((text or "").lower()):
+        if _ASCII_WORD_RE.fullmatch(run):
+            tokens.append(run)
+            continue
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+@dataclass
+class _KbIndex:
+    rows: List[dict]
+    blobs: List[str]
+    postings: Dict[str, List[Tuple[int, int]]] = field(default_factory=dict)
+    doc_len: List[int] = field(default_factory=list)
+    avgdl: float = 0.0
+    built_at: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def build(cls, rows: List[dict], fields: List[str]) -> "_KbIndex":
+        blobs = [" ".join(str(row.get(f, "")) for f in fields).lower() for row in rows]
+        idx = cls(rows=rows, blobs=blobs)
+        for doc_id, blob in enumerate(blobs):
+            counts = Counter(tokenize(blob))
+            idx.doc_len.append(sum(counts.values()))
+            for tok, tf in counts.items():
+                idx.postings.setdefault(tok, []).append((doc_id, tf))
+        idx.avgdl = (sum(idx.doc_len) / len(idx.doc_len)) if idx.doc_len else 0.0
+        return idx
+
+    def search(self, query: str, top_k: int) -> List[dict]:
+        q = (query or "").strip().lower()
+        if not q:
+            return [dict(r) for r in self.rows[:top_k]]
+
+        n = len(self.rows)
+        scores: Dict[int, float] = {}
+        matched: Counter = Counter()
+        query_tokens = set(tokenize(_QUERY_STOPWORDS_RE.sub(" ", q)))
+        for tok in query_tokens:
+            plist = self.postings.get(tok)
+            if not plist:
+                continue
+            idf = math.log(1 + (n - len(plist) + 0.5) / (len(plist) + 0.5))
+            for doc_id, tf in plist:
+                norm = 1 - _B + _B * (self.doc_len[doc_id] / self.avgdl if self.avgdl else 1)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (_K1 + 1) / (tf + _K1 * norm)
+                matched[doc_id] += 1
+        relevant = {
+            doc_id for doc_id, hits in matched.items()
+            if hits >= _MIN_TOKEN_COVERAGE * len(query_tokens)
+        }
+
+        # 空白分隔的整詞 / 整句子字串命中（舊版行為；也涵蓋符號等未被斷詞的字元）
+        words = [w for w in re.split(r"\s+", q) if w and not _QUERY_STOPWORDS_RE.fullmatch(w)]
+        for doc_id, blob in enumerate(self.blobs):
+            bonus = 0.0
+            if q in blob:
+                bonus += _PHRASE_BONUS
+            if len(words) > 1:
+                bonus += sum(0.5 for w in words if w in blob)
+            if bonus:
+                scores[doc_id] = scores.get(doc_id, 0.0) + bonus
+                relevant.add(doc_id)
+
+        # 沒命中就回空陣列（AI 看到空 items 會依系統提示詞回「沒有相關資料」，並呼叫 mark_unanswerable）
+        ranked = sorted(relevant, key=lambda d: (-scores[d], d))
+        return [dict(self.rows[d]) for d in ranked[:top_k]]
+
+
+class KbIndexRegistry:
+    """(channel, category, test_mode) → _KbIndex；以 generation 避免失效期間的舊資料寫回"""
+
+    def __init__(self) -> None:
+        self._indexes: Dict[_IndexKey, _KbIndex] = {}
+        self._generation = 0
+        self.builds = 0
+        self.hits = 0
+
+    def _fresh(self, idx: _KbIndex) -> bool:
+        ttl = settings.KB_INDEX_TTL_SECONDS
+        return ttl <= 0 or time.monotonic() - idx.built_at < ttl
+
+    async def get(
+        self,
+        db: AsyncSession,
+        category: str,
+        cat_name: str,
+        fields: List[str],
+        test_mode: bool,
+        line_channel_id: Optional[str],
+    ) -> _KbIndex:
+        key: _IndexKey = (line_channel_id, category, test_mode)
+        idx = self._indexes.get(key)
+        if idx is not None and self._fresh(idx):
+            self.hits += 1
+            return idx
+
+        generation = self._generation
+        rows = await _load_rows(db, cat_name, test_mode, line_channel_id)
+        idx = _KbIndex.build(rows, fields)
+        self.builds += 1
+        # 建置期間有人失效過 → 這份可能是舊資料，只用這一次不快取
+        if generation == self._generation:
+            self._indexes[key] = idx
+        return idx
+
+    def invalidate(self, channels: Optional[Set[Optional[str]]] = None) -> None:
+        """channels=None 或含 _ALL → 全部失效；否則只清該 channel 與「不分 channel」的索引"""
+        self._generation += 1
+        if not channels or _ALL in channels:
+            self._indexes.clear()
+            return
+        for key in [k for k in self._indexes if k[0] is None or k[0] in channels]:
+            self._indexes.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "indexes": len(self._indexes),
+            "documents": sum(len(i.rows) for i in self._indexes.values()),
+            "builds": self.builds,
+            "hits": self.hits,
+        }
+
+
+async def _load_rows(
+    db: AsyncSession,
+    cat_name: str,
+    test_mode: bool,
+    line_channel_id: Optional[str],
+) -> List[dict]:
+    # 查詢啟用中的分類
+    cat_result = await db.execute(
+        select(FaqCategory).where(
+            FaqCategory.name == cat_name, FaqCategory.is_active == True
+        )  # noqa: E712
+    )
+    cat = cat_result.scalar_one_or_none()
+    if not cat:
+        return []
+
+    # 測試模式：讀 draft + active；正式模式：只讀 active
+    allowed_statuses = ["draft", "active"] if test_mode else ["active"]
+
+    rule_query = select(FaqRule).where(
+        FaqRule.category_id == cat.id,
+        FaqRule.status.in_(allowed_statuses),
+        FaqRule.is_enabled_filter(),
+    )
+    # 多 OA 隔離：訊息來自特定 LINE OA 時，只用該 OA 的規則
+    if line_channel_id:
+        rule_query = rule_query.where(FaqRule.channel_id == line_channel_id)
+
+    rule_result = await db.execute(
+        rule_query.options(selectinload(FaqRule.tags)).order_by(FaqRule.created_at)
+    )
+    rows = []
+    for rule in rule_result.scalars().all():
+        c = rule.content_json
+        if isinstance(c, str):
+            try:
+                c = json.loads(c)
+            except Exception:
+                c = {}
+        row = dict(c or {})
+        row["tags"] = [t.tag_name for t in (rule.tags or [])]
+        row["_rule_id"] = rule.id
+        rows.append(row)
+    return rows
+
+
+kb_index_registry = KbIndexRegistry()
+
+
+def invalidate_kb_index(line_channel_id: Optional[str] = None) -> None:
+    """line_channel_id=None → 全部失效"""
+    kb_index_registry.invalidate({line_channel_id} if line_channel_id else None)
+
+
+# ---------------------------------------------------------------------------
+# FAQ 異動 → commit 後失效
+# ---------------------------------------------------------------------------
+
+_SESSION_KEY = "kb_index_dirty"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_faq_changes(session: Session, flush_context) -> None:
+    dirty: Set[Optional[str]] = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, FaqRule):
+            dirty.add(obj.channel_id)
+            # 規則改到別的 channel：原 channel 的索引也要清掉
+            dirty.update(inspect(obj).attrs.channel_id.history.deleted)
+        elif isinstance(obj, FaqRuleTag):
+            dirty.add(_ALL)
+        elif isinstance(obj, FaqCategory):
+            # _touch_category 每次都會改 updated_at，只有名稱 / 啟用狀態才影響檢索
+            state = inspect(obj)
+            if (
+                obj in session.new
+                or obj in session.deleted
+                or state.attrs.is_active.history.has_changes()
+                or state.attrs.name.history.has_changes()
+            ):
+                dirty.add(_ALL)
+    if dirty:
+        session.info.setdefault(_SESSION_KEY, set()).update(dirty)
+
+
+def invalidate_kb_index_on_commit(db: AsyncSession) -> None:
+    """db 下一次 commit 後全部失效；rollback 則不動（commit 前失效的話，期間的查詢會把舊資料重新快取）"""
+    db.sync_session.info.setdefault(_SESSION_KEY, set()).add(_ALL)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_faq_changes(session: Session) -> None:
+    dirty = session.info.pop(_SESSION_KEY, None)
+    if dirty:
+        kb_index_registry.invalidate(dirty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_faq_changes(session: Session) -> None:
+    session.info.pop(_SESSION_KEY, None)
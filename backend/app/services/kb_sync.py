@@ -12,6 +12,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.models.faq import FaqCategory, FaqRule
+from app.services.kb_index import invalidate_kb_index_on_commit
 
 logger = logging.getLogger(__name__)
 
@@ -100,5 +101,8 @@ async def sync_kb(db: AsyncSession) -> None:
                 )
                 logger.info(f"KB sync: booking_billing → {len(rooms)} rules")
 
+        # kb_search 的記憶體索引在呼叫端 commit 後清掉，下次查詢時整份重建
+        invalidate_kb_index_on_commit(db)
+
     except Exception as e:
         logger.error(f"KB sync failed: {e}")
@@ -0,0 +1,83 @@
+"""
+會員搜尋
+
+- MySQL：members 的 FULLTEXT 索引 ft_members_search（WITH PARSER ngram，涵蓋 name / email / phone / line_display_name），
+  中文姓名、手機號碼片段、email 片段都走索引；InnoDB 會隨 INSERT / UPDATE 自動更新索引，不需另外同步
+  （索引建立時關閉 stopword，否則 ngram 會丟掉含 a / i 的 token，英文姓名 / email 搜不到）
+- 關鍵字以空白 / 布林運算子切詞，每個詞都必須命中（AND）；分數 = 前綴命中加權 + MATCH 相關度
+- 比 ngram token（MEMBER_SEARCH_NGRAM_SIZE，需與 MySQL ngram_token_size 一致）短的詞無法用 ngram 索引比對，該詞退回 LIKE
+- 非 MySQL（單元測試的 SQLite）整體退回 LIKE，分數只看前綴命中
+"""
+from __future__ import annotations
+
+import re
+from typing import List, Tuple
+
+from sqlalchemy import and_, case, literal, or_
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.sql.elements import ColumnElement
+
+from app.config import settings
+from app.models.member import Member
+from app.utils.validators import InputValidator
+
+SEARCH_COLUMNS = (Member.name, Member.email, Member.phone, Member.line_display_name)
+
+# 前綴命中（姓名 / 手機開頭就是關鍵字）排在單純包含之前
+PREFIX_BOOST = 100
+
+# InnoDB 布林模式的運算子；一律當分隔字元，避免使用者輸入改變查詢語意
+_SPLIT_RE = re.compile(r'[\s+\-()<>~*"]+')
+
+
+def search_terms(search: str) -> List[str]:
+    """關鍵字切詞（去重、保留順序）"""
+    seen, terms = set(), []
+    for term in _SPLIT_RE.split(search or ""):
+        if term and term.lower() not in seen:
+            seen.add(term.lower())
+            terms.append(term)
+    return terms
+
+
+def boolean_query(terms: List[str]) -> str:
+    """['王小明', '0912'] → '+"王小明" +"0912"'（ngram 片語比對：每個詞都需連續出現）"""
+    return " ".join(f'+"{t}"' for t in terms)
+
+
+def _contains(term: str) -> ColumnElement:
+    pattern = f"%{InputValidator.escape_like_pattern(term)}%"
+    return or_(*[col.like(pattern, escape="\\") for col in SEARCH_COLUMNS])
+
+
+def _prefix(term: str) -> ColumnElement:
+    pattern = f"{InputValidator.escape_like_pattern(term)}%"
+    return or_(*[col.like(pattern, escape="\\") for col in SEARCH_COLUMNS])
+
+
+def member_search_filter(search: str, dialect: str) -> Tuple[ColumnElement, ColumnElement]:
+    """
+    回傳 (WHERE 條件, 排序分數)。
+
+    Args:
+        search: 已經過 InputValidator.sanitize_search_input() 的關鍵字
+        dialect: session 的 dialect 名稱（mysql 以外退回 LIKE）
+    """
+    terms = search_terms(search)
+    if not terms:
+        return literal(True), literal(0)
+
+    prefix_score = case((_prefix(terms[0]), PREFIX_BOOST), else_=0)
+
+    if dialect != "mysql":
+        return and_(*[_contains(t) for t in terms]), prefix_score
+
+    indexed = [t for t in terms if len(t) >= settings.MEMBER_SEARCH_NGRAM_SIZE]
+    short = [t for t in terms if len(t) < settings.MEMBER_SEARCH_NGRAM_SIZE]
+    conditions = [_contains(t) for t in short]
+    score: ColumnElement = prefix_score
+    if indexed:
+        relevance = match(*SEARCH_COLUMNS, against=boolean_query(indexed)).in_boolean_mode()
+        conditions.insert(0, relevance)
+        score = prefix_score + relevance
+    return and_(*conditions), score
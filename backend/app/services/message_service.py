@@ -19,6 +19,7 @@ from app.models.line_channel import LineChannel
 from app.models.fb_channel import FbChannel
 from app.adapters.line_app_adapter import LineAppAdapter
 from app.clients.line_app_client import LineAppClient
+from app.services.broadcast_job_tracker import broadcast_job_tracker
 from app.clients.fb_message_client import FbMessageClient
 from app.core.pagination import PageResponse
 from app.schemas.message import MessageListItem, CreatorInfo
@@ -1439,7 +1440,8 @@ class MessageService:
             {
                 "ok": bool,
                 "sent": int,
-                "failed": int
+                "failed": int,
+                "job_id": str  # 工作建立成功時；進度由 broadcast_job_tracker 回寫
             }
         """
         # 1. 解析 Flex Message JSON
@@ -1482,9 +1484,9 @@ class MessageService:
             f"🎯 將以 line_friends.is_following=1 做為發送人數基準: {target_recipient_count}"
         )
 
-        # 5. 調用 line_app API
+        # 5. 送出 line_app 群發工作（收件人選好、工作建立後即回傳，實際發送在背景進行）
         try:
-            result = await client.broadcast_message(
+            result = await client.submit_broadcast_job(
                 flex_message_json=flex_message_json,
                 target_audience=target_audience,
                 include_tags=include_tags,
@@ -1494,10 +1496,6 @@ class MessageService:
                 campaign_id=message.id,
                 channel_id=channel_id
             )
-            logger.info(
-                f"✅ 發送完成: 成功 {result.get('sent', 0)}, "
-                f"失敗 {result.get('failed', 0)}"
-            )
         except Exception as e:
             logger.error(f"❌ 發送失敗: {e}")
             # 更新狀態爲發送失敗
@@ -1505,6 +1503,22 @@ class MessageService:
             await db.commit()
             raise
 
+        job_id = result.get("job_id")
+        if result.get("ok") and job_id:
+            logger.info(f"🚀 群發工作已建立: job_id={job_id}, total={result.get('total')}")
+            message.send_status = "發送中"
+            message.estimated_send_count = target_recipient_count
+            await db.commit()
+            broadcast_job_tracker.track(message.id, job_id, target_recipient_count, client)
+            return {
+                "ok": True,
+                "campaign_id": result.get("campaign_id"),
+                "job_id": job_id,
+                "sent": target_recipient_count,
+                "failed": 0,
+                "errors": None,
+            }
+
         # 6. 更新消息狀態與發送統計
         success = bool(result.get("ok"))
         actual_sent = result.get("sent", 0) or 0
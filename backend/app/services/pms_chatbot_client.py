@@ -1,18 +1,30 @@
 """
 PMS client helpers for chatbot booking flow.
+
+房況查詢走共用的 httpx.AsyncClient（連線池），並以
+(hotelcode, startdate, enddate, housingcnt, roomtype) 為 key 做短 TTL 快取；
+同 key 的並發查詢只會打一次 PMS，其他人等同一個結果。
 """
 
 from __future__ import annotations
 
+import asyncio
+import copy
 import hashlib
+import logging
+import time
+from collections import deque
 from datetime import datetime
+from typing import Any, Optional
 from urllib.parse import urlencode
 from app.core.timezone import OPERATING_TZ
 
-import requests
+import httpx
 
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 def _pms_api_url() -> str:
     return settings.PMS_API_URL
@@ -68,38 +80,214 @@ def pms_enabled() -> bool:
     return bool(_pms_api_url() and _pms_account() and _pms_secret())
 
 
-def query_pms(
+# 不送 housingcnt 的查詢在快取 key 裡以 None 表示
+_CacheKey = tuple[str, str, str, Optional[int], str]
+
+
+class _PmsAvailabilityCache:
+    """房況 TTL 快取 + in-flight 合併 + 上游延遲統計（單一 event loop 內使用）"""
+
+    def __init__(self) -> None:
+        self._entries: dict[_CacheKey, tuple[float, dict]] = {}
+        self._inflight: dict[_CacheKey, asyncio.Future] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+        self._latencies: deque[float] = deque(maxlen=500)
+
+    def _bind_loop(self) -> None:
+        # 測試 / 重啟 loop 時，前一個 loop 的 future 不能再等
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._inflight.clear()
+
+    def _purge_expired(self, now: float) -> None:
+        if len(self._entries) < 256:
+            return
+        for key in [k for k, (exp, _) in self._entries.items() if exp <= now]:
+            self._entries.pop(key, None)
+
+    async def get(self, key: _CacheKey, fetch, *, use_cache: bool = True) -> dict:
+        """回傳深拷貝（呼叫端會就地修改 raw，例如注入測試房庫存）"""
+        self._bind_loop()
+        ttl = settings.PMS_CACHE_TTL_SECONDS
+        if not use_cache or ttl <= 0:
+            self.misses += 1
+            return await self._call_upstream(fetch)
+
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry and entry[0] > now:
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # 上游查詢跑在自己的 task：發起的請求被取消（client 斷線）時，其他等同一查詢的請求不受影響
+            pending = asyncio.create_task(self._fill(key, fetch, ttl))
+            # 所有等待者都取消時沒有人讀例外，避免 "exception was never retrieved" 警告
+            pending.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = pending
+        return copy.deepcopy(await asyncio.shield(pending))
+
+    async def _fill(self, key: _CacheKey, fetch, ttl: int) -> dict:
+        try:
+            data = await self._call_upstream(fetch)
+            now = time.monotonic()
+            self._purge_expired(now)
+            self._entries[key] = (now + ttl, data)
+            return data
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    async def _call_upstream(self, fetch) -> dict:
+        started = time.perf_counter()
+        self.upstream_calls += 1
+        try:
+            return await fetch()
+        except Exception:
+            self.upstream_errors += 1
+            raise
+        finally:
+            self._latencies.append(time.perf_counter() - started)
+
+    def invalidate(self, hotelcode: Optional[str] = None) -> None:
+        if hotelcode is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == hotelcode]:
+            self._entries.pop(key, None)
+
+    def metrics(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        lat = sorted(self._latencies)
+
+        def pct(p: float) -> Optional[float]:
+            if not lat:
+                return None
+            return round(lat[min(len(lat) - 1, int(len(lat) * p))] * 1000, 1)
+
+        return {
+            "cache_entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+            "upstream_latency_ms_p50": pct(0.5),
+            "upstream_latency_ms_p95": pct(0.95),
+            "upstream_latency_ms_max": round(lat[-1] * 1000, 1) if lat else None,
+        }
+
+
+_cache = _PmsAvailabilityCache()
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """共用連線池；event loop 換掉時（測試）重建"""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=settings.PMS_TIMEOUT_SECONDS,
+            verify=True,
+            limits=httpx.Limits(
+                max_connections=settings.PMS_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.PMS_MAX_CONNECTIONS,
+            ),
+        )
+        _client_loop = loop
+    return _client
+
+
+async def close_pms_client() -> None:
+    """應用關閉時釋放連線池"""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def pms_metrics() -> dict[str, Any]:
+    """快取命中率與上游延遲（給監控 / 管理端點用）"""
+    return _cache.metrics()
+
+
+def invalidate_pms_cache(hotelcode: Optional[str] = None) -> None:
+    _cache.invalidate(hotelcode)
+
+
+async def _fetch_availability(
+    hotelcode: str,
+    startdate: str,
+    enddate: str,
+    housingcnt: Optional[int],
+    roomtype: str,
+    *,
+    use_cache: bool = True,
+) -> dict:
+    """單次 PMS 房況查詢（housingcnt=None 表示不送該欄位）"""
+
+    async def fetch() -> dict:
+        ts = taipei_timestamp()
+        payload = {
+            "account": _pms_account(),
+            "password": md5_hex(f"{_pms_secret()}{ts}"),
+            "timestamp": ts,
+            "hotelcode": hotelcode,
+            "startdate": startdate,
+            "enddate": enddate,
+            "roomtype": roomtype,
+        }
+        if housingcnt is not None:
+            payload["housingcnt"] = housingcnt
+        response = await _get_client().post(_pms_api_url(), json=payload)
+        response.raise_for_status()
+        try:
+            return response.json()
+        except Exception:
+            return {"raw_text": response.text}
+
+    key: _CacheKey = (hotelcode, startdate, enddate, housingcnt, roomtype)
+    return await _cache.get(key, fetch, use_cache=use_cache)
+
+
+async def query_pms(
     startdate: str,
     enddate: str,
     roomtype: str | None = None,
     housingcnt: int = 2,
     hotelcode: str | None = None,
+    *,
+    use_cache: bool = True,
 ) -> dict:
-    """查 PMS 房況。hotelcode 為 None 時 fallback 到 env PMS_HOTELCODE。"""
+    """查 PMS 房況。hotelcode 為 None 時 fallback 到 env PMS_HOTELCODE。
+
+    use_cache=False 用於「測試連線」類呼叫，一定會打到 PMS。
+    """
     effective_hotelcode = _ensure_pms_settings(hotelcode)
+    return await _fetch_availability(
+        effective_hotelcode,
+        startdate,
+        enddate,
+        int(housingcnt or 2),
+        roomtype or "",
+        use_cache=use_cache,
+    )
+
 
-    housingcnt = int(housingcnt or 2)
-    ts = taipei_timestamp()
-    password = md5_hex(f"{_pms_secret()}{ts}")
-    payload = {
-        "account": _pms_account(),
-        "password": password,
-        "timestamp": ts,
-        "hotelcode": effective_hotelcode,
-        "startdate": startdate,
-        "enddate": enddate,
-        "housingcnt": housingcnt,
-        "roomtype": roomtype or "",
-    }
-    response = requests.post(_pms_api_url(), json=payload, timeout=20, verify=True)
-    response.raise_for_status()
-    try:
-        return response.json()
-    except Exception:
-        return {"raw_text": response.text}
-
-
-def query_pms_all_roomtypes(
+async def query_pms_all_roomtypes(
     startdate: str,
     enddate: str,
     hotelcode: str | None = None,
@@ -107,32 +295,23 @@ def query_pms_all_roomtypes(
     # 閎運 PMS 行為怪：
     #   - 不送 housingcnt（依官方 post.php 範例）→ 回所有 11 個房型（含 TT/KK），但近期日期會回 "Session halted."
     #   - 送 housingcnt=N → 只回 N 人房，但任何日期都穩
-    # 所以三招都打、合併去重：不送 + housingcnt=2 + housingcnt=4。任一招失敗不影響其他招。
+    # 所以三招同時打、合併去重：不送 + housingcnt=2 + housingcnt=4。任一招失敗不影響其他招。
     effective_hotelcode = _ensure_pms_settings(hotelcode)
 
+    variants: list[Optional[int]] = [None, 2, 4]
+    results = await asyncio.gather(
+        *(
+            _fetch_availability(effective_hotelcode, startdate, enddate, cnt, "")
+            for cnt in variants
+        ),
+        return_exceptions=True,
+    )
+
     merged: dict[str, dict] = {}
     resp_hotelcode = None
-    base_payload = {
-        "account": _pms_account(),
-        "hotelcode": effective_hotelcode,
-        "startdate": startdate,
-        "enddate": enddate,
-        "roomtype": "",
-    }
-    variants: list[dict] = [{}, {"housingcnt": 2}, {"housingcnt": 4}]
-    for extra in variants:
-        ts = taipei_timestamp()
-        payload = {
-            **base_payload,
-            "password": md5_hex(f"{_pms_secret()}{ts}"),
-            "timestamp": ts,
-            **extra,
-        }
-        try:
-            response = requests.post(_pms_api_url(), json=payload, timeout=20, verify=True)
-            response.raise_for_status()
-            data = response.json()
-        except Exception:
+    for cnt, data in zip(variants, results):
+        if isinstance(data, BaseException):
+            logger.warning(f"[PMS] variant housingcnt={cnt} failed: {data}")
             continue
         if resp_hotelcode is None:
             resp_hotelcode = data.get("hotelcode")
@@ -1,17 +1,75 @@
 """
 排程服務模組
-使用 APScheduler 管理定時任務
+排程任務存在 DB（scheduled_jobs），APScheduler 只負責每 SCHEDULER_POLL_SECONDS 秒掃描到期任務
+
+- 多 worker：每個 worker 都會掃描，但以條件式 UPDATE 認領（租約 locked_by / locked_until），
+  同一任務只會有一個 worker 執行；worker 中途當掉，租約逾時後由其他 worker 接手
+- 重試：發送丟出例外時以指數退避重新排入（SCHEDULER_RETRY_BASE_SECONDS × 2^(n-1)），
+  超過 SCHEDULER_MAX_ATTEMPTS 次標記 failed
+- 補跑：停機期間錯過的任務，在原定時間後 SCHEDULER_CATCHUP_GRACE_SECONDS 內仍會發送，
+  超過寬限才改回草稿（舊版行為）
 """
 import logging
-from datetime import datetime, timezone
-from typing import Optional
-from app.core.timezone import now_utc
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
-from apscheduler.job import Job
+from apscheduler.triggers.interval import IntervalTrigger
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.config import settings
+from app.core.timezone import ensure_utc, now_utc
+from app.models.scheduled_job import ScheduledJob
 
 logger = logging.getLogger(__name__)
 
+JOB_TYPE_CAMPAIGN = "campaign"
+_POLL_JOB_ID = "scheduled_jobs_poll"
+# 單次掃描最多認領的任務數
+_POLL_BATCH = 20
+
+
+def _campaign_key(campaign_id: int) -> str:
+    return f"campaign_{campaign_id}"
+
+
+def _naive(dt: datetime) -> datetime:
+    """DB 存 naive UTC；帶 tzinfo 的時間（例如 +08:00）先換算成 UTC 再去掉時區"""
+    return ensure_utc(dt).replace(tzinfo=None)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """第 attempts 次失敗後的等待時間（指數退避，上限 SCHEDULER_RETRY_MAX_SECONDS）"""
+    seconds = settings.SCHEDULER_RETRY_BASE_SECONDS * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(seconds, settings.SCHEDULER_RETRY_MAX_SECONDS))
+
+
+def missed_grace(scheduled_at: datetime, now: datetime) -> bool:
+    """是否已超過補跑寬限（停機太久錯過的排程不再發送）"""
+    return now - _naive(scheduled_at) > timedelta(seconds=settings.SCHEDULER_CATCHUP_GRACE_SECONDS)
+
+
+def _job_dict(job: ScheduledJob) -> Dict[str, Any]:
+    return {
+        "id": job.job_key,
+        "name": f"Send Campaign {job.target_id}" if job.job_type == JOB_TYPE_CAMPAIGN else job.job_key,
+        "job_type": job.job_type,
+        "target_id": job.target_id,
+        "status": job.status,
+        "scheduled_at": job.scheduled_at.isoformat() if job.scheduled_at else None,
+        "next_run_time": job.run_at.isoformat() if job.run_at and job.status == "pending" else None,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "locked_by": job.locked_by,
+        "locked_until": job.locked_until.isoformat() if job.locked_until else None,
+        "last_error": job.last_error,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
 
 class CampaignScheduler:
     """活動與問卷排程管理器"""
@@ -29,11 +87,29 @@ class CampaignScheduler:
         """初始化排程器"""
         if self._scheduler is None:
             self._scheduler = AsyncIOScheduler()
-            logger.info("✅ CampaignScheduler initialized")
+            self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+            self._session_factory = None
+            logger.info(f"✅ CampaignScheduler initialized (worker={self.worker_id})")
+
+    def _sessions(self):
+        if self._session_factory is None:
+            from app.database import AsyncSessionLocal  # 動態導入以避免循環依賴
+
+            self._session_factory = AsyncSessionLocal
+        return self._session_factory
 
     def start(self):
-        """啟動排程器"""
+        """啟動排程器（定期掃描 DB 中到期的任務）"""
         if not self._scheduler.running:
+            self._scheduler.add_job(
+                func=self.poll_due_jobs,
+                trigger=IntervalTrigger(seconds=settings.SCHEDULER_POLL_SECONDS),
+                id=_POLL_JOB_ID,
+                name="Poll scheduled jobs",
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True,
+            )
             self._scheduler.start()
             logger.info("🚀 Scheduler started")
 
@@ -45,7 +121,7 @@ class CampaignScheduler:
 
     async def schedule_campaign(self, campaign_id: int, scheduled_at: datetime) -> bool:
         """
-        排程發送活動
+        排程發送活動（同一活動重複排程會覆蓋原任務）
 
         Args:
             campaign_id: 活動 ID
@@ -54,35 +130,52 @@ class CampaignScheduler:
         Returns:
             bool: 是否排程成功
         """
+        job_key = _campaign_key(campaign_id)
+        run_at = _naive(scheduled_at)
         try:
-            job_id = f"campaign_{campaign_id}"
-
-            # 檢查是否已存在相同任務
-            existing_job = self._scheduler.get_job(job_id)
-            if existing_job:
-                logger.warning(f"⚠️  Job {job_id} already exists, replacing...")
-                existing_job.remove()
-
-            # 添加新任務
-            self._scheduler.add_job(
-                func=self._send_campaign_job,
-                trigger=DateTrigger(run_date=scheduled_at),
-                args=[campaign_id],
-                id=job_id,
-                name=f"Send Campaign {campaign_id}",
-                replace_existing=True,
-            )
+            async with self._sessions()() as db:
+                job = (
+                    await db.execute(select(ScheduledJob).where(ScheduledJob.job_key == job_key))
+                ).scalar_one_or_none()
+                if job is None:
+                    db.add(ScheduledJob(
+                        job_key=job_key,
+                        job_type=JOB_TYPE_CAMPAIGN,
+                        target_id=campaign_id,
+                        scheduled_at=run_at,
+                        run_at=run_at,
+                        status="pending",
+                        attempts=0,
+                        max_attempts=settings.SCHEDULER_MAX_ATTEMPTS,
+                    ))
+                else:
+                    if job.status == "pending":
+                        logger.warning(f"⚠️  Job {job_key} already exists, replacing...")
+                    job.scheduled_at = run_at
+                    job.run_at = run_at
+                    job.status = "pending"
+                    job.attempts = 0
+                    job.max_attempts = settings.SCHEDULER_MAX_ATTEMPTS
+                    job.locked_by = None
+                    job.locked_until = None
+                    job.last_error = None
+                    job.finished_at = None
+                await db.commit()
 
             logger.info(f"✅ Campaign {campaign_id} scheduled for {scheduled_at}")
             return True
 
+        except IntegrityError:
+            # 另一個 worker 同時建立了同一任務
+            logger.info(f"ℹ️  Job {job_key} was created concurrently")
+            return True
         except Exception as e:
             logger.error(f"❌ Failed to schedule campaign {campaign_id}: {e}")
             return False
 
     async def cancel_campaign(self, campaign_id: int) -> bool:
         """
-        取消活動排程
+        取消活動排程（執行中的任務無法取消）
 
         Args:
             campaign_id: 活動 ID
@@ -91,149 +184,267 @@ class CampaignScheduler:
             bool: 是否取消成功
         """
         try:
-            job_id = f"campaign_{campaign_id}"
-            job = self._scheduler.get_job(job_id)
+            async with self._sessions()() as db:
+                result = await db.execute(
+                    update(ScheduledJob)
+                    .where(
+                        ScheduledJob.job_key == _campaign_key(campaign_id),
+                        ScheduledJob.status == "pending",
+                    )
+                    .values(status="canceled", finished_at=now_utc())
+                )
+                await db.commit()
 
-            if job:
-                job.remove()
+            if result.rowcount:
                 logger.info(f"✅ Campaign {campaign_id} schedule canceled")
                 return True
-            else:
-                logger.warning(f"⚠️  Campaign {campaign_id} schedule not found")
-                return False
+            logger.warning(f"⚠️  Campaign {campaign_id} schedule not found")
+            return False
 
         except Exception as e:
             logger.error(f"❌ Failed to cancel campaign {campaign_id}: {e}")
             return False
 
-    def get_scheduled_jobs(self) -> list:
+    async def get_scheduled_jobs(
+        self,
+        status: Optional[str] = "pending",
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
         """
-        獲取所有排程任務
+        獲取排程任務
+
+        Args:
+            status: 只列出此狀態（None = 全部，依更新時間新到舊）
+            limit: 筆數上限
 
         Returns:
             list: 任務列表
         """
-        jobs = self._scheduler.get_jobs()
-        return [
-            {
-                "id": job.id,
-                "name": job.name,
-                "next_run_time": job.next_run_time.isoformat()
-                if job.next_run_time
-                else None,
-            }
-            for job in jobs
-        ]
-
-    async def _send_campaign_job(self, campaign_id: int) -> None:
-        """背景任務：發送已排程的群發訊息
-
-        Args:
-            campaign_id: 活動 ID
-        """
+        async with self._sessions()() as db:
+            stmt = select(ScheduledJob)
+            if status:
+                stmt = stmt.where(ScheduledJob.status == status).order_by(ScheduledJob.run_at)
+            else:
+                stmt = stmt.order_by(ScheduledJob.updated_at.desc(), ScheduledJob.id.desc())
+            jobs = (await db.execute(stmt.limit(limit))).scalars().all()
+        return [_job_dict(job) for job in jobs]
+
+    async def get_job_counts(self) -> Dict[str, int]:
+        """各狀態任務數"""
+        async with self._sessions()() as db:
+            rows = await db.execute(
+                select(ScheduledJob.status, func.count()).group_by(ScheduledJob.status)
+            )
+            return {status: count for status, count in rows.all()}
+
+    # -------------------------------------------------
+    # 掃描 / 認領 / 執行
+    # -------------------------------------------------
+    @staticmethod
+    def _claimable(now: datetime):
+        return or_(
+            and_(ScheduledJob.status == "pending", ScheduledJob.run_at <= now),
+            and_(ScheduledJob.status == "running", ScheduledJob.locked_until < now),
+        )
+
+    async def poll_due_jobs(self) -> int:
+        """掃描並執行到期任務，回傳本 worker 實際執行的數量"""
+        now = now_utc()
         try:
-            logger.info(f"🚀 Executing scheduled campaign {campaign_id}")
+            async with self._sessions()() as db:
+                ids = (
+                    await db.execute(
+                        select(ScheduledJob.id)
+                        .where(self._claimable(now))
+                        .order_by(ScheduledJob.run_at)
+                        .limit(_POLL_BATCH)
+                    )
+                ).scalars().all()
+        except Exception as e:
+            logger.error(f"❌ Failed to poll scheduled jobs: {e}")
+            return 0
+
+        executed = 0
+        for job_id in ids:
+            job = await self._claim(job_id)
+            if job is None:
+                continue  # 被其他 worker 搶先認領
+            await self._run_job(job)
+            executed += 1
+        return executed
+
+    async def _claim(self, job_id: int) -> Optional[ScheduledJob]:
+        """條件式 UPDATE 認領；rowcount=0 代表已被其他 worker 認領或狀態已變"""
+        now = now_utc()
+        async with self._sessions()() as db:
+            result = await db.execute(
+                update(ScheduledJob)
+                .where(ScheduledJob.id == job_id, self._claimable(now))
+                .values(
+                    status="running",
+                    locked_by=self.worker_id,
+                    locked_until=now + timedelta(seconds=settings.SCHEDULER_LEASE_SECONDS),
+                    attempts=ScheduledJob.attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            if result.rowcount != 1:
+                return None
+            return await db.get(ScheduledJob, job_id)
+
+    async def _finish(self, job: ScheduledJob, **values) -> None:
+        """只更新仍由本 worker 持有的任務（租約逾時被接手後不覆蓋別人的結果）"""
+        async with self._sessions()() as db:
+            await db.execute(
+                update(ScheduledJob)
+                .where(ScheduledJob.id == job.id, ScheduledJob.locked_by == self.worker_id)
+                .values(locked_by=None, locked_until=None, **values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
 
-            # 動態導入以避免循環依賴
-            from app.database import AsyncSessionLocal
-            from app.services.message_service import MessageService
+    async def _run_job(self, job: ScheduledJob) -> None:
+        now = now_utc()
 
-            message_service = MessageService()
+        # 第一次執行就已超過寬限：停機期間錯過太久，不補發
+        if job.attempts == 1 and missed_grace(job.scheduled_at, now):
+            logger.warning(
+                f"⚠️ Job {job.job_key} expired (was scheduled for {job.scheduled_at}), not catching up"
+            )
+            await self._expire(job)
+            await self._finish(job, status="expired", finished_at=now)
+            return
+
+        try:
+            result = await self._dispatch(job)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:2000]
+            if job.attempts < job.max_attempts:
+                delay = retry_delay(job.attempts)
+                logger.warning(
+                    f"⚠️ Job {job.job_key} attempt {job.attempts}/{job.max_attempts} failed, "
+                    f"retrying in {int(delay.total_seconds())}s: {error}"
+                )
+                await self._finish(job, status="pending", run_at=now_utc() + delay, last_error=error)
+            else:
+                logger.error(
+                    f"❌ Job {job.job_key} failed after {job.attempts} attempts: {error}",
+                    exc_info=True,
+                )
+                await self._finish(job, status="failed", last_error=error, finished_at=now_utc())
+            return
+
+        if result.get("skipped"):
+            await self._finish(job, status="canceled", last_error=result["skipped"], finished_at=now_utc())
+        elif result.get("ok"):
+            await self._finish(job, status="succeeded", last_error=None, finished_at=now_utc())
+        else:
+            # 業務面失敗（例如沒有符合條件的會員）重試也不會成功，不重試
+            error = result.get("error") or result.get("errors") or "send reported failure"
+            await self._finish(job, status="failed", last_error=str(error)[:2000], finished_at=now_utc())
+
+    async def _dispatch(self, job: ScheduledJob) -> Dict[str, Any]:
+        if job.job_type == JOB_TYPE_CAMPAIGN:
+            return await self._send_campaign_job(job.target_id, retry=job.attempts > 1)
+        raise ValueError(f"Unknown job type: {job.job_type}")
+
+    async def _expire(self, job: ScheduledJob) -> None:
+        if job.job_type != JOB_TYPE_CAMPAIGN:
+            return
+        from app.models.message import Message
 
-            async with AsyncSessionLocal() as db:
-                result = await message_service.send_message(db, campaign_id)
+        async with self._sessions()() as db:
+            campaign = await db.get(Message, job.target_id)
+            if campaign is not None and campaign.send_status == "已排程":
+                campaign.send_status = "草稿"
+                campaign.scheduled_datetime_utc = None
+                await db.commit()
+                logger.warning(f"⚠️ Campaign {job.target_id} reverted to draft")
 
-            sent_count = 0
-            failed_count = 0
-            ok = False
-            if isinstance(result, dict):
-                sent_count = result.get("sent", 0) or 0
-                failed_count = result.get("failed", 0) or 0
-                ok = bool(result.get("ok"))
+    async def _send_campaign_job(self, campaign_id: int, retry: bool = False) -> Dict[str, Any]:
+        """執行排程群發；發送例外會往上丟給 _run_job 決定是否重試
 
-            if ok:
-                if failed_count:
-                    logger.warning(
-                        "⚠️ Campaign %s sent with partial failures: %s", campaign_id, failed_count
-                    )
-                else:
-                    logger.info(
-                        "✅ Campaign %s sent successfully to %s users", campaign_id, sent_count
-                    )
-            else:
+        Args:
+            campaign_id: 活動 ID
+            retry: 是否為重試（上次失敗時 send_status 已被標成發送失敗）
+        """
+        logger.info(f"🚀 Executing scheduled campaign {campaign_id}")
+
+        # 動態導入以避免循環依賴
+        from app.models.message import Message
+        from app.services.message_service import MessageService
+
+        allowed = ("已排程", "發送失敗") if retry else ("已排程",)
+        async with self._sessions()() as db:
+            campaign = await db.get(Message, campaign_id)
+            if campaign is None or campaign.send_status not in allowed:
+                status = campaign.send_status if campaign is not None else "deleted"
+                logger.warning(f"⚠️ Campaign {campaign_id} is no longer scheduled ({status}), skipping")
+                return {"skipped": f"campaign status is {status}"}
+
+            result = await MessageService().send_message(db, campaign_id)
+
+        result = result if isinstance(result, dict) else {}
+        sent_count = result.get("sent", 0) or 0
+        failed_count = result.get("failed", 0) or 0
+        if result.get("ok"):
+            if failed_count:
                 logger.warning(
-                    "⚠️ Campaign %s schedule finished but reported failure", campaign_id
+                    "⚠️ Campaign %s sent with partial failures: %s", campaign_id, failed_count
                 )
-
-        except Exception as e:
-            logger.error(
-                f"❌ Failed to send campaign {campaign_id}: {e}",
-                exc_info=True,
+            else:
+                logger.info(
+                    "✅ Campaign %s sent successfully to %s users", campaign_id, sent_count
+                )
+        else:
+            logger.warning(
+                "⚠️ Campaign %s schedule finished but reported failure", campaign_id
             )
-            # 這裡可以加入重試邏輯或通知管理員
+        return result
 
     async def restore_scheduled_jobs(self) -> None:
-        """從資料庫恢復所有待發送的排程任務
-
-        在應用啟動時調用。
+        """確保每筆「已排程」訊息都有待執行的任務
 
-        Note:
-            資料庫中的 scheduled_datetime_utc 實際存儲的是本地時間（台灣 UTC+8）
+        在應用啟動時調用。任務本身存在 DB，重啟不會遺失；這裡補上舊版（APScheduler 記憶體排程）
+        留下、還沒有任務列的已排程訊息。錯過的排程交給掃描時的補跑寬限處理。
         """
-        from app.database import AsyncSessionLocal
         from app.models.message import Message
-        from sqlalchemy import select
 
         try:
-            async with AsyncSessionLocal() as db:
-                # 查詢所有「已排程」的訊息
-                stmt = select(Message).where(
-                    Message.send_status == "已排程",
-                    Message.scheduled_datetime_utc != None
-                )
-                result = await db.execute(stmt)
-                campaigns = result.scalars().all()
-
-                # 與 DB 的 scheduled_at（naive UTC）同基底比較
-                now = now_utc()
-                restored_count = 0
-                expired_count = 0
-
-                logger.info(f"🔍 Found {len(campaigns)} scheduled campaigns to process")
-                logger.info(f"📍 Current local time: {now}")
-
-                for campaign in campaigns:
-                    scheduled_at = campaign.scheduled_datetime_utc
-
-                    # 移除 timezone 資訊以便比較（資料庫存的是 naive datetime）
-                    if scheduled_at.tzinfo is not None:
-                        scheduled_at = scheduled_at.replace(tzinfo=None)
-
-                    logger.info(f"📋 Campaign {campaign.id}: scheduled for {scheduled_at}")
-
-                    if scheduled_at > now:
-                        # 未過期：重新排程
-                        await self.schedule_campaign(campaign.id, scheduled_at)
-                        restored_count += 1
-                        logger.info(f"📅 Restored campaign {campaign.id} for {scheduled_at}")
-                    else:
-                        # 已過期：改為草稿狀態
-                        campaign.send_status = "草稿"
-                        campaign.scheduled_datetime_utc = None
-                        expired_count += 1
-                        logger.warning(
-                            f"⚠️ Campaign {campaign.id} expired (was scheduled for {scheduled_at}), "
-                            f"reverted to draft"
+            async with self._sessions()() as db:
+                active_keys = set(
+                    (
+                        await db.execute(
+                            select(ScheduledJob.job_key).where(
+                                ScheduledJob.job_type == JOB_TYPE_CAMPAIGN,
+                                ScheduledJob.status.in_(("pending", "running")),
+                            )
                         )
-
-                if expired_count > 0:
-                    await db.commit()
-                    logger.info(f"💾 Committed {expired_count} expired campaigns as drafts")
-
-                logger.info(
-                    f"✅ Scheduler restoration complete: "
-                    f"{restored_count} restored, {expired_count} reverted to draft"
+                    ).scalars().all()
                 )
+                campaigns = (
+                    await db.execute(
+                        select(Message.id, Message.scheduled_datetime_utc).where(
+                            Message.send_status == "已排程",
+                            Message.scheduled_datetime_utc != None,  # noqa: E711
+                        )
+                    )
+                ).all()
+
+            logger.info(f"🔍 Found {len(campaigns)} scheduled campaigns to process")
+            restored_count = 0
+            for campaign_id, scheduled_at in campaigns:
+                if _campaign_key(campaign_id) in active_keys:
+                    continue
+                if await self.schedule_campaign(campaign_id, scheduled_at):
+                    restored_count += 1
+                    logger.info(f"📅 Restored campaign {campaign_id} for {scheduled_at}")
+
+            logger.info(
+                f"✅ Scheduler restoration complete: {restored_count} restored, "
+                f"{len(active_keys)} already queued"
+            )
         except Exception as e:
             logger.error(f"❌ Failed to restore scheduled jobs: {e}", exc_info=True)
 
@@ -0,0 +1,224 @@
+"""
+對話摘要（conversation_thread_summary）
+=============================
+取代會員列表每次對 conversation_messages 全歷史跑兩次 GROUP BY thread_id MAX(created_at)：
+
+- 每個 (thread_id, platform) 一筆：最後訊息時間（含群發）、最後一則非群發訊息的時間 / 方向 / 來源 /
+  unanswered（藍點判斷用）、未讀 incoming 數
+- 寫入訊息時以 upsert 增量合併（MySQL ON DUPLICATE KEY UPDATE / SQLite ON CONFLICT），
+  與訊息在同一個交易內；line_app 的 conversation_service 以同樣規則維護同一張表
+- 訊息 platform 為 NULL（舊資料）一律視為 LINE
+- rebuild_thread_summaries：從 conversation_messages 重建指定 thread（訪客資料清理後、或資料修正後）；
+  全表重建用 scripts/rebuild_thread_summary.py
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, case, delete, exists, func, insert, or_, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.timezone import now_utc
+from app.models.conversation import ConversationMessage, ConversationThreadSummary
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PLATFORM = "LINE"
+REBUILD_BATCH_SIZE = 500
+
+_table = ConversationThreadSummary.__table__
+
+
+def summary_row(
+    thread_id: str,
+    platform: Optional[str],
+    direction: str,
+    message_source: Optional[str],
+    unanswered: bool,
+    status: Optional[str],
+    created_at: datetime,
+) -> Dict[str, Any]:
+    """單則訊息對摘要的貢獻（群發只影響 last_message_at）"""
+    counted = message_source != "broadcast"
+    return {
+        "thread_id": thread_id,
+        "platform": platform or DEFAULT_PLATFORM,
+        "last_message_at": created_at,
+        "last_non_broadcast_at": created_at if counted else None,
+        "last_non_broadcast_direction": direction if counted else None,
+        "last_non_broadcast_source": message_source if counted else None,
+        "last_unanswered": bool(counted and unanswered),
+        "unread_count": 1 if direction == "incoming" and status != "read" else 0,
+        "updated_at": now_utc(),
+    }
+
+
+def _upsert_stmt(dialect: str, rows: List[Dict[str, Any]]):
+    if dialect == "mysql":
+        stmt = mysql_insert(_table).values(rows)
+        new = stmt.inserted
+    else:
+        stmt = sqlite_insert(_table).values(rows)
+        new = stmt.excluded
+    c = _table.c
+
+    newer = and_(
+        new.last_non_broadcast_at.isnot(None),
+        or_(c.last_non_broadcast_at.is_(None), new.last_non_broadcast_at >= c.last_non_broadcast_at),
+    )
+
+    def pick(col: str):
+        return case((newer, new[col]), else_=c[col])
+
+    # MySQL 依序套用：判斷「是否比較新」的欄位必須排在 last_non_broadcast_at 之前
+    updates: List[Tuple[str, Any]] = [
+        ("last_message_at", case(
+            (or_(c.last_message_at.is_(None), new.last_message_at > c.last_message_at), new.last_message_at),
+            else_=c.last_message_at,
+        )),
+        ("last_non_broadcast_direction", pick("last_non_broadcast_direction")),
+        ("last_non_broadcast_source", pick("last_non_broadcast_source")),
+        ("last_unanswered", pick("last_unanswered")),
+        ("last_non_broadcast_at", pick("last_non_broadcast_at")),
+        ("unread_count", c.unread_count + new.unread_count),
+        ("updated_at", new.updated_at),
+    ]
+    if dialect == "mysql":
+        return stmt.on_duplicate_key_update(updates)
+    return stmt.on_conflict_do_update(index_elements=["thread_id", "platform"], set_=dict(updates))
+
+
+async def record_messages(db: AsyncSession, messages: Iterable[ConversationMessage]) -> None:
+    """新寫入的訊息合併進摘要（呼叫端負責 commit；同一則訊息不可重複記錄）"""
+    rows = [
+        summary_row(
+            m.thread_id, m.platform, m.direction, m.message_source,
+            bool(m.unanswered), m.status, m.created_at or now_utc(),
+        )
+        for m in messages
+        if m is not None
+    ]
+    if rows:
+        await db.execute(_upsert_stmt(db.get_bind().dialect.name, rows))
+
+
+async def rebuild_thread_summaries(db: AsyncSession, thread_ids: Sequence[str]) -> int:
+    """從 conversation_messages 重建指定 thread 的摘要（已無訊息的 thread 摘要會被刪除），回傳摘要筆數"""
+    thread_ids = list(dict.fromkeys(t for t in thread_ids if t))
+    if not thread_ids:
+        return 0
+
+    platform = func.coalesce(ConversationMessage.platform, DEFAULT_PLATFORM)
+    agg = await db.execute(
+        select(
+            ConversationMessage.thread_id,
+            platform.label("platform"),
+            func.max(ConversationMessage.created_at),
+            func.sum(case(
+                (and_(
+                    ConversationMessage.direction == "incoming",
+                    or_(ConversationMessage.status.is_(None), ConversationMessage.status != "read"),
+                ), 1),
+                else_=0,
+            )),
+        )
+        .where(ConversationMessage.thread_id.in_(thread_ids))
+        .group_by(ConversationMessage.thread_id, platform)
+    )
+    now = now_utc()
+    rows: Dict[Tuple[str, str], Dict[str, Any]] = {
+        (tid, plat): {
+            "thread_id": tid,
+            "platform": plat,
+            "last_message_at": last_at,
+            "last_non_broadcast_at": None,
+            "last_non_broadcast_direction": None,
+            "last_non_broadcast_source": None,
+            "last_unanswered": False,
+            "unread_count": int(unread or 0),
+            "updated_at": now,
+        }
+        for tid, plat, last_at, unread in agg
+    }
+
+    # 每個 (thread, platform) 最後一則非群發訊息（同秒多筆取 id 最大者，結果才穩定）
+    non_broadcast = or_(
+        ConversationMessage.message_source.is_(None),
+        ConversationMessage.message_source != "broadcast",
+    )
+    last_subq = (
+        select(
+            ConversationMessage.thread_id,
+            platform.label("platform"),
+            func.max(ConversationMessage.created_at).label("max_created_at"),
+        )
+        .where(ConversationMessage.thread_id.in_(thread_ids), non_broadcast)
+        .group_by(ConversationMessage.thread_id, platform)
+    ).subquery()
+    last_rows = await db.execute(
+        select(
+            ConversationMessage.id,
+            ConversationMessage.thread_id,
+            platform,
+            ConversationMessage.created_at,
+            ConversationMessage.direction,
+            ConversationMessage.message_source,
+            ConversationMessage.unanswered,
+        )
+        .join(last_subq, and_(
+            ConversationMessage.thread_id == last_subq.c.thread_id,
+            platform == last_subq.c.platform,
+            ConversationMessage.created_at == last_subq.c.max_created_at,
+        ))
+        .where(non_broadcast)
+    )
+    picked: Dict[Tuple[str, str], str] = {}
+    for msg_id, tid, plat, created_at, direction, source, unanswered in last_rows:
+        key = (tid, plat)
+        if key not in rows or (key in picked and picked[key] > msg_id):
+            continue
+        picked[key] = msg_id
+        rows[key].update(
+            last_non_broadcast_at=created_at,
+            last_non_broadcast_direction=direction,
+            last_non_broadcast_source=source,
+            last_unanswered=bool(unanswered),
+        )
+
+    await db.execute(delete(ConversationThreadSummary).where(ConversationThreadSummary.thread_id.in_(thread_ids)))
+    if rows:
+        await db.execute(insert(ConversationThreadSummary), list(rows.values()))
+    return len(rows)
+
+
+async def rebuild_all_thread_summaries(db: AsyncSession, batch_size: int = REBUILD_BATCH_SIZE) -> int:
+    """依 thread_id 順序分批重建全部摘要，每批 commit 一次；最後清掉已無訊息的摘要"""
+    total = 0
+    last_tid = ""
+    while True:
+        result = await db.execute(
+            select(ConversationMessage.thread_id)
+            .where(ConversationMessage.thread_id > last_tid)
+            .group_by(ConversationMessage.thread_id)
+            .order_by(ConversationMessage.thread_id)
+            .limit(batch_size)
+        )
+        batch = [row[0] for row in result]
+        if not batch:
+            break
+        total += await rebuild_thread_summaries(db, batch)
+        await db.commit()
+        last_tid = batch[-1]
+        logger.info("[THREAD_SUMMARY] rebuilt %d summaries (up to thread %s)", total, last_tid)
+
+    await db.execute(
+        delete(ConversationThreadSummary).where(
+            ~exists().where(ConversationMessage.thread_id == ConversationThreadSummary.thread_id)
+        )
+    )
+    await db.commit()
+    return total
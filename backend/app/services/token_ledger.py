@@ -0,0 +1,244 @@
+"""
+AI Token 用量記帳
+=============================
+取代 chat / test_chat / _deduct_tokens 對先前讀出的 AiTokenUsage ORM 物件做 used_amount += n：
+
+- 扣量一律 UPDATE ai_token_usages SET used_amount = used_amount + :n；原子遞增，
+  同一館別同時多段對話、多個 worker 都不會互蓋
+- 扣量先累積在程序內（每個 ai_token_usages 列一筆），每 AI_TOKEN_FLUSH_SECONDS 秒合併寫回；
+  AI_TOKEN_FLUSH_SECONDS=0 → 不緩衝，在呼叫端的交易內寫入
+- 額度檢查讀程序內的額度快取（AI_TOKEN_QUOTA_CACHE_SECONDS），連同預設產業 / 預設 LINE 館別的查詢，
+  不必每輪對話都查 Industry / LineChannel / AiTokenUsage；本程序的扣量會即時反映在快取上，
+  其他 worker 的扣量與後台調整額度最多延遲一個快取週期
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.faq import AiTokenUsage, Industry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHANNEL_QUOTA = 10_000_000  # 新 LINE OA 第一次互動時自動建立的額度
+
+
+@dataclass
+class QuotaView:
+    """某館別的額度快照（used_amount 含本程序尚未寫回的扣量）"""
+
+    usage_id: int
+    industry_id: int
+    channel_id: Optional[str]
+    total_quota: int
+    used_amount: int
+    fetched_at: float
+
+    @property
+    def exhausted(self) -> bool:
+        return self.total_quota > 0 and self.used_amount >= self.total_quota
+
+
+async def _apply(db: AsyncSession, usage_id: int, tokens: int) -> int:
+    """原子遞增 used_amount，回傳更新到的列數（0 = 該列不存在）"""
+    result = await db.execute(
+        update(AiTokenUsage)
+        .where(AiTokenUsage.id == usage_id)
+        .values(used_amount=AiTokenUsage.used_amount + tokens)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+class TokenLedger:
+    """程序內累積 token 扣量並快取額度，定期合併寫回"""
+
+    def __init__(self) -> None:
+        self._pending: Dict[int, int] = {}
+        self._quotas: Dict[Tuple[int, Optional[str]], QuotaView] = {}
+        # (產業 ID, 預設館別 channel_id, 查詢時間)
+        self._defaults: Optional[Tuple[Optional[int], Optional[str], float]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flushed_rows = 0
+
+    @property
+    def buffered(self) -> bool:
+        return settings.AI_TOKEN_FLUSH_SECONDS > 0
+
+    def _fresh(self, fetched_at: float) -> bool:
+        return time.monotonic() - fetched_at < settings.AI_TOKEN_QUOTA_CACHE_SECONDS
+
+    # ------------------------------------------------------------------
+    # 額度快取
+    # ------------------------------------------------------------------
+
+    async def _resolve_defaults(self, db: AsyncSession) -> Tuple[Optional[int], Optional[str]]:
+        """啟用中的產業與第一個啟用中的 LINE 館別（官網 chatbot 沒帶 channel 時的預設）"""
+        if self._defaults is not None and self._fresh(self._defaults[2]):
+            return self._defaults[0], self._defaults[1]
+        from app.models.line_channel import LineChannel
+
+        industry_id = (await db.execute(
+            select(Industry.id).where(Industry.is_active == True).limit(1)  # noqa: E712
+        )).scalar_one_or_none()
+        channel_id = (await db.execute(
+            select(LineChannel.channel_id)
+            .where(LineChannel.is_active == True)  # noqa: E712
+            .order_by(LineChannel.id.asc())
+            .limit(1)
+        )).scalar_one_or_none()
+        self._defaults = (industry_id, channel_id or None, time.monotonic())
+        return industry_id, channel_id or None
+
+    async def quota(
+        self,
+        db: AsyncSession,
+        industry_id: Optional[int] = None,
+        line_channel_id: Optional[str] = None,
+        seed: bool = True,
+    ) -> Optional[QuotaView]:
+        """
+        取得館別額度（未指定產業 / 館別時用預設值）；沒有額度列時回傳 None
+
+        seed=True 且有館別時，新 LINE OA 第一次互動會自動建立預設額度列（在呼叫端的交易內）。
+        剛建立的列還沒 commit，呼叫端 rollback 後就不存在，所以這次的結果不快取。
+        """
+        if not industry_id or not line_channel_id:
+            default_industry, default_channel = await self._resolve_defaults(db)
+            industry_id = industry_id or default_industry
+            line_channel_id = line_channel_id or default_channel
+        if not industry_id:
+            return None
+
+        key = (industry_id, line_channel_id)
+        view = self._quotas.get(key)
+        if view is not None and self._fresh(view.fetched_at):
+            return view
+
+        usage_query = select(AiTokenUsage).where(AiTokenUsage.industry_id == industry_id)
+        if line_channel_id:
+            usage_query = usage_query.where(AiTokenUsage.channel_id == line_channel_id)
+        usage = (await db.execute(usage_query)).scalar_one_or_none()
+        seeded = False
+
+        # Lazy seed：新 LINE OA 第一次互動時自動建立 quota row（預設 10M）
+        # Phase E：讓 admin 不用先手動配置就能讓新 channel 即時運作
+        if usage is None and line_channel_id and seed:
+            usage = AiTokenUsage(
+                industry_id=industry_id,
+                channel_id=line_channel_id,
+                total_quota=DEFAULT_CHANNEL_QUOTA,
+                used_amount=0,
+            )
+            db.add(usage)
+            await db.flush()
+            seeded = True
+            logger.info(
+                f"[token-usage] auto-seeded default 10M quota for new channel: {line_channel_id}"
+            )
+        if usage is None:
+            return None
+
+        view = QuotaView(
+            usage_id=usage.id,
+            industry_id=industry_id,
+            channel_id=usage.channel_id,
+            total_quota=usage.total_quota or 0,
+            used_amount=(usage.used_amount or 0) + self._pending.get(usage.id, 0),
+            fetched_at=time.monotonic(),
+        )
+        if not seeded:
+            self._quotas[key] = view
+        return view
+
+    def invalidate(self) -> None:
+        """後台調整額度 / 新增館別後呼叫，下次檢查重新讀 DB"""
+        self._quotas.clear()
+        self._defaults = None
+
+    def _forget(self, usage_id: int) -> None:
+        """額度列已不存在（例如 lazy seed 的交易 rollback）：丟掉指向它的快取，下次重新查詢 / 建立"""
+        for key in [k for k, v in self._quotas.items() if v.usage_id == usage_id]:
+            del self._quotas[key]
+
+    def pending_for(self, usage_id: int) -> int:
+        """本程序尚未寫回的扣量（後台顯示用量時補上）"""
+        return self._pending.get(usage_id, 0)
+
+    # ------------------------------------------------------------------
+    # 扣量
+    # ------------------------------------------------------------------
+
+    async def charge(self, db: AsyncSession, view: QuotaView, tokens: int) -> None:
+        """記一筆扣量；不緩衝時直接在呼叫端的交易內原子遞增"""
+        if tokens <= 0:
+            return
+        view.used_amount += tokens
+        if self.buffered:
+            self._pending[view.usage_id] = self._pending.get(view.usage_id, 0) + tokens
+        elif not await _apply(db, view.usage_id, tokens):
+            logger.warning("AI token usage row %s not found; %d tokens not recorded", view.usage_id, tokens)
+            self._forget(view.usage_id)
+
+    def _merge(self, batch: Dict[int, int]) -> None:
+        for usage_id, tokens in batch.items():
+            self._pending[usage_id] = self._pending.get(usage_id, 0) + tokens
+
+    async def flush(self) -> int:
+        """把累積的扣量寫回 DB，回傳寫入的列數；失敗時扣量放回下次再試"""
+        if not self._pending:
+            return 0
+        from app.database import AsyncSessionLocal
+
+        batch, self._pending = self._pending, {}
+        missing = []
+        try:
+            async with AsyncSessionLocal() as db:
+                # 依 id 排序寫入，多 worker 同時 flush 時鎖定順序一致，避免 deadlock
+                for usage_id in sorted(batch):
+                    if not await _apply(db, usage_id, batch[usage_id]):
+                        missing.append(usage_id)
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to flush AI token usage (%d rows)", len(batch))
+            self._merge(batch)
+            return 0
+        for usage_id in missing:
+            logger.warning(
+                "AI token usage row %s not found; %d tokens not recorded", usage_id, batch[usage_id]
+            )
+            self._forget(usage_id)
+        written = len(batch) - len(missing)
+        self.flushes += 1
+        self.flushed_rows += written
+        return written
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.AI_TOKEN_FLUSH_SECONDS)
+            await self.flush()
+
+    def start(self) -> None:
+        if self.buffered and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+token_ledger = TokenLedger()
@@ -6,15 +6,21 @@ from typing import Dict, Any, Optional
 from datetime import datetime
 from app.core.timezone import now_utc, to_utc_iso
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, update
+from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
 import logging
 
 from app.models.tracking import ComponentInteractionLog, InteractionType
 from app.models.message import Message
-from app.models.template import MessageTemplate, TemplateCarouselItem
+from app.models.template import MessageTemplate
 from app.models.tag import InteractionTag, MemberInteractionTag
 from app.models.member import Member
+from app.services.interaction_stats import (
+    CAROUSEL_ITEM,
+    INTERACTION_TAG,
+    build_delta,
+    interaction_stats,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -85,17 +91,17 @@ class TrackingService:
             db.add(interaction_log)
             await db.flush()
 
-            # 2. 更新輪播圖卡片統計（如果有）
+            # 2~3. 輪播圖卡片 / 互動標籤統計：只算本次點擊的增量（不重掃歷史）
+            stat_deltas = []
             if carousel_item_id:
-                await self._update_carousel_item_stats(
-                    db, carousel_item_id
-                )
-
-            # 3. 更新互動標籤統計（如果有）
+                stat_deltas.append(await build_delta(
+                    db, CAROUSEL_ITEM, carousel_item_id, line_uid, interaction_log.id
+                ))
             if interaction_tag_id:
-                await self._update_interaction_tag_stats(
-                    db, interaction_tag_id
-                )
+                stat_deltas.append(await build_delta(
+                    db, INTERACTION_TAG, interaction_tag_id, line_uid, interaction_log.id
+                ))
+            await interaction_stats.stage(db, stat_deltas)
 
             # 4. 寫入 member_interaction_tags（如果有互動標籤）
             #    以 campaign_id（訊息 ID）作為 instance 去重 key：同則訊息內重複點擊
@@ -108,6 +114,7 @@ class TrackingService:
 
             # 5. 提交事務
             await db.commit()
+            interaction_stats.committed(stat_deltas)
             await db.refresh(interaction_log)
 
             logger.info(f"Tracked interaction: line_uid={line_uid}, campaign_id={campaign_id}, type={interaction_type}")
@@ -118,79 +125,6 @@ class TrackingService:
             logger.error(f"Failed to track interaction: {e}", exc_info=True)
             raise
 
-    async def _update_carousel_item_stats(
-        self,
-        db: AsyncSession,
-        carousel_item_id: int,
-    ):
-        """更新輪播圖卡片統計"""
-        total_count_stmt = (
-            select(func.count())
-            .where(ComponentInteractionLog.carousel_item_id == carousel_item_id)
-        )
-        total_count_result = await db.execute(total_count_stmt)
-        total_count = total_count_result.scalar() or 0
-
-        unique_count_stmt = (
-            select(func.count(func.distinct(ComponentInteractionLog.line_id)))
-            .where(ComponentInteractionLog.carousel_item_id == carousel_item_id)
-        )
-        unique_count_result = await db.execute(unique_count_stmt)
-        unique_count = unique_count_result.scalar() or 0
-
-        await db.execute(
-            update(TemplateCarouselItem)
-            .where(TemplateCarouselItem.id == carousel_item_id)
-            .values(
-                click_count=total_count,
-                unique_click_count=unique_count,
-                last_clicked_at=now_utc(),
-            )
-        )
-
-        logger.debug(f"Updated carousel item {carousel_item_id} stats: click_count={total_count}, unique_click_count={unique_count}")
-
-    async def _update_interaction_tag_stats(
-        self,
-        db: AsyncSession,
-        interaction_tag_id: int,
-    ):
-        """更新互動標籤統計"""
-        # 查詢該標籤是否存在
-        stmt = select(InteractionTag).where(InteractionTag.id == interaction_tag_id)
-        result = await db.execute(stmt)
-        tag = result.scalar_one_or_none()
-
-        if not tag:
-            logger.warning(f"Interaction tag not found: {interaction_tag_id}")
-            return
-
-        total_count_stmt = (
-            select(func.count())
-            .where(ComponentInteractionLog.interaction_tag_id == interaction_tag_id)
-        )
-        total_count_result = await db.execute(total_count_stmt)
-        total_count = total_count_result.scalar() or 0
-
-        unique_member_stmt = (
-            select(func.count(func.distinct(ComponentInteractionLog.line_id)))
-            .where(ComponentInteractionLog.interaction_tag_id == interaction_tag_id)
-        )
-        unique_member_result = await db.execute(unique_member_stmt)
-        unique_members = unique_member_result.scalar() or 0
-
-        await db.execute(
-            update(InteractionTag)
-            .where(InteractionTag.id == interaction_tag_id)
-            .values(
-                trigger_count=total_count,
-                member_count=unique_members,
-                last_triggered_at=now_utc(),
-            )
-        )
-
-        logger.debug(f"Updated interaction tag {interaction_tag_id} stats: trigger_count={total_count}, members={unique_members}")
-
     async def _resolve_member_from_line_id(
         self,
         db: AsyncSession,
@@ -0,0 +1,46 @@
+"""add (item, line_id) indexes on component_interaction_logs for incremental stats
+
+Revision ID: 3c5d7e9f1a2b
+Revises: 9fff2f41b7e8
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5d7e9f1a2b'
+down_revision: Union[str, None] = '9fff2f41b7e8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "component_interaction_logs"
+INDEXES = {
+    "ix_component_interaction_logs_carousel_line": ["carousel_item_id", "line_id"],
+    "ix_component_interaction_logs_tag_line": ["interaction_tag_id", "line_id"],
+}
+
+
+def _has_index(bind, table, idx):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema=DATABASE() AND table_name=:t AND index_name=:i"
+    ), {"t": table, "i": idx}).scalar() > 0
+
+
+def upgrade() -> None:
+    # tracking_service 每次點擊以 (item, line_id) 查是否首次互動，取代全歷史 COUNT(DISTINCT)
+    bind = op.get_bind()
+    for name, cols in INDEXES.items():
+        if not _has_index(bind, TABLE, name):
+            op.create_index(name, TABLE, cols)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    for name in INDEXES:
+        if _has_index(bind, TABLE, name):
+            op.drop_index(name, table_name=TABLE)
@@ -0,0 +1,61 @@
+"""add scheduled_jobs table (DB-backed campaign scheduler with leasing)
+
+Revision ID: 5e7a9c1b3d4f
+Revises: 3c5d7e9f1a2b
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e7a9c1b3d4f'
+down_revision: Union[str, None] = '3c5d7e9f1a2b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "scheduled_jobs"
+
+
+def _has_table(bind, table):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.tables "
+        "WHERE table_schema=DATABASE() AND table_name=:t"
+    ), {"t": table}).scalar() > 0
+
+
+def upgrade() -> None:
+    # 排程任務改存 DB：多 worker 以租約（locked_by / locked_until）搶同一筆，避免重複發送
+    bind = op.get_bind()
+    if _has_table(bind, TABLE):
+        return
+    op.create_table(TABLE,
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False, comment='主鍵ID'),
+    sa.Column('job_key', sa.String(length=100), nullable=False, comment='任務識別（例：campaign_123）'),
+    sa.Column('job_type', sa.String(length=50), nullable=False, comment='任務類型：campaign'),
+    sa.Column('target_id', sa.BigInteger(), nullable=False, comment='目標 ID（campaign → messages.id）'),
+    sa.Column('scheduled_at', sa.DateTime(), nullable=False, comment='原定執行時間（UTC，補跑寬限以此判斷）'),
+    sa.Column('run_at', sa.DateTime(), nullable=False, comment='下次執行時間（UTC，重試時往後延）'),
+    sa.Column('status', sa.String(length=20), nullable=False, comment='狀態：pending/running/succeeded/failed/canceled/expired'),
+    sa.Column('attempts', sa.Integer(), nullable=False, server_default='0', comment='已執行次數'),
+    sa.Column('max_attempts', sa.Integer(), nullable=False, server_default='3', comment='最多執行次數'),
+    sa.Column('locked_by', sa.String(length=100), nullable=True, comment='持有租約的 worker'),
+    sa.Column('locked_until', sa.DateTime(), nullable=True, comment='租約到期時間（UTC）'),
+    sa.Column('last_error', sa.Text(), nullable=True, comment='最近一次錯誤'),
+    sa.Column('finished_at', sa.DateTime(), nullable=True, comment='結束時間（UTC）'),
+    sa.Column('created_at', sa.DateTime(), nullable=False, comment='創建時間'),
+    sa.Column('updated_at', sa.DateTime(), nullable=True, comment='更新時間'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('job_key', name='uq_scheduled_jobs_job_key'),
+    )
+    op.create_index('ix_scheduled_jobs_status_run_at', TABLE, ['status', 'run_at'])
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if _has_table(bind, TABLE):
+        op.drop_index('ix_scheduled_jobs_status_run_at', table_name=TABLE)
+        op.drop_table(TABLE)
@@ -0,0 +1,42 @@
+"""add (thread_id, platform, created_at, id) index on conversation_messages for keyset paging
+
+Revision ID: 7b9d1f3a5c6e
+Revises: 5e7a9c1b3d4f
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b9d1f3a5c6e'
+down_revision: Union[str, None] = '5e7a9c1b3d4f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "conversation_messages"
+INDEX = "ix_conversation_messages_thread_platform_created_id"
+COLUMNS = ["thread_id", "platform", "created_at", "id"]
+
+
+def _has_index(bind, table, idx):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema=DATABASE() AND table_name=:t AND index_name=:i"
+    ), {"t": table, "i": idx}).scalar() > 0
+
+
+def upgrade() -> None:
+    # 聊天紀錄游標分頁：WHERE thread_id, platform + (created_at, id) < 游標 ORDER BY created_at, id DESC
+    bind = op.get_bind()
+    if not _has_index(bind, TABLE, INDEX):
+        op.create_index(INDEX, TABLE, COLUMNS)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if _has_index(bind, TABLE, INDEX):
+        op.drop_index(INDEX, table_name=TABLE)
@@ -0,0 +1,59 @@
+"""add ngram FULLTEXT index on members for member search
+
+Revision ID: 9c2e4a6b8d1f
+Revises: 7b9d1f3a5c6e
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2e4a6b8d1f'
+down_revision: Union[str, None] = '7b9d1f3a5c6e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "members"
+INDEX = "ft_members_search"
+
+
+def _has_index(bind, table, idx):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema=DATABASE() AND table_name=:t AND index_name=:i"
+    ), {"t": table, "i": idx}).scalar() > 0
+
+
+def _create_index() -> None:
+    # InnoDB 預設的英文 stopword（a / i / com …）在 ngram parser 下會把含有它們的 token 整個丟掉，
+    # 「maria」「gmail」這類英文姓名 / email 就搜不到；stopword 設定在建索引當下決定，所以建索引時關掉
+    op.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+    try:
+        op.execute(
+            f"ALTER TABLE {TABLE} ADD FULLTEXT INDEX {INDEX} "
+            "(name, email, phone, line_display_name) WITH PARSER ngram"
+        )
+    finally:
+        op.execute("SET SESSION innodb_ft_enable_stopword = DEFAULT")
+
+
+def upgrade() -> None:
+    # 會員搜尋：取代 name / email / phone / line_display_name 四個 LIKE '%kw%' 全表掃描
+    # ngram parser 才能切中文姓名與手機號碼片段（token 長度 = ngram_token_size，預設 2）
+    bind = op.get_bind()
+    if bind.dialect.name != "mysql":
+        return
+    if not _has_index(bind, TABLE, INDEX):
+        _create_index()
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "mysql":
+        return
+    if _has_index(bind, TABLE, INDEX):
+        op.drop_index(INDEX, table_name=TABLE)
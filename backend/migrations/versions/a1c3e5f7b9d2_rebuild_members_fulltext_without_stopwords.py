@@ -0,0 +1,56 @@
+"""rebuild members FULLTEXT search index without stopwords
+
+Revision ID: a1c3e5f7b9d2
+Revises: f2b4d6e8a0c3
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1c3e5f7b9d2'
+down_revision: Union[str, None] = 'f2b4d6e8a0c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "members"
+INDEX = "ft_members_search"
+
+
+def _has_index(bind, table, idx):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema=DATABASE() AND table_name=:t AND index_name=:i"
+    ), {"t": table, "i": idx}).scalar() > 0
+
+
+def _create_index() -> None:
+    # stopword 設定在建索引當下決定：關掉後 a / i 等英文 stopword 不會讓 ngram token 被丟掉
+    op.execute("SET SESSION innodb_ft_enable_stopword = OFF")
+    try:
+        op.execute(
+            f"ALTER TABLE {TABLE} ADD FULLTEXT INDEX {INDEX} "
+            "(name, email, phone, line_display_name) WITH PARSER ngram"
+        )
+    finally:
+        op.execute("SET SESSION innodb_ft_enable_stopword = DEFAULT")
+
+
+def upgrade() -> None:
+    # 9c2e4a6b8d1f 原本用 InnoDB 預設 stopword 建索引，英文姓名 / email（maria、gmail）搜不到；
+    # 已套用過的環境在這裡重建
+    bind = op.get_bind()
+    if bind.dialect.name != "mysql":
+        return
+    if _has_index(bind, TABLE, INDEX):
+        op.drop_index(INDEX, table_name=TABLE)
+    _create_index()
+
+
+def downgrade() -> None:
+    # 沒有 stopword 的索引是 9c2e4a6b8d1f 的正確狀態，不需還原
+    pass
@@ -0,0 +1,80 @@
+"""add conversation_thread_summary table for member list last-message / unanswered / unread
+
+Revision ID: a4d6f8b0c2e3
+Revises: 9c2e4a6b8d1f
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4d6f8b0c2e3'
+down_revision: Union[str, None] = '9c2e4a6b8d1f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "conversation_thread_summary"
+
+# 一次性回填：每個 (thread, platform) 的最後訊息時間 / 未讀數 + 最後一則非群發訊息
+# 之後由寫入訊息的程式增量維護；需要時可用 scripts/rebuild_thread_summary.py 重建
+BACKFILL_SQL = """
+INSERT INTO conversation_thread_summary
+    (thread_id, platform, last_message_at, last_non_broadcast_at, last_non_broadcast_direction,
+     last_non_broadcast_source, last_unanswered, unread_count, updated_at)
+SELECT a.thread_id, a.platform, a.last_message_at, l.created_at, l.direction,
+       l.message_source, COALESCE(l.unanswered, 0), a.unread_count, UTC_TIMESTAMP()
+FROM (
+    SELECT thread_id, COALESCE(platform, 'LINE') AS platform, MAX(created_at) AS last_message_at,
+           SUM(direction = 'incoming' AND (status IS NULL OR status <> 'read')) AS unread_count
+    FROM conversation_messages
+    GROUP BY thread_id, COALESCE(platform, 'LINE')
+) a
+LEFT JOIN (
+    SELECT thread_id, COALESCE(platform, 'LINE') AS platform, created_at, direction, message_source, unanswered,
+           ROW_NUMBER() OVER (
+               PARTITION BY thread_id, COALESCE(platform, 'LINE') ORDER BY created_at DESC, id DESC
+           ) AS rn
+    FROM conversation_messages
+    WHERE message_source IS NULL OR message_source <> 'broadcast'
+) l ON l.thread_id = a.thread_id AND l.platform = a.platform AND l.rn = 1
+"""
+
+
+def _has_table(bind, table):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.tables "
+        "WHERE table_schema=DATABASE() AND table_name=:t"
+    ), {"t": table}).scalar() > 0
+
+
+def upgrade() -> None:
+    # 會員列表原本每次對 conversation_messages 全歷史跑兩次 GROUP BY thread_id MAX(created_at)
+    bind = op.get_bind()
+    if _has_table(bind, TABLE):
+        return
+    op.create_table(TABLE,
+    sa.Column('thread_id', sa.String(length=150), nullable=False, comment='對話串ID（= conversation_messages.thread_id）'),
+    sa.Column('platform', sa.String(length=20), nullable=False, comment='渠道類型：LINE / Facebook / Webchat（訊息 platform 為 NULL 視為 LINE）'),
+    sa.Column('last_message_at', sa.DateTime(), nullable=True, comment='最後訊息時間（含群發）'),
+    sa.Column('last_non_broadcast_at', sa.DateTime(), nullable=True, comment='最後一則非群發訊息時間'),
+    sa.Column('last_non_broadcast_direction', sa.String(length=20), nullable=True, comment='最後一則非群發訊息方向：incoming/outgoing'),
+    sa.Column('last_non_broadcast_source', sa.String(length=20), nullable=True, comment='最後一則非群發訊息來源'),
+    sa.Column('last_unanswered', sa.Boolean(), nullable=False, server_default='0', comment='最後一則非群發訊息是否為 AI 答不出（unanswered=1）'),
+    sa.Column('unread_count', sa.Integer(), nullable=False, server_default='0', comment='未讀的 incoming 訊息數'),
+    sa.Column('updated_at', sa.DateTime(), nullable=True, comment='更新時間'),
+    sa.PrimaryKeyConstraint('thread_id', 'platform'),
+    comment='對話摘要表',
+    )
+    op.create_index('ix_conversation_thread_summary_last_message', TABLE, ['last_message_at'])
+    op.execute(BACKFILL_SQL)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if _has_table(bind, TABLE):
+        op.drop_index('ix_conversation_thread_summary_last_message', table_name=TABLE)
+        op.drop_table(TABLE)
@@ -0,0 +1,125 @@
+"""add analytics rollup tables (message hourly / member daily / tag activity hourly)
+
+Revision ID: b5e7a9c1d3f4
+Revises: a4d6f8b0c2e3
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e7a9c1d3f4'
+down_revision: Union[str, None] = 'a4d6f8b0c2e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 彙總表不在 migration 回填：backend 啟動後由 analytics_rollup worker 從最早一天分批補算
+# （或手動執行 scripts/rebuild_analytics_rollups.py）
+SOURCE_INDEXES = [
+    ("members", "ix_members_created_at", ["created_at"]),
+    ("tag_trigger_logs", "ix_tag_trigger_logs_triggered_at", ["triggered_at"]),
+]
+
+
+def _has_table(bind, table):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.tables "
+        "WHERE table_schema=DATABASE() AND table_name=:t"
+    ), {"t": table}).scalar() > 0
+
+
+def _has_index(bind, table, idx):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema=DATABASE() AND table_name=:t AND index_name=:i"
+    ), {"t": table, "i": idx}).scalar() > 0
+
+
+def upgrade() -> None:
+    # 數據洞察 API 原本每次請求都對原始資料 CONVERT_TZ 後 GROUP BY（WHERE 套函數用不到索引）
+    bind = op.get_bind()
+
+    if not _has_table(bind, "analytics_message_hourly"):
+        op.create_table('analytics_message_hourly',
+        sa.Column('bucket_date', sa.Date(), nullable=False, comment='日期（營運時區）'),
+        sa.Column('bucket_hour', sa.SmallInteger(), autoincrement=False, nullable=False, comment='小時 0-23（營運時區）'),
+        sa.Column('tenant_id', sa.BigInteger(), autoincrement=False, nullable=False, comment='會員所屬組織 ID（0 = 無對應會員）'),
+        sa.Column('line_channel_id', sa.String(length=100), nullable=False, comment="會員所屬 LINE channel_id（'' = 無）"),
+        sa.Column('platform', sa.String(length=20), nullable=False, comment='渠道類型：LINE / Facebook / Webchat（NULL 視為 LINE）'),
+        sa.Column('message_source', sa.String(length=20), nullable=False, comment="訊息來源（'' = 未標記）"),
+        sa.Column('direction', sa.String(length=20), nullable=False, comment='方向：incoming / outgoing'),
+        sa.Column('message_count', sa.Integer(), nullable=False, comment='訊息數'),
+        sa.Column('unanswered_count', sa.Integer(), nullable=False, comment='AI 答不出（unanswered=1）訊息數'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True, comment='重算時間'),
+        sa.PrimaryKeyConstraint('bucket_date', 'bucket_hour', 'tenant_id', 'line_channel_id', 'platform', 'message_source', 'direction'),
+        comment='對話訊息每小時彙總（營運時區）',
+        )
+        op.create_index('ix_analytics_message_hourly_date', 'analytics_message_hourly', ['bucket_date'])
+
+    if not _has_table(bind, "analytics_member_daily"):
+        op.create_table('analytics_member_daily',
+        sa.Column('bucket_date', sa.Date(), nullable=False, comment='日期（營運時區，依 members.created_at）'),
+        sa.Column('tenant_id', sa.BigInteger(), autoincrement=False, nullable=False, comment='所屬組織 ID（0 = 無）'),
+        sa.Column('line_channel_id', sa.String(length=100), nullable=False, comment="LINE channel_id（'' = 無）"),
+        sa.Column('has_line', sa.Boolean(), nullable=False, comment='有 line_uid'),
+        sa.Column('has_fb', sa.Boolean(), nullable=False, comment='有 fb_customer_id'),
+        sa.Column('has_webchat', sa.Boolean(), nullable=False, comment='有 webchat_uid'),
+        sa.Column('new_members', sa.Integer(), nullable=False, comment='新增會員數'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True, comment='重算時間'),
+        sa.PrimaryKeyConstraint('bucket_date', 'tenant_id', 'line_channel_id', 'has_line', 'has_fb', 'has_webchat'),
+        comment='新增會員每日彙總（營運時區）',
+        )
+        op.create_index('ix_analytics_member_daily_date', 'analytics_member_daily', ['bucket_date'])
+
+    if not _has_table(bind, "analytics_tag_activity_hourly"):
+        op.create_table('analytics_tag_activity_hourly',
+        sa.Column('bucket_date', sa.Date(), nullable=False, comment='日期（營運時區）'),
+        sa.Column('bucket_hour', sa.SmallInteger(), autoincrement=False, nullable=False, comment='小時 0-23（營運時區）'),
+        sa.Column('member_id', sa.BigInteger(), autoincrement=False, nullable=False, comment='會員ID'),
+        sa.Column('tenant_id', sa.BigInteger(), autoincrement=False, nullable=False, comment='所屬組織 ID（0 = 無）'),
+        sa.Column('channel_id', sa.String(length=100), nullable=False, comment="頻道識別（'' = 無）"),
+        sa.Column('trigger_source', sa.String(length=20), nullable=False, comment='觸發來源（與 tag_trigger_logs 相同）'),
+        sa.Column('event_count', sa.Integer(), nullable=False, comment='觸發次數'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True, comment='重算時間'),
+        sa.PrimaryKeyConstraint('bucket_date', 'bucket_hour', 'member_id', 'tenant_id', 'channel_id', 'trigger_source'),
+        comment='標籤觸發每小時彙總（營運時區）',
+        )
+        op.create_index(
+            'ix_analytics_tag_activity_hourly_date', 'analytics_tag_activity_hourly', ['bucket_date', 'bucket_hour']
+        )
+
+    if not _has_table(bind, "analytics_rollup_state"):
+        op.create_table('analytics_rollup_state',
+        sa.Column('name', sa.String(length=50), nullable=False, comment='彙總表名稱'),
+        sa.Column('complete_through', sa.Date(), nullable=True, comment='已定案（不再重算）的最後一天（營運時區）'),
+        sa.Column('locked_by', sa.String(length=100), nullable=True, comment='持有重算租約的 worker'),
+        sa.Column('locked_until', sa.DateTime(), nullable=True, comment='租約到期時間（UTC）'),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=True, comment='最近一次重算完成時間（UTC）'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True, comment='更新時間'),
+        sa.PrimaryKeyConstraint('name'),
+        comment='數據洞察彙總水位線',
+        )
+
+    # 重算時以時間區間掃原始資料（conversation_messages.created_at 已有索引）
+    for table, idx, cols in SOURCE_INDEXES:
+        if not _has_index(bind, table, idx):
+            op.create_index(idx, table, cols)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    for table, idx, _ in SOURCE_INDEXES:
+        if _has_index(bind, table, idx):
+            op.drop_index(idx, table_name=table)
+    for table in (
+        "analytics_rollup_state",
+        "analytics_tag_activity_hourly",
+        "analytics_member_daily",
+        "analytics_message_hourly",
+    ):
+        if _has_table(bind, table):
+            op.drop_table(table)
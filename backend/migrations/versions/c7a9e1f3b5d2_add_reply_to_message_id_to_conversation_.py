@@ -0,0 +1,75 @@
+"""add reply_to_message_id to conversation_messages (link AI replies to the triggering question)
+
+Revision ID: c7a9e1f3b5d2
+Revises: b5e7a9c1d3f4
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7a9e1f3b5d2'
+down_revision: Union[str, None] = 'b5e7a9c1d3f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLE = "conversation_messages"
+COLUMN = "reply_to_message_id"
+
+# 一次性回填：既有 AI 回覆 → 同 thread 在它之前（含同秒）最近一筆 incoming
+# 先落到暫存表再 UPDATE JOIN（MySQL 不允許 UPDATE 的子查詢讀同一張表）
+BACKFILL_SQL = [
+    """
+    CREATE TEMPORARY TABLE tmp_reply_to AS
+    SELECT a.id,
+           (
+               SELECT u.id
+               FROM conversation_messages u
+               WHERE u.thread_id = a.thread_id
+                 AND u.direction = 'incoming'
+                 AND u.created_at <= a.created_at
+               ORDER BY u.created_at DESC, u.id DESC
+               LIMIT 1
+           ) AS question_id
+    FROM conversation_messages a
+    WHERE a.message_source = 'gpt'
+      AND a.direction = 'outgoing'
+      AND a.reply_to_message_id IS NULL
+    """,
+    """
+    UPDATE conversation_messages m
+    JOIN tmp_reply_to t ON t.id = m.id
+    SET m.reply_to_message_id = t.question_id
+    WHERE t.question_id IS NOT NULL
+    """,
+    "DROP TEMPORARY TABLE tmp_reply_to",
+]
+
+
+def _has_column(bind, table, column):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.columns "
+        "WHERE table_schema=DATABASE() AND table_name=:t AND column_name=:c"
+    ), {"t": table, "c": column}).scalar() > 0
+
+
+def upgrade() -> None:
+    # 未解問題 top N 原本每筆都跑一次相關子查詢找「前一筆 incoming」
+    bind = op.get_bind()
+    if not _has_column(bind, TABLE, COLUMN):
+        op.add_column(TABLE, sa.Column(
+            COLUMN, sa.String(length=100), nullable=True,
+            comment='自動回覆所回應的使用者訊息ID（寫入回覆時帶入；未解問題報表直接以主鍵取回觸發問題）',
+        ))
+    for sql in BACKFILL_SQL:
+        op.execute(sql)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if _has_column(bind, TABLE, COLUMN):
+        op.drop_column(TABLE, COLUMN)
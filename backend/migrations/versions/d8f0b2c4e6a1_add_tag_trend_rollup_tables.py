@@ -0,0 +1,84 @@
+"""add tag trend rollup tables (tag trigger daily / member tag daily)
+
+Revision ID: d8f0b2c4e6a1
+Revises: c7a9e1f3b5d2
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f0b2c4e6a1'
+down_revision: Union[str, None] = 'c7a9e1f3b5d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 彙總表不在 migration 回填：backend 啟動後由 analytics_rollup worker 從最早一天分批補算
+# （或手動執行 scripts/rebuild_analytics_rollups.py --only tag_trigger_daily --only member_tag_daily）
+SOURCE_INDEXES = [
+    ("member_tags", "ix_member_tags_tagged_at", ["tagged_at"]),
+]
+
+
+def _has_table(bind, table):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.tables "
+        "WHERE table_schema=DATABASE() AND table_name=:t"
+    ), {"t": table}).scalar() > 0
+
+
+def _has_index(bind, table, idx):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema=DATABASE() AND table_name=:t AND index_name=:i"
+    ), {"t": table, "i": idx}).scalar() > 0
+
+
+def upgrade() -> None:
+    # 標籤趨勢圖原本每天 × 每個標籤各跑一兩次 COUNT（30 天約 1,200 次查詢）
+    bind = op.get_bind()
+
+    if not _has_table(bind, "analytics_tag_trigger_daily"):
+        op.create_table('analytics_tag_trigger_daily',
+        sa.Column('bucket_date', sa.Date(), nullable=False, comment='日期（營運時區）'),
+        sa.Column('tag_id', sa.BigInteger(), autoincrement=False, nullable=False, comment='標籤 ID（tag_trigger_logs.tag_id）'),
+        sa.Column('trigger_count', sa.Integer(), nullable=False, comment='觸發次數'),
+        sa.Column('member_count', sa.Integer(), nullable=False, comment='當日不重複觸發會員數'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True, comment='重算時間'),
+        sa.PrimaryKeyConstraint('bucket_date', 'tag_id'),
+        comment='標籤觸發每日彙總（營運時區）',
+        )
+        op.create_index(
+            'ix_analytics_tag_trigger_daily_tag', 'analytics_tag_trigger_daily', ['tag_id', 'bucket_date']
+        )
+
+    if not _has_table(bind, "analytics_member_tag_daily"):
+        op.create_table('analytics_member_tag_daily',
+        sa.Column('bucket_date', sa.Date(), nullable=False, comment='日期（營運時區，依 member_tags.tagged_at）'),
+        sa.Column('tag_name', sa.String(length=20), nullable=False, comment='標籤名稱'),
+        sa.Column('tagged_count', sa.Integer(), nullable=False, comment='新貼標筆數'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True, comment='重算時間'),
+        sa.PrimaryKeyConstraint('bucket_date', 'tag_name'),
+        comment='會員貼標每日彙總（營運時區）',
+        )
+        op.create_index(
+            'ix_analytics_member_tag_daily_tag', 'analytics_member_tag_daily', ['tag_name', 'bucket_date']
+        )
+
+    for table, idx, cols in SOURCE_INDEXES:
+        if not _has_index(bind, table, idx):
+            op.create_index(idx, table, cols)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    for table, idx, _ in SOURCE_INDEXES:
+        if _has_index(bind, table, idx):
+            op.drop_index(idx, table_name=table)
+    for table in ("analytics_member_tag_daily", "analytics_tag_trigger_daily"):
+        if _has_table(bind, table):
+            op.drop_table(table)
@@ -0,0 +1,51 @@
+"""add chatbot_session_states (shared AI booking session store)
+
+Revision ID: e0a2c4d6f8b1
+Revises: d8f0b2c4e6a1
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e0a2c4d6f8b1'
+down_revision: Union[str, None] = 'd8f0b2c4e6a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(bind, table):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.tables "
+        "WHERE table_schema=DATABASE() AND table_name=:t"
+    ), {"t": table}).scalar() > 0
+
+
+def upgrade() -> None:
+    # CHATBOT_SESSION_STORE=db 時 AI 訂房對話 session 存這張表，多個 worker 共用
+    bind = op.get_bind()
+
+    if not _has_table(bind, "chatbot_session_states"):
+        op.create_table('chatbot_session_states',
+        sa.Column('browser_key', sa.String(length=100), nullable=False, comment='Session key：官網 browser_key / LINE line_uid'),
+        sa.Column('version', sa.Integer(), nullable=False, comment='樂觀鎖版本，每次寫回 +1'),
+        sa.Column('payload', mysql.MEDIUMBLOB(), nullable=False, comment='ChatbotSessionState（省略預設值的 JSON，zlib 壓縮）'),
+        sa.Column('expires_at', sa.DateTime(), nullable=False, comment='過期時間（UTC，最後寫回 + TTL）'),
+        sa.Column('updated_at', sa.DateTime(), nullable=True, comment='最後寫回時間（UTC）'),
+        sa.PrimaryKeyConstraint('browser_key'),
+        comment='AI 訂房對話 session 狀態（壓縮 JSON + 樂觀鎖版本）',
+        )
+        op.create_index(
+            'ix_chatbot_session_states_expires_at', 'chatbot_session_states', ['expires_at']
+        )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if _has_table(bind, "chatbot_session_states"):
+        op.drop_table('chatbot_session_states')
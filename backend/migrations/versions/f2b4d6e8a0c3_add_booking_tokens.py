@@ -0,0 +1,49 @@
+"""add booking_tokens (shared LINE booking link tokens)
+
+Revision ID: f2b4d6e8a0c3
+Revises: e0a2c4d6f8b1
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2b4d6e8a0c3'
+down_revision: Union[str, None] = 'e0a2c4d6f8b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(bind, table):
+    return bind.execute(sa.text(
+        "SELECT COUNT(*) FROM information_schema.tables "
+        "WHERE table_schema=DATABASE() AND table_name=:t"
+    ), {"t": table}).scalar() > 0
+
+
+def upgrade() -> None:
+    # BOOKING_TOKEN_STORE=db 時 LINE 房卡訂房連結 token 存這張表，多個 worker 共用
+    bind = op.get_bind()
+
+    if not _has_table(bind, "booking_tokens"):
+        op.create_table('booking_tokens',
+        sa.Column('token', sa.String(length=64), nullable=False, comment='訂房連結 token'),
+        sa.Column('line_uid', sa.String(length=100), nullable=False, comment='LINE 使用者 UID'),
+        sa.Column('data', sa.JSON(), nullable=True, comment='表單預填資料：rooms / checkin / checkout / member'),
+        sa.Column('clicked_roomtypes', sa.String(length=500), server_default=',', nullable=False, comment='此 token 已記錄點擊的房型代碼（,WS,DS, 格式，房卡點擊去重用）'),
+        sa.Column('expires_at', sa.DateTime(), nullable=False, comment='過期時間（UTC）'),
+        sa.Column('created_at', sa.DateTime(), nullable=False, comment='創建時間'),
+        sa.PrimaryKeyConstraint('token'),
+        comment='訂房表單 token（line_uid + 房型資料，用完即棄）',
+        )
+        op.create_index('ix_booking_tokens_expires_at', 'booking_tokens', ['expires_at'])
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if _has_table(bind, "booking_tokens"):
+        op.drop_table('booking_tokens')
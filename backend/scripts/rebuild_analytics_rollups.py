@@ -0,0 +1,44 @@
+"""
+重建數據洞察彙總表（analytics_message_hourly / analytics_member_daily / analytics_tag_activity_hourly /
+analytics_tag_trigger_daily / analytics_member_tag_daily）
+
+平常由 backend 背景 worker 每 ANALYTICS_ROLLUP_REFRESH_SECONDS 秒增量重算；
+已定案的日期不會再重算，修改 / 刪除 / 匯入歷史資料後執行：
+    python scripts/rebuild_analytics_rollups.py                       # 全部從頭重建
+    python scripts/rebuild_analytics_rollups.py --since 2026-01-01    # 只重建該日（含）以後
+    python scripts/rebuild_analytics_rollups.py --only member_daily   # 只重建指定彙總表
+ANALYTICS_ROLLUP_REFRESH_SECONDS=0 的環境也可以用 --refresh 排程執行（只做增量重算，不退水位線）
+"""
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+
+from app.database import AsyncSessionLocal
+from app.services.analytics_rollup import ROLLUPS, analytics_rollup_worker, reset_rollups
+
+
+async def main(names, since, refresh_only):
+    if not refresh_only:
+        async with AsyncSessionLocal() as session:
+            await reset_rollups(session, names, since)
+    results = await analytics_rollup_worker.refresh(names)
+    for name in names:
+        days = results.get(name)
+        if days is None:
+            print(f"⚠️  {name}：其他 worker 正在重算或發生錯誤，請稍後再試")
+        else:
+            print(f"✅ {name}：已重算 {days} 天")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="重建數據洞察彙總表")
+    parser.add_argument("--since", type=date.fromisoformat, help="只重建此日期（營運時區，含）以後")
+    parser.add_argument("--only", choices=sorted(ROLLUPS), action="append", help="只處理指定彙總表（可重複）")
+    parser.add_argument("--refresh", action="store_true", help="只做增量重算")
+    args = parser.parse_args()
+    asyncio.run(main(args.only or list(ROLLUPS), args.since, args.refresh))
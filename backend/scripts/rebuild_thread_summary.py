@@ -0,0 +1,39 @@
+"""
+從 conversation_messages 重建對話摘要（conversation_thread_summary）
+
+平常由寫入訊息的程式增量維護；手動修改 / 匯入訊息後，或懷疑摘要與訊息不一致時執行：
+    python scripts/rebuild_thread_summary.py              # 全部重建
+    python scripts/rebuild_thread_summary.py U123 U456    # 只重建指定 thread
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import argparse
+import asyncio
+
+from app.database import AsyncSessionLocal
+from app.services.thread_summary import (
+    REBUILD_BATCH_SIZE,
+    rebuild_all_thread_summaries,
+    rebuild_thread_summaries,
+)
+
+
+async def main(thread_ids, batch_size):
+    async with AsyncSessionLocal() as session:
+        if thread_ids:
+            count = await rebuild_thread_summaries(session, thread_ids)
+            await session.commit()
+        else:
+            count = await rebuild_all_thread_summaries(session, batch_size=batch_size)
+    print(f"✅ 已重建 {count} 筆對話摘要")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="重建 conversation_thread_summary")
+    parser.add_argument("thread_ids", nargs="*", help="只重建這些 thread（預設全部）")
+    parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE)
+    args = parser.parse_args()
+    asyncio.run(main(args.thread_ids, args.batch_size))
@@ -0,0 +1,290 @@
+import asyncio
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from sqlalchemy import BigInteger, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+
+import app.models  # noqa: F401  — 註冊所有 FK 參照的表
+from app.api.v1.analytics import (
+    get_ai_coverage,
+    get_new_members,
+    get_pending_conversations,
+    get_time_slot_insights,
+)
+from app.api.v1.tags import get_tag_trends
+from app.models.analytics_rollup import (
+    AnalyticsMemberDaily,
+    AnalyticsMemberTagDaily,
+    AnalyticsMessageHourly,
+    AnalyticsRollupState,
+    AnalyticsTagActivityHourly,
+    AnalyticsTagTriggerDaily,
+)
+from app.models.conversation import ConversationMessage, ConversationThread, ConversationThreadSummary
+from app.models.member import Member
+from app.models.tag import InteractionTag, MemberTag
+from app.models.tag_trigger_log import TagTriggerLog, TriggerSource
+from app.services import analytics_rollup
+from app.services.analytics_rollup import (
+    MESSAGE_HOURLY,
+    ROLLUPS,
+    local_today,
+    refresh_rollup,
+    reset_rollups,
+    utc_bounds,
+)
+from app.services.thread_summary import rebuild_thread_summaries
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_sqlite(type_, compiler, **kw):
+    return "INTEGER"
+
+
+# 台北 = UTC+8：UTC 2026-01-01 16:30 是台北 2026-01-02 00:30
+NOW = datetime(2026, 1, 5, 0, 0, 0)  # 台北 2026-01-05 08:00
+
+TABLES = (
+    Member, ConversationThread, ConversationMessage, ConversationThreadSummary, TagTriggerLog,
+    MemberTag, InteractionTag,
+    AnalyticsMessageHourly, AnalyticsMemberDaily, AnalyticsTagActivityHourly, AnalyticsRollupState,
+    AnalyticsTagTriggerDaily, AnalyticsMemberTagDaily,
+)
+
+
+def test_utc_bounds_follow_operating_timezone():
+    assert utc_bounds(date(2026, 1, 2), date(2026, 1, 3)) == (
+        datetime(2026, 1, 1, 16, 0), datetime(2026, 1, 3, 16, 0),
+    )
+    assert local_today(datetime(2026, 1, 1, 16, 0)) == date(2026, 1, 2)
+
+
+def _msg(i, tid, platform, direction, source, at, unanswered=False, reply_to=None):
+    return ConversationMessage(
+        id=f"m{i}", thread_id=tid, platform=platform, direction=direction,
+        message_source=source, unanswered=unanswered, status="sent", content=f"c{i}", created_at=at,
+        reply_to_message_id=reply_to,
+    )
+
+
+async def _seed(db):
+    db.add_all([
+        Member(id=1, line_uid="U1", line_channel_id="C1", tenant_id=1, line_display_name="阿明",
+               created_at=datetime(2026, 1, 1, 20, 0)),
+        Member(id=2, webchat_uid="W1", tenant_id=2, name="訪客", created_at=datetime(2026, 1, 1, 2, 0)),
+        ConversationThread(id="U1", platform="LINE", platform_uid="U1"),
+        ConversationThread(id="W1", platform="Webchat", platform_uid="W1"),
+        ConversationThread(id="X9", platform="LINE", platform_uid="X9"),
+    ])
+    await db.flush()
+    db.add_all([
+        _msg(1, "U1", "LINE", "incoming", "webhook", datetime(2026, 1, 1, 16, 20)),
+        _msg(2, "U1", "LINE", "outgoing", "gpt", datetime(2026, 1, 1, 16, 30), unanswered=True, reply_to="m1"),
+        _msg(3, "U1", "LINE", "outgoing", "gpt", datetime(2026, 1, 1, 17, 45)),
+        _msg(4, "U1", "LINE", "outgoing", "broadcast", datetime(2026, 1, 1, 18, 0)),
+        _msg(5, "W1", "Webchat", "outgoing", "gpt", datetime(2026, 1, 1, 10, 0)),
+        _msg(6, "X9", "LINE", "outgoing", "gpt", datetime(2026, 1, 1, 10, 5)),  # 無對應會員
+        TagTriggerLog(member_id=1, tag_id=11, tag_name="訂房", trigger_source=TriggerSource.INTERACTION,
+                      triggered_at=datetime(2026, 1, 1, 17, 0), channel_id="C1", tenant_id=1),
+        TagTriggerLog(member_id=1, tag_id=11, tag_name="訂房", trigger_source=TriggerSource.INTERACTION,
+                      triggered_at=datetime(2026, 1, 1, 17, 10), channel_id="C1", tenant_id=1),
+        TagTriggerLog(member_id=1, tag_id=12, tag_name="早餐", trigger_source=TriggerSource.CLICK,
+                      triggered_at=datetime(2026, 1, 1, 17, 30), channel_id="C1", tenant_id=1),
+        TagTriggerLog(member_id=1, tag_name="VIP", trigger_source=TriggerSource.MANUAL,
+                      triggered_at=datetime(2026, 1, 2, 2, 0), channel_id="C1", tenant_id=1),
+        MemberTag(id=21, member_id=1, tag_name="VIP", trigger_member_count=1, tagged_at=datetime(2026, 1, 1, 20, 0)),
+        InteractionTag(id=11, tag_name="訂房", trigger_count=2),
+        InteractionTag(id=12, tag_name="早餐", trigger_count=1),
+    ])
+    await db.commit()
+
+
+async def _with_db(body):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        for model in TABLES:
+            await conn.run_sync(model.__table__.create)
+    try:
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            await _seed(db)
+            return await body(db)
+    finally:
+        await engine.dispose()
+
+
+async def _refresh_all(db, now=NOW, worker="w1"):
+    return {name: await refresh_rollup(db, name, worker, now=now) for name in ROLLUPS}
+
+
+def test_refresh_buckets_by_operating_day_and_advances_watermark():
+    async def body(db):
+        days = await _refresh_all(db)
+        hourly = (await db.execute(select(AnalyticsMessageHourly))).scalars().all()
+        state = (await db.execute(select(AnalyticsRollupState))).scalars().all()
+        return days, hourly, state
+
+    days, hourly, state = asyncio.run(_with_db(body))
+    # 從各自最早資料的那天重算到今天（台北 1/5）：訊息 / 會員 1/1 起，標籤觸發 / 貼標 1/2 起
+    assert days == {
+        "message_hourly": 5, "member_daily": 5, "tag_activity_hourly": 4,
+        "tag_trigger_daily": 4, "member_tag_daily": 4,
+    }
+    # 1/5 尚未結束、1/4 結束後已過 settle → 水位線停在 1/4，租約已釋放
+    assert {s.name: s.complete_through for s in state} == {name: date(2026, 1, 4) for name in ROLLUPS}
+    assert all(s.locked_by is None and s.refreshed_at is not None for s in state)
+
+    gpt = {
+        (r.bucket_date, r.bucket_hour, r.tenant_id, r.line_channel_id): (r.message_count, r.unanswered_count)
+        for r in hourly if r.message_source == "gpt"
+    }
+    assert gpt == {
+        (date(2026, 1, 2), 0, 1, "C1"): (1, 1),
+        (date(2026, 1, 2), 1, 1, "C1"): (1, 0),
+        (date(2026, 1, 1), 18, 2, ""): (1, 0),
+        (date(2026, 1, 1), 18, 0, ""): (1, 0),
+    }
+
+
+def test_refresh_only_recomputes_after_watermark_and_respects_lease():
+    async def body(db):
+        await _refresh_all(db)
+        db.add(ConversationThread(id="U2", platform="LINE", platform_uid="U2"))
+        await db.flush()
+        db.add(_msg(7, "U2", "LINE", "outgoing", "gpt", datetime(2026, 1, 5, 1, 0)))
+        await db.commit()
+
+        later = NOW + timedelta(hours=2)
+        incremental = await refresh_rollup(db, MESSAGE_HOURLY, "w1", now=later)
+
+        await db.execute(
+            update(AnalyticsRollupState)
+            .where(AnalyticsRollupState.name == MESSAGE_HOURLY)
+            .values(locked_by="w2", locked_until=later + timedelta(minutes=5))
+        )
+        await db.commit()
+        blocked = await refresh_rollup(db, MESSAGE_HOURLY, "w1", now=later)
+
+        rows = (await db.execute(
+            select(AnalyticsMessageHourly).where(AnalyticsMessageHourly.bucket_date == date(2026, 1, 5))
+        )).scalars().all()
+        return incremental, blocked, rows
+
+    incremental, blocked, rows = asyncio.run(_with_db(body))
+    assert incremental == 1  # 只重算水位線隔天（1/5）
+    assert blocked is None
+    assert [(r.bucket_hour, r.message_count) for r in rows] == [(9, 1)]
+
+
+def test_reset_rebuilds_from_since():
+    async def body(db):
+        await _refresh_all(db)
+        await reset_rollups(db, [MESSAGE_HOURLY], since=date(2026, 1, 2))
+        state = await db.get(AnalyticsRollupState, MESSAGE_HOURLY)
+        remaining = (await db.execute(select(AnalyticsMessageHourly.bucket_date))).scalars().all()
+        days = await refresh_rollup(db, MESSAGE_HOURLY, "w1", now=NOW)
+        return state.complete_through, set(remaining), days
+
+    watermark, remaining, days = asyncio.run(_with_db(body))
+    assert watermark == date(2026, 1, 1)
+    assert remaining == {date(2026, 1, 1)}
+    assert days == 4
+
+
+def test_dashboard_endpoints_read_rollups():
+    async def body(db):
+        await _refresh_all(db)
+        # 群發之後使用者又來訊：待回覆（群發不算回覆）
+        db.add(_msg(8, "U1", "LINE", "incoming", "webhook", datetime(2026, 1, 1, 19, 0)))
+        await db.flush()
+        await rebuild_thread_summaries(db, ["U1", "W1", "X9"])
+        await db.commit()
+
+        coverage = await get_ai_coverage(
+            start_date="2026-01-01", end_date="2026-01-05", top_n=10, line_channel_id=None, tenant_id=None, db=db,
+        )
+        scoped = await get_ai_coverage(
+            start_date="2026-01-01", end_date="2026-01-05", top_n=10, line_channel_id=None, tenant_id=1, db=db,
+        )
+        members_all = await get_new_members(
+            start_date="2026-01-01", end_date="2026-01-05", source="all", line_channel_id=None, tenant_id=None, db=db,
+        )
+        members_line = await get_new_members(
+            start_date="2026-01-01", end_date="2026-01-05", source="line", line_channel_id=None, tenant_id=None, db=db,
+        )
+        slots = await get_time_slot_insights(
+            channel="line", line_channel_id="C1", tenant_id=None, end_date="2026-01-05", db=db,
+        )
+        pending = await get_pending_conversations(limit=50, line_channel_id=None, tenant_id=1, db=db)
+        return coverage, scoped, members_all, members_line, slots, pending
+
+    coverage, scoped, members_all, members_line, slots, pending = asyncio.run(_with_db(body))
+
+    assert [(d.date, d.total, d.unanswered) for d in coverage.daily] == [
+        ("2026-01-01", 2, 0), ("2026-01-02", 2, 1),
+    ]
+    assert (coverage.total, coverage.unanswered, coverage.coverage_rate) == (4, 1, 75.0)
+    assert [(d.date, d.total) for d in scoped.daily] == [("2026-01-02", 2)]
+    assert [q.message_id for q in scoped.top_unanswered] == ["m2"]
+    assert scoped.top_unanswered[0].question == "c1"
+
+    assert [(d.date, d.count) for d in members_all.daily] == [("2026-01-01", 1), ("2026-01-02", 1)]
+    assert [(d.date, d.count) for d in members_line.daily] == [("2026-01-02", 1)]
+
+    # 1/2 在 7 天（12/30 ~ 1/5）的第 4 欄；台北 00:00-04:00 = 第 0 時段；MANUAL 不計
+    assert slots.matrix[0][3] == 1
+    assert sum(map(sum, slots.matrix)) == 1
+    assert slots.total_unique_members == 1
+
+    assert pending.total == 1
+    assert [(i.thread_id, i.member_id, i.display_name, i.question, i.reason) for i in pending.items] == [
+        ("U1", 1, "阿明", "c8", "no_reply"),
+    ]
+
+
+def test_tag_trends_read_daily_rollups(monkeypatch):
+    today = analytics_rollup.local_today
+    monkeypatch.setattr(analytics_rollup, "local_today", lambda now=None: today(now or NOW))
+
+    async def body(db):
+        await _refresh_all(db)
+        # 已定案的 1/2 補進另一位會員的觸發，重建後不重複會員數 = 2
+        db.add(TagTriggerLog(member_id=2, tag_id=11, tag_name="訂房", trigger_source=TriggerSource.CLICK,
+                             triggered_at=datetime(2026, 1, 2, 3, 0), tenant_id=2))
+        await db.commit()
+        await reset_rollups(db, [analytics_rollup.TAG_TRIGGER_DAILY], since=date(2026, 1, 2))
+        await refresh_rollup(db, analytics_rollup.TAG_TRIGGER_DAILY, "w1", now=NOW)
+        daily = (await db.execute(select(AnalyticsTagTriggerDaily))).scalars().all()
+        resp = await get_tag_trends(days=5, db=db)
+        return daily, resp.data
+
+    daily, data = asyncio.run(_with_db(body))
+    # 台北 1/2 01:00 ~ 11:00 都算 1/2
+    assert {(r.bucket_date, r.tag_id): (r.trigger_count, r.member_count) for r in daily} == {
+        (date(2026, 1, 2), 11): (3, 2),
+        (date(2026, 1, 2), 12): (1, 1),
+    }
+    assert [t["date"] for t in data["trends"]] == ["01/01", "01/02", "01/03", "01/04", "01/05"]
+    jan2 = data["trends"][1]
+    assert (jan2["訂房_trigger"], jan2["訂房_member"]) == (3, 2)
+    assert (jan2["早餐_trigger"], jan2["早餐_member"]) == (1, 1)
+    assert (jan2["VIP_trigger"], jan2["VIP_member"]) == (0, 1)
+    assert data["trends"][0]["訂房_trigger"] == 0
+
+
+def test_worker_disabled_when_interval_is_zero(monkeypatch):
+    monkeypatch.setattr(analytics_rollup.settings, "ANALYTICS_ROLLUP_REFRESH_SECONDS", 0)
+    worker = analytics_rollup.AnalyticsRollupWorker()
+    worker.start()
+    assert worker._task is None
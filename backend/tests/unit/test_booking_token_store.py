@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.timezone import now_utc
+from app.models.booking import BookingToken
+from app.services import booking_token_store as store_module
+from app.services.booking_token_store import DbBookingTokenStore, InMemoryBookingTokenStore
+
+DATA = {"rooms": [{"room_type_code": "WS", "room_count": 1}], "checkin": "2026-11-01"}
+
+
+async def _with_db_store(body):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(BookingToken.__table__.create)
+    try:
+        return await body(DbBookingTokenStore(3600, async_sessionmaker(engine, expire_on_commit=False)), engine)
+    finally:
+        await engine.dispose()
+
+
+def test_memory_store_consumes_once_and_expires_by_heap(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(store_module.time, "time", lambda: clock[0])
+
+    async def body():
+        store = InMemoryBookingTokenStore(60)
+        token = await store.issue("U1", DATA)
+        stale = await store.issue("U2")
+        assert await store.peek(token) == {"line_uid": "U1", "data": DATA}
+        assert await store.consume(token) == {"line_uid": "U1", "data": DATA}
+        assert await store.consume(token) is None
+
+        clock[0] += 61
+        assert await store.peek(stale) is None
+        return store
+
+    store = asyncio.run(body())
+    metrics = store.metrics()
+    assert (metrics["issued"], metrics["consumed"], metrics["expired"], metrics["active"]) == (2, 1, 1, 0)
+    assert (metrics["hits"], metrics["misses"]) == (2, 2)
+    assert store._heap == []
+
+
+def test_memory_store_click_claims_are_per_token():
+    async def body():
+        store = InMemoryBookingTokenStore(60)
+        token = await store.issue("U1")
+        first = await store.claim_click(token, "WS")
+        again = await store.claim_click(token, "WS")
+        await store.release_click(token, "WS")
+        retried = await store.claim_click(token, "WS")
+        return first, again, retried, await store.claim_click("missing", "WS")
+
+    assert asyncio.run(body()) == (True, False, True, False)
+
+
+def test_db_store_shares_tokens_and_consumes_once():
+    async def body(store, engine):
+        token = await store.issue("U1", DATA)
+        # 另一個 worker：同一張表、不同 store 實例
+        other = DbBookingTokenStore(3600, store._session_factory)
+        assert await other.peek(token) == {"line_uid": "U1", "data": DATA}
+
+        assert await other.claim_click(token, "WS") is True
+        assert await store.claim_click(token, "WS") is False
+        assert await store.claim_click(token, "V1_%") is True
+        await store.release_click(token, "WS")
+        assert await other.claim_click(token, "WS") is True
+
+        results = await asyncio.gather(store.consume(token), other.consume(token))
+        assert sorted(r is None for r in results) == [False, True]
+
+        expired = await store.issue("U2")
+        async with engine.begin() as conn:
+            await conn.execute(update(BookingToken).values(expires_at=now_utc()))
+        assert await store.peek(expired) is None
+        assert await store.consume(expired) is None
+        assert await store.claim_click(expired, "WS") is False
+        return store.metrics()
+
+    metrics = asyncio.run(_with_db_store(body))
+    assert metrics["backend"] == "db"
+    assert metrics["issued"] == 2
+    assert metrics["misses"] == 2
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from app.config import settings
+from app.models.message import Message
+from app.services.broadcast_job_tracker import BroadcastJobTracker, apply_job_progress
+
+
+def test_running_job_reports_actual_sent():
+    msg = Message()
+    finished = apply_job_progress(msg, {"status": "running", "sent": 500, "failed": 0}, 1200)
+    assert finished is False
+    assert msg.send_status == "發送中"
+    assert msg.send_count == 500
+
+
+def test_done_job_uses_target_count():
+    msg = Message()
+    finished = apply_job_progress(
+        msg, {"status": "done", "sent": 1190, "failed": 10, "errors": ["multicast: 429"]}, 1200
+    )
+    assert finished is True
+    assert msg.send_status == "已發送"
+    assert msg.send_count == 1200
+    assert msg.send_time is not None
+    assert msg.failure_reason == "multicast: 429"
+
+
+def test_failed_job_marks_failure():
+    msg = Message()
+    assert apply_job_progress(msg, {"status": "failed", "sent": 0, "errors": ["boom"]}, 10)
+    assert msg.send_status == "發送失敗"
+    assert msg.failure_reason == "boom"
+
+
+class _FakeClient:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+
+    async def get_broadcast_job(self, job_id):
+        status = self.statuses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        return {"job_id": job_id, "status": status, "sent": 1}
+
+
+def test_tracker_polls_until_finished(monkeypatch):
+    monkeypatch.setattr(settings, "BROADCAST_JOB_POLL_SECONDS", 0)
+    applied = []
+
+    async def fake_apply(message_id, job, target_count):
+        applied.append(job["status"])
+        return job["status"] == "done"
+
+    tracker = BroadcastJobTracker()
+    monkeypatch.setattr(tracker, "_apply", fake_apply)
+
+    async def run():
+        client = _FakeClient(["queued", RuntimeError("line_app restarting"), "running", "done"])
+        tracker.track(7, "job-1", 10, client)
+        await asyncio.wait_for(asyncio.gather(*tracker._tasks.values()), timeout=2)
+
+    asyncio.run(run())
+    assert applied == ["queued", "running", "done"]
+    assert tracker._tasks == {}
@@ -110,8 +110,12 @@ async def test_get_chat_messages_by_platform():
     )
     await async_session.commit()
 
-    resp_line = await get_chat_messages(member_id=1, page=1, page_size=50, platform="LINE", db=async_session)
-    assert resp_line.data["total"] == 1
+    resp_line = await get_chat_messages(
+        member_id=1, page=1, page_size=50, before=None, platform="LINE", db=async_session
+    )
+    # 第一頁走游標分頁：不做 COUNT
+    assert len(resp_line.data["messages"]) == 1
+    assert resp_line.data["next_cursor"] is None
     assert resp_line.data["messages"][0]["type"] == "user"
 
     # Facebook 測試需要 mock 外部 API 調用
@@ -130,12 +134,14 @@ async def test_get_chat_messages_by_platform():
         mock_instance = MockFbClient.return_value
         mock_instance.get_chat_history = AsyncMock(return_value=mock_fb_result)
         resp_fb = await get_chat_messages(
-            member_id=1, page=1, page_size=50, platform="Facebook",
+            member_id=1, page=1, page_size=50, before=None, platform="Facebook",
             jwt_token="test_token", db=async_session
         )
         assert resp_fb.data["total"] == 1
         assert resp_fb.data["messages"][0]["text"] == "hello fb"
 
     # default platform is LINE when not provided
-    resp_default = await get_chat_messages(member_id=1, page=1, page_size=50, platform=None, db=async_session)
-    assert resp_default.data["total"] == 1
+    resp_default = await get_chat_messages(
+        member_id=1, page=1, page_size=50, before=None, platform=None, db=async_session
+    )
+    assert len(resp_default.data["messages"]) == 1
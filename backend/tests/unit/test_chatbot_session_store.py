@@ -0,0 +1,124 @@
+import asyncio
+import os
+import sys
+from collections import deque
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.timezone import now_utc
+from app.models.chatbot_booking import ChatbotSessionStateRecord
+from app.schemas.chatbot import RoomCardSchema
+from app.services.chatbot_session_store import (
+    ChatbotSessionState,
+    DbSessionStore,
+    InMemorySessionStore,
+    dump_session,
+    load_session,
+)
+
+
+def _card():
+    return RoomCardSchema(
+        room_type_code="DBL",
+        room_type_name="森森系雙人房",
+        price=2600,
+        price_label="NT$2,600",
+        max_occupancy=2,
+        source="pms",
+    )
+
+
+async def _with_store(body):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(ChatbotSessionStateRecord.__table__.create)
+    try:
+        return await body(DbSessionStore(1200, async_sessionmaker(engine, expire_on_commit=False)), engine)
+    finally:
+        await engine.dispose()
+
+
+def test_dump_omits_defaults_and_round_trips():
+    empty = ChatbotSessionState(browser_key="b1", session_id="s1")
+    state = ChatbotSessionState(
+        browser_key="b1",
+        session_id="s1",
+        turn_count=2,
+        checkin_date="2026-11-01",
+        checkout_date="2026-11-03",
+        selected_rooms=[{"room_type_code": "DBL", "room_count": 1}],
+        history=deque([{"role": "user", "content": "我要訂房"}], maxlen=10),
+        last_room_cards=[_card()],
+    )
+
+    assert len(dump_session(empty)) < 40
+    restored = load_session("b1", dump_session(state), version=3)
+    restored.ts = state.ts
+    assert restored == state
+    assert restored.version == 3
+    assert restored.history.maxlen == 10
+    assert restored.last_room_cards[0].room_type_name == "森森系雙人房"
+    assert restored.checkin_date_obj.isoformat() == "2026-11-01"
+
+
+def test_db_store_rejects_stale_version():
+    async def body(store, engine):
+        assert await store.load("b1") is None
+        state = ChatbotSessionState(browser_key="b1", turn_count=1)
+        assert await store.save(state) is True
+        assert state.version == 1
+
+        first = await store.load("b1")
+        second = await store.load("b1")
+        first.turn_count = 2
+        second.turn_count = 5
+        assert await store.save(first) is True
+        assert await store.save(second) is False
+
+        # 同時建立同一個 session：後到的 insert 撞主鍵，同樣視為衝突
+        dup = ChatbotSessionState(browser_key="b1")
+        assert await store.save(dup) is False
+        return await store.load("b1")
+
+    stored = asyncio.run(_with_store(body))
+    assert (stored.turn_count, stored.version) == (2, 2)
+
+
+def test_db_store_expired_session_starts_over_with_same_version():
+    async def body(store, engine):
+        await store.save(ChatbotSessionState(browser_key="b1", turn_count=4))
+        async with engine.begin() as conn:
+            await conn.execute(update(ChatbotSessionStateRecord).values(expires_at=now_utc()))
+        fresh = await store.load("b1")
+        assert (fresh.turn_count, fresh.version) == (0, 1)
+
+        assert await store.save(fresh) is True
+        return await store.load("b1")
+
+    stored = asyncio.run(_with_store(body))
+    assert (stored.turn_count, stored.version) == (0, 2)
+
+
+def test_memory_store_keeps_live_object():
+    async def body():
+        store = InMemorySessionStore(1200)
+        state = ChatbotSessionState(browser_key="b1")
+        await store.save(state)
+        loaded = await store.load("b1")
+        loaded.turn_count = 3
+        await store.delete("b2")
+        return state, await store.load("b1")
+
+    state, loaded = asyncio.run(body())
+    assert loaded is state
+    assert loaded.turn_count == 3
@@ -0,0 +1,175 @@
+import asyncio
+import os
+import sys
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from app.services.chatbot_service import ChatbotService, ToolCallingContext
+
+
+def _service(delays, log):
+    svc = ChatbotService()
+
+    async def fake_execute(ctx, fn_name, args):
+        log.append(("start", fn_name))
+        await asyncio.sleep(delays.get(fn_name, 0))
+        log.append(("end", fn_name))
+        return {"tool": fn_name}
+
+    svc._execute_tool = fake_execute
+    return svc
+
+
+def test_independent_tools_run_concurrently():
+    log = []
+    svc = _service({"query_pms_availability": 0.2, "kb_search": 0.2}, log)
+    ctx = ToolCallingContext()
+    calls = [("query_pms_availability", {}, None), ("kb_search", {}, None)]
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        results = await svc._run_tool_calls(ctx, calls, 1)
+        return results, loop.time() - t0
+
+    results, elapsed = asyncio.run(run())
+    assert [r["tool"] for r in results] == ["query_pms_availability", "kb_search"]
+    assert elapsed < 0.35
+    assert {t["step"] for t in ctx.timings} == {"query_pms_availability", "kb_search"}
+    assert all(t["turn"] == 1 and t["ms"] >= 150 for t in ctx.timings)
+
+
+def test_session_tools_keep_order_and_act_as_barrier():
+    log = []
+    svc = _service({"kb_search": 0.05, "confirm_room_selection": 0.01}, log)
+    ctx = ToolCallingContext()
+    calls = [
+        ("kb_search", {}, None),
+        ("confirm_room_selection", {}, None),
+        ("save_member_info", {}, None),
+        ("query_pms_availability", {}, {"error": "duplicate pms call suppressed"}),
+    ]
+
+    results = asyncio.run(svc._run_tool_calls(ctx, calls, 2))
+    assert log == [
+        ("start", "kb_search"),
+        ("end", "kb_search"),
+        ("start", "confirm_room_selection"),
+        ("end", "confirm_room_selection"),
+        ("start", "save_member_info"),
+        ("end", "save_member_info"),
+    ]
+    assert results[3] == {"error": "duplicate pms call suppressed"}
+
+
+def test_room_card_tools_run_in_call_order_within_a_batch():
+    log = []
+    svc = ChatbotService()
+    delays = {"query_pms_mixed_availability": 0.15, "query_pms_availability": 0.01, "kb_search": 0.15}
+
+    async def fake_execute(ctx, fn_name, args):
+        log.append(("start", fn_name))
+        await asyncio.sleep(delays[fn_name])
+        if fn_name != "kb_search":
+            ctx.room_cards = [fn_name]
+        log.append(("end", fn_name))
+        return {"tool": fn_name}
+
+    svc._execute_tool = fake_execute
+    ctx = ToolCallingContext()
+    calls = [
+        ("query_pms_mixed_availability", {}, None),
+        ("kb_search", {}, None),
+        ("query_pms_availability", {}, None),
+    ]
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        t0 = loop.time()
+        results = await svc._run_tool_calls(ctx, calls, 1)
+        return results, loop.time() - t0
+
+    results, elapsed = asyncio.run(run())
+    # 快的 query_pms_availability 要等慢的混搭查詢結束才開始：房卡取 AI 給的最後一個呼叫
+    assert ctx.room_cards == ["query_pms_availability"]
+    assert log.index(("end", "query_pms_mixed_availability")) < log.index(("start", "query_pms_availability"))
+    # kb_search 仍與 PMS 查詢並行
+    assert elapsed < 0.28
+    assert [r["tool"] for r in results] == [name for name, _, _ in calls]
+
+
+def _chunk(content=None, tool_calls=None, usage=None):
+    from openai.types.chat import ChatCompletionChunk
+
+    choices = []
+    if content is not None or tool_calls is not None:
+        choices = [{"index": 0, "delta": {"content": content, "tool_calls": tool_calls}}]
+    return ChatCompletionChunk.model_validate({
+        "id": "c", "object": "chat.completion.chunk", "created": 0, "model": "m",
+        "choices": choices, "usage": usage,
+    })
+
+
+class _FakeStreamingOpenAI:
+    """第一輪：過場文字 + 分段送來的 tool call；第二輪：分段送來的最終回覆"""
+
+    def __init__(self):
+        self.turns = [
+            [
+                _chunk(content="稍等"),
+                _chunk(tool_calls=[{"index": 0, "id": "t1", "type": "function",
+                                    "function": {"name": "kb_search", "arguments": '{"query"'}}]),
+                _chunk(tool_calls=[{"index": 0, "function": {"arguments": ': "早餐"}'}}]),
+                _chunk(usage={"prompt_tokens": 7, "completion_tokens": 3, "total_tokens": 10}),
+            ],
+            [
+                _chunk(content="早餐"),
+                _chunk(content="7 點開始"),
+                _chunk(usage={"prompt_tokens": 9, "completion_tokens": 2, "total_tokens": 11}),
+            ],
+        ]
+        self.calls = []
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        chunks = self.turns.pop(0)
+
+        async def stream():
+            for c in chunks:
+                yield c
+
+        return stream()
+
+
+def test_streaming_loop_emits_tool_status_and_reply_deltas():
+    log = []
+    svc = _service({}, log)
+    svc._openai = _FakeStreamingOpenAI()
+    events = []
+
+    async def on_event(event, data):
+        events.append((event, data))
+
+    ctx = ToolCallingContext(on_event=on_event)
+    reply = asyncio.run(svc._unified_tool_loop([{"role": "user", "content": "早餐幾點"}], ctx))
+
+    assert reply == "早餐7 點開始"
+    assert ctx.total_tokens_used == 21
+    assert all(call["stream"] for call in svc._openai.calls)
+    assert [e for e, _ in events] == [
+        "reply_delta", "reply_reset", "tool", "tool", "reply_delta", "reply_delta",
+    ]
+    assert events[2][1] == {"name": "kb_search", "status": "start"}
+    assert events[3][1]["status"] == "done"
+    # tool call 的 arguments 分段送達，組回完整 JSON 後照常回填給 LLM
+    tool_msg = svc._openai.calls[1]["messages"][-1]
+    assert tool_msg["role"] == "tool" and tool_msg["tool_call_id"] == "t1"
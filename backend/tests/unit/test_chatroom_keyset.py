@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.models.conversation import ConversationMessage, ConversationThread
+from app.models.member import Member
+from app.services.chatroom_service import (ChatroomService, decode_message_cursor,
+                                           encode_message_cursor)
+
+BASE = datetime(2026, 1, 1, 12, 0, 0)
+
+
+async def _seed_and_page(n, limit, same_second=False):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(ConversationThread.__table__.create)
+        await conn.run_sync(ConversationMessage.__table__.create)
+
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        db.add(ConversationThread(id="U1", platform="LINE", platform_uid="U1"))
+        for i in range(n):
+            db.add(ConversationMessage(
+                id=f"m{i:03d}",
+                thread_id="U1",
+                platform="LINE",
+                direction="incoming",
+                content=f"msg {i}",
+                created_at=BASE if same_second else BASE + timedelta(seconds=i),
+            ))
+        # 同 thread_id 的其他渠道訊息不應混入
+        db.add(ConversationMessage(
+            id="fb", thread_id="U1", platform="Facebook", direction="incoming",
+            content="fb", created_at=BASE + timedelta(days=1),
+        ))
+        await db.commit()
+
+        service = ChatroomService(db)
+        member = Member(line_uid="U1")
+        pages, cursor = [], None
+        while True:
+            page = await service.get_messages_before(
+                member, "LINE", limit,
+                before=decode_message_cursor(cursor) if cursor else None,
+            )
+            pages.append(page)
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+    await engine.dispose()
+    return pages
+
+
+@pytest.mark.parametrize("same_second", [False, True])
+def test_cursor_walks_whole_thread_without_gaps(same_second):
+    pages = asyncio.run(_seed_and_page(7, 3, same_second=same_second))
+
+    assert [len(p["messages"]) for p in pages] == [3, 3, 1]
+    assert [p["has_more"] for p in pages] == [True, True, False]
+    # 每頁內由舊到新；整體串回來不重複、不遺漏
+    ids = [m["id"] for p in reversed(pages) for m in p["messages"]]
+    assert ids == [f"m{i:03d}" for i in range(7)]
+
+
+def test_exact_multiple_has_no_trailing_cursor():
+    pages = asyncio.run(_seed_and_page(3, 3))
+    assert len(pages) == 1
+    assert pages[0]["has_more"] is False
+    assert pages[0]["next_cursor"] is None
+
+
+def test_cursor_round_trip_and_invalid():
+    cursor = encode_message_cursor(BASE, "abc")
+    assert decode_message_cursor(cursor) == (BASE, "abc")
+    with pytest.raises(ValueError):
+        decode_message_cursor("not-a-cursor")
@@ -0,0 +1,109 @@
+import asyncio
+import csv
+import gzip
+import io
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.v1 import conversations_export as export
+
+
+def _row(i):
+    msg = SimpleNamespace(
+        created_at=datetime(2026, 1, 1, 0, 0, i), direction="incoming",
+        message_source=None, message_type="text", content=f"hi {i}", platform="LINE",
+    )
+    thread = SimpleNamespace(id=f"T{i}")
+    return (msg, thread, None)
+
+
+class _FakeResult:
+    def __init__(self, rows, size):
+        self._rows, self._size = rows, size
+
+    async def partitions(self):
+        for i in range(0, len(self._rows), self._size):
+            yield self._rows[i:i + self._size]
+
+
+class _FakeSession:
+    def __init__(self, rows):
+        self._rows = rows
+        self.options = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def stream(self, stmt):
+        self.options = stmt.get_execution_options()
+        return _FakeResult(self._rows, self.options["yield_per"])
+
+
+class _FakeStmt:
+    def __init__(self):
+        self._opts = {}
+
+    def execution_options(self, **kw):
+        self._opts.update(kw)
+        return self
+
+    def get_execution_options(self):
+        return self._opts
+
+
+def _collect(monkeypatch, rows, compress):
+    session = _FakeSession(rows)
+    monkeypatch.setattr(export, "AsyncSessionLocal", lambda: session)
+    monkeypatch.setattr(export, "_BATCH_SIZE", 2)
+
+    async def run():
+        return [chunk async for chunk in export._iter_csv(_FakeStmt(), compress)]
+
+    return asyncio.run(run()), session
+
+
+def test_cursor_round_trip():
+    ts = datetime(2026, 3, 4, 5, 6, 7)
+    assert export._decode_cursor(export._encode_cursor(ts, "msg-1")) == (ts, "msg-1")
+
+
+def test_bad_cursor_is_400():
+    with pytest.raises(HTTPException) as exc:
+        export._decode_cursor("not-a-cursor")
+    assert exc.value.status_code == 400
+
+
+def test_streams_one_chunk_per_batch(monkeypatch):
+    chunks, session = _collect(monkeypatch, [_row(i) for i in range(5)], compress=False)
+    assert session.options["yield_per"] == 2
+    # header + ceil(5 / 2) batches
+    assert len(chunks) == 4
+    text = b"".join(chunks).decode("utf-8")
+    assert text.startswith("﻿")
+    rows = list(csv.reader(io.StringIO(text.lstrip("﻿"))))
+    assert rows[0] == export._CSV_HEADER
+    assert [r[0] for r in rows[1:]] == ["T0", "T1", "T2", "T3", "T4"]
+    assert rows[1][2:4] == ["匿名", "未知"]
+
+
+def test_gzip_output(monkeypatch):
+    chunks, _ = _collect(monkeypatch, [_row(i) for i in range(3)], compress=True)
+    text = gzip.decompress(b"".join(chunks)).decode("utf-8")
+    assert text.count("\n") == 4
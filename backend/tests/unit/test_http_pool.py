@@ -0,0 +1,95 @@
+import asyncio
+import os
+import sys
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import httpx
+import pytest
+
+from app.clients import http_pool as http_pool_module
+from app.clients.http_pool import FB_API, LINE_APP, HttpPool
+
+
+def _mock(pool, name, handler):
+    """把上游的 client 換成 MockTransport（保留池子的併發上限與統計）"""
+    upstream = pool._get(name)
+    upstream.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return upstream
+
+
+def test_request_records_calls_errors_and_latency():
+    async def handler(request):
+        if request.url.path == "/boom":
+            return httpx.Response(502)
+        if request.url.path == "/down":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"ok": True})
+
+    async def body():
+        pool = HttpPool()
+        _mock(pool, FB_API, handler)
+        ok = await pool.get(FB_API, "https://fb.test/ok")
+        bad = await pool.post(FB_API, "https://fb.test/boom", json={})
+        with pytest.raises(httpx.ConnectError):
+            await pool.get(FB_API, "https://fb.test/down")
+        await pool.aclose()
+        return ok, bad, pool.metrics()
+
+    ok, bad, metrics = asyncio.run(body())
+    assert ok.json() == {"ok": True}
+    assert bad.status_code == 502
+    fb = metrics[FB_API]
+    assert (fb["calls"], fb["errors"], fb["in_flight"], fb["waiting"]) == (3, 2, 0, 0)
+    assert fb["latency_ms_p50"] is not None
+    assert metrics[LINE_APP]["calls"] == 0
+
+
+def test_concurrency_is_capped_per_upstream(monkeypatch):
+    monkeypatch.setattr(http_pool_module.settings, "FB_API_MAX_CONCURRENCY", 2)
+    active = peak = 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200)
+
+    async def body():
+        pool = HttpPool()
+        _mock(pool, FB_API, handler)
+        await asyncio.gather(*(pool.get(FB_API, f"https://fb.test/{i}") for i in range(6)))
+        await pool.aclose()
+        return pool.metrics()[FB_API]
+
+    fb = asyncio.run(body())
+    assert peak == 2
+    assert fb["calls"] == 6
+    assert fb["max_concurrency"] == 2
+
+
+def test_client_is_reused_within_loop_and_rebuilt_for_new_loop():
+    pool = HttpPool()
+
+    async def clients():
+        pool.open()
+        first = pool._get(LINE_APP).client
+        assert pool._get(LINE_APP).client is first
+        return first
+
+    first = asyncio.run(clients())
+    second = asyncio.run(clients())
+    assert second is not first
+    assert pool.metrics()[LINE_APP]["http2"] is False
+
+    asyncio.run(pool.aclose())
+    assert second.is_closed
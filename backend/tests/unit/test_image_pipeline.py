@@ -0,0 +1,79 @@
+import asyncio
+import os
+import sys
+from io import BytesIO
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pytest
+from PIL import Image
+
+from app.config import settings
+from app.services import image_pipeline
+
+
+def _png(width, height, mode="RGBA"):
+    out = BytesIO()
+    Image.new(mode, (width, height), (200, 100, 50, 255) if mode == "RGBA" else 128).save(out, format="PNG")
+    return out.getvalue()
+
+
+@pytest.fixture
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "IMAGE_MAX_WIDTH", 1200)
+    monkeypatch.setattr(settings, "IMAGE_VARIANT_WIDTHS", "240,480,800")
+    yield tmp_path
+    image_pipeline.shutdown_image_pool()
+
+
+def test_render_variants_writes_jpeg_and_webp_per_width(tmp_path):
+    manifest = image_pipeline.render_variants(_png(2000, 1000), "abc", str(tmp_path), 1200, (240, 480, 800))
+
+    assert (manifest["width"], manifest["height"]) == (1200, 600)
+    assert [v["width"] for v in manifest["variants"]] == [240, 480, 800]
+    with Image.open(tmp_path / "abc.jpg") as main:
+        assert main.format == "JPEG" and main.size == (1200, 600)
+    with Image.open(tmp_path / "abc_w480.webp") as small:
+        assert small.format == "WEBP" and small.size == (480, 240)
+    # 沒有殘留暫存檔
+    assert not [p for p in tmp_path.iterdir() if p.name.endswith(".tmp")]
+
+
+def test_small_image_gets_no_upscaled_variants(tmp_path):
+    manifest = image_pipeline.render_variants(_png(300, 300, "L"), "abc", str(tmp_path), 1200, (240, 480, 800))
+    assert manifest["width"] == 300
+    assert [v["width"] for v in manifest["variants"]] == [240]
+
+
+def test_process_upload_dedups_identical_content(upload_dir):
+    contents = _png(1000, 500)
+
+    async def run():
+        first = await image_pipeline.process_upload(contents)
+        mtime = (upload_dir / first["jpg"]).stat().st_mtime_ns
+        second = await image_pipeline.process_upload(contents)
+        return first, second, mtime
+
+    first, second, mtime = asyncio.run(run())
+    assert first["deduplicated"] is False
+    assert second["deduplicated"] is True
+    assert first["jpg"] == second["jpg"] == f"{first['hash']}.jpg"
+    assert [v["width"] for v in second["variants"]] == [240, 480, 800]
+    assert (upload_dir / second["jpg"]).stat().st_mtime_ns == mtime
+
+    urls = image_pipeline.public_urls(second)
+    assert urls["url"].endswith(f"/{first['hash']}.jpg")
+    assert urls["variants"][0]["webp_url"].endswith(f"/{first['hash']}_w240.webp")
+
+
+def test_process_upload_rejects_non_image(upload_dir):
+    with pytest.raises(Exception):
+        asyncio.run(image_pipeline.process_upload(b"not an image"))
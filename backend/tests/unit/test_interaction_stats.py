@@ -0,0 +1,94 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from app.config import settings
+from app.services.interaction_stats import (CAROUSEL_ITEM, INTERACTION_TAG,
+                                            InteractionStatsBuffer, StatDelta)
+
+
+class _FakeSession:
+    def __init__(self, fail=False):
+        self.statements = []
+        self.fail = fail
+        self.committed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt):
+        if self.fail:
+            raise RuntimeError("db down")
+        self.statements.append(stmt)
+
+    async def commit(self):
+        self.committed = True
+
+
+def _delta(kind, target, uniques, minute):
+    return StatDelta(kind, target, 1, uniques, datetime(2026, 1, 1, 0, minute))
+
+
+def test_buffered_deltas_merge_per_item(monkeypatch):
+    monkeypatch.setattr(settings, "TRACKING_STATS_FLUSH_SECONDS", 5.0)
+    buf = InteractionStatsBuffer()
+    db = _FakeSession()
+
+    asyncio.run(buf.stage(db, [_delta(CAROUSEL_ITEM, 1, 1, 0)]))
+    assert db.statements == []  # 緩衝模式 commit 前不寫
+
+    buf.committed([_delta(CAROUSEL_ITEM, 1, 1, 0), _delta(INTERACTION_TAG, 9, 1, 0)])
+    buf.committed([_delta(CAROUSEL_ITEM, 1, 0, 5)])
+    merged = buf._pending[(CAROUSEL_ITEM, 1)]
+    assert (merged.clicks, merged.uniques, merged.last_at.minute) == (2, 1, 5)
+    assert len(buf._pending) == 2
+
+
+def test_flush_writes_one_update_per_item(monkeypatch):
+    monkeypatch.setattr(settings, "TRACKING_STATS_FLUSH_SECONDS", 5.0)
+    buf = InteractionStatsBuffer()
+    for _ in range(3):
+        buf.committed([_delta(CAROUSEL_ITEM, 1, 1, 0)])
+    buf.committed([_delta(INTERACTION_TAG, 2, 1, 0)])
+
+    session = _FakeSession()
+    monkeypatch.setattr("app.database.AsyncSessionLocal", lambda: session)
+    assert asyncio.run(buf.flush()) == 2
+    assert len(session.statements) == 2
+    assert session.committed
+    assert buf._pending == {}
+
+
+def test_failed_flush_keeps_deltas(monkeypatch):
+    monkeypatch.setattr(settings, "TRACKING_STATS_FLUSH_SECONDS", 5.0)
+    buf = InteractionStatsBuffer()
+    buf.committed([_delta(CAROUSEL_ITEM, 1, 1, 0)])
+    monkeypatch.setattr("app.database.AsyncSessionLocal", lambda: _FakeSession(fail=True))
+    assert asyncio.run(buf.flush()) == 0
+    assert buf._pending[(CAROUSEL_ITEM, 1)].clicks == 1
+
+
+def test_unbuffered_writes_in_same_transaction(monkeypatch):
+    monkeypatch.setattr(settings, "TRACKING_STATS_FLUSH_SECONDS", 0)
+    buf = InteractionStatsBuffer()
+    db = _FakeSession()
+    deltas = [_delta(INTERACTION_TAG, 3, 1, 0)]
+    asyncio.run(buf.stage(db, deltas))
+    buf.committed(deltas)
+    assert len(db.statements) == 1
+    assert buf._pending == {}
+    sql = str(db.statements[0])
+    assert "trigger_count" in sql and "trigger_member_count" in sql
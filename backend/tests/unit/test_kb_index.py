@@ -0,0 +1,149 @@
+import asyncio
+import os
+import sys
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+
+import app.models  # noqa: F401  — 註冊所有 FK 參照的表
+from app.models.faq import FaqCategory, FaqRule, Industry
+from app.models.line_channel import LineChannel
+from app.services import kb_index as kb_index_module
+from app.services.kb_index import KbIndexRegistry, _KbIndex, tokenize
+
+FIELDS = ["設施名稱", "位置", "說明"]
+
+ROWS = [
+    {"設施名稱": "健身房", "位置": "B1", "說明": "24 小時開放", "_rule_id": 1},
+    {"設施名稱": "室內游泳池", "位置": "3F", "說明": "溫水游泳池，需戴泳帽", "_rule_id": 2},
+    {"設施名稱": "停車場", "位置": "B2", "說明": "住客免費停車", "_rule_id": 3},
+]
+
+
+def test_tokenize_cjk_bigrams_and_words():
+    assert tokenize("游泳池 Gym") == ["游泳", "泳池", "gym"]
+    assert tokenize("B2 停車、住") == ["b2", "停車", "住"]
+
+
+def test_search_ranks_best_match_first():
+    idx = _KbIndex.build(ROWS, FIELDS)
+    items = idx.search("游泳池", top_k=6)
+    assert items[0]["_rule_id"] == 2
+    # 「游泳」「泳池」在別的規則都沒出現 → 只有一筆命中
+    assert [r["_rule_id"] for r in items] == [2]
+
+
+def test_search_without_match_returns_empty():
+    idx = _KbIndex.build(ROWS, FIELDS)
+    assert idx.search("餐廳 早餐", top_k=6) == []
+
+
+def test_unrelated_cjk_query_sharing_one_character_returns_empty():
+    # 「入住」和「住客」只共用「住」這個字，不能因此把停車場 FAQ 當成答案
+    idx = _KbIndex.build(ROWS, FIELDS)
+    assert idx.search("寵物可以入住嗎", top_k=6) == []
+
+
+def test_off_topic_question_with_common_words_returns_empty():
+    # 「可以」「請問」是問句常見詞，不能讓只共用這些詞的 FAQ 被當成答案
+    rows = ROWS + [{"設施名稱": "兒童遊戲區", "位置": "2F", "說明": "可以免費使用，請問櫃台", "_rule_id": 4}]
+    idx = _KbIndex.build(rows, FIELDS)
+    assert idx.search("可以抽菸嗎", top_k=6) == []
+    assert idx.search("請問可以帶寵物嗎", top_k=6) == []
+    # 問句裡的主題詞仍會命中
+    assert [r["_rule_id"] for r in idx.search("請問可以使用游泳池嗎", top_k=6)] == [2]
+
+
+def test_partial_match_needs_half_of_query_terms():
+    idx = _KbIndex.build(ROWS, FIELDS)
+    # 九個 bigram 只命中「停車」「車場」，不到一半
+    assert idx.search("停車場有電動車充電樁", top_k=6) == []
+    assert [r["_rule_id"] for r in idx.search("停車場 位置", top_k=6)] == [3]
+
+
+def test_sync_kb_invalidation_waits_for_commit(monkeypatch):
+    reg = KbIndexRegistry()
+    monkeypatch.setattr(kb_index_module, "kb_index_registry", reg)
+    key = ("C1", "facilities", False)
+
+    async def body():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        try:
+            async with AsyncSession(engine) as db:
+                reg._indexes = {key: _KbIndex.build(ROWS, FIELDS)}
+                kb_index_module.invalidate_kb_index_on_commit(db)
+                await db.rollback()
+                rolled_back = key in reg._indexes
+
+                await db.execute(text("SELECT 1"))
+                kb_index_module.invalidate_kb_index_on_commit(db)
+                before_commit = key in reg._indexes
+                await db.commit()
+            return rolled_back, before_commit, key in reg._indexes
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(body()) == (True, True, False)
+
+
+def test_empty_query_returns_rows_in_order():
+    idx = _KbIndex.build(ROWS, FIELDS)
+    assert [r["_rule_id"] for r in idx.search("", top_k=2)] == [1, 2]
+
+
+def test_results_are_copies():
+    idx = _KbIndex.build(ROWS, FIELDS)
+    idx.search("停車", top_k=1)[0]["設施名稱"] = "changed"
+    assert ROWS[2]["設施名稱"] == "停車場"
+
+
+def test_invalidate_by_channel_keeps_other_channels():
+    reg = KbIndexRegistry()
+    reg._indexes = {
+        ("C1", "facilities", False): _KbIndex.build(ROWS, FIELDS),
+        ("C2", "facilities", False): _KbIndex.build(ROWS, FIELDS),
+        (None, "facilities", False): _KbIndex.build(ROWS, FIELDS),
+    }
+    reg.invalidate({"C1"})
+    assert list(reg._indexes) == [("C2", "facilities", False)]
+    reg.invalidate()
+    assert reg._indexes == {}
+
+
+def test_moving_rule_to_another_channel_invalidates_both(monkeypatch):
+    reg = KbIndexRegistry()
+    monkeypatch.setattr(kb_index_module, "kb_index_registry", reg)
+    engine = create_engine("sqlite://")
+    for model in (Industry, LineChannel, FaqCategory, FaqRule):
+        model.__table__.create(engine)
+
+    with Session(engine) as session:
+        session.add_all([
+            Industry(id=1, name="飯店", is_active=True),
+            LineChannel(id=1, channel_id="C1", channel_access_token="t", channel_secret="s", is_active=True),
+            LineChannel(id=2, channel_id="C2", channel_access_token="t", channel_secret="s", is_active=True),
+            FaqCategory(id=1, industry_id=1, name="設施"),
+        ])
+        session.add(FaqRule(id=1, category_id=1, channel_id="C1", content_json="{}", status="active"))
+        session.commit()
+
+    reg._indexes = {
+        ("C1", "facilities", False): _KbIndex.build(ROWS, FIELDS),
+        ("C2", "facilities", False): _KbIndex.build(ROWS, FIELDS),
+        ("C3", "facilities", False): _KbIndex.build(ROWS, FIELDS),
+    }
+    with Session(engine) as session:
+        session.get(FaqRule, 1).channel_id = "C2"
+        session.commit()
+
+    assert list(reg._indexes) == [("C3", "facilities", False)]
@@ -0,0 +1,130 @@
+import asyncio
+import importlib.util
+import os
+import sys
+from types import SimpleNamespace
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, select
+from sqlalchemy.dialects import mysql
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+
+from app.api.v1.members import suggest_members
+from app.models.line_channel import LineChannel
+from app.models.member import Member
+from app.services.member_search import boolean_query, member_search_filter, search_terms
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_sqlite(type_, compiler, **kw):
+    return "INTEGER"
+
+
+def _mysql_sql(search):
+    condition, score = member_search_filter(search, "mysql")
+    stmt = select(Member.id).where(condition).order_by(score.desc())
+    return str(stmt.compile(dialect=mysql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_search_terms_strip_boolean_operators():
+    assert search_terms('王小明 +0912-345 (vip)* "x"') == ["王小明", "0912", "345", "vip", "x"]
+    assert search_terms("Amy amy") == ["Amy"]
+    assert boolean_query(["王小明", "0912"]) == '+"王小明" +"0912"'
+
+
+def test_mysql_uses_fulltext_and_short_terms_fall_back_to_like():
+    sql = _mysql_sql("王 小明")
+    assert "MATCH (members.name, members.email, members.phone, members.line_display_name)" in sql
+    assert "AGAINST ('+\"小明\"' IN BOOLEAN MODE)" in sql
+    assert "LIKE '%%王%%'" in sql
+
+    assert "MATCH" not in _mysql_sql("王")
+
+
+async def _suggest(q, **kwargs):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(LineChannel.__table__.create)
+        await conn.run_sync(Member.__table__.create)
+
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        db.add_all([
+            LineChannel(channel_id="C1", channel_name="OA", channel_access_token="t", channel_secret="s", is_active=True),
+            Member(name="陳王明", phone="0922000111", line_uid="U1", line_channel_id="C1", tenant_id=1),
+            Member(name="王小明", phone="0912345678", line_uid="U2", line_channel_id="C1", tenant_id=1),
+            Member(name="王大同", phone="0912999999", tenant_id=2),
+            Member(name="王停用", line_uid="U9", line_channel_id="C_OFF", tenant_id=1),
+            Member(name="Maria Lin", email="maria.lin@gmail.com", tenant_id=1),
+        ])
+        await db.commit()
+        result = await suggest_members(q=q, limit=kwargs.get("limit", 8),
+                                       line_channel_id=kwargs.get("line_channel_id"),
+                                       tenant_id=kwargs.get("tenant_id"), db=db)
+    await engine.dispose()
+    return [item["name"] for item in result.data["items"]]
+
+
+def test_suggest_ranks_prefix_hits_first_and_hides_inactive_channels():
+    names = asyncio.run(_suggest("王"))
+    assert set(names[:2]) == {"王小明", "王大同"}
+    assert names[2:] == ["陳王明"]
+
+
+def test_suggest_keeps_tenant_scope_and_matches_phone_fragments():
+    assert asyncio.run(_suggest("王", tenant_id=1)) == ["王小明", "陳王明"]
+    assert asyncio.run(_suggest("345-678")) == ["王小明"]
+
+
+def test_suggest_rejects_invalid_input():
+    with pytest.raises(HTTPException):
+        asyncio.run(_suggest("王'; DROP"))
+
+
+def test_suggest_finds_latin_names_and_emails_with_stopword_letters():
+    # 「maria」「gmail」含 InnoDB 預設 stopword 的 a / i
+    assert asyncio.run(_suggest("maria")) == ["Maria Lin"]
+    assert asyncio.run(_suggest("gmail")) == ["Maria Lin"]
+    assert "AGAINST ('+\"maria\"' IN BOOLEAN MODE)" in _mysql_sql("maria")
+
+
+def _run_migration(filename, index_exists):
+    path = os.path.join(os.path.dirname(__file__), "..", "..", "migrations", "versions", filename)
+    spec = importlib.util.spec_from_file_location(filename[:-3], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    executed = []
+    bind = SimpleNamespace(
+        dialect=SimpleNamespace(name="mysql"),
+        execute=lambda *a, **kw: SimpleNamespace(scalar=lambda: int(index_exists)),
+    )
+    module.op = SimpleNamespace(
+        get_bind=lambda: bind,
+        execute=executed.append,
+        drop_index=lambda name, table_name: executed.append(f"DROP INDEX {name}"),
+    )
+    module.upgrade()
+    return executed
+
+
+@pytest.mark.parametrize("filename, index_exists", [
+    ("9c2e4a6b8d1f_add_members_fulltext_search_index.py", False),
+    ("a1c3e5f7b9d2_rebuild_members_fulltext_without_stopwords.py", True),
+])
+def test_fulltext_index_is_built_without_stopwords(filename, index_exists):
+    executed = _run_migration(filename, index_exists)
+    create = next(i for i, sql in enumerate(executed) if "ADD FULLTEXT INDEX" in sql)
+    assert executed[create - 1] == "SET SESSION innodb_ft_enable_stopword = OFF"
+    assert executed[create + 1] == "SET SESSION innodb_ft_enable_stopword = DEFAULT"
+    assert ("DROP INDEX ft_members_search" in executed) is index_exists
@@ -0,0 +1,144 @@
+import asyncio
+import os
+import sys
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.v1 import chatbot as chatbot_api
+from app.database import get_db
+from app.services import pms_chatbot_client as pms
+
+
+def _fresh_cache(monkeypatch):
+    cache = pms._PmsAvailabilityCache()
+    monkeypatch.setattr(pms, "_cache", cache)
+    monkeypatch.setattr(pms.settings, "PMS_CACHE_TTL_SECONDS", 60)
+    return cache
+
+
+def test_concurrent_identical_queries_coalesce(monkeypatch):
+    cache = _fresh_cache(monkeypatch)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"room": [{"roomtype": "DD"}]}
+
+    async def run():
+        key = ("H1", "2026-01-01", "2026-01-02", 2, "")
+        return await asyncio.gather(*(cache.get(key, fetch) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(r == {"room": [{"roomtype": "DD"}]} for r in results)
+    # 各呼叫端拿到獨立拷貝，就地修改不會污染快取
+    results[0]["room"].clear()
+    assert results[1]["room"]
+    assert cache.metrics()["coalesced"] == 4
+
+
+def test_cancelled_leader_does_not_cancel_waiters(monkeypatch):
+    cache = _fresh_cache(monkeypatch)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"room": [{"roomtype": "DD"}]}
+
+    async def run():
+        key = ("H1", "2026-01-01", "2026-01-02", 2, "")
+        leader = asyncio.create_task(cache.get(key, fetch))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get(key, fetch))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # 發起查詢的 client 斷線
+        result = await waiter
+        return leader.cancelled(), result, await cache.get(key, fetch)
+
+    leader_cancelled, result, cached = asyncio.run(run())
+    assert leader_cancelled
+    assert result == cached == {"room": [{"roomtype": "DD"}]}
+    assert len(calls) == 1
+
+
+def test_pms_metrics_requires_login():
+    app = FastAPI()
+    app.include_router(chatbot_api.router)
+
+    async def no_db():
+        yield None
+
+    app.dependency_overrides[get_db] = no_db
+    assert TestClient(app).get("/pms-metrics").status_code == 401
+
+
+def test_cached_result_served_until_invalidated(monkeypatch):
+    cache = _fresh_cache(monkeypatch)
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return {"room": []}
+
+    async def run():
+        key = ("H1", "2026-01-01", "2026-01-02", None, "")
+        await cache.get(key, fetch)
+        await cache.get(key, fetch)
+        cache.invalidate("H1")
+        await cache.get(key, fetch)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+    assert cache.metrics()["hits"] == 1
+
+
+def test_errors_are_not_cached(monkeypatch):
+    cache = _fresh_cache(monkeypatch)
+    attempts = []
+
+    async def fetch():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("PMS down")
+        return {"room": []}
+
+    async def run():
+        key = ("H1", "2026-01-01", "2026-01-02", 4, "")
+        try:
+            await cache.get(key, fetch)
+        except RuntimeError:
+            pass
+        return await cache.get(key, fetch)
+
+    assert asyncio.run(run()) == {"room": []}
+    assert cache.metrics()["upstream_errors"] == 1
+
+
+def test_all_roomtypes_fans_out_and_merges(monkeypatch):
+    _fresh_cache(monkeypatch)
+    monkeypatch.setattr(pms, "_ensure_pms_settings", lambda hotelcode=None: "H1")
+
+    async def fake_fetch(hotelcode, startdate, enddate, housingcnt, roomtype, *, use_cache=True):
+        if housingcnt is None:
+            return {"hotelcode": "H1", "room": [{"roomtype": "DD"}, {"roomtype": "KK"}]}
+        if housingcnt == 2:
+            return {"hotelcode": "H1", "room": [{"roomtype": "DD", "data": [{"remain": "3"}]}]}
+        raise RuntimeError("Session halted.")
+
+    monkeypatch.setattr(pms, "_fetch_availability", fake_fetch)
+    result = asyncio.run(pms.query_pms_all_roomtypes("2026-01-01", "2026-01-02", "H1"))
+    rooms = {r["roomtype"]: r for r in result["room"]}
+    assert set(rooms) == {"DD", "KK"}
+    assert rooms["DD"]["data"]
@@ -0,0 +1,200 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+
+from app.api.v1.scheduler_jobs import list_scheduled_jobs
+from app.config import settings
+from app.core.timezone import now_utc
+from app.models.scheduled_job import ScheduledJob
+from app.services.scheduler import CampaignScheduler, retry_delay
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_as_integer(type_, compiler, **kw):
+    # SQLite 只有 INTEGER PRIMARY KEY 會自動遞增
+    return "INTEGER"
+
+
+@pytest.fixture
+def sched(monkeypatch):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(ScheduledJob.__table__.create)
+
+    asyncio.run(setup())
+    s = CampaignScheduler()
+    monkeypatch.setattr(s, "_session_factory", async_sessionmaker(engine, expire_on_commit=False))
+    monkeypatch.setattr(s, "worker_id", "worker-a")
+    s.dispatched = []
+    s.expired = []
+
+    async def dispatch(job):
+        s.dispatched.append(job.target_id)
+        outcome = s.outcomes.pop(0) if s.outcomes else {"ok": True}
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def expire(job):
+        s.expired.append(job.target_id)
+
+    s.outcomes = []
+    monkeypatch.setattr(s, "_dispatch", dispatch)
+    monkeypatch.setattr(s, "_expire", expire)
+    return s
+
+
+async def _job(s, campaign_id):
+    return [j for j in await s.get_scheduled_jobs(status=None) if j["target_id"] == campaign_id][0]
+
+
+def test_due_job_runs_once_and_succeeds(sched):
+    async def run():
+        await sched.schedule_campaign(1, now_utc() - timedelta(seconds=1))
+        await sched.schedule_campaign(2, now_utc() + timedelta(hours=1))
+        assert await sched.poll_due_jobs() == 1
+        assert await sched.poll_due_jobs() == 0
+        return await _job(sched, 1), await _job(sched, 2)
+
+    done, future = asyncio.run(run())
+    assert sched.dispatched == [1]
+    assert done["status"] == "succeeded"
+    assert done["locked_by"] is None
+    assert future["status"] == "pending"
+
+
+def test_offset_aware_time_is_converted_to_utc(sched):
+    # 前端送來 +08:00 的時間：要換算成 UTC 存，不能直接去掉時區（會晚 8 小時才發送）
+    taipei = timezone(timedelta(hours=8))
+    scheduled_at = (datetime.now(timezone.utc) - timedelta(minutes=1)).astimezone(taipei)
+
+    async def run():
+        await sched.schedule_campaign(1, scheduled_at)
+        async with sched._session_factory() as db:
+            job = await db.get(ScheduledJob, 1)
+        return job.run_at, await sched.poll_due_jobs()
+
+    run_at, ran = asyncio.run(run())
+    assert run_at == scheduled_at.astimezone(timezone.utc).replace(tzinfo=None)
+    assert ran == 1 and sched.dispatched == [1]
+
+
+def test_claim_is_exclusive_until_lease_expires(sched, monkeypatch):
+    async def run():
+        await sched.schedule_campaign(1, now_utc() - timedelta(seconds=1))
+        first = await sched._claim(1)
+        monkeypatch.setattr(sched, "worker_id", "worker-b")
+        second = await sched._claim(1)
+        # worker-a 當掉：租約逾時後 worker-b 可接手
+        async with sched._session_factory() as db:
+            await db.execute(
+                update(ScheduledJob).values(locked_until=now_utc() - timedelta(seconds=1))
+            )
+            await db.commit()
+        third = await sched._claim(1)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first is not None and first.locked_by == "worker-a"
+    assert second is None
+    assert third.locked_by == "worker-b"
+    assert third.attempts == 2
+
+
+def test_exception_retries_with_backoff_then_fails(sched, monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_MAX_ATTEMPTS", 2)
+    sched.outcomes = [RuntimeError("line_app down"), RuntimeError("line_app down")]
+
+    async def run():
+        await sched.schedule_campaign(1, now_utc() - timedelta(seconds=1))
+        await sched.poll_due_jobs()
+        after_first = await _job(sched, 1)
+        # 等待中的重試不會被提早執行
+        assert await sched.poll_due_jobs() == 0
+        async with sched._session_factory() as db:
+            await db.execute(update(ScheduledJob).values(run_at=now_utc() - timedelta(seconds=1)))
+            await db.commit()
+        await sched.poll_due_jobs()
+        return after_first, await _job(sched, 1)
+
+    after_first, final = asyncio.run(run())
+    assert after_first["status"] == "pending"
+    assert after_first["attempts"] == 1
+    assert "line_app down" in after_first["last_error"]
+    assert final["status"] == "failed"
+    assert final["attempts"] == 2
+    assert sched.dispatched == [1, 1]
+
+
+def test_business_failure_is_not_retried(sched):
+    sched.outcomes = [{"ok": False, "error": "no members"}]
+
+    async def run():
+        await sched.schedule_campaign(1, now_utc() - timedelta(seconds=1))
+        await sched.poll_due_jobs()
+        return await _job(sched, 1)
+
+    job = asyncio.run(run())
+    assert job["status"] == "failed"
+    assert job["last_error"] == "no members"
+
+
+def test_catch_up_within_grace_and_expire_beyond(sched, monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_CATCHUP_GRACE_SECONDS", 600)
+
+    async def run():
+        await sched.schedule_campaign(1, now_utc() - timedelta(seconds=300))
+        await sched.schedule_campaign(2, now_utc() - timedelta(seconds=3600))
+        await sched.poll_due_jobs()
+        return await _job(sched, 1), await _job(sched, 2)
+
+    caught_up, missed = asyncio.run(run())
+    assert sched.dispatched == [1]
+    assert caught_up["status"] == "succeeded"
+    assert sched.expired == [2]
+    assert missed["status"] == "expired"
+
+
+def test_cancel_and_reschedule(sched):
+    async def run():
+        await sched.schedule_campaign(1, now_utc() + timedelta(hours=1))
+        assert await sched.cancel_campaign(1) is True
+        assert await sched.cancel_campaign(1) is False
+        await sched.schedule_campaign(1, now_utc() - timedelta(seconds=1))
+        await sched.poll_due_jobs()
+        return await sched.get_job_counts()
+
+    assert asyncio.run(run()) == {"succeeded": 1}
+    assert sched.dispatched == [1]
+
+
+def test_retry_delay_is_exponential_and_capped(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_RETRY_BASE_SECONDS", 60)
+    monkeypatch.setattr(settings, "SCHEDULER_RETRY_MAX_SECONDS", 200)
+    assert [retry_delay(n).total_seconds() for n in (1, 2, 3)] == [60, 120, 200]
+
+
+def test_jobs_endpoint_requires_cron_token(monkeypatch):
+    monkeypatch.setattr(settings, "CRON_TOKEN", "cron-secret")
+    for token in (None, "wrong"):
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(list_scheduled_jobs(status=None, limit=10, x_cron_token=token))
+        assert exc.value.status_code == 401
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.models.conversation import ConversationMessage, ConversationThread, ConversationThreadSummary
+from app.services import thread_summary
+from app.services.thread_summary import rebuild_thread_summaries, record_messages
+
+BASE = datetime(2026, 1, 1, 12, 0, 0)
+
+# (秒, thread, platform, direction, source, unanswered, status)
+MESSAGES = [
+    (0, "U1", "LINE", "incoming", "webhook", False, "received"),
+    (1, "U1", "LINE", "outgoing", "gpt", True, "sent"),
+    (2, "U1", "LINE", "outgoing", "broadcast", False, "sent"),
+    (3, "U2", "LINE", "incoming", "webhook", False, "read"),
+    (4, "U2", "LINE", "incoming", "webhook", False, "received"),
+    (5, "W1", "Webchat", "incoming", "webhook", False, "received"),
+    (6, "W1", "Webchat", "outgoing", "gpt", False, "sent"),
+]
+
+
+def _message(i, sec, tid, platform, direction, source, unanswered, status):
+    return ConversationMessage(
+        id=f"m{i}", thread_id=tid, platform=platform, direction=direction,
+        message_source=source, unanswered=unanswered, status=status,
+        created_at=BASE + timedelta(seconds=sec),
+    )
+
+
+async def _summaries(incremental):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        for model in (ConversationThread, ConversationMessage, ConversationThreadSummary):
+            await conn.run_sync(model.__table__.create)
+
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        for tid, platform in (("U1", "LINE"), ("U2", "LINE"), ("W1", "Webchat")):
+            db.add(ConversationThread(id=tid, platform=platform, platform_uid=tid))
+        # 打亂寫入順序：晚到的舊訊息不可蓋掉較新的摘要
+        order = [1, 0, 2, 4, 3, 6, 5]
+        for i in order:
+            msg = _message(i, *MESSAGES[i])
+            db.add(msg)
+            await db.flush()
+            if incremental:
+                await record_messages(db, [msg])
+        if not incremental:
+            await rebuild_thread_summaries(db, ["U1", "U2", "W1"])
+        await db.commit()
+
+        rows = (await db.execute(select(ConversationThreadSummary))).scalars().all()
+    await engine.dispose()
+    return {
+        (r.thread_id, r.platform): (
+            r.last_message_at, r.last_non_broadcast_at, r.last_non_broadcast_direction,
+            r.last_non_broadcast_source, r.last_unanswered, r.unread_count,
+        )
+        for r in rows
+    }
+
+
+def test_incremental_summary_matches_rebuild():
+    incremental = asyncio.run(_summaries(incremental=True))
+    rebuilt = asyncio.run(_summaries(incremental=False))
+    assert incremental == rebuilt
+
+    at = lambda s: BASE + timedelta(seconds=s)  # noqa: E731
+    # 群發只推進 last_message_at，藍點仍看最後一則 AI 答不出的回覆
+    assert incremental[("U1", "LINE")] == (at(2), at(1), "outgoing", "gpt", True, 1)
+    # 已讀的 incoming 不算未讀
+    assert incremental[("U2", "LINE")] == (at(4), at(4), "incoming", "webhook", False, 1)
+    assert incremental[("W1", "Webchat")] == (at(6), at(6), "outgoing", "gpt", False, 1)
+
+
+def test_rebuild_drops_summaries_of_emptied_threads():
+    async def run():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            for model in (ConversationThread, ConversationMessage, ConversationThreadSummary):
+                await conn.run_sync(model.__table__.create)
+        async with AsyncSession(engine) as db:
+            db.add(ConversationThread(id="U1", platform="LINE", platform_uid="U1"))
+            msg = _message(0, *MESSAGES[0])
+            db.add(msg)
+            await db.flush()
+            await record_messages(db, [msg])
+            await db.delete(msg)
+            await db.flush()
+            await rebuild_thread_summaries(db, ["U1"])
+            count = len((await db.execute(select(ConversationThreadSummary))).all())
+        await engine.dispose()
+        return count
+
+    assert asyncio.run(run()) == 0
+
+
+def test_summary_row_treats_missing_platform_as_line():
+    row = thread_summary.summary_row("U1", None, "outgoing", "broadcast", False, "sent", BASE)
+    assert row["platform"] == "LINE"
+    assert row["last_non_broadcast_at"] is None and row["unread_count"] == 0
+
+
+def test_mysql_upsert_updates_recency_columns_before_timestamp():
+    row = thread_summary.summary_row("U1", "LINE", "incoming", "webhook", False, "received", BASE)
+    sql = str(thread_summary._upsert_stmt("mysql", [row]).compile(dialect=mysql.dialect()))
+    update_clause = sql.split("ON DUPLICATE KEY UPDATE", 1)[1]
+    assert update_clause.index("last_non_broadcast_direction =") < update_clause.index("last_non_broadcast_at =")
+    assert "unread_count = (conversation_thread_summary.unread_count + VALUES(unread_count))" in update_clause
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import sys
+
+# Minimal env for app.config to load
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("LINE_CHANNEL_ACCESS_TOKEN", "test")
+os.environ.setdefault("LINE_CHANNEL_SECRET", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+# allow direct import of backend app package when running from repo root
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from sqlalchemy import BigInteger, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+
+import app.models  # noqa: F401  — 註冊所有 FK 參照的表
+from app.config import settings
+from app.models.faq import AiTokenUsage, Industry
+from app.models.line_channel import LineChannel
+from app.services.token_ledger import TokenLedger
+
+
+@compiles(BigInteger, "sqlite")
+def _bigint_sqlite(type_, compiler, **kw):
+    return "INTEGER"
+
+
+async def _with_db(body):
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        for model in (Industry, LineChannel, AiTokenUsage):
+            await conn.run_sync(model.__table__.create)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+    async with sessions() as db:
+        db.add_all([
+            Industry(id=1, name="飯店", is_active=True),
+            LineChannel(id=1, channel_id="C1", channel_access_token="t", channel_secret="s", is_active=True),
+            LineChannel(id=2, channel_id="C2", channel_access_token="t", channel_secret="s", is_active=True),
+            AiTokenUsage(id=5, industry_id=1, channel_id="C1", total_quota=1000, used_amount=100),
+        ])
+        await db.commit()
+    try:
+        return await body(sessions)
+    finally:
+        await engine.dispose()
+
+
+async def _used(sessions, usage_id=5):
+    async with sessions() as db:
+        return (await db.execute(
+            select(AiTokenUsage.used_amount).where(AiTokenUsage.id == usage_id)
+        )).scalar_one()
+
+
+def test_unbuffered_charges_are_atomic_increments(monkeypatch):
+    monkeypatch.setattr(settings, "AI_TOKEN_FLUSH_SECONDS", 0)
+
+    async def body(sessions):
+        # 兩段對話都先讀到 used_amount=100 才扣量：原本的 += 後寫入者會蓋掉先寫入者（→ 150）
+        first, second = TokenLedger(), TokenLedger()
+        async with sessions() as db:
+            view_a = await first.quota(db, line_channel_id="C1")
+            view_b = await second.quota(db, line_channel_id="C1")
+        for ledger, view, tokens in ((first, view_a, 30), (second, view_b, 50)):
+            async with sessions() as db:
+                await ledger.charge(db, view, tokens)
+                await db.commit()
+        return await _used(sessions)
+
+    assert asyncio.run(_with_db(body)) == 180
+
+
+def test_buffered_charges_merge_into_one_update_per_row(monkeypatch):
+    monkeypatch.setattr(settings, "AI_TOKEN_FLUSH_SECONDS", 5.0)
+
+    async def body(sessions):
+        monkeypatch.setattr("app.database.AsyncSessionLocal", sessions)
+        ledger = TokenLedger()
+        async with sessions() as db:
+            view = await ledger.quota(db)  # 預設產業 + 第一個館別 C1
+            for tokens in (10, 20, 30):
+                await ledger.charge(db, view, tokens)
+            assert await ledger.quota(db, line_channel_id="C1") is view
+        before = await _used(sessions)
+        assert (view.used_amount, ledger.pending_for(5)) == (160, 60)
+        written = await ledger.flush()
+        return before, written, await _used(sessions), ledger.pending_for(5)
+
+    assert asyncio.run(_with_db(body)) == (100, 1, 160, 0)
+
+
+def test_quota_view_is_cached_and_tracks_exhaustion(monkeypatch):
+    monkeypatch.setattr(settings, "AI_TOKEN_FLUSH_SECONDS", 5.0)
+
+    async def body(sessions):
+        ledger = TokenLedger()
+        async with sessions() as db:
+            view = await ledger.quota(db, line_channel_id="C1")
+            await ledger.charge(db, view, 900)
+            assert view.exhausted
+
+            # 後台調高額度：快取期間仍是舊值，invalidate 後重新讀取（保留尚未寫回的扣量）
+            await db.execute(update(AiTokenUsage).values(total_quota=5000))
+            await db.commit()
+            assert (await ledger.quota(db, line_channel_id="C1")).total_quota == 1000
+            ledger.invalidate()
+            refreshed = await ledger.quota(db, line_channel_id="C1")
+
+            # 新館別第一次互動自動建立預設額度；seed=False 則不建立
+            assert await ledger.quota(db, line_channel_id="C9", seed=False) is None
+            seeded = await ledger.quota(db, line_channel_id="C2")
+            await db.commit()
+        return refreshed, seeded
+
+    refreshed, seeded = asyncio.run(_with_db(body))
+    assert (refreshed.total_quota, refreshed.used_amount, refreshed.exhausted) == (5000, 1000, False)
+    assert (seeded.channel_id, seeded.total_quota, seeded.used_amount) == ("C2", 10_000_000, 0)
+
+
+def test_seeded_quota_is_not_cached_across_rollback(monkeypatch):
+    monkeypatch.setattr(settings, "AI_TOKEN_FLUSH_SECONDS", 5.0)
+
+    async def body(sessions):
+        monkeypatch.setattr("app.database.AsyncSessionLocal", sessions)
+        ledger = TokenLedger()
+        async with sessions() as db:
+            await ledger.quota(db, line_channel_id="C2")
+            await db.rollback()  # 對話的交易失敗，lazy seed 的列跟著消失
+        async with sessions() as db:
+            view = await ledger.quota(db, line_channel_id="C2")
+            await db.commit()
+        await ledger.charge(None, view, 40)
+        written = await ledger.flush()
+        return written, await _used(sessions, view.usage_id)
+
+    assert asyncio.run(_with_db(body)) == (1, 40)
+
+
+def test_charge_to_missing_row_drops_cached_view(monkeypatch):
+    monkeypatch.setattr(settings, "AI_TOKEN_FLUSH_SECONDS", 5.0)
+
+    async def body(sessions):
+        monkeypatch.setattr("app.database.AsyncSessionLocal", sessions)
+        ledger = TokenLedger()
+        async with sessions() as db:
+            view = await ledger.quota(db, line_channel_id="C1")
+            await db.execute(update(AiTokenUsage).values(id=6))  # 快取指向的列已不存在
+            await db.commit()
+            await ledger.charge(db, view, 10)
+            written = await ledger.flush()
+            refreshed = await ledger.quota(db, line_channel_id="C1")
+        return written, refreshed.usage_id
+
+    assert asyncio.run(_with_db(body)) == (0, 6)
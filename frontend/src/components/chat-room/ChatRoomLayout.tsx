@@ -179,6 +179,8 @@ export default function ChatRoomLayout({
   const [isLoading, setIsLoading] = useState(false);
   const [hasMore, setHasMore] = useState(true);
   const [page, setPage] = useState(1);
+  // LINE/Webchat 往上翻頁用的游標（後端回傳的 next_cursor）
+  const nextCursorRef = useRef<string | null>(null);
 
   const [messageInput, setMessageInput] = useState("");
   const [isComposing, setIsComposing] = useState(false); // IME composition state
@@ -570,7 +572,12 @@ export default function ChatRoomLayout({
           }
         } else {
           // LINE/Webchat：透過後端 API（使用 apiGet 自動處理 token 和 401 重試）
-          const url = `/api/v1/members/${targetId}/chat-messages?page=${pageNum}&page_size=${PAGE_SIZE}&platform=${currentPlatform}`;
+          // 往上翻頁帶 before 游標（不論翻多深，每頁成本相同）；第一頁不帶
+          const cursor = append ? nextCursorRef.current : null;
+          if (append && !cursor) return;
+          const url = cursor
+            ? `/api/v1/members/${targetId}/chat-messages?before=${encodeURIComponent(cursor)}&page_size=${PAGE_SIZE}&platform=${currentPlatform}`
+            : `/api/v1/members/${targetId}/chat-messages?page=1&page_size=${PAGE_SIZE}&platform=${currentPlatform}`;
 
           const response = await apiGet(url);
 
@@ -579,6 +586,7 @@ export default function ChatRoomLayout({
           if (result.code === 200 && result.data) {
             newMessages = result.data.messages;
             has_more = result.data.has_more;
+            nextCursorRef.current = result.data.next_cursor ?? null;
           } else {
             console.error("API 回應格式錯誤:", result);
             return;
@@ -701,6 +709,7 @@ export default function ChatRoomLayout({
     setMessages([]);
     setPage(1);
     setHasMore(true);
+    nextCursorRef.current = null;
     setVisibleDate("");
     loadChatMessages(1, false);
   }, [currentPlatform, loadChatMessages, fbPageId]);
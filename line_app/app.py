@@ -47,6 +47,8 @@ from config import (
     MYSQL_DB,
     ASSET_LOCAL_DIR,
     ASSET_ROUTE_PREFIX,
+    WEBHOOK_QUEUE_ENABLED,
+    BROADCAST_CHUNK_SIZE,
 )
 from db import (
     engine,
@@ -74,6 +76,9 @@ from services.line_sdk import (
     get_channel_access_token_by_channel_id,
     get_messaging_api,
     get_messaging_api_by_line_id,
+    get_webhook_handler_by_line_id,
+    invalidate_channel_cache,
+    channel_registry,
     fetch_line_profile,
     setup_line_webhook,
     get_login_access_token,
@@ -87,17 +92,29 @@ from services.member_service import (
     is_gpt_enabled_for_user,
     is_human_override_active,
     get_all_follower_ids,
-    backfill_line_friends_on_startup,
     DISPLAY_NAME_TOKEN,
     DISPLAY_NAME_TOKEN_SIMPLE,
     _get_display_name_for_uid,
     render_template_text,
 )
+from services.broadcast_engine import run_broadcast, rollup_send_status
+from services.broadcast_jobs import broadcast_jobs
+from services.follower_backfill import backfill_line_friends_on_startup, follower_backfill
+from services.webhook_queue import webhook_queue
+from services.profile_refresh import profile_refresher
+from services.auto_response_index import (
+    auto_response_index,
+    check_always_response,
+    check_keyword_trigger,
+    check_welcome_response,
+    invalidate_auto_response_index,
+)
 from services.conversation_service import (
     ensure_thread_for_user,
     insert_conversation_message,
     get_chat_history,
     get_member_conversations,
+    reset_thread_unread,
 )
 from typing import Any, Dict, List, Optional, Tuple, Iterable
 from urllib.parse import quote_plus, quote, parse_qs
@@ -107,6 +124,7 @@ from flask import Flask, request, abort, jsonify, render_template_string, redire
 
 # LINE Bot SDK v3
 from linebot.v3 import WebhookHandler
+from linebot.v3.webhook import SignatureValidator
 from linebot.v3.messaging import (
     ApiClient,
     Configuration,
@@ -239,10 +257,10 @@ def _map_question_for_liff(q: dict) -> dict:
 # -------------------------------------------------
 # upsert_member, insert_message (已廢棄) 已遷移至 services/member_service.py
 
-# upsert_line_friend, get_all_follower_ids, backfill_line_friends_on_startup
-# 已遷移至 services/member_service.py
+# upsert_line_friend, get_all_follower_ids 已遷移至 services/member_service.py
+# backfill_line_friends_on_startup 已遷移至 services/follower_backfill.py
 
-# 啟動時自動補齊 line_friends 的好友資料（只補缺少的）
+# 啟動時在背景補齊 line_friends 的好友資料（只補缺少的，不擋啟動）
 backfill_line_friends_on_startup()
 
 
@@ -251,216 +269,8 @@ backfill_line_friends_on_startup()
 # -------------------------------------------------
 # Auto Response 檢查函數
 # -------------------------------------------------
-# DB schema compatibility for auto_response tables
-AUTO_RESPONSE_MSG_ID_COL = (
-    "response_id" if _table_has("auto_response_messages", "response_id") else "auto_response_id"
-)
-AUTO_RESPONSE_KW_ID_COL = (
-    "auto_response_id" if _table_has("auto_response_keywords", "auto_response_id") else "response_id"
-)
-AUTO_RESPONSE_KW_TEXT_COL = (
-    "keyword" if _table_has("auto_response_keywords", "keyword") else "keyword_text"
-)
-
-# Security: validate all dynamically-determined column names against whitelist
-_VALID_COL_NAMES = frozenset({
-    "line_channel_id", "channel_id",
-    "response_id", "auto_response_id",
-    "keyword", "keyword_text",
-})
-for _col_var_name, _col_val in [
-    ("LINE_CHANNEL_ID_COL", LINE_CHANNEL_ID_COL),
-    ("AUTO_RESPONSE_MSG_ID_COL", AUTO_RESPONSE_MSG_ID_COL),
-    ("AUTO_RESPONSE_KW_ID_COL", AUTO_RESPONSE_KW_ID_COL),
-    ("AUTO_RESPONSE_KW_TEXT_COL", AUTO_RESPONSE_KW_TEXT_COL),
-]:
-    if _col_val not in _VALID_COL_NAMES:
-        raise RuntimeError(f"Invalid column name for {_col_var_name}: {_col_val!r}")
-
-def _get_basic_id_for_line_channel(line_channel_id: Optional[str]) -> Optional[str]:
-    if not line_channel_id:
-        return None
-    try:
-        row = fetchone(
-            f"SELECT basic_id FROM line_channels WHERE {LINE_CHANNEL_ID_COL}=:cid LIMIT 1",
-            {"cid": line_channel_id},
-        )
-        return row.get("basic_id") if row else None
-    except Exception:
-        return None
-
-
-def _parse_json_list(val) -> Optional[list]:
-    if val is None:
-        return None
-    if isinstance(val, list):
-        return val
-    if isinstance(val, (str, bytes)):
-        try:
-            return json.loads(val)
-        except Exception:
-            return None
-    return None
-
-
-def _time_to_seconds(t) -> Optional[int]:
-    if t is None:
-        return None
-    if isinstance(t, datetime.timedelta):
-        return int(t.total_seconds())
-    if isinstance(t, datetime.time):
-        return int(t.hour * 3600 + t.minute * 60 + t.second)
-    if isinstance(t, str):
-        try:
-            parts = [int(p) for p in t.split(":")]
-            while len(parts) < 3:
-                parts.append(0)
-            return parts[0] * 3600 + parts[1] * 60 + parts[2]
-        except Exception:
-            return None
-    return None
-
-
-def _is_within_date_range(start, end, today: datetime.date) -> bool:
-    if start is None and end is None:
-        return True
-    if start is None:
-        return today <= end
-    if end is None:
-        return today >= start
-    return start <= today <= end
-
-
-def _is_within_time_range(start, end, now: datetime.datetime) -> bool:
-    if start is None and end is None:
-        return True
-    now_sec = now.hour * 3600 + now.minute * 60 + now.second
-    start_sec = _time_to_seconds(start)
-    end_sec = _time_to_seconds(end)
-    if start_sec is None and end_sec is None:
-        return True
-    if start_sec is None:
-        return now_sec <= end_sec
-    if end_sec is None:
-        return now_sec >= start_sec
-    if start_sec == end_sec:
-        # Treat equal bounds as "no time restriction"
-        return True
-    if start_sec < end_sec:
-        return start_sec <= now_sec <= end_sec
-    # Crosses midnight
-    return now_sec >= start_sec or now_sec <= end_sec
-
-
-def _auto_response_applicable(row: Dict[str, Any], line_channel_id: Optional[str]) -> bool:
-    # Channel filter
-    ar_channel_id = row.get("channel_id")
-    if ar_channel_id:
-        basic_id = _get_basic_id_for_line_channel(line_channel_id)
-        if line_channel_id and ar_channel_id == line_channel_id:
-            pass
-        elif basic_id and ar_channel_id == basic_id:
-            pass
-        else:
-            return False
-
-    # Channels list filter (if set and doesn't include LINE)
-    channels = _parse_json_list(row.get("channels"))
-    if channels is not None and "LINE" not in channels:
-        return False
-
-    today = datetime.datetime.now().date()
-    now = datetime.datetime.now()
-    if not _is_within_date_range(row.get("date_range_start"), row.get("date_range_end"), today):
-        return False
-    if not _is_within_time_range(row.get("trigger_time_start"), row.get("trigger_time_end"), now):
-        return False
-    return True
-
-
-def check_keyword_trigger(line_uid: str, text: str, line_channel_id: Optional[str] = None):
-    """
-    檢查是否有匹配的關鍵字自動回應
-
-    Returns:
-        回應內容（如果有匹配且啟用）或 None
-    """
-    try:
-        rows = fetchall(f"""
-            SELECT ar.channel_id, ar.channels, ar.trigger_time_start, ar.trigger_time_end,
-                   ar.date_range_start, ar.date_range_end, ar.updated_at, ar.created_at,
-                   arm.message_content
-            FROM auto_responses ar
-            JOIN auto_response_keywords ark ON ar.id = ark.{AUTO_RESPONSE_KW_ID_COL}
-            JOIN auto_response_messages arm ON ar.id = arm.{AUTO_RESPONSE_MSG_ID_COL}
-            WHERE ar.is_active = 1
-              AND ar.trigger_type = 'keyword'
-              AND ark.is_enabled = 1
-              AND LOWER(:text) = LOWER(ark.{AUTO_RESPONSE_KW_TEXT_COL})
-            ORDER BY COALESCE(ar.updated_at, ar.created_at) DESC, arm.sequence_order ASC
-        """, {"text": text})
-        for row in rows:
-            if _auto_response_applicable(row, line_channel_id):
-                logging.info(f"Keyword matched for user {line_uid}: {text}")
-                return row.get("message_content") if isinstance(row, dict) else row[0]
-        return None
-    except Exception as e:
-        logging.exception(f"check_keyword_trigger error: {e}")
-        return None
-
-def check_always_response(line_channel_id: Optional[str] = None):
-    """
-    檢查是否有啟用的一律回應
-
-    Returns:
-        回應內容（如果有啟用）或 None
-    """
-    try:
-        rows = fetchall(f"""
-            SELECT ar.channel_id, ar.channels, ar.trigger_time_start, ar.trigger_time_end,
-                   ar.date_range_start, ar.date_range_end, ar.updated_at, ar.created_at,
-                   arm.message_content
-            FROM auto_responses ar
-            JOIN auto_response_messages arm ON ar.id = arm.{AUTO_RESPONSE_MSG_ID_COL}
-            WHERE ar.is_active = 1
-              AND ar.trigger_type IN ('always', 'follow')
-            ORDER BY COALESCE(ar.updated_at, ar.created_at) DESC, arm.sequence_order ASC
-        """)
-        for row in rows:
-            if _auto_response_applicable(row, line_channel_id):
-                logging.info("Always response is active")
-                return row.get("message_content") if isinstance(row, dict) else row[0]
-        return None
-    except Exception as e:
-        logging.exception(f"check_always_response error: {e}")
-        return None
-
-def check_welcome_response(line_channel_id: Optional[str] = None):
-    """
-    檢查是否有啟用的歡迎訊息
-
-    Returns:
-        回應內容（如果有啟用）或 None
-    """
-    try:
-        rows = fetchall(f"""
-            SELECT ar.channel_id, ar.channels, ar.trigger_time_start, ar.trigger_time_end,
-                   ar.date_range_start, ar.date_range_end, ar.updated_at,
-                   arm.message_content
-            FROM auto_responses ar
-            JOIN auto_response_messages arm ON ar.id = arm.{AUTO_RESPONSE_MSG_ID_COL}
-            WHERE ar.is_active = 1
-              AND ar.trigger_type = 'welcome'
-            ORDER BY ar.updated_at DESC, arm.sequence_order ASC
-        """)
-        for row in rows:
-            if _auto_response_applicable(row, line_channel_id):
-                logging.info("Welcome response is active")
-                return row.get("message_content") if isinstance(row, dict) else row[0]
-        return None
-    except Exception as e:
-        logging.exception(f"check_welcome_response error: {e}")
-        return None
+# 規則查詢已改為記憶體索引：check_keyword_trigger / check_always_response /
+# check_welcome_response 遷移至 services/auto_response_index.py
 
 # -------------------------------------------------
 # Base64 圖片 → 檔案
@@ -972,13 +782,26 @@ def _add_campaign_recipients(campaign_id: int, mids: List[int]):
         conn.execute(text("UPDATE messages SET send_count=send_count+:n, updated_at=:now WHERE id=:cid"),
                      {"n": len(mids), "cid": campaign_id, "now": utcnow()})
 
-def push_campaign(payload: dict) -> Dict[str, Any]:
-    # ⛔ 重要：不要在這裡無條件呼叫 _create_campaign_row()！
-    # Backend (FastAPI) 已在 messages 表建好記錄，並透過 payload["campaign_id"] 傳過來。
-    # 如果這裡再 INSERT 一筆，會造成重複記錄（歷史 bug，2026-04-13 修復）。
-    # 只有獨立腳本（manage_push.py 等）不帶 campaign_id 時，才需要自行建立。
-    cid = payload.get("campaign_id") or _create_campaign_row(payload)
+# 用一個不存在的 userId 試組訊息：若它出現在 Flex 內容裡（追蹤連結），代表每人內容不同
+_PERSONALIZATION_PROBE_UID = "U" + "0" * 32
 
+
+def _is_personalized(probe_messages: list) -> bool:
+    return any(_PERSONALIZATION_PROBE_UID in json.dumps(m.to_dict(), ensure_ascii=False) for m in probe_messages)
+
+
+def _mark_campaign_failed(cid: int, reason: str) -> None:
+    execute(
+        "UPDATE messages SET send_status='發送失敗', failure_reason=:reason, updated_at=:now WHERE id=:cid",
+        {"cid": cid, "reason": reason[:2000], "now": utcnow()},
+    )
+
+
+def _select_campaign_recipients(payload: dict, cid: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    依 target_audience / 標籤 / OA 取得目標會員 [{line_uid, id}, ...]。
+    沒有任何目標時把 messages 標成發送失敗，回傳 ([], 錯誤訊息)。
+    """
     # 依 target_audience 取得目標用戶（使用 members 表）
     target_audience = payload.get("target_audience", "all")
     include_tags = payload.get("include_tags", [])
@@ -1160,133 +983,102 @@ def push_campaign(payload: dict) -> Dict[str, Any]:
             error_msg = "未找到符合條件的會員"
 
         logging.error(f"[Broadcast Error] {error_msg}")
-        execute(
-            "UPDATE messages SET send_status='發送失敗', failure_reason=:reason, updated_at=:now WHERE id=:cid",
-            {"cid": cid, "reason": error_msg, "now": utcnow()},
-        )
-        return {"ok": False, "campaign_id": cid, "sent": 0, "error": error_msg}
-
-    # 在迴圈外先決定要用哪個 Messaging API（避免重複 new client）
-    # line_cid 已在上面 target 查詢前取得，這裡直接用
-    api = get_messaging_api_by_line_id(line_cid)
-
-    sent = 0
-    failed = 0
-    total_targets = len(rs)
+        _mark_campaign_failed(cid, error_msg)
+        return [], error_msg
 
-    logging.info(f"Starting to send to {total_targets} members.")
-
-    # 後台自訂的兩段文案（可以是空）
-    notification_message = (payload.get("notification_message") or "").strip()
-    preview_message = (payload.get("preview_message") or "").strip()
+    return rs, None
 
-    for idx, r in enumerate(rs, 1):
-        uid = r["line_uid"]
-        mid = r["id"]
 
-        if not _is_valid_line_user_id(uid):
-            logging.warning(f"[{idx}/{total_targets}] Skip invalid user id: {uid}")
-            failed += 1
-            continue
+def _split_valid_recipients(rs: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    # 無效 userId 直接算失敗，不送進群發引擎
+    recipients = [r for r in rs if _is_valid_line_user_id(r["line_uid"])]
+    invalid = len(rs) - len(recipients)
+    if invalid:
+        logging.warning(f"Skip {invalid} invalid user ids")
+    return recipients, invalid
 
-        try:
-            # 先組 Flex（裡面的 alt_text 已經用 preview_message）
-            msgs = build_user_messages_from_payload(payload, cid, uid)
-
-            # 判斷是否啟用「雙訊息模式」
-            #   - 兩個欄位都有值，而且內容不同：才啟用
-            #   - 否則就跟原本一樣只送一次 Flex
-            
-            #use_two_step = (
-            #   notification_message
-            #  and preview_message
-            #  and notification_message != preview_message
-            #)
-
-            use_two_step = False
-            
-            logging.info(
-                f"[{idx}/{total_targets}] Sending to {uid} "
-                f"(member_id={mid}), two_step={use_two_step}"
-            )
 
-            # - altText = notification_message（作為通知內容）
-            # - notification_disabled = False（讓通知跳出）
-            # - 聊天室不會顯示文字 notification_message
+def _deliver_campaign(payload: dict, cid: int, recipients: List[Dict[str, Any]], *,
+                      skip_chunks=None, on_chunk_done=None) -> Dict[str, Any]:
+    """
+    組訊息並交給群發引擎送出（不更新 messages.send_status，由呼叫端彙整）。
+    訊息組裝失敗會直接丟出例外。
+    """
+    # 多帳號模式：依推播 channel 決定要用哪個 Messaging API（避免重複 new client）
+    line_cid = (payload or {}).get("line_channel_id") or (payload or {}).get("channel_id")
+    api = get_messaging_api_by_line_id(line_cid)
 
-            try:
-                # 用 notification_message 當 alt_text（LINE 通知會用 alt_text）
-                alt_txt = notification_message or preview_message or payload.get("title", "通知")
+    logging.info(f"Starting to send to {len(recipients)} members.")
 
-                # msgs 是 build_user_messages_from_payload 回傳的 list
-                # 通常 msgs[0] 就是 FlexMessage
-                flex_msg = msgs[0]
+    # 後台自訂的兩段文案（可以是空）
+    notification_message = (payload.get("notification_message") or "").strip()
+    preview_message = (payload.get("preview_message") or "").strip()
 
-                # 強制設置 Flex 的 alt_text
-                flex_msg.alt_text = alt_txt
+    # 用 notification_message 當 alt_text（LINE 通知會用 alt_text）
+    alt_txt = notification_message or preview_message or payload.get("title", "通知")
+
+    def _build_for(uid: str) -> list:
+        # msgs 是 build_user_messages_from_payload 回傳的 list，msgs[0] 就是 FlexMessage
+        flex_msg = build_user_messages_from_payload(payload, cid, uid)[0]
+        flex_msg.alt_text = alt_txt  # 強制設置 Flex 的 alt_text
+        return [flex_msg]
+
+    # Flex 內若有追蹤連結（/__track?uid=...），每人內容不同只能逐人 push；
+    # 否則所有人內容相同，可用 multicast 一次送 500 人。
+    probe_messages = _build_for(_PERSONALIZATION_PROBE_UID)
+    shared_messages = None if _is_personalized(probe_messages) else probe_messages
+
+    return run_broadcast(
+        api,
+        recipients,
+        campaign_id=cid,
+        alt_text=alt_txt,
+        messages=shared_messages,
+        build_messages=None if shared_messages is not None else _build_for,
+        skip_chunks=skip_chunks,
+        on_chunk_done=on_chunk_done,
+    )
 
-                api.push_message(PushMessageRequest(
-                    to=uid,
-                    messages=[flex_msg],
-                    notification_disabled=False     # 允許通知跳出
-                ))
 
-                sent += 1
-                logging.info(f"[{idx}/{total_targets}] ✓ Success to {uid}")
+def push_campaign(payload: dict) -> Dict[str, Any]:
+    """同步群發：送完才回傳（獨立腳本 / 舊呼叫端用；backend 走 broadcast_jobs）"""
+    # ⛔ 重要：不要在這裡無條件呼叫 _create_campaign_row()！
+    # Backend (FastAPI) 已在 messages 表建好記錄，並透過 payload["campaign_id"] 傳過來。
+    # 如果這裡再 INSERT 一筆，會造成重複記錄（歷史 bug，2026-04-13 修復）。
+    # 只有獨立腳本（manage_push.py 等）不帶 campaign_id 時，才需要自行建立。
+    cid = payload.get("campaign_id") or _create_campaign_row(payload)
 
-                # 寫入 1:1 聊天紀錄（conversation_messages）：
-                # 只存參照 broadcast_message_id → messages.id，不複製 flex JSON 本體，
-                # Backend 聊天室讀取時再以此 id 撈 messages.flex_message_json 還原外觀。
-                # 寫入失敗只記 log，不影響群發主流程。
-                try:
-                    thread_id = ensure_thread_for_user(uid)
-                    insert_conversation_message(
-                        thread_id=thread_id,
-                        role="assistant",
-                        direction="outgoing",
-                        message_type="flex",
-                        response=alt_txt,
-                        message_source="broadcast",
-                        status="sent",
-                        broadcast_message_id=cid,
-                    )
-                except Exception:
-                    logging.exception(
-                        f"[{idx}/{total_targets}] Failed to save broadcast to conversation_messages for {uid}"
-                    )
+    rs, error_msg = _select_campaign_recipients(payload, cid)
+    if error_msg:
+        return {"ok": False, "campaign_id": cid, "sent": 0, "error": error_msg}
 
-                # 記錄 outgoing log
-                # 註解：群發記錄已在 _create_campaign_row() 和 _add_campaign_recipients() 中處理
-                # insert_message() 使用錯誤的 schema (試圖寫 member_id 到 messages 表)
-                # if mid is not None:
-                #     payload_for_log = dict(payload)
-                #     payload_for_log.pop("image_base64", None)
-                #     payload_for_log.pop("image_url", None)
-                #     insert_message(
-                #         mid,
-                #         "outgoing",
-                #         "flex",
-                #         {"campaign_id": cid, "payload": payload_for_log},
-                #         campaign_id=cid,
-                #     )
+    recipients, invalid = _split_valid_recipients(rs)
+    try:
+        result = _deliver_campaign(payload, cid, recipients)
+    except Exception as e:
+        error_msg = f"Failed to build broadcast message: {e}"
+        logging.exception(f"[Broadcast Error] {error_msg}")
+        _mark_campaign_failed(cid, error_msg)
+        return {"ok": False, "campaign_id": cid, "sent": 0, "failed": len(rs), "error": error_msg}
 
-            except Exception as e:
-                logging.exception(f"[{idx}/{total_targets}] ✗ Failed to {uid}: {e}")
-                failed += 1
-                continue
+    sent = result["sent"]
+    failed = result["failed"] + invalid
 
-        except Exception as e:
-            logging.exception(f"[{idx}/{total_targets}] ✗ Failed to {uid}: {e}")
-            failed += 1
-            continue
+    rollup_send_status(cid, sent=sent, failed=failed, errors=result["errors"])
 
-    logging.info(f"[Broadcast Done] sent={sent}, failed={failed}")
+    logging.info(
+        f"[Broadcast Done] sent={sent}, failed={failed}, mode={result['mode']}, "
+        f"chunks={result['chunks']}, failed_chunks={result['failed_chunks']}"
+    )
 
     return {
-        "ok": True,
+        "ok": sent > 0,
         "campaign_id": cid,
         "sent": sent,
         "failed": failed,
+        "chunks": result["chunks"],
+        "failed_chunks": result["failed_chunks"],
+        "errors": result["errors"][:20] or None,
     }
 
 
@@ -2284,6 +2076,69 @@ def api_broadcast():
     return jsonify({**result, "preflight": check})
 
 
+# 非同步群發：選好收件人、建立工作後立即回 job_id，實際發送在背景進行
+@app.route("/api/v1/messages/broadcast_jobs", methods=["POST"])
+def api_broadcast_job_submit():
+    payload = request.get_json(force=True) or {}
+
+    from usage_monitor import preflight_check
+    check = preflight_check(payload)
+    if not check.get("ok"):
+        return jsonify(check), 409
+
+    cid = payload.get("campaign_id") or _create_campaign_row(payload)
+    rs, error_msg = _select_campaign_recipients(payload, cid)
+    if error_msg:
+        return jsonify({"ok": False, "campaign_id": cid, "sent": 0, "error": error_msg})
+
+    recipients, invalid = _split_valid_recipients(rs)
+    job = broadcast_jobs.create(cid, {**payload, "campaign_id": cid}, recipients, invalid, BROADCAST_CHUNK_SIZE)
+    execute(
+        "UPDATE messages SET send_status='發送中', updated_at=:now WHERE id=:cid",
+        {"cid": cid, "now": utcnow()},
+    )
+    broadcast_jobs.run_in_background(job["job_id"], _run_broadcast_job)
+    return jsonify({"ok": True, **job, "preflight": check}), 202
+
+
+@app.route("/api/v1/messages/broadcast_jobs/<job_id>", methods=["GET"])
+def api_broadcast_job_status(job_id):
+    job = broadcast_jobs.get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "job not found"}), 404
+    return jsonify({"ok": True, **job})
+
+
+def _run_broadcast_job(job: Dict[str, Any]) -> None:
+    """背景執行 / 續跑群發工作：只送未完成的區塊，每塊完成即記錄進度"""
+    job_id, cid = job["job_id"], job["campaign_id"]
+
+    def _on_chunk_done(idx: int, result: Dict[str, Any]) -> None:
+        broadcast_jobs.record_chunk(job_id, idx, len(result["sent_uids"]), result["failed"], result["errors"])
+
+    try:
+        _deliver_campaign(
+            job["payload"], cid, job["recipients"],
+            skip_chunks=job["done_chunks"], on_chunk_done=_on_chunk_done,
+        )
+    except Exception as e:
+        error_msg = f"Failed to build broadcast message: {e}"
+        logging.exception(f"[Broadcast Error] {error_msg}")
+        _mark_campaign_failed(cid, error_msg)
+        broadcast_jobs.finish(job_id, "failed", error=error_msg[:500])
+        return
+
+    # 以整個工作（含先前中斷前已送的區塊）的統計彙整
+    progress = broadcast_jobs.get(job_id)
+    status = rollup_send_status(cid, sent=progress["sent"], failed=progress["failed"],
+                                errors=progress["errors"] or [])
+    broadcast_jobs.finish(job_id, "done" if status == "已發送" else "failed")
+    logging.info(
+        f"[Broadcast Job Done] job_id={job_id} campaign_id={cid} "
+        f"sent={progress['sent']} failed={progress['failed']} attempts={progress['attempts']}"
+    )
+
+
 # ============================================
 # 1:1 聊天 API
 # ============================================
@@ -2432,13 +2287,15 @@ def api_mark_chat_read():
             return jsonify({"ok": False, "error": "line_uid required"}), 400
 
         # 更新該 thread 的所有 incoming 訊息為已讀
+        # （status IS NULL 也要涵蓋——SQL 三值邏輯下 status != 'read' 會漏掉 NULL）
         result = execute("""
             UPDATE conversation_messages
             SET status = 'read', updated_at = NOW()
             WHERE thread_id = :thread_id
               AND direction = 'incoming'
-              AND status != 'read'
+              AND (status IS NULL OR status != 'read')
         """, {"thread_id": line_uid})
+        reset_thread_unread(line_uid)
 
         marked_count = result.rowcount if hasattr(result, 'rowcount') else 0
         logging.info(f"[api_mark_chat_read] 標記 {marked_count} 則訊息為已讀，thread_id={line_uid}")
@@ -2602,11 +2459,28 @@ def connect_line_channel():
         ON CONFLICT({id_col})
         DO UPDATE SET channel_secret=:sec, channel_access_token=:tok, is_active=1
     """, {"cid": line_channel_id, "sec": secret, "tok": token})
+    invalidate_channel_cache(line_channel_id)
 
     # 自動註冊 webhook
     result = setup_line_webhook(line_channel_id, token)
     return jsonify(result)
 
+# backend 更新 / 刪除 line_channels 後通知這裡清掉快取的憑證與 client
+@app.post("/api/line_channels/invalidate_cache")
+def invalidate_line_channel_cache():
+    data = request.get_json(silent=True) or {}
+    line_channel_id = (data.get("channel_id") or "").strip() or None
+    invalidate_channel_cache(line_channel_id)
+    # basic_id 對照也在自動回應索引裡
+    invalidate_auto_response_index()
+    return jsonify({"ok": True, "channel_id": line_channel_id, "cache": channel_registry.stats()})
+
+# backend 新增 / 修改 / 刪除 / 切換自動回應後通知這裡重建規則索引
+@app.post("/api/auto_responses/invalidate_cache")
+def invalidate_auto_response_cache():
+    invalidate_auto_response_index()
+    return jsonify({"ok": True, "index": auto_response_index.stats()})
+
 # 後台送進 Channel ID/Secret + 要開啟的 view_url，自動建立 LIFF 並回存 liff_id_open
 @app.post("/api/connect_line_liff")
 def connect_line_liff():
@@ -2638,6 +2512,8 @@ def connect_line_liff():
 def callback():
     signature = request.headers.get("X-Line-Signature", "")
     body = request.get_data(as_text=True)
+    if WEBHOOK_QUEUE_ENABLED:
+        return _enqueue_webhook(None, LINE_CHANNEL_SECRET, body, signature)
     try:
         default_handler.handle(body, signature)   # ← 這裡要用 default_handler
     except Exception as e:
@@ -2664,9 +2540,12 @@ def callback_by_line_id(line_channel_id):
     body = request.get_data(as_text=True)
     logging.info(f"[callback/{line_channel_id}] body length={len(body)}")
 
-    # 3) 以該 secret 建 handler，掛上同一組事件處理
-    h = WebhookHandler(cred["secret"])
-    register_handlers(h)
+    # 2.1) 佇列模式：驗章後入列即回 200，事件由背景 worker 處理
+    if WEBHOOK_QUEUE_ENABLED:
+        return _enqueue_webhook(line_channel_id, cred["secret"], body, signature)
+
+    # 3) 取該頻道的 handler（registry 快取；首次建立時掛上同一組事件處理）
+    h = get_webhook_handler_by_line_id(line_channel_id, cred["secret"], register_handlers)
 
     # 4) 驗章 + 分派事件
     try:
@@ -2681,6 +2560,47 @@ def callback_by_line_id(line_channel_id):
     return "OK", 200
 
 
+def _enqueue_webhook(line_channel_id: Optional[str], secret: str, body: str, signature: str):
+    """驗章後把事件寫進本機佇列，立即回 200（LINE 要求 webhook 盡快回應）"""
+    if not SignatureValidator(secret).validate(body, signature):
+        logging.error(f"[callback/{line_channel_id}] invalid signature")
+        return "invalid signature", 400
+    try:
+        n = webhook_queue.enqueue_events(body, line_channel_id)
+    except Exception:
+        logging.exception(f"[callback/{line_channel_id}] enqueue failed")
+        return "enqueue error", 500
+    logging.info(f"[callback/{line_channel_id}] enqueued {n} events")
+    return "OK", 200
+
+
+def _dispatch_queued_event(line_channel_id: Optional[str], body: str) -> None:
+    """佇列 worker 呼叫：在 app context 內以同一組 handler 處理單一事件（已於入列前驗章）"""
+    with app.app_context():
+        g.line_channel_id = line_channel_id
+        _queue_handler.handle(body, "")
+
+
+@app.get("/__profile_cache/stats")
+def profile_cache_stats():
+    """LINE profile 新鮮度快取命中率 / 背景更新統計"""
+    return jsonify({"ok": True, **profile_refresher.stats()})
+
+
+@app.get("/__backfill/stats")
+def backfill_stats():
+    """好友補齊進度：是否執行中、已處理頁數 / 寫入數、各 OA 游標"""
+    return jsonify({"ok": True, **follower_backfill.stats()})
+
+
+@app.get("/__webhook_queue/stats")
+def webhook_queue_stats():
+    """佇列深度、最舊待處理事件延遲、處理延遲 p50/p95"""
+    if not WEBHOOK_QUEUE_ENABLED:
+        return jsonify({"ok": True, "enabled": False})
+    return jsonify({"ok": True, "enabled": True, **webhook_queue.stats()})
+
+
 def _source_key(ev_source) -> str:
     uid = getattr(ev_source, "user_id", None)
     if uid: return uid
@@ -2823,6 +2743,7 @@ def on_follow(event: FollowEvent):
         try:
             # 取得 LINE profile
             dn, pu = fetch_line_profile(uid, line_channel_id=line_channel_id)
+            profile_refresher.mark_fresh(uid)
 
             # 創建/更新 LINE 好友記錄
             friend_id = upsert_line_friend(
@@ -2895,9 +2816,12 @@ def on_postback(event: PostbackEvent):
     if uid:
         try:
             cur = fetch_member_profile(uid) or {}
-            api_dn, api_pu = fetch_line_profile(uid, line_channel_id=line_channel_id)
-            dn_to_write = api_dn if (api_dn and api_dn != cur.get("line_display_name")) else None
-            pu_to_write = api_pu if (api_pu and api_pu != cur.get("line_avatar")) else None
+            # profile 在新鮮期內直接用 DB 值；過期改由背景 worker 更新
+            api_dn, api_pu, fetched = profile_refresher.resolve(
+                uid, line_channel_id, cur.get("line_display_name"), cur.get("line_avatar"),
+            )
+            dn_to_write = api_dn if (fetched and api_dn and api_dn != cur.get("line_display_name")) else None
+            pu_to_write = api_pu if (fetched and api_pu and api_pu != cur.get("line_avatar")) else None
 
             # 1) 一樣先處理 members（問卷用的那張表）
             channel_id = getattr(g, 'line_channel_id', None)
@@ -3099,9 +3023,10 @@ def on_text(event: MessageEvent):
 
     # === 1. 建立 thread 並儲存用戶的 incoming message ===
     thread_id = None
+    incoming_msg_id = None  # 自動回覆以 reply_to_message_id 指回這則訊息
     try:
         thread_id = ensure_thread_for_user(uid)
-        insert_conversation_message(
+        incoming_msg_id = insert_conversation_message(
             thread_id=thread_id,
             role="user",
             direction="incoming",
@@ -3127,12 +3052,12 @@ def on_text(event: MessageEvent):
             cur_dn = cur.get("line_display_name")
             cur_pu = cur.get("line_avatar")
 
-            # 從 LINE API 取得最新 profile
-            api_dn, api_pu = fetch_line_profile(uid, line_channel_id=line_channel_id)
+            # profile 在新鮮期內直接用 DB 值；過期改由背景 worker 更新，不在 webhook 內等 LINE API
+            api_dn, api_pu, fetched = profile_refresher.resolve(uid, line_channel_id, cur_dn, cur_pu)
 
             # 只在有變更時才更新
-            dn_to_write = api_dn if (api_dn and api_dn != cur_dn) else None
-            pu_to_write = api_pu if (api_pu and api_pu != cur_pu) else None
+            dn_to_write = api_dn if (fetched and api_dn and api_dn != cur_dn) else None
+            pu_to_write = api_pu if (fetched and api_pu and api_pu != cur_pu) else None
 
             # 更新 members 表
             channel_id = getattr(g, 'line_channel_id', None)
@@ -3306,6 +3231,7 @@ def on_text(event: MessageEvent):
                     message_source=message_source,
                     status="sent",
                     unanswered=is_unanswered,
+                    reply_to_message_id=incoming_msg_id,
                 )
 
                 # 房卡另存一筆 room_cards 訊息（供 CRM 聊天室顯示）
@@ -3318,7 +3244,8 @@ def on_text(event: MessageEvent):
                             message_type="room_cards",
                             response=json.dumps({"room_cards": ai_room_cards}, ensure_ascii=False),
                             message_source=message_source,
-                            status="sent"
+                            status="sent",
+                            reply_to_message_id=incoming_msg_id,
                         )
                     except Exception:
                         logging.exception("[on_text] Failed to save room_cards message")
@@ -3454,6 +3381,15 @@ def register_handlers(h):
 # 啟動時，先把事件註冊到預設 handler（吃 .env 的 secret）
 register_handlers(default_handler)
 
+# 佇列 worker 用的 handler：入列前已驗章，這裡略過驗章
+_queue_handler = WebhookHandler(LINE_CHANNEL_SECRET or "", skip_signature_verification=lambda: True)
+register_handlers(_queue_handler)
+if WEBHOOK_QUEUE_ENABLED:
+    webhook_queue.start(_dispatch_queued_event)
+
+# 群發工作：續跑上次程序中斷時未完成的工作，之後定期檢查 lease 逾時的工作
+broadcast_jobs.start_resume_watcher(_run_broadcast_job)
+
 # -------------------------------------------------
 # 測試路由
 # -------------------------------------------------
@@ -96,3 +96,68 @@ ASSET_ROUTE_PREFIX = "/uploads"
 # 功能開關
 # -------------------------------------------------
 AUTO_BACKFILL_FRIENDS = os.getenv("AUTO_BACKFILL_FRIENDS", "1") == "1"
+
+# -------------------------------------------------
+# 好友補齊（背景 backfill）
+# -------------------------------------------------
+# 取 LINE profile 的速率上限（token bucket，次/秒）
+BACKFILL_PROFILE_RPS = float(os.getenv("BACKFILL_PROFILE_RPS", "50"))
+# 同時取 profile 的執行緒數
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "8"))
+# members / line_friends 每批 multi-row 寫入筆數
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "500"))
+# 各 OA 的 followers 分頁游標，重啟後從上次完成的頁接續
+BACKFILL_STATE_PATH = os.getenv(
+    "BACKFILL_STATE_PATH",
+    str(Path(__file__).resolve().parent / "var" / "follower_backfill.json"),
+)
+
+# -------------------------------------------------
+# 群發引擎
+# -------------------------------------------------
+# 每個 multicast 區塊的收件人數（LINE 上限 500）
+BROADCAST_CHUNK_SIZE = min(int(os.getenv("BROADCAST_CHUNK_SIZE", "500")), 500)
+# 同時送出的區塊數（thread pool 上限）
+BROADCAST_MAX_WORKERS = int(os.getenv("BROADCAST_MAX_WORKERS", "8"))
+# 非同步群發工作（收件人名單 / 已完成區塊）存放位置，程序重啟後可續跑
+BROADCAST_JOB_PATH = os.getenv(
+    "BROADCAST_JOB_PATH",
+    str(Path(__file__).resolve().parent / "var" / "broadcast_jobs.sqlite3"),
+)
+
+# -------------------------------------------------
+# Webhook 非同步佇列
+# -------------------------------------------------
+# 開啟後 /callback 只驗章 + 入列就回 200，事件由背景 worker 依使用者順序處理
+WEBHOOK_QUEUE_ENABLED = os.getenv("WEBHOOK_QUEUE_ENABLED", "0") == "1"
+WEBHOOK_QUEUE_PATH = os.getenv(
+    "WEBHOOK_QUEUE_PATH",
+    str(Path(__file__).resolve().parent / "var" / "webhook_queue.sqlite3"),
+)
+WEBHOOK_QUEUE_WORKERS = int(os.getenv("WEBHOOK_QUEUE_WORKERS", "4"))
+# 處理失敗的重試上限（超過即標記 failed，留待人工檢查）
+WEBHOOK_QUEUE_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_QUEUE_MAX_ATTEMPTS", "3"))
+
+# -------------------------------------------------
+# LINE 頻道憑證 / client 快取
+# -------------------------------------------------
+# line_channels 查到的憑證與 MessagingApi / WebhookHandler 快取秒數
+LINE_CHANNEL_CACHE_TTL = int(os.getenv("LINE_CHANNEL_CACHE_TTL", "300"))
+# 查無頻道（或停用）時的負向快取秒數，避免新頻道上線後要等太久
+LINE_CHANNEL_NEGATIVE_CACHE_TTL = int(os.getenv("LINE_CHANNEL_NEGATIVE_CACHE_TTL", "30"))
+
+# -------------------------------------------------
+# LINE Profile 更新快取
+# -------------------------------------------------
+# 同一使用者在此秒數內已向 LINE 取過 profile 就不再取；過期改由背景 worker 批次更新
+PROFILE_FRESHNESS_SECONDS = int(os.getenv("PROFILE_FRESHNESS_SECONDS", "3600"))
+# 記錄「最後更新時間」的使用者上限（LRU）
+PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("PROFILE_CACHE_MAX_ENTRIES", "50000"))
+# 背景 worker 每批處理人數
+PROFILE_REFRESH_BATCH_SIZE = int(os.getenv("PROFILE_REFRESH_BATCH_SIZE", "50"))
+
+# -------------------------------------------------
+# 自動回應規則索引
+# -------------------------------------------------
+# 規則快照最長存活秒數（後台異動會主動通知失效，這是保底）
+AUTO_RESPONSE_INDEX_TTL = int(os.getenv("AUTO_RESPONSE_INDEX_TTL", "300"))
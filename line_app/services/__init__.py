@@ -4,3 +4,7 @@
 #   - line_sdk: LINE SDK factory, credentials, profile fetching
 #   - member_service: Member/friend CRUD, profile management
 #   - conversation_service: Conversation thread + message management
+#   - broadcast_engine: Multicast-chunked, concurrent campaign broadcast
+#   - webhook_queue: Durable local queue + worker pool for LINE webhook events
+#   - profile_refresh: Profile freshness cache + background batch refresh
+#   - auto_response_index: In-memory keyword/always/welcome rule index
@@ -0,0 +1,366 @@
+# line_app/services/auto_response_index.py
+# ============================================================
+# 自動回應規則索引（關鍵字 / 一律回應 / 歡迎訊息）
+# - 啟用中的規則一次載入記憶體（3 個查詢 + line_channels basic_id 對照）
+# - 依 line_channel_id 編成頻道專屬索引：
+#     keywords: 小寫關鍵字 → 規則清單（hash 查找）
+#     always / welcome: 規則清單
+#   清單已依「最近更新優先」排好，每條規則只留第一則訊息（sequence_order 最小）
+# - 日期 / 時段限制先換算成日期序數與當日秒數，比對只剩整數比較
+# - 熱路徑零 DB 查詢；後台異動時呼叫 invalidate_auto_response_index()，
+#   另有 AUTO_RESPONSE_INDEX_TTL 保底重載
+# ============================================================
+
+import datetime
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import AUTO_RESPONSE_INDEX_TTL
+from db import fetchall, table_has_column as _table_has
+from services.line_sdk import LINE_CHANNEL_ID_COL
+
+# DB schema compatibility for auto_response tables
+AUTO_RESPONSE_MSG_ID_COL = (
+    "response_id" if _table_has("auto_response_messages", "response_id") else "auto_response_id"
+)
+AUTO_RESPONSE_KW_ID_COL = (
+    "auto_response_id" if _table_has("auto_response_keywords", "auto_response_id") else "response_id"
+)
+AUTO_RESPONSE_KW_TEXT_COL = (
+    "keyword" if _table_has("auto_response_keywords", "keyword") else "keyword_text"
+)
+
+# Security: validate all dynamically-determined column names against whitelist
+_VALID_COL_NAMES = frozenset({
+    "line_channel_id", "channel_id",
+    "response_id", "auto_response_id",
+    "keyword", "keyword_text",
+})
+for _col_var_name, _col_val in [
+    ("LINE_CHANNEL_ID_COL", LINE_CHANNEL_ID_COL),
+    ("AUTO_RESPONSE_MSG_ID_COL", AUTO_RESPONSE_MSG_ID_COL),
+    ("AUTO_RESPONSE_KW_ID_COL", AUTO_RESPONSE_KW_ID_COL),
+    ("AUTO_RESPONSE_KW_TEXT_COL", AUTO_RESPONSE_KW_TEXT_COL),
+]:
+    if _col_val not in _VALID_COL_NAMES:
+        raise RuntimeError(f"Invalid column name for {_col_var_name}: {_col_val!r}")
+
+
+def _parse_json_list(val) -> Optional[list]:
+    if val is None:
+        return None
+    if isinstance(val, list):
+        return val
+    if isinstance(val, (str, bytes)):
+        try:
+            return json.loads(val)
+        except Exception:
+            return None
+    return None
+
+
+def _time_to_seconds(t) -> Optional[int]:
+    if t is None:
+        return None
+    if isinstance(t, datetime.timedelta):
+        return int(t.total_seconds())
+    if isinstance(t, datetime.time):
+        return int(t.hour * 3600 + t.minute * 60 + t.second)
+    if isinstance(t, str):
+        try:
+            parts = [int(p) for p in t.split(":")]
+            while len(parts) < 3:
+                parts.append(0)
+            return parts[0] * 3600 + parts[1] * 60 + parts[2]
+        except Exception:
+            return None
+    return None
+
+
+def _to_ordinal(d) -> Optional[int]:
+    if d is None:
+        return None
+    if isinstance(d, datetime.datetime):
+        return d.date().toordinal()
+    if isinstance(d, datetime.date):
+        return d.toordinal()
+    if isinstance(d, str):
+        try:
+            return datetime.date.fromisoformat(d[:10]).toordinal()
+        except Exception:
+            return None
+    return None
+
+
+@dataclass(frozen=True)
+class _Rule:
+    id: int
+    channel_id: Optional[str]
+    content: str
+    sort_key: Tuple[datetime.datetime, int]
+    date_start: Optional[int]   # date ordinal
+    date_end: Optional[int]
+    time_start: Optional[int]   # 當日秒數
+    time_end: Optional[int]
+
+    def active_at(self, now: datetime.datetime) -> bool:
+        """日期區間含頭尾；時段可跨午夜，起訖相同視為不限時段"""
+        today = now.toordinal()
+        if self.date_start is not None and today < self.date_start:
+            return False
+        if self.date_end is not None and today > self.date_end:
+            return False
+
+        s, e = self.time_start, self.time_end
+        if s is None and e is None:
+            return True
+        now_sec = now.hour * 3600 + now.minute * 60 + now.second
+        if s is None:
+            return now_sec <= e
+        if e is None:
+            return now_sec >= s
+        if s == e:
+            # Treat equal bounds as "no time restriction"
+            return True
+        if s < e:
+            return s <= now_sec <= e
+        # Crosses midnight
+        return now_sec >= s or now_sec <= e
+
+
+@dataclass
+class _ChannelIndex:
+    keywords: Dict[str, List[_Rule]]
+    always: List[_Rule]
+    welcome: List[_Rule]
+
+
+_MIN_DT = datetime.datetime.min
+
+
+class AutoResponseIndex:
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._rules: List[Tuple[str, _Rule, List[str]]] = []   # (trigger_type, rule, keywords)
+        self._basic_ids: Dict[str, str] = {}
+        self._channels: Dict[Optional[str], _ChannelIndex] = {}
+        self.loads = 0
+
+    # -------------------------------------------------
+    # 載入
+    # -------------------------------------------------
+    def _load(self) -> None:
+        rows = fetchall("""
+            SELECT id, trigger_type, channel_id, channels,
+                   trigger_time_start, trigger_time_end,
+                   date_range_start, date_range_end, updated_at, created_at
+            FROM auto_responses
+            WHERE is_active = 1
+              AND trigger_type IN ('keyword', 'always', 'follow', 'welcome')
+        """)
+        msg_rows = fetchall(f"""
+            SELECT arm.{AUTO_RESPONSE_MSG_ID_COL} AS rid, arm.message_content
+            FROM auto_response_messages arm
+            JOIN auto_responses ar ON ar.id = arm.{AUTO_RESPONSE_MSG_ID_COL}
+            WHERE ar.is_active = 1
+            ORDER BY arm.sequence_order ASC, arm.id ASC
+        """)
+        kw_rows = fetchall(f"""
+            SELECT ark.{AUTO_RESPONSE_KW_ID_COL} AS rid, ark.{AUTO_RESPONSE_KW_TEXT_COL} AS kw
+            FROM auto_response_keywords ark
+            JOIN auto_responses ar ON ar.id = ark.{AUTO_RESPONSE_KW_ID_COL}
+            WHERE ar.is_active = 1 AND ar.trigger_type = 'keyword' AND ark.is_enabled = 1
+        """)
+        try:
+            ch_rows = fetchall(
+                f"SELECT {LINE_CHANNEL_ID_COL} AS cid, basic_id FROM line_channels WHERE basic_id IS NOT NULL"
+            )
+        except Exception:
+            ch_rows = []
+
+        first_msg: Dict[int, str] = {}
+        for m in msg_rows:
+            first_msg.setdefault(m["rid"], m["message_content"])
+        keywords: Dict[int, List[str]] = {}
+        for k in kw_rows:
+            if k["kw"]:
+                keywords.setdefault(k["rid"], []).append(k["kw"].strip().lower())
+
+        rules: List[Tuple[str, _Rule, List[str]]] = []
+        for r in rows:
+            # 沒有訊息的規則等同舊版 JOIN 不到
+            if r["id"] not in first_msg:
+                continue
+            channels = _parse_json_list(r.get("channels"))
+            if channels is not None and "LINE" not in channels:
+                continue
+            ttype = r["trigger_type"]
+            # 歡迎訊息舊版只依 updated_at 排序；其他依 COALESCE(updated_at, created_at)
+            if ttype == "welcome":
+                ts = r.get("updated_at") or _MIN_DT
+            else:
+                ts = r.get("updated_at") or r.get("created_at") or _MIN_DT
+            rule = _Rule(
+                id=r["id"],
+                channel_id=r.get("channel_id") or None,
+                content=first_msg[r["id"]],
+                sort_key=(ts, r["id"]),
+                date_start=_to_ordinal(r.get("date_range_start")),
+                date_end=_to_ordinal(r.get("date_range_end")),
+                time_start=_time_to_seconds(r.get("trigger_time_start")),
+                time_end=_time_to_seconds(r.get("trigger_time_end")),
+            )
+            rules.append((ttype, rule, keywords.get(r["id"], [])))
+        rules.sort(key=lambda t: t[1].sort_key, reverse=True)
+
+        self._rules = rules
+        self._basic_ids = {c["cid"]: c["basic_id"] for c in ch_rows if c.get("cid")}
+        self._channels = {}
+        self._loaded_at = time.monotonic()
+        self.loads += 1
+        logging.info("[AUTO_RESPONSE] index loaded: %d rules", len(rules))
+
+    def _compile(self, line_channel_id: Optional[str]) -> _ChannelIndex:
+        basic_id = self._basic_ids.get(line_channel_id) if line_channel_id else None
+        idx = _ChannelIndex(keywords={}, always=[], welcome=[])
+        for ttype, rule, kws in self._rules:
+            if rule.channel_id and rule.channel_id not in (line_channel_id, basic_id):
+                continue
+            if ttype == "keyword":
+                for kw in kws:
+                    bucket = idx.keywords.setdefault(kw, [])
+                    if not bucket or bucket[-1] is not rule:
+                        bucket.append(rule)
+            elif ttype in ("always", "follow"):
+                idx.always.append(rule)
+            elif ttype == "welcome":
+                idx.welcome.append(rule)
+        return idx
+
+    def _index_for(self, line_channel_id: Optional[str]) -> _ChannelIndex:
+        now = time.monotonic()
+        idx = self._channels.get(line_channel_id)
+        if idx is not None and self._loaded_at is not None and now - self._loaded_at < self.ttl:
+            return idx
+        with self._lock:
+            if self._loaded_at is None or now - self._loaded_at >= self.ttl:
+                try:
+                    self._load()
+                except Exception:
+                    if self._loaded_at is None:
+                        raise
+                    # 重載失敗時沿用舊快照，稍後再試
+                    logging.exception("[AUTO_RESPONSE] index reload failed, keep previous snapshot")
+                    self._loaded_at = now
+            idx = self._channels.get(line_channel_id)
+            if idx is None:
+                idx = self._compile(line_channel_id)
+                self._channels[line_channel_id] = idx
+            return idx
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._loaded_at = None
+            self._channels = {}
+
+    # -------------------------------------------------
+    # 查詢
+    # -------------------------------------------------
+    @staticmethod
+    def _first_active(rules: List[_Rule]) -> Optional[_Rule]:
+        now = datetime.datetime.now()
+        for rule in rules:
+            if rule.active_at(now):
+                return rule
+        return None
+
+    def match_keyword(self, text: str, line_channel_id: Optional[str]) -> Optional[_Rule]:
+        rules = self._index_for(line_channel_id).keywords.get((text or "").strip().lower())
+        return self._first_active(rules) if rules else None
+
+    def match_always(self, line_channel_id: Optional[str]) -> Optional[_Rule]:
+        return self._first_active(self._index_for(line_channel_id).always)
+
+    def match_welcome(self, line_channel_id: Optional[str]) -> Optional[_Rule]:
+        return self._first_active(self._index_for(line_channel_id).welcome)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rules": len(self._rules),
+            "channels_compiled": len(self._channels),
+            "loads": self.loads,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+        }
+
+
+# 全域 singleton
+auto_response_index = AutoResponseIndex(AUTO_RESPONSE_INDEX_TTL)
+
+
+def invalidate_auto_response_index() -> None:
+    """後台新增 / 修改 / 刪除 / 切換自動回應後呼叫"""
+    auto_response_index.invalidate()
+    logging.info("[AUTO_RESPONSE] index invalidated")
+
+
+# -------------------------------------------------
+# 對外介面（與原 app.py 版本相同）
+# -------------------------------------------------
+def check_keyword_trigger(line_uid: str, text: str, line_channel_id: Optional[str] = None):
+    """
+    檢查是否有匹配的關鍵字自動回應
+
+    Returns:
+        回應內容（如果有匹配且啟用）或 None
+    """
+    try:
+        rule = auto_response_index.match_keyword(text, line_channel_id)
+        if rule:
+            logging.info(f"Keyword matched for user {line_uid}: {text}")
+            return rule.content
+        return None
+    except Exception as e:
+        logging.exception(f"check_keyword_trigger error: {e}")
+        return None
+
+
+def check_always_response(line_channel_id: Optional[str] = None):
+    """
+    檢查是否有啟用的一律回應
+
+    Returns:
+        回應內容（如果有啟用）或 None
+    """
+    try:
+        rule = auto_response_index.match_always(line_channel_id)
+        if rule:
+            logging.info("Always response is active")
+            return rule.content
+        return None
+    except Exception as e:
+        logging.exception(f"check_always_response error: {e}")
+        return None
+
+
+def check_welcome_response(line_channel_id: Optional[str] = None):
+    """
+    檢查是否有啟用的歡迎訊息
+
+    Returns:
+        回應內容（如果有啟用）或 None
+    """
+    try:
+        rule = auto_response_index.match_welcome(line_channel_id)
+        if rule:
+            logging.info("Welcome response is active")
+            return rule.content
+        return None
+    except Exception as e:
+        logging.exception(f"check_welcome_response error: {e}")
+        return None
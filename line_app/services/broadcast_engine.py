@@ -0,0 +1,233 @@
+# line_app/services/broadcast_engine.py
+# ============================================================
+# 群發引擎
+# - 收件人切成 LINE multicast 區塊（每塊最多 500 個 userId）
+# - 以有上限的 thread pool 併發送出各區塊
+# - 成功收件人的聊天紀錄（conversation_messages）以批次 INSERT 寫入
+# - 各區塊成功 / 失敗統計彙整回 messages.send_status
+# - 可傳入 on_chunk_done 回報各區塊進度、skip_chunks 跳過已完成區塊（群發工作續跑用）
+#
+# 兩種送法：
+#   - multicast：所有收件人內容相同（Flex 沒有個人化追蹤連結）→ 一塊一次 API
+#   - push：內容含個人追蹤連結（uid 寫在 /__track URL 裡）→ 區塊內逐人 push，
+#     但區塊之間仍併發、DB 仍批次寫，避免 N 次 HTTP + 2N 次 DB 串行。
+# ============================================================
+
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set
+
+from linebot.v3.messaging import ApiException, MulticastRequest, PushMessageRequest
+
+from config import BROADCAST_CHUNK_SIZE, BROADCAST_MAX_WORKERS
+from db import execute
+from services.conversation_service import (
+    bulk_insert_conversation_messages,
+    ensure_threads_for_users,
+)
+
+# LINE multicast 單次收件人上限
+MULTICAST_MAX_RECIPIENTS = 500
+
+# 暫時性錯誤（rate limit / LINE 端 5xx）只重送一次，帶同一把 retry key 避免重複送達
+_RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+_RETRY_DELAY_SECONDS = 1.0
+
+
+def chunk_recipients(recipients: Sequence[Dict[str, Any]],
+                     size: int = BROADCAST_CHUNK_SIZE) -> List[List[Dict[str, Any]]]:
+    """把收件人切成固定大小的區塊（size 超過 LINE 上限時以 500 計）"""
+    size = max(1, min(size, MULTICAST_MAX_RECIPIENTS))
+    return [list(recipients[i:i + size]) for i in range(0, len(recipients), size)]
+
+
+def _call_with_retry(send: Callable[[str], Any]) -> None:
+    retry_key = str(uuid.uuid4())
+    try:
+        send(retry_key)
+    except ApiException as e:
+        if e.status not in _RETRYABLE_STATUS:
+            raise
+        logging.warning("[BROADCAST] LINE API %s, retry once (retry_key=%s)", e.status, retry_key)
+        time.sleep(_RETRY_DELAY_SECONDS)
+        send(retry_key)
+
+
+def _send_chunk_multicast(api, uids: List[str], messages: list) -> Dict[str, Any]:
+    try:
+        _call_with_retry(lambda key: api.multicast(
+            MulticastRequest(to=uids, messages=messages, notification_disabled=False),
+            x_line_retry_key=key,
+        ))
+        return {"sent_uids": uids, "failed": 0, "errors": []}
+    except Exception as e:
+        return {"sent_uids": [], "failed": len(uids), "errors": [f"multicast: {e}"]}
+
+
+def _send_chunk_push(api, uids: List[str],
+                     build_messages: Callable[[str], list]) -> Dict[str, Any]:
+    sent_uids, errors = [], []
+    for uid in uids:
+        try:
+            msgs = build_messages(uid)
+            _call_with_retry(lambda key: api.push_message(
+                PushMessageRequest(to=uid, messages=msgs, notification_disabled=False),
+                x_line_retry_key=key,
+            ))
+            sent_uids.append(uid)
+        except Exception as e:
+            logging.warning("[BROADCAST] push to %s failed: %s", uid, e)
+            errors.append(f"{uid}: {e}")
+    return {"sent_uids": sent_uids, "failed": len(uids) - len(sent_uids), "errors": errors}
+
+
+def _record_chunk(campaign_id: int, alt_text: str, sent_uids: List[str]) -> None:
+    """
+    寫入 1:1 聊天紀錄：只存參照 broadcast_message_id → messages.id，不複製 flex 本體。
+    寫入失敗只記 log，不影響群發主流程（與逐筆版行為一致）。
+    """
+    if not sent_uids:
+        return
+    try:
+        thread_ids = ensure_threads_for_users(sent_uids)
+        bulk_insert_conversation_messages([
+            {
+                "thread_id": tid,
+                "role": "assistant",
+                "direction": "outgoing",
+                "message_type": "flex",
+                "response": alt_text,
+                "message_source": "broadcast",
+                "status": "sent",
+                "broadcast_message_id": campaign_id,
+            }
+            for tid in thread_ids
+        ])
+    except Exception:
+        logging.exception(
+            "[BROADCAST] Failed to save broadcast to conversation_messages (campaign_id=%s, %d users)",
+            campaign_id, len(sent_uids),
+        )
+
+
+def _process_chunk(idx: int, total_chunks: int, api, chunk: List[Dict[str, Any]], *,
+                   campaign_id: int, alt_text: str, messages: Optional[list],
+                   build_messages: Optional[Callable[[str], list]]) -> Dict[str, Any]:
+    uids = [r["line_uid"] for r in chunk]
+    if messages is not None:
+        result = _send_chunk_multicast(api, uids, messages)
+    else:
+        result = _send_chunk_push(api, uids, build_messages)
+    _record_chunk(campaign_id, alt_text, result["sent_uids"])
+    logging.info(
+        "[BROADCAST] chunk %d/%d done: sent=%d failed=%d",
+        idx, total_chunks, len(result["sent_uids"]), result["failed"],
+    )
+    return result
+
+
+def rollup_send_status(campaign_id: int, *, sent: int, failed: int, errors: List[str]) -> str:
+    """
+    把區塊統計彙整進 messages：
+      - 全部失敗 → 發送失敗（failure_reason 記前幾個錯誤）
+      - 有成功   → 已發送；部分失敗時 failure_reason 記失敗人數與錯誤摘要
+    """
+    total = sent + failed
+    reason = None
+    if failed:
+        reason = f"{failed}/{total} 位發送失敗"
+        if errors:
+            reason += "：" + "; ".join(errors[:5])
+        reason = reason[:2000]
+    status = "已發送" if sent > 0 else "發送失敗"
+
+    try:
+        if reason is None:
+            execute(
+                "UPDATE messages SET send_status=:st, send_count=:sent, updated_at=NOW() WHERE id=:cid",
+                {"st": status, "sent": sent, "cid": campaign_id},
+            )
+        else:
+            execute(
+                "UPDATE messages SET send_status=:st, send_count=:sent, failure_reason=:reason, "
+                "updated_at=NOW() WHERE id=:cid",
+                {"st": status, "sent": sent, "reason": reason, "cid": campaign_id},
+            )
+    except Exception:
+        logging.exception("[BROADCAST] Failed to roll up send_status (campaign_id=%s)", campaign_id)
+    return status
+
+
+def run_broadcast(api, recipients: Sequence[Dict[str, Any]], *,
+                  campaign_id: int,
+                  alt_text: str,
+                  messages: Optional[list] = None,
+                  build_messages: Optional[Callable[[str], list]] = None,
+                  chunk_size: int = BROADCAST_CHUNK_SIZE,
+                  max_workers: int = BROADCAST_MAX_WORKERS,
+                  skip_chunks: Optional[Set[int]] = None,
+                  on_chunk_done: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    送出一次群發。
+
+    Args:
+        api: 該 OA 的 MessagingApi
+        recipients: [{"line_uid": ..., "id": member_id}, ...]（呼叫端需先過濾無效 userId）
+        campaign_id: messages.id
+        alt_text: 寫進聊天紀錄的預覽文字
+        messages: 所有人相同的訊息 → 走 multicast
+        build_messages: 依 uid 產生個人化訊息 → 走 push（messages 為 None 時必填）
+        chunk_size: 每區塊收件人數（≤ 500）
+        max_workers: 同時處理的區塊數
+        skip_chunks: 已完成、不需再送的區塊序號（從 1 起算；續跑中斷的群發工作用）
+        on_chunk_done: 每個區塊完成後呼叫 on_chunk_done(idx, result)（在呼叫端 thread 依完成順序執行）
+
+    Returns:
+        {"sent", "failed", "chunks", "failed_chunks", "errors", "mode"}（只含本次實際送出的區塊）
+    """
+    if messages is None and build_messages is None:
+        raise ValueError("run_broadcast requires messages or build_messages")
+
+    mode = "multicast" if messages is not None else "push"
+    chunks = chunk_recipients(recipients, chunk_size)
+    total_chunks = len(chunks)
+    skip_chunks = skip_chunks or set()
+    pending = [(idx, chunk) for idx, chunk in enumerate(chunks, 1) if idx not in skip_chunks]
+    logging.info(
+        "[BROADCAST] campaign_id=%s mode=%s recipients=%d chunks=%d workers=%d",
+        campaign_id, mode, len(recipients), total_chunks, max_workers,
+    )
+
+    sent = failed = failed_chunks = 0
+    errors: List[str] = []
+    if pending:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pending))),
+                                thread_name_prefix="broadcast") as pool:
+            futures = {
+                pool.submit(
+                    _process_chunk, idx, total_chunks, api, chunk,
+                    campaign_id=campaign_id, alt_text=alt_text,
+                    messages=messages, build_messages=build_messages,
+                ): idx
+                for idx, chunk in pending
+            }
+            for fut in as_completed(futures):
+                result = fut.result()
+                if on_chunk_done is not None:
+                    on_chunk_done(futures[fut], result)
+                sent += len(result["sent_uids"])
+                failed += result["failed"]
+                if result["failed"]:
+                    failed_chunks += 1
+                errors.extend(result["errors"])
+
+    return {
+        "sent": sent,
+        "failed": failed,
+        "chunks": total_chunks,
+        "failed_chunks": failed_chunks,
+        "errors": errors,
+        "mode": mode,
+    }
@@ -0,0 +1,293 @@
+# line_app/services/broadcast_jobs.py
+# ============================================================
+# 群發工作（非同步群發 + 續跑）
+# - backend 送出群發 → 建立工作、立即回 job_id，實際發送在背景 thread 進行
+# - 工作、收件人名單與「已完成區塊」存在 SQLite 檔案，程序重啟不遺失
+# - 每送完一個區塊就記錄進度（sent / failed / 已完成區塊序號）並延長 lease
+# - 程序崩潰：lease 逾時後由 resume watcher 重新認領，只送尚未完成的區塊
+# - 同一個 campaign 尚未結束時重複送出，回傳既有工作（不會重送）
+# ============================================================
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from config import BROADCAST_JOB_PATH
+
+# 認領後超過此秒數沒有任何區塊完成，視為執行中的程序已死，可被重新認領
+LEASE_SECONDS = 600
+# resume watcher 掃描逾時工作的間隔（秒）
+RESUME_POLL_SECONDS = 60
+# 回報給 backend 的錯誤訊息上限
+_MAX_REPORTED_ERRORS = 20
+
+_ACTIVE = ("queued", "running")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    job_id        TEXT PRIMARY KEY,
+    campaign_id   INTEGER NOT NULL,
+    payload       TEXT NOT NULL,
+    recipients    TEXT NOT NULL,
+    invalid       INTEGER NOT NULL DEFAULT 0,
+    chunk_size    INTEGER NOT NULL,
+    total_chunks  INTEGER NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'queued',
+    sent          INTEGER NOT NULL DEFAULT 0,
+    failed        INTEGER NOT NULL DEFAULT 0,
+    done_chunks   TEXT NOT NULL DEFAULT '[]',
+    errors        TEXT NOT NULL DEFAULT '[]',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    created_at    REAL NOT NULL,
+    updated_at    REAL NOT NULL,
+    lease_until   REAL,
+    finished_at   REAL
+);
+CREATE INDEX IF NOT EXISTS ix_broadcast_jobs_status ON broadcast_jobs (status, lease_until);
+CREATE INDEX IF NOT EXISTS ix_broadcast_jobs_campaign ON broadcast_jobs (campaign_id, status);
+"""
+
+
+class BroadcastJobStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+
+    # -------------------------------------------------
+    # 連線（每個 thread 一條）
+    # -------------------------------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._ensure_schema()
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self) -> None:
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                conn.executescript(_SCHEMA)
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+
+    # -------------------------------------------------
+    # 建立 / 查詢
+    # -------------------------------------------------
+    def create(self, campaign_id: int, payload: Dict[str, Any],
+               recipients: List[Dict[str, Any]], invalid: int, chunk_size: int) -> Dict[str, Any]:
+        """建立工作；同 campaign 已有進行中的工作時直接回傳該工作"""
+        conn = self._conn()
+        now = time.time()
+        total_chunks = (len(recipients) + chunk_size - 1) // chunk_size if chunk_size > 0 else 0
+        job_id = uuid.uuid4().hex
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT job_id FROM broadcast_jobs WHERE campaign_id = ? AND status IN (?, ?) LIMIT 1",
+                (campaign_id, *_ACTIVE),
+            ).fetchone()
+            if row:
+                conn.execute("COMMIT")
+                logging.info("[BROADCAST_JOB] campaign_id=%s already has job %s", campaign_id, row["job_id"])
+                return self.get(row["job_id"])
+            conn.execute(
+                "INSERT INTO broadcast_jobs (job_id, campaign_id, payload, recipients, invalid, "
+                "chunk_size, total_chunks, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id, campaign_id,
+                    json.dumps(payload, ensure_ascii=False),
+                    json.dumps([{"line_uid": r["line_uid"], "id": r.get("id")} for r in recipients]),
+                    invalid, chunk_size, total_chunks, now, now,
+                ),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """對外進度（不含 payload / 收件人名單）"""
+        row = self._conn().execute(
+            "SELECT job_id, campaign_id, status, sent, failed, invalid, total_chunks, done_chunks, "
+            "errors, attempts, created_at, updated_at, finished_at, "
+            "json_array_length(recipients) AS recipients FROM broadcast_jobs WHERE job_id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        total = row["recipients"] + row["invalid"]
+        sent, failed = row["sent"], row["failed"] + row["invalid"]
+        return {
+            "job_id": row["job_id"],
+            "campaign_id": row["campaign_id"],
+            "status": row["status"],
+            "total": total,
+            "sent": sent,
+            "failed": failed,
+            "remaining": max(total - sent - failed, 0),
+            "chunks": row["total_chunks"],
+            "chunks_done": len(json.loads(row["done_chunks"])),
+            "errors": json.loads(row["errors"])[:_MAX_REPORTED_ERRORS] or None,
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "finished_at": row["finished_at"],
+        }
+
+    # -------------------------------------------------
+    # 執行
+    # -------------------------------------------------
+    def claim(self, job_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        認領一個可執行的工作（排隊中，或執行中但 lease 已逾時）。
+        job_id=None 時認領最舊的一個。回傳含 payload / recipients / done_chunks 的完整資料。
+        """
+        conn = self._conn()
+        now = time.time()
+        where = "status = 'queued' OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?))"
+        params: list = [now]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if job_id:
+                row = conn.execute(
+                    f"SELECT * FROM broadcast_jobs WHERE job_id = ? AND ({where})", (job_id, *params)
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    f"SELECT * FROM broadcast_jobs WHERE {where} ORDER BY created_at LIMIT 1", params
+                ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE broadcast_jobs SET status = 'running', attempts = attempts + 1, "
+                "lease_until = ?, updated_at = ? WHERE job_id = ?",
+                (now + LEASE_SECONDS, now, row["job_id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        job = dict(row)
+        job["attempts"] += 1
+        job["payload"] = json.loads(job["payload"])
+        job["recipients"] = json.loads(job["recipients"])
+        job["done_chunks"] = set(json.loads(job["done_chunks"]))
+        return job
+
+    def record_chunk(self, job_id: str, idx: int, sent: int, failed: int, errors: List[str]) -> None:
+        """區塊完成：累加統計、記下區塊序號、延長 lease（重複回報同一區塊不重算）"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT done_chunks, errors FROM broadcast_jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            done = json.loads(row["done_chunks"])
+            if idx not in done:
+                done.append(idx)
+                all_errors = (json.loads(row["errors"]) + list(errors))[:_MAX_REPORTED_ERRORS]
+                conn.execute(
+                    "UPDATE broadcast_jobs SET sent = sent + ?, failed = failed + ?, done_chunks = ?, "
+                    "errors = ?, lease_until = ?, updated_at = ? WHERE job_id = ?",
+                    (sent, failed, json.dumps(done), json.dumps(all_errors, ensure_ascii=False),
+                     now + LEASE_SECONDS, now, job_id),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        conn = self._conn()
+        now = time.time()
+        if error:
+            row = conn.execute("SELECT errors FROM broadcast_jobs WHERE job_id = ?", (job_id,)).fetchone()
+            errors = (json.loads(row["errors"]) if row else []) + [error]
+            conn.execute(
+                "UPDATE broadcast_jobs SET errors = ? WHERE job_id = ?",
+                (json.dumps(errors[:_MAX_REPORTED_ERRORS], ensure_ascii=False), job_id),
+            )
+        conn.execute(
+            "UPDATE broadcast_jobs SET status = ?, lease_until = NULL, finished_at = ?, updated_at = ? "
+            "WHERE job_id = ?",
+            (status, now, now, job_id),
+        )
+
+    # -------------------------------------------------
+    # 背景執行 / 續跑
+    # -------------------------------------------------
+    def run_in_background(self, job_id: str, runner: Callable[[Dict[str, Any]], None]) -> None:
+        """認領並在背景 thread 執行指定工作（已被其他程序認領則略過）"""
+        def _target():
+            job = self.claim(job_id)
+            if job is not None:
+                self._run(job, runner)
+
+        threading.Thread(target=_target, name=f"broadcast-job-{job_id[:8]}", daemon=True).start()
+
+    def _run(self, job: Dict[str, Any], runner: Callable[[Dict[str, Any]], None]) -> None:
+        try:
+            runner(job)
+        except Exception as e:
+            logging.exception("[BROADCAST_JOB] job %s crashed", job["job_id"])
+            self.finish(job["job_id"], "failed", error=str(e)[:500])
+
+    def resume_pending(self, runner: Callable[[Dict[str, Any]], None]) -> int:
+        """認領並執行所有可續跑的工作，回傳數量"""
+        count = 0
+        while True:
+            job = self.claim()
+            if job is None:
+                return count
+            logging.warning(
+                "[BROADCAST_JOB] resuming job %s (campaign_id=%s, %d/%d chunks done)",
+                job["job_id"], job["campaign_id"], len(job["done_chunks"]), job["total_chunks"],
+            )
+            threading.Thread(
+                target=self._run, args=(job, runner),
+                name=f"broadcast-job-{job['job_id'][:8]}", daemon=True,
+            ).start()
+            count += 1
+
+    def start_resume_watcher(self, runner: Callable[[Dict[str, Any]], None]) -> None:
+        """啟動時與之後每 RESUME_POLL_SECONDS 秒檢查一次逾時 / 未執行的工作"""
+        if self._watcher and self._watcher.is_alive():
+            return
+
+        def _loop():
+            while True:
+                try:
+                    self.resume_pending(runner)
+                except Exception:
+                    logging.exception("[BROADCAST_JOB] resume watcher failed")
+                time.sleep(RESUME_POLL_SECONDS)
+
+        self._watcher = threading.Thread(target=_loop, name="broadcast-job-resume", daemon=True)
+        self._watcher.start()
+
+
+# 全域 singleton
+broadcast_jobs = BroadcastJobStore(BROADCAST_JOB_PATH)
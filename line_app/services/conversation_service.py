@@ -3,15 +3,23 @@
 # 對話 thread + message 管理
 # - ensure_thread_for_user: 建立/取得對話 thread
 # - insert_conversation_message: 寫入對話訊息
+# - ensure_threads_for_users / bulk_insert_conversation_messages: 群發用批次版本
+# - conversation_thread_summary: 每個 (thread, 渠道) 的摘要（最後訊息時間、藍點判斷、未讀數），
+#   寫入訊息時在同一個交易內增量更新，會員列表不必每次對全歷史 GROUP BY
+#   （backend 的 app/services/thread_summary.py 維護同一張表，並提供重建）
 # - get_chat_history: 查詢某 thread 的對話紀錄
 # - get_member_conversations: 列出某會員的所有對話 thread
 # ============================================================
 
+import datetime
 import logging
 import uuid
-from typing import Optional
+from typing import Iterable, Optional
+
+from sqlalchemy import text
 
 from db import (
+    engine,
     fetchone,
     fetchall,
     execute,
@@ -45,6 +53,68 @@ def ensure_thread_for_user(line_uid: str) -> str:
     return line_uid
 
 
+# -------------------------------------------------
+# 對話摘要（conversation_thread_summary）
+# -------------------------------------------------
+# 新訊息合併進摘要：
+#   - last_message_at：含群發
+#   - last_non_broadcast_*：最後一則非群發訊息（藍點：incoming 或 AI 答不出）
+#   - unread_count：未讀的 incoming 數（標記已讀時歸零）
+# MySQL 的 ON DUPLICATE KEY UPDATE 依序套用，後面的欄位會看到前面更新過的值：
+# 判斷「是否比較新」的三欄必須寫在 last_non_broadcast_at 之前。
+_SUMMARY_NEWER = (
+    "VALUES(last_non_broadcast_at) IS NOT NULL AND "
+    "(last_non_broadcast_at IS NULL OR VALUES(last_non_broadcast_at) >= last_non_broadcast_at)"
+)
+_SUMMARY_UPSERT_SQL = f"""
+    INSERT INTO conversation_thread_summary
+        (thread_id, platform, last_message_at, last_non_broadcast_at, last_non_broadcast_direction,
+         last_non_broadcast_source, last_unanswered, unread_count, updated_at)
+    VALUES
+        (:thread_id, :platform, :at, :nb_at, :nb_direction, :nb_source, :nb_unanswered, :unread, :at)
+    ON DUPLICATE KEY UPDATE
+        last_message_at = GREATEST(COALESCE(last_message_at, VALUES(last_message_at)), VALUES(last_message_at)),
+        last_non_broadcast_direction = IF({_SUMMARY_NEWER}, VALUES(last_non_broadcast_direction), last_non_broadcast_direction),
+        last_non_broadcast_source = IF({_SUMMARY_NEWER}, VALUES(last_non_broadcast_source), last_non_broadcast_source),
+        last_unanswered = IF({_SUMMARY_NEWER}, VALUES(last_unanswered), last_unanswered),
+        last_non_broadcast_at = IF({_SUMMARY_NEWER}, VALUES(last_non_broadcast_at), last_non_broadcast_at),
+        unread_count = unread_count + VALUES(unread_count),
+        updated_at = VALUES(updated_at)
+"""
+
+
+def _has_thread_summary() -> bool:
+    # 尚未套用 migration 的 DB 直接略過摘要
+    return _table_has("conversation_thread_summary", "thread_id")
+
+
+def _summary_params(thread_id: str, platform: str | None, direction: str,
+                    message_source: str | None, unanswered: bool, status: str | None,
+                    at: datetime.datetime) -> dict:
+    counted = message_source != "broadcast"
+    return {
+        "thread_id": thread_id,
+        "platform": platform or "LINE",
+        "at": at,
+        "nb_at": at if counted else None,
+        "nb_direction": direction if counted else None,
+        "nb_source": message_source if counted else None,
+        "nb_unanswered": 1 if counted and unanswered else 0,
+        "unread": 1 if direction == "incoming" and status != "read" else 0,
+    }
+
+
+def reset_thread_unread(thread_id: str) -> None:
+    """標記已讀後把摘要的未讀數歸零"""
+    if not thread_id or not _has_thread_summary():
+        return
+    execute(
+        "UPDATE conversation_thread_summary SET unread_count = 0, updated_at = :now "
+        "WHERE thread_id = :tid AND unread_count <> 0",
+        {"tid": thread_id, "now": datetime.datetime.utcnow()},
+    )
+
+
 # -------------------------------------------------
 # Message 寫入
 # -------------------------------------------------
@@ -58,7 +128,8 @@ def insert_conversation_message(*, thread_id: str, role: str, direction: str,
                                 message_id: str | None = None,
                                 platform: str | None = "LINE",
                                 unanswered: bool = False,
-                                broadcast_message_id: int | None = None):
+                                broadcast_message_id: int | None = None,
+                                reply_to_message_id: str | None = None):
     """
     儲存對話訊息到 conversation_messages 表
 
@@ -78,6 +149,7 @@ def insert_conversation_message(*, thread_id: str, role: str, direction: str,
                     用於數據洞察頁計算 AI 覆蓋率）
         broadcast_message_id: 群發訊息對應的 messages.id（message_source=broadcast 時必填，
                               聊天室讀取時以此參照還原 Flex 內容）
+        reply_to_message_id: 自動回覆所回應的使用者訊息 ID（數據洞察的未解問題直接以此取回觸發問題）
     """
     # 確保 thread_id 去除前後空白字元
     thread_id = thread_id.strip() if thread_id else ""
@@ -144,18 +216,33 @@ def insert_conversation_message(*, thread_id: str, role: str, direction: str,
             values.append(":broadcast_message_id")
             params["broadcast_message_id"] = broadcast_message_id
 
+        # reply_to_message_id 欄位（若該 DB 已套用 migration）
+        if reply_to_message_id and _table_has("conversation_messages", "reply_to_message_id"):
+            columns.append("reply_to_message_id")
+            values.append(":reply_to")
+            params["reply_to"] = reply_to_message_id
+
+        # 時間由 Python 帶（UTC、秒為單位，同 NOW()），摘要表才能用同一個值
+        now = datetime.datetime.utcnow().replace(microsecond=0)
         columns.extend(["created_at", "updated_at"])
-        values.extend(["NOW()", "NOW()"])
-
-        execute(
-            f"""
-            INSERT IGNORE INTO conversation_messages
-                ({", ".join(columns)})
-            VALUES
-                ({", ".join(values)})
-            """,
-            params,
-        )
+        values.extend([":now", ":now"])
+        params["now"] = now
+
+        with engine.begin() as conn:
+            result = conn.execute(
+                text(f"""
+                INSERT IGNORE INTO conversation_messages
+                    ({", ".join(columns)})
+                VALUES
+                    ({", ".join(values)})
+                """),
+                params,
+            )
+            # INSERT IGNORE 撞到既有 id（重送）時不重複累計摘要
+            if result.rowcount and _has_thread_summary():
+                conn.execute(text(_SUMMARY_UPSERT_SQL), _summary_params(
+                    thread_id, platform, direction, message_source, unanswered, status, now,
+                ))
         logging.info(f"Inserted message: {msg_id}, thread: {thread_id}, source: {message_source}")
         return msg_id
 
@@ -164,6 +251,141 @@ def insert_conversation_message(*, thread_id: str, role: str, direction: str,
         raise
 
 
+# -------------------------------------------------
+# 批次寫入（群發用）
+# -------------------------------------------------
+# 注意：VALUES 內只能放 placeholder（不能放 NOW()），pymysql 的 executemany
+# 才會改寫成單一條 multi-row INSERT；時間改由 Python 帶 UTC（session 時區已固定 +00:00）。
+BULK_INSERT_BATCH_SIZE = 500
+
+
+def _batched(items: list, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def ensure_threads_for_users(line_uids: Iterable[str],
+                             batch_size: int = BULK_INSERT_BATCH_SIZE) -> list[str]:
+    """
+    批次版 ensure_thread_for_user：一次 INSERT IGNORE 多筆 conversation_threads。
+
+    Returns:
+        去除空白、去重後的 thread_id 列表（順序同輸入）
+    """
+    thread_ids = []
+    seen = set()
+    for uid in line_uids:
+        uid = uid.strip() if uid else ""
+        if uid and uid not in seen:
+            seen.add(uid)
+            thread_ids.append(uid)
+    if not thread_ids:
+        return []
+
+    now = datetime.datetime.utcnow()
+    sql = text("""
+        INSERT IGNORE INTO conversation_threads (id, conversation_name, created_at, updated_at)
+        VALUES (:tid, :name, :now, :now)
+    """)
+    try:
+        with engine.begin() as conn:
+            for batch in _batched(thread_ids, batch_size):
+                conn.execute(sql, [
+                    {"tid": tid, "name": f"LINE:{tid}", "now": now} for tid in batch
+                ])
+    except Exception as e:
+        logging.warning(f"Failed to ensure threads in bulk: {e}")
+
+    return thread_ids
+
+
+def bulk_insert_conversation_messages(rows: list[dict],
+                                      batch_size: int = BULK_INSERT_BATCH_SIZE) -> int:
+    """
+    批次寫入 conversation_messages（每批一條 multi-row INSERT IGNORE）。
+
+    Args:
+        rows: 每筆為 insert_conversation_message 的關鍵字參數 dict
+              （thread_id / role / direction 必填，其餘同單筆版預設值）
+        batch_size: 每批筆數
+
+    Returns:
+        送出寫入的筆數
+    """
+    if not rows:
+        return 0
+
+    has_platform = _table_has("conversation_messages", "platform")
+    has_unanswered = _table_has("conversation_messages", "unanswered")
+    has_broadcast = (
+        any(r.get("broadcast_message_id") is not None for r in rows)
+        and _table_has("conversation_messages", "broadcast_message_id")
+    )
+
+    columns = ["id", "thread_id", "role", "direction", "message_type",
+               "content", "event_id", "status", "message_source"]
+    if has_platform:
+        columns.append("platform")
+    if has_unanswered:
+        columns.append("unanswered")
+    if has_broadcast:
+        columns.append("broadcast_message_id")
+    columns.extend(["created_at", "updated_at"])
+
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    params_list = []
+    for r in rows:
+        thread_id = (r.get("thread_id") or "").strip()
+        if not thread_id:
+            continue
+        message_id = r.get("message_id")
+        params = {
+            "id": message_id.strip() if isinstance(message_id, str) and message_id.strip() else uuid.uuid4().hex,
+            "thread_id": thread_id,
+            "role": r["role"],
+            "direction": r["direction"],
+            "message_type": r.get("message_type", "chat"),
+            "content": r.get("question") or r.get("response") or "",
+            "event_id": r.get("event_id"),
+            "status": r.get("status", "received"),
+            "message_source": r.get("message_source"),
+            "created_at": now,
+            "updated_at": now,
+        }
+        if has_platform:
+            params["platform"] = r.get("platform", "LINE")
+        if has_unanswered:
+            params["unanswered"] = 1 if r.get("unanswered") else 0
+        if has_broadcast:
+            params["broadcast_message_id"] = r.get("broadcast_message_id")
+        params_list.append(params)
+
+    if not params_list:
+        return 0
+
+    sql = text(
+        f"INSERT IGNORE INTO conversation_messages ({', '.join(columns)}) "
+        f"VALUES ({', '.join(':' + c for c in columns)})"
+    )
+    summary_rows = []
+    if _has_thread_summary():
+        summary_rows = [
+            _summary_params(p["thread_id"], p.get("platform", "LINE"), p["direction"],
+                            p["message_source"], bool(p.get("unanswered")), p["status"], now)
+            for p in params_list
+        ]
+    summary_sql = text(_SUMMARY_UPSERT_SQL)
+    with engine.begin() as conn:
+        for batch in _batched(params_list, batch_size):
+            conn.execute(sql, batch)
+        # 群發呼叫端不帶 message_id（皆為新 UUID），不會被 INSERT IGNORE 略過；同一個交易內一併更新摘要
+        for batch in _batched(summary_rows, batch_size):
+            conn.execute(summary_sql, batch)
+
+    logging.info(f"Bulk inserted {len(params_list)} conversation messages")
+    return len(params_list)
+
+
 # -------------------------------------------------
 # 聊天紀錄查詢
 # -------------------------------------------------
@@ -0,0 +1,265 @@
+# line_app/services/follower_backfill.py
+# ============================================================
+# 好友補齊（背景 pipeline）
+# - 補「LINE 有、但 DB 還沒正確歸屬本 OA」的好友，寫法與 on_follow 一致
+#   （line_friends + members 帶 channel + 連結 member_id）
+# - followers API 逐頁處理：每頁先查 DB 過濾已存在者，只對缺的人取 profile
+# - profile 以 thread pool 併發取，速率由 token bucket 控制（取代固定 sleep）
+# - members / line_friends 以 multi-row INSERT ... ON DUPLICATE KEY 批次寫入
+# - 每頁寫完把 followers 的 next 游標存進 BACKFILL_STATE_PATH，重啟後從該頁接續
+# - 在背景執行緒跑，不擋啟動；多個 worker 程序以檔案鎖保證同時只有一個在跑
+# ============================================================
+
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import (
+    AUTO_BACKFILL_FRIENDS,
+    BACKFILL_BATCH_SIZE,
+    BACKFILL_PROFILE_RPS,
+    BACKFILL_STATE_PATH,
+    BACKFILL_WORKERS,
+)
+from db import fetchall
+from services.line_sdk import LINE_CHANNEL_ID_COL, fetch_line_profile
+from services.member_service import (
+    bulk_upsert_followers,
+    get_followers_in_db,
+    iter_follower_id_pages,
+)
+
+# followers API 每頁筆數（官方上限）
+_FOLLOWERS_PAGE_SIZE = 1000
+# .env 單帳號在狀態檔中的 key
+_DEFAULT_KEY = "__default__"
+
+
+class TokenBucket:
+    """執行緒安全的 token bucket：平均每秒 rate 次，最多累積 capacity 次突發"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(1.0, capacity if capacity is not None else self.rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class FollowerBackfill:
+    def __init__(self, state_path: str, rps: float, workers: int, batch_size: int):
+        self.state_path = state_path
+        self.workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
+        self._bucket = TokenBucket(rps)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.running = False
+        self.current_oa: Optional[str] = None
+        self.pages = 0
+        self.written = 0
+        self.failed = 0
+
+    # -------------------------------------------------
+    # 游標狀態（JSON 檔，寫入走 tmp + rename 保證原子性）
+    # -------------------------------------------------
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cursor(self, key: str, next_cursor: Optional[str]) -> None:
+        state = self._load_state()
+        entry = state.setdefault(key, {})
+        entry["next"] = next_cursor
+        entry["updated_at"] = time.time()
+        if next_cursor is None:
+            entry["completed_at"] = entry["updated_at"]
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    # -------------------------------------------------
+    # 單一 OA
+    # -------------------------------------------------
+    def _fetch_profile(self, uid: str, line_channel_id: Optional[str]) -> Tuple[str, Optional[str], Optional[str]]:
+        self._bucket.acquire()
+        display_name, picture_url = fetch_line_profile(uid, line_channel_id=line_channel_id)
+        return uid, display_name, picture_url
+
+    def _process_page(self, pool: ThreadPoolExecutor, line_channel_id: Optional[str],
+                      user_ids: List[str]) -> int:
+        existing = get_followers_in_db(line_channel_id, user_ids)
+        missing = [uid for uid in user_ids if uid not in existing]
+        if not missing:
+            return 0
+
+        profiles = list(pool.map(lambda uid: self._fetch_profile(uid, line_channel_id), missing))
+        written = 0
+        for i in range(0, len(profiles), self.batch_size):
+            batch = profiles[i:i + self.batch_size]
+            try:
+                written += bulk_upsert_followers(batch, line_channel_id=line_channel_id)
+            except Exception:
+                with self._lock:
+                    self.failed += len(batch)
+                logging.exception(
+                    "[BACKFILL] OA=%s 批次寫入 %d 位好友失敗", line_channel_id or "(.env 預設)", len(batch)
+                )
+        return written
+
+    def run_one(self, line_channel_id: Optional[str]) -> int:
+        """
+        補單一 OA 的好友（line_channel_id=None 代表 .env 預設帳號，相容單帳號舊環境）。
+        回傳寫入筆數。
+        """
+        label = line_channel_id or "(.env 預設)"
+        key = line_channel_id or _DEFAULT_KEY
+        start = (self._load_state().get(key) or {}).get("next")
+        if start:
+            logging.info("[BACKFILL] === OA=%s 從上次游標接續 ===", label)
+        else:
+            logging.info("[BACKFILL] === OA=%s 開始撈取好友 userId ===", label)
+
+        total = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="backfill") as pool:
+            pages = iter_follower_id_pages(line_channel_id, start=start, limit=_FOLLOWERS_PAGE_SIZE)
+            while True:
+                self._bucket.acquire()
+                try:
+                    user_ids, next_cursor = next(pages)
+                except StopIteration:
+                    break
+                except RuntimeError:
+                    if not start:
+                        raise
+                    # 游標過期 / 失效 → 從頭開始（已寫入的會被 DB 過濾掉）
+                    logging.warning("[BACKFILL] OA=%s 游標失效，從頭重新撈取", label)
+                    start = None
+                    pages = iter_follower_id_pages(line_channel_id, limit=_FOLLOWERS_PAGE_SIZE)
+                    continue
+
+                written = self._process_page(pool, line_channel_id, user_ids)
+                total += written
+                with self._lock:
+                    self.pages += 1
+                    self.written += written
+                self._save_cursor(key, next_cursor)
+                logging.info(
+                    "[BACKFILL] OA=%s 本頁 %d 位，補 %d 位（累計 %d）", label, len(user_ids), written, total
+                )
+
+        logging.info("[BACKFILL] OA=%s 補齊完成，共補 %d 位", label, total)
+        return total
+
+    # -------------------------------------------------
+    # 全部 OA
+    # -------------------------------------------------
+    def _active_channel_ids(self) -> List[Optional[str]]:
+        # 取得所有啟用中的 OA channel id（欄名因環境而異，沿用 LINE_CHANNEL_ID_COL）
+        try:
+            oa_rows = fetchall(
+                f"SELECT {LINE_CHANNEL_ID_COL} AS cid FROM line_channels WHERE is_active = 1 ORDER BY id",
+                {},
+            )
+        except Exception:
+            logging.exception("[BACKFILL] 查詢 line_channels 失敗，改用 .env 單帳號")
+            oa_rows = []
+
+        channel_ids = [r["cid"] for r in (oa_rows or []) if r.get("cid")]
+        if not channel_ids:
+            logging.info("[BACKFILL] 無啟用中的 OA，使用 .env 預設帳號 backfill")
+            channel_ids = [None]  # None -> iter_follower_id_pages fallback .env
+        return channel_ids
+
+    def run_all(self) -> None:
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        with open(f"{self.state_path}.lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                logging.info("[BACKFILL] 其他程序正在 backfill，略過")
+                return
+            with self._lock:
+                self.running = True
+            try:
+                channel_ids = self._active_channel_ids()
+                logging.info("[BACKFILL] 共 %d 個 OA 需要 backfill", len(channel_ids))
+                for channel_id in channel_ids:
+                    self.current_oa = channel_id or _DEFAULT_KEY
+                    try:
+                        self.run_one(channel_id)
+                    except Exception:
+                        # 單一 OA 失敗不影響其他 OA
+                        logging.exception("[BACKFILL] OA=%s backfill 失敗", channel_id or "(.env 預設)")
+            finally:
+                with self._lock:
+                    self.running = False
+                    self.current_oa = None
+
+    def start(self) -> bool:
+        """在背景執行緒跑 run_all；已在跑時回 False"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return False
+            self._thread = threading.Thread(target=self.run_all, name="follower-backfill", daemon=True)
+            self._thread.start()
+            return True
+
+    # -------------------------------------------------
+    # 指標
+    # -------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        cursors = self._load_state()
+        with self._lock:
+            return {
+                "running": self.running,
+                "current_oa": self.current_oa,
+                "pages": self.pages,
+                "written": self.written,
+                "failed": self.failed,
+                "cursors": cursors,
+            }
+
+
+# 全域 singleton
+follower_backfill = FollowerBackfill(
+    BACKFILL_STATE_PATH,
+    rps=BACKFILL_PROFILE_RPS,
+    workers=BACKFILL_WORKERS,
+    batch_size=BACKFILL_BATCH_SIZE,
+)
+
+
+def backfill_line_friends_on_startup() -> None:
+    """
+    啟動時在背景補齊資料（只補「LINE 有、但 DB 還沒正確歸屬」的好友），不擋啟動。
+
+    多 OA：遍歷 line_channels 中 is_active=1 的每個官方帳號，各用自己的 token 撈
+    followers，並把好友以「對應 line_channel_id」寫入 members / line_friends。
+    無任何 active OA 時退回 .env 單帳號（相容舊行為）。AUTO_BACKFILL_FRIENDS 為總開關。
+    """
+    if not AUTO_BACKFILL_FRIENDS:
+        logging.info("[BACKFILL] AUTO_BACKFILL_FRIENDS=0，略過 backfill")
+        return
+    follower_backfill.start()
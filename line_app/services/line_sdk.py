@@ -4,14 +4,18 @@
 # - 全域 LINE SDK singleton (config, api_client, handler, messaging_api)
 # - 多頻道憑證查詢 (get_credentials, get_credentials_by_line_id)
 # - MessagingApi 工廠 (get_messaging_api, get_messaging_api_by_line_id)
+# - 頻道 registry：憑證 / MessagingApi / WebhookHandler 以 TTL 快取，
+#   line_channels 異動時呼叫 invalidate_channel_cache() 失效
 # - LINE Profile 取得 (fetch_line_profile)
 # - Webhook / LIFF 設定 (setup_line_webhook, setup_line_liff)
 # ============================================================
 
 import logging
 import os
+import threading
+import time
 import requests
-from typing import Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 
 from linebot.v3 import WebhookHandler
 from linebot.v3.messaging import (
@@ -20,7 +24,13 @@ from linebot.v3.messaging import (
     MessagingApi,
 )
 
-from config import LINE_CHANNEL_SECRET, LINE_CHANNEL_ACCESS_TOKEN, PUBLIC_BASE
+from config import (
+    LINE_CHANNEL_SECRET,
+    LINE_CHANNEL_ACCESS_TOKEN,
+    PUBLIC_BASE,
+    LINE_CHANNEL_CACHE_TTL,
+    LINE_CHANNEL_NEGATIVE_CACHE_TTL,
+)
 from db import fetchone, execute, table_has_column as _table_has
 
 # -------------------------------------------------
@@ -39,17 +49,110 @@ LINE_CHANNEL_ID_COL = "line_channel_id" if _table_has("line_channels", "line_cha
 
 
 # -------------------------------------------------
-# 憑證查詢
+# 頻道 registry（TTL 快取）
 # -------------------------------------------------
-def get_credentials(channel_id: str | None):
+class _ChannelRegistry:
     """
-    從資料表抓該 channel 的 access_token / secret / liff_id_open。
-    若查不到就回 None，代表用預設 .env。
+    依頻道快取：
+      - 憑證（line_channels 查詢結果；查無時以較短 TTL 負向快取）
+      - MessagingApi（同一個 ApiClient → urllib3 連線池保持溫熱，不必每次 TLS 握手）
+      - WebhookHandler（事件處理只註冊一次）
+    token / secret 變更時會自動重建對應的 client / handler。
     """
-    if not channel_id:
-        return None
+
+    def __init__(self, ttl: int, negative_ttl: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.RLock()
+        self._creds: Dict[str, Tuple[float, Optional[dict]]] = {}
+        self._apis: Dict[str, Tuple[float, str, MessagingApi]] = {}
+        self._handlers: Dict[str, Tuple[float, str, WebhookHandler]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def credentials(self, key: str, loader: Callable[[], Optional[dict]]) -> Optional[dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._creds.get(key)
+            if entry and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # DB 查詢不持鎖；例外不快取，照舊往上拋
+        row = loader()
+        row = dict(row) if row else None
+        ttl = self.ttl if row else self.negative_ttl
+        with self._lock:
+            self._creds[key] = (now + ttl, row)
+        return row
+
+    def messaging_api(self, key: str, token: str) -> MessagingApi:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._apis.get(key)
+            if entry and entry[0] > now and entry[1] == token:
+                return entry[2]
+            api = MessagingApi(ApiClient(Configuration(access_token=token)))
+            self._apis[key] = (now + self.ttl, token, api)
+            return api
+
+    def webhook_handler(self, key: str, secret: str,
+                        register: Callable[[WebhookHandler], Any]) -> WebhookHandler:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._handlers.get(key)
+            if entry and entry[0] > now and entry[1] == secret:
+                return entry[2]
+            h = WebhookHandler(secret)
+            register(h)
+            self._handlers[key] = (now + self.ttl, secret, h)
+            return h
+
+    def invalidate(self, line_channel_id: Optional[str] = None) -> None:
+        """
+        line_channel_id 有值：清掉該頻道；沒值：全部清空。
+        以 DB id 為 key 的項目無法對應 line_channel_id，一律清掉（數量很少）。
+        """
+        with self._lock:
+            if not line_channel_id:
+                self._creds.clear()
+                self._apis.clear()
+                self._handlers.clear()
+                return
+            key = f"line:{line_channel_id}"
+            for d in (self._creds, self._apis, self._handlers):
+                d.pop(key, None)
+                for k in [k for k in d if k.startswith("id:")]:
+                    d.pop(k, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "credentials": len(self._creds),
+                "messaging_apis": len(self._apis),
+                "webhook_handlers": len(self._handlers),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+            }
+
+
+channel_registry = _ChannelRegistry(LINE_CHANNEL_CACHE_TTL, LINE_CHANNEL_NEGATIVE_CACHE_TTL)
+
+
+def invalidate_channel_cache(line_channel_id: Optional[str] = None) -> None:
+    """line_channels 異動後呼叫（不帶參數 = 全部失效）"""
+    channel_registry.invalidate(line_channel_id)
+    logging.info("[LINE] channel cache invalidated: %s", line_channel_id or "*")
+
+
+# -------------------------------------------------
+# 憑證查詢
+# -------------------------------------------------
+def _load_credentials(channel_id: str):
     try:
-        row = fetchone("""
+        return fetchone("""
             SELECT channel_access_token AS token,
                    channel_secret       AS secret,
                    COALESCE(liff_id_open, '') AS liff_id_open
@@ -57,23 +160,34 @@ def get_credentials(channel_id: str | None):
              WHERE id = :cid AND is_active = 1
              LIMIT 1
         """, {"cid": channel_id})
-        return row if row else None
     except Exception:
         return None
 
 
+def get_credentials(channel_id: str | None):
+    """
+    從資料表抓該 channel 的 access_token / secret / liff_id_open。
+    若查不到就回 None，代表用預設 .env。
+    """
+    if not channel_id:
+        return None
+    return channel_registry.credentials(f"id:{channel_id}", lambda: _load_credentials(channel_id))
+
+
 def get_credentials_by_line_id(line_channel_id: str) -> dict | None:
     """用 LINE 的 Channel ID（line_channel_id）抓憑證"""
-    row = fetchone(f"""
-        SELECT
-            channel_access_token AS token,
-            channel_secret       AS secret,
-            COALESCE(liff_id_open, '') AS liff_id_open
-        FROM line_channels
-        WHERE {LINE_CHANNEL_ID_COL} = :cid AND is_active = 1
-        LIMIT 1
-    """, {"cid": line_channel_id})
-    return row  # 可能為 None
+    def _load():
+        return fetchone(f"""
+            SELECT
+                channel_access_token AS token,
+                channel_secret       AS secret,
+                COALESCE(liff_id_open, '') AS liff_id_open
+            FROM line_channels
+            WHERE {LINE_CHANNEL_ID_COL} = :cid AND is_active = 1
+            LIMIT 1
+        """, {"cid": line_channel_id})
+
+    return channel_registry.credentials(f"line:{line_channel_id}", _load)  # 可能為 None
 
 
 def get_channel_access_token_by_channel_id(line_channel_id: Optional[str]) -> str:
@@ -83,19 +197,11 @@ def get_channel_access_token_by_channel_id(line_channel_id: Optional[str]) -> st
     - 沒有 line_channel_id -> fallback 使用 .env 的 LINE_CHANNEL_ACCESS_TOKEN
     - 任何情況下：一定回傳 str，否則直接丟 RuntimeError
     """
-    # 指定了 line_channel_id -> 從 DB 查
+    # 指定了 line_channel_id -> 從 DB 查（經 registry 快取）
     if line_channel_id:
-        row = fetchone(f"""
-            SELECT channel_access_token
-            FROM line_channels
-            WHERE {LINE_CHANNEL_ID_COL} = :cid AND is_active = 1
-            LIMIT 1
-        """, {"cid": line_channel_id})
-
-        if row:
-            token = row.get("channel_access_token")
-            if token:
-                return token
+        cred = get_credentials_by_line_id(line_channel_id)
+        if cred and cred.get("token"):
+            return cred["token"]
 
         logging.warning(
             "[LINE] line_channel_id not found or missing token, fallback to env token: %s",
@@ -115,7 +221,7 @@ def get_channel_access_token_by_channel_id(line_channel_id: Optional[str]) -> st
 # -------------------------------------------------
 def get_messaging_api(channel_id: str | None = None):
     """
-    有給 channel_id -> 用該 token 建臨時 MessagingApi
+    有給 channel_id -> 用該 token 的 MessagingApi（registry 快取）
     沒給 -> 回傳全域 messaging_api（= .env 預設）
     """
     if not channel_id:
@@ -124,8 +230,7 @@ def get_messaging_api(channel_id: str | None = None):
     if not cred or not cred.get("token"):
         # 有指定 channel_id 但找不到 -> 明確錯誤，不 fallback
         raise RuntimeError(f"Invalid channel_id or missing token: {channel_id}")
-    cfg = Configuration(access_token=cred["token"])
-    return MessagingApi(ApiClient(cfg))
+    return channel_registry.messaging_api(f"id:{channel_id}", cred["token"])
 
 
 def get_messaging_api_by_line_id(line_channel_id: str | None) -> MessagingApi:
@@ -137,8 +242,13 @@ def get_messaging_api_by_line_id(line_channel_id: str | None) -> MessagingApi:
     if not cred or not cred.get("token"):
         raise RuntimeError(f"Invalid line_channel_id or missing token: {line_channel_id}")
 
-    cfg = Configuration(access_token=cred["token"])
-    return MessagingApi(ApiClient(cfg))
+    return channel_registry.messaging_api(f"line:{line_channel_id}", cred["token"])
+
+
+def get_webhook_handler_by_line_id(line_channel_id: str, secret: str,
+                                   register: Callable[[WebhookHandler], Any]) -> WebhookHandler:
+    """取得該頻道的 WebhookHandler（首次建立時呼叫 register 掛上事件處理）"""
+    return channel_registry.webhook_handler(f"line:{line_channel_id}", secret, register)
 
 
 # -------------------------------------------------
@@ -242,6 +352,7 @@ def setup_line_liff(line_channel_id: str, channel_secret: str, view_url: str, si
             f"UPDATE line_channels SET liff_id_open=:liff, updated_at=:now WHERE {LINE_CHANNEL_ID_COL}=:cid",
             {"liff": liff_id, "cid": line_channel_id, "now": datetime.datetime.utcnow()},
         )
+        invalidate_channel_cache(line_channel_id)
 
     return {
         "ok": ok,
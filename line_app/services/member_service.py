@@ -4,22 +4,19 @@
 # - upsert_member, upsert_line_friend
 # - fetch_member_profile, maybe_update_member_profile
 # - is_gpt_enabled_for_user
-# - get_all_follower_ids, backfill_line_friends_on_startup
+# - get_all_follower_ids, bulk_upsert_followers（好友補齊見 services/follower_backfill.py）
 # - render_template_text (顯示名稱模板)
 # ============================================================
 
 import datetime
 import logging
-import time
 from typing import Optional
 
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 
-from config import AUTO_BACKFILL_FRIENDS
 from db import (
     engine,
     fetchone,
-    fetchall,
     execute,
     table_has_column as _table_has,
     column_is_required as _col_required,
@@ -27,7 +24,6 @@ from db import (
 from services.line_sdk import (
     fetch_line_profile,
     get_channel_access_token_by_channel_id,
-    LINE_CHANNEL_ID_COL,
 )
 
 import requests
@@ -380,181 +376,170 @@ def render_template_text(
 
 
 # -------------------------------------------------
-# Followers 批量取得 / 補齊
+# Followers 批量取得 / 批次寫入
 # -------------------------------------------------
-def get_all_follower_ids(line_channel_id: Optional[str] = None, limit: int = 500) -> list[str]:
+_FOLLOWERS_URL = "https://api.line.me/v2/bot/followers/ids"
+
+
+def iter_follower_id_pages(line_channel_id: Optional[str] = None,
+                           start: Optional[str] = None,
+                           limit: int = 1000):
     """
-    用 LINE 官方 followers API 把『指定 OA』目前所有好友的 userId 撈出來。
+    逐頁產生『指定 OA』好友的 (userIds, next)；next 為 None 代表最後一頁。
 
-    :param line_channel_id: LINE 官方帳號 channel id；None 時 fallback .env 預設 token（與群發同一套）
-    :param limit: 每次 API 要幾筆（官方上限 1000，這裡保守用 500）
-    :return: 所有好友的 userId list
+    :param line_channel_id: LINE 官方帳號 channel id；None 時 fallback .env 預設 token
+    :param start: 上次中斷時保存的 next（續跑用）
+    :param limit: 每頁筆數（官方上限 1000）
+    :raises RuntimeError: followers API 回非 2xx
     """
     # 多 OA：依 channel 取對應 token；沒帶 channel -> get_channel_access_token_by_channel_id
     # 內部自動 fallback .env（保證回 str，否則丟 RuntimeError）
     token = get_channel_access_token_by_channel_id(line_channel_id)
+    headers = {"Authorization": f"Bearer {token}"}
 
-    headers = {
-        "Authorization": f"Bearer {token}"
-    }
-
-    all_ids: list[str] = []
-    next_cursor: str | None = None
-
+    next_cursor = start
     while True:
         params = {"limit": limit}
         if next_cursor:
             params["start"] = next_cursor
 
-        resp = requests.get(
-            "https://api.line.me/v2/bot/followers/ids",
-            headers=headers,
-            params=params,
-            timeout=10,
-        )
-
+        resp = requests.get(_FOLLOWERS_URL, headers=headers, params=params, timeout=10)
         if not resp.ok:
-            logging.error("[BACKFILL] 取得 followers 失敗：%s %s", resp.status_code, resp.text)
-            break
+            raise RuntimeError(f"followers API {resp.status_code}: {resp.text[:200]}")
 
         data = resp.json()
-        user_ids = data.get("userIds", []) or []
-        all_ids.extend(user_ids)
-
-        logging.info("[BACKFILL] 目前累積好友數：%d", len(all_ids))
-
-        # 有下一頁就接著撈，沒有就結束
-        next_cursor = data.get("next")
+        next_cursor = data.get("next") or None
+        yield data.get("userIds", []) or [], next_cursor
         if not next_cursor:
-            break
-
-        # 避免過快打 API，稍微休息一下
-        time.sleep(0.3)
-
-    return all_ids
+            return
 
 
-def _backfill_one_oa(line_channel_id: Optional[str]) -> None:
+def get_all_follower_ids(line_channel_id: Optional[str] = None, limit: int = 500) -> list[str]:
     """
-    補單一 OA 的好友（line_channel_id=None 代表 .env 預設帳號，相容單帳號舊環境）。
+    用 LINE 官方 followers API 把『指定 OA』目前所有好友的 userId 撈出來。
 
-    重點：好友以「對應的 line_channel_id」寫進 members —— 這是群發受眾人數、
-    會員列表多 OA 過濾（members.line_channel_id）唯一的資料來源。寫法與 on_follow
-    一致：upsert_line_friend + upsert_member(帶 channel) + 連結 member_id。
+    :param line_channel_id: LINE 官方帳號 channel id；None 時 fallback .env 預設 token（與群發同一套）
+    :param limit: 每次 API 要幾筆（官方上限 1000，這裡保守用 500）
+    :return: 所有好友的 userId list
     """
-    label = line_channel_id or "(.env 預設)"
-    logging.info("[BACKFILL] === OA=%s 開始撈取好友 userId ===", label)
+    all_ids: list[str] = []
+    try:
+        for user_ids, _ in iter_follower_id_pages(line_channel_id, limit=limit):
+            all_ids.extend(user_ids)
+            logging.info("[BACKFILL] 目前累積好友數：%d", len(all_ids))
+    except RuntimeError as e:
+        logging.error("[BACKFILL] 取得 followers 失敗：%s", e)
+    return all_ids
 
-    follower_ids = get_all_follower_ids(line_channel_id=line_channel_id)
-    if not follower_ids:
-        logging.warning("[BACKFILL] OA=%s 未取得任何好友（token 有問題或目前沒有好友）", label)
-        return
 
-    # 已正確歸屬本 OA 的好友：以 members.line_channel_id 判斷（受眾/列表都讀這張表）。
-    # 沒帶 channel（單帳號舊環境）時退回用 line_friends 既有名單判斷。
+def get_followers_in_db(line_channel_id: Optional[str], uids: list[str]) -> set[str]:
+    """
+    uids 中已正確歸屬本 OA 的好友：以 members.line_channel_id 判斷（受眾/列表都讀這張表）。
+    沒帶 channel（單帳號舊環境）時退回用 line_friends 既有名單判斷。
+    """
+    if not uids:
+        return set()
     if line_channel_id:
-        rows = fetchall(
+        sql = text(
             "SELECT line_uid FROM members "
-            "WHERE line_channel_id = :cid AND is_following = 1 "
-            "AND line_uid IS NOT NULL AND line_uid != ''",
-            {"cid": line_channel_id},
-        )
+            "WHERE line_channel_id = :cid AND is_following = 1 AND line_uid IN :uids"
+        ).bindparams(bindparam("uids", expanding=True))
+        params = {"cid": line_channel_id, "uids": uids}
     else:
-        rows = fetchall("SELECT line_uid FROM line_friends WHERE is_following = 1", {})
-    db_existing = {row["line_uid"] for row in rows}
-
-    # 找出「LINE 有、但 DB 還沒正確歸屬本 OA」的 userId（含舊資料缺 channel 的修復）
-    missing_ids = [uid for uid in follower_ids if uid not in db_existing]
-    if not missing_ids:
-        logging.info("[BACKFILL] OA=%s 資料已齊全，不需要補", label)
-        return
-
-    logging.info("[BACKFILL] OA=%s 需要補 %d 位好友", label, len(missing_ids))
-
-    success = 0
-    fail = 0
-    total = len(missing_ids)
-    for idx, uid in enumerate(missing_ids, start=1):
-        try:
-            # 1) 用該 OA 的 token 取 profile（名稱 & 大頭貼）
-            display_name, picture_url = fetch_line_profile(uid, line_channel_id=line_channel_id)
-
-            # 2) 寫 line_friends（與 on_follow 同序：先 friend，member_id 之後再連）
-            friend_id = upsert_line_friend(
-                line_uid=uid,
-                display_name=display_name,
-                picture_url=picture_url,
-                is_following=True,
-            )
-
-            # 3) 寫 members（帶 channel）—— 受眾人數 / 會員列表多 OA 過濾的來源
-            mid = upsert_member(
-                uid,
-                display_name,
-                picture_url,
-                line_channel_id=line_channel_id,
-            )
-
-            # 4) 連結 friend ↔ member（此 UPDATE 觸發 trigger 把 is_following 同步回 members）
-            if friend_id and mid:
-                execute(
-                    "UPDATE line_friends SET member_id = :mid WHERE id = :fid",
-                    {"mid": mid, "fid": friend_id},
-                )
-
-            success += 1
-            logging.info(
-                "[BACKFILL] OA=%s (%d/%d) 已補 %s name=%r avatar=%s",
-                label, idx, total, uid, display_name, "Y" if picture_url else "N"
-            )
-
-        except Exception as e:
-            fail += 1
-            logging.exception(
-                "[BACKFILL] OA=%s (%d/%d) 補 %s 失敗：%s", label, idx, total, uid, e
-            )
-
-        # 防止太密集打 profile API，被 LINE throttle
-        time.sleep(0.2)
-
-    logging.info("[BACKFILL] OA=%s 補齊完成，成功 %d 筆，失敗 %d 筆", label, success, fail)
-
-
-def backfill_line_friends_on_startup():
+        sql = text(
+            "SELECT line_uid FROM line_friends WHERE is_following = 1 AND line_uid IN :uids"
+        ).bindparams(bindparam("uids", expanding=True))
+        params = {"uids": uids}
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(sql, params)}
+
+
+def bulk_upsert_followers(profiles: list[tuple[str, Optional[str], Optional[str]]],
+                          line_channel_id: Optional[str] = None) -> int:
     """
-    啟動時執行資料補齊（只補「LINE 有、但 DB 還沒正確歸屬」的好友）。
+    批次版 on_follow 寫入：一個交易內
+      1) multi-row INSERT ... ON DUPLICATE KEY UPDATE line_friends（標記為關注中）
+      2) multi-row INSERT ... ON DUPLICATE KEY UPDATE members（帶 channel）
+      3) 一條 UPDATE ... JOIN 連結 line_friends.member_id（觸發 trigger 同步 is_following 回 members）
 
-    多 OA：遍歷 line_channels 中 is_active=1 的每個官方帳號，各用自己的 token 撈
-    followers，並把好友以「對應 line_channel_id」寫入 members / line_friends。
-    無任何 active OA 時退回 .env 單帳號（相容舊行為）。AUTO_BACKFILL_FRIENDS 為總開關。
+    profiles: [(line_uid, display_name, picture_url), ...]；名稱 / 頭像為 None 時保留 DB 舊值。
+    回傳寫入筆數。
     """
-    try:
-        if not AUTO_BACKFILL_FRIENDS:
-            logging.info("[BACKFILL] AUTO_BACKFILL_FRIENDS=0，略過 backfill")
-            return
+    if not profiles:
+        return 0
+    now = utcnow()
+    uids = [uid for uid, _, _ in profiles]
+
+    friend_sql = text(
+        "INSERT INTO line_friends ("
+        "line_uid, line_display_name, line_picture_url, is_following, "
+        "followed_at, last_interaction_at, created_at, updated_at"
+        ") VALUES (:uid, :dn, :pu, 1, :now, :now, :now, :now) "
+        "ON DUPLICATE KEY UPDATE "
+        "line_display_name = COALESCE(VALUES(line_display_name), line_display_name), "
+        "line_picture_url = COALESCE(VALUES(line_picture_url), line_picture_url), "
+        # 重新關注才更新 followed_at；須寫在 is_following = 1 之前（MySQL 依序套用）
+        "followed_at = IF(is_following = 1, followed_at, VALUES(followed_at)), "
+        "unfollowed_at = IF(is_following = 1, unfollowed_at, NULL), "
+        "is_following = 1, "
+        "last_interaction_at = VALUES(last_interaction_at), "
+        "updated_at = VALUES(updated_at)"
+    )
 
-        # 取得所有啟用中的 OA channel id（欄名因環境而異，沿用 LINE_CHANNEL_ID_COL）
-        try:
-            oa_rows = fetchall(
-                f"SELECT {LINE_CHANNEL_ID_COL} AS cid FROM line_channels WHERE is_active = 1 ORDER BY id",
-                {},
-            )
-        except Exception:
-            logging.exception("[BACKFILL] 查詢 line_channels 失敗，改用 .env 單帳號")
-            oa_rows = []
-
-        channel_ids = [r["cid"] for r in (oa_rows or []) if r.get("cid")]
-        if not channel_ids:
-            logging.info("[BACKFILL] 無啟用中的 OA，使用 .env 預設帳號 backfill")
-            channel_ids = [None]  # None -> get_all_follower_ids fallback .env
-
-        logging.info("[BACKFILL] 共 %d 個 OA 需要 backfill", len(channel_ids))
-        for channel_id in channel_ids:
-            try:
-                _backfill_one_oa(channel_id)
-            except Exception:
-                # 單一 OA 失敗不影響其他 OA
-                logging.exception("[BACKFILL] OA=%s backfill 失敗", channel_id or "(.env 預設)")
+    # members：欄位依環境而異，與 upsert_member 同一套相容判斷
+    fields = ["line_uid"]
+    set_parts = []
+    if _table_has("members", "line_display_name"):
+        fields.append("line_display_name")
+        set_parts.append("line_display_name = COALESCE(VALUES(line_display_name), line_display_name)")
+    if _table_has("members", "line_avatar"):
+        fields.append("line_avatar")
+        set_parts.append("line_avatar = COALESCE(VALUES(line_avatar), line_avatar)")
+    if line_channel_id and _table_has("members", "line_channel_id"):
+        fields.append("line_channel_id")
+        set_parts.append("line_channel_id = VALUES(line_channel_id)")
+    for col in ("join_source", "source"):
+        if _table_has("members", col):
+            fields.append(col)
+            set_parts.append(f"{col} = VALUES({col})")
+            break
+    if _col_required("members", "created_at"):
+        fields.append("created_at")
+    for col in ("updated_at", "last_interaction_at"):
+        if _table_has("members", col):
+            fields.append(col)
+            set_parts.append(f"{col} = VALUES({col})")
 
-    except Exception as e:
-        logging.exception("[BACKFILL] backfill_line_friends_on_startup 整體失敗：%s", e)
+    member_sql = text(
+        f"INSERT INTO members ({', '.join(fields)}) "
+        f"VALUES ({', '.join(':' + f for f in fields)}) "
+        f"ON DUPLICATE KEY UPDATE {', '.join(set_parts) or 'line_uid = line_uid'}"
+    )
+
+    friend_rows, member_rows = [], []
+    for uid, dn, pu in profiles:
+        friend_rows.append({"uid": uid, "dn": dn, "pu": pu, "now": now})
+        member_rows.append({
+            "line_uid": uid,
+            "line_display_name": dn,
+            "line_avatar": pu,
+            "line_channel_id": line_channel_id,
+            "join_source": "LINE",
+            "source": "LINE",
+            "created_at": now,
+            "updated_at": now,
+            "last_interaction_at": now,
+        })
+
+    link_sql = text(
+        "UPDATE line_friends lf JOIN members m ON m.line_uid = lf.line_uid "
+        "SET lf.member_id = m.id WHERE lf.line_uid IN :uids"
+    ).bindparams(bindparam("uids", expanding=True))
+
+    # executemany 的 INSERT ... VALUES 由 driver 改寫成一條 multi-row INSERT
+    with engine.begin() as conn:
+        conn.execute(friend_sql, friend_rows)
+        conn.execute(member_sql, [{k: r[k] for k in fields} for r in member_rows])
+        conn.execute(link_sql, {"uids": uids})
+
+    return len(profiles)
@@ -0,0 +1,188 @@
+# line_app/services/profile_refresh.py
+# ============================================================
+# LINE Profile 新鮮度快取 + 背景批次更新
+# - 每則訊息不再同步呼叫 api.line.me 取 profile（省掉 webhook 內一次外部 round trip）
+# - 以 line_uid 記錄最後一次向 LINE 取 profile 的時間（LRU，程序內）
+#   - 在 PROFILE_FRESHNESS_SECONDS 內 → 直接用 DB 現值（hit）
+#   - 已過期 → 排入背景 worker，批次取 profile 並只在有變更時寫回 members / line_friends
+#   - DB 裡還沒有名字（新使用者）→ 同步取一次，回覆模板才有名字可用
+# - stats(): hit ratio / 排隊數 / 更新數
+# ============================================================
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import (
+    PROFILE_CACHE_MAX_ENTRIES,
+    PROFILE_FRESHNESS_SECONDS,
+    PROFILE_REFRESH_BATCH_SIZE,
+)
+from services.line_sdk import fetch_line_profile
+from services.member_service import fetch_member_profile, upsert_line_friend, upsert_member
+
+# worker 沒收到通知時的最長等待秒數
+_IDLE_WAIT_SECONDS = 5.0
+
+
+class ProfileRefresher:
+    def __init__(self, freshness_seconds: int, max_entries: int, batch_size: int):
+        self.freshness_seconds = freshness_seconds
+        self.max_entries = max(1, max_entries)
+        self.batch_size = max(1, batch_size)
+        self._lock = threading.Lock()
+        self._refreshed_at: "OrderedDict[str, float]" = OrderedDict()
+        self._pending: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.hits = 0
+        self.misses = 0
+        self.sync_fetches = 0
+        self.refreshed = 0
+        self.updated = 0
+        self.failed = 0
+
+    # -------------------------------------------------
+    # 新鮮度紀錄
+    # -------------------------------------------------
+    def mark_fresh(self, uid: str) -> None:
+        """剛向 LINE 取過 profile（例如 on_follow 已同步取過）"""
+        with self._lock:
+            self._refreshed_at[uid] = time.monotonic()
+            self._refreshed_at.move_to_end(uid)
+            while len(self._refreshed_at) > self.max_entries:
+                self._refreshed_at.popitem(last=False)
+
+    def is_fresh(self, uid: str) -> bool:
+        with self._lock:
+            ts = self._refreshed_at.get(uid)
+            return ts is not None and time.monotonic() - ts < self.freshness_seconds
+
+    # -------------------------------------------------
+    # 對外：取得可用的 profile
+    # -------------------------------------------------
+    def resolve(self, uid: str, line_channel_id: Optional[str],
+                cur_dn: Optional[str], cur_pu: Optional[str]) -> Tuple[Optional[str], Optional[str], bool]:
+        """
+        回傳 (display_name, picture_url, fetched)：
+          - fetched=True：本次已同步向 LINE 取得（呼叫端負責比對寫回）
+          - fetched=False：回傳 DB 現值；過期時已排入背景更新
+        """
+        if not cur_dn:
+            with self._lock:
+                self.misses += 1
+                self.sync_fetches += 1
+            api_dn, api_pu = fetch_line_profile(uid, line_channel_id=line_channel_id)
+            self.mark_fresh(uid)
+            return api_dn or cur_dn, api_pu or cur_pu, True
+
+        if self.is_fresh(uid):
+            with self._lock:
+                self.hits += 1
+            return cur_dn, cur_pu, False
+
+        with self._lock:
+            self.misses += 1
+        self.request_refresh(uid, line_channel_id)
+        return cur_dn, cur_pu, False
+
+    def request_refresh(self, uid: str, line_channel_id: Optional[str]) -> None:
+        with self._lock:
+            self._pending[uid] = line_channel_id
+        self._ensure_worker()
+        self._wakeup.set()
+
+    # -------------------------------------------------
+    # 背景 worker
+    # -------------------------------------------------
+    def _ensure_worker(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="profile-refresh", daemon=True)
+            self._thread.start()
+
+    def _take_batch(self) -> list:
+        with self._lock:
+            batch = []
+            while self._pending and len(batch) < self.batch_size:
+                batch.append(self._pending.popitem(last=False))
+            return batch
+
+    def _refresh_one(self, uid: str, line_channel_id: Optional[str]) -> None:
+        api_dn, api_pu = fetch_line_profile(uid, line_channel_id=line_channel_id)
+        # 取不到（網路錯誤 / 已封鎖）不覆蓋舊值，也不標記 fresh，下次互動再試
+        if not api_dn and not api_pu:
+            with self._lock:
+                self.failed += 1
+            return
+        self.mark_fresh(uid)
+
+        cur = fetch_member_profile(uid) or {}
+        dn_to_write = api_dn if (api_dn and api_dn != cur.get("line_display_name")) else None
+        pu_to_write = api_pu if (api_pu and api_pu != cur.get("line_avatar")) else None
+        with self._lock:
+            self.refreshed += 1
+        if dn_to_write is None and pu_to_write is None:
+            return
+
+        mid = upsert_member(uid, dn_to_write, pu_to_write, line_channel_id=line_channel_id)
+        upsert_line_friend(
+            line_uid=uid,
+            display_name=dn_to_write,
+            picture_url=pu_to_write,
+            member_id=mid,
+            is_following=True,
+        )
+        with self._lock:
+            self.updated += 1
+
+    def process_pending(self) -> int:
+        """處理一批排隊中的使用者，回傳處理人數（worker 與測試共用）"""
+        batch = self._take_batch()
+        for uid, line_channel_id in batch:
+            try:
+                self._refresh_one(uid, line_channel_id)
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                logging.exception("[PROFILE] background refresh failed uid=%s", uid)
+        return len(batch)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(_IDLE_WAIT_SECONDS)
+            self._wakeup.clear()
+            while self.process_pending():
+                pass
+
+    # -------------------------------------------------
+    # 指標
+    # -------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else None,
+                "sync_fetches": self.sync_fetches,
+                "pending": len(self._pending),
+                "tracked_users": len(self._refreshed_at),
+                "refreshed": self.refreshed,
+                "updated": self.updated,
+                "failed": self.failed,
+                "freshness_seconds": self.freshness_seconds,
+            }
+
+
+# 全域 singleton
+profile_refresher = ProfileRefresher(
+    PROFILE_FRESHNESS_SECONDS,
+    max_entries=PROFILE_CACHE_MAX_ENTRIES,
+    batch_size=PROFILE_REFRESH_BATCH_SIZE,
+)
@@ -0,0 +1,364 @@
+# line_app/services/webhook_queue.py
+# ============================================================
+# LINE Webhook 非同步佇列（SQLite 檔案，程序重啟不遺失）
+# - enqueue_events: callback 驗章後把每個事件寫入佇列即回 200
+# - worker pool: 背景 thread 取件處理；同一使用者（partition_key）嚴格依序，
+#   前一件未完成（含重試中）時後面的事件不會被取走 —— 跨 thread / 跨 gunicorn 程序都成立
+# - webhookEventId 唯一鍵：LINE 重送的同一事件只會入列一次
+# - 處理中程序崩潰：lease 逾時後自動放回 pending
+# - stats(): 佇列深度 / 最舊待處理事件延遲 / 處理延遲等指標
+# ============================================================
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from config import (
+    WEBHOOK_QUEUE_MAX_ATTEMPTS,
+    WEBHOOK_QUEUE_PATH,
+    WEBHOOK_QUEUE_WORKERS,
+)
+
+# 取件後超過此秒數仍未完成視為 worker 已死，放回 pending
+LEASE_SECONDS = 120
+# 重試退避（秒）：第 n 次失敗後等待 RETRY_BACKOFF_SECONDS * 2^(n-1)
+RETRY_BACKOFF_SECONDS = 2.0
+# 已完成事件保留時間（秒），過期清掉避免檔案無限長大
+DONE_RETENTION_SECONDS = 24 * 3600
+# 沒有工作時的輪詢間隔（同程序入列會立即喚醒，跨程序靠輪詢）
+_IDLE_POLL_SECONDS = 0.5
+# 統計用：保留最近 N 筆處理延遲
+_LATENCY_WINDOW = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_events (
+    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id        TEXT UNIQUE,
+    line_channel_id TEXT,
+    destination     TEXT,
+    partition_key   TEXT NOT NULL,
+    payload         TEXT NOT NULL,
+    status          TEXT NOT NULL DEFAULT 'pending',
+    attempts        INTEGER NOT NULL DEFAULT 0,
+    enqueued_at     REAL NOT NULL,
+    available_at    REAL NOT NULL,
+    claimed_at      REAL,
+    finished_at     REAL,
+    last_error      TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_webhook_events_status ON webhook_events (status, id);
+CREATE INDEX IF NOT EXISTS ix_webhook_events_partition ON webhook_events (partition_key, status, id);
+"""
+
+
+def partition_key_for(event: Dict[str, Any]) -> str:
+    """同一個對話來源（使用者 / 群組 / 聊天室）的事件共用一個 partition，確保依序處理"""
+    src = event.get("source") or {}
+    st = src.get("type")
+    if st == "group":
+        return f"group_{src.get('groupId', 'unknown')}"
+    if st == "room":
+        return f"room_{src.get('roomId', 'unknown')}"
+    return src.get("userId") or "anonymous"
+
+
+class WebhookQueue:
+    """SQLite 檔案佇列 + 背景 worker pool"""
+
+    def __init__(self, path: str, workers: int = 4, max_attempts: int = 3):
+        self.path = path
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._dispatch: Optional[Callable[[Optional[str], str], None]] = None
+        self._stats_lock = threading.Lock()
+        self._processed = 0
+        self._failed = 0
+        self._retried = 0
+        self._latencies: deque = deque(maxlen=_LATENCY_WINDOW)
+        self._initialized = False
+        self._init_lock = threading.Lock()
+
+    # -------------------------------------------------
+    # 連線（每個 thread 一條）
+    # -------------------------------------------------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            self._ensure_schema()
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self) -> None:
+        if self._initialized:
+            return
+        with self._init_lock:
+            if self._initialized:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            try:
+                conn.executescript(_SCHEMA)
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+
+    # -------------------------------------------------
+    # 入列
+    # -------------------------------------------------
+    def enqueue_events(self, body: str, line_channel_id: Optional[str]) -> int:
+        """
+        把已驗章的 webhook body 拆成事件逐一入列。
+
+        Returns:
+            實際新入列的事件數（重送的重複事件不計）
+        """
+        data = json.loads(body)
+        destination = data.get("destination")
+        now = time.time()
+        rows = [
+            (
+                ev.get("webhookEventId"),
+                line_channel_id,
+                destination,
+                partition_key_for(ev),
+                json.dumps(ev, ensure_ascii=False),
+                now,
+                now,
+            )
+            for ev in data.get("events") or []
+        ]
+        if not rows:
+            return 0
+
+        conn = self._conn()
+        before = conn.total_changes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                """
+                INSERT OR IGNORE INTO webhook_events
+                    (event_id, line_channel_id, destination, partition_key, payload,
+                     enqueued_at, available_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                rows,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        inserted = conn.total_changes - before
+        if inserted:
+            self._wakeup.set()
+        return inserted
+
+    # -------------------------------------------------
+    # 取件 / 完成
+    # -------------------------------------------------
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """取出一件可處理的事件：該 partition 沒有處理中的事件，且它是該 partition 最早的一件"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # lease 逾時（worker 崩潰）放回 pending
+            conn.execute(
+                "UPDATE webhook_events SET status='pending', available_at=? "
+                "WHERE status='processing' AND claimed_at < ?",
+                (now, now - LEASE_SECONDS),
+            )
+            row = conn.execute(
+                """
+                SELECT e.* FROM webhook_events e
+                WHERE e.status = 'pending'
+                  AND e.available_at <= ?
+                  AND NOT EXISTS (
+                      SELECT 1 FROM webhook_events p
+                      WHERE p.partition_key = e.partition_key
+                        AND (p.status = 'processing' OR (p.status = 'pending' AND p.id < e.id))
+                  )
+                ORDER BY e.id
+                LIMIT 1
+                """,
+                (now,),
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE webhook_events SET status='processing', claimed_at=?, attempts=attempts+1 "
+                    "WHERE id=?",
+                    (now, row["id"]),
+                )
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _finish(self, row: sqlite3.Row, error: Optional[str]) -> None:
+        conn = self._conn()
+        now = time.time()
+        attempts = row["attempts"] + 1
+        if error is None:
+            conn.execute(
+                "UPDATE webhook_events SET status='done', finished_at=?, last_error=NULL WHERE id=?",
+                (now, row["id"]),
+            )
+            with self._stats_lock:
+                self._processed += 1
+                self._latencies.append(now - row["enqueued_at"])
+        elif attempts >= self.max_attempts:
+            conn.execute(
+                "UPDATE webhook_events SET status='failed', finished_at=?, last_error=? WHERE id=?",
+                (now, error[:2000], row["id"]),
+            )
+            with self._stats_lock:
+                self._failed += 1
+            logging.error("[WEBHOOK_QUEUE] event %s failed after %d attempts: %s",
+                          row["event_id"], attempts, error)
+        else:
+            delay = RETRY_BACKOFF_SECONDS * (2 ** (attempts - 1))
+            conn.execute(
+                "UPDATE webhook_events SET status='pending', available_at=?, last_error=? WHERE id=?",
+                (now + delay, error[:2000], row["id"]),
+            )
+            with self._stats_lock:
+                self._retried += 1
+            logging.warning("[WEBHOOK_QUEUE] event %s attempt %d failed, retry in %.0fs: %s",
+                            row["event_id"], attempts, delay, error)
+
+    def _purge_done(self) -> None:
+        try:
+            self._conn().execute(
+                "DELETE FROM webhook_events WHERE status='done' AND finished_at < ?",
+                (time.time() - DONE_RETENTION_SECONDS,),
+            )
+        except Exception:
+            logging.exception("[WEBHOOK_QUEUE] purge failed")
+
+    def _build_body(self, row: sqlite3.Row) -> str:
+        return json.dumps(
+            {"destination": row["destination"], "events": [json.loads(row["payload"])]},
+            ensure_ascii=False,
+        )
+
+    # -------------------------------------------------
+    # Worker
+    # -------------------------------------------------
+    def _worker_loop(self, idx: int) -> None:
+        last_purge = 0.0
+        while not self._stop.is_set():
+            try:
+                row = self._claim()
+            except Exception:
+                logging.exception("[WEBHOOK_QUEUE] worker-%d claim failed", idx)
+                self._stop.wait(_IDLE_POLL_SECONDS)
+                continue
+
+            if row is None:
+                if idx == 0 and time.time() - last_purge > 600:
+                    self._purge_done()
+                    last_purge = time.time()
+                self._wakeup.wait(_IDLE_POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+
+            error = None
+            try:
+                self._dispatch(row["line_channel_id"], self._build_body(row))
+            except Exception as e:
+                logging.exception("[WEBHOOK_QUEUE] worker-%d dispatch failed event=%s", idx, row["event_id"])
+                error = f"{type(e).__name__}: {e}"
+            try:
+                self._finish(row, error)
+            except Exception:
+                logging.exception("[WEBHOOK_QUEUE] worker-%d finish failed event=%s", idx, row["event_id"])
+            # 同 partition 的下一件可能正等著，讓其他 worker 也醒來看看
+            self._wakeup.set()
+
+    def start(self, dispatch: Callable[[Optional[str], str], None]) -> None:
+        """
+        啟動 worker pool。
+
+        Args:
+            dispatch: (line_channel_id, single_event_body) -> None；拋例外即視為失敗並重試
+        """
+        if self._threads:
+            return
+        self._dispatch = dispatch
+        self._ensure_schema()
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker_loop, args=(i,),
+                                 name=f"webhook-queue-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logging.info("[WEBHOOK_QUEUE] started %d workers, path=%s", self.workers, self.path)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    # -------------------------------------------------
+    # 指標
+    # -------------------------------------------------
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        now = time.time()
+        counts = {
+            r["status"]: r["cnt"]
+            for r in conn.execute(
+                "SELECT status, COUNT(*) AS cnt FROM webhook_events GROUP BY status"
+            ).fetchall()
+        }
+        oldest = conn.execute(
+            "SELECT MIN(enqueued_at) FROM webhook_events WHERE status IN ('pending', 'processing')"
+        ).fetchone()[0]
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            processed, failed, retried = self._processed, self._failed, self._retried
+
+        def pct(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3)
+
+        pending = counts.get("pending", 0)
+        processing = counts.get("processing", 0)
+        return {
+            "depth": pending + processing,
+            "pending": pending,
+            "processing": processing,
+            "failed": counts.get("failed", 0),
+            "oldest_pending_age_seconds": round(now - oldest, 3) if oldest else 0.0,
+            "workers": len(self._threads),
+            # 以下為本程序自啟動以來的統計
+            "processed_total": processed,
+            "failed_total": failed,
+            "retried_total": retried,
+            "lag_seconds_p50": pct(0.5),
+            "lag_seconds_p95": pct(0.95),
+        }
+
+
+# 全域 singleton
+webhook_queue = WebhookQueue(
+    WEBHOOK_QUEUE_PATH,
+    workers=WEBHOOK_QUEUE_WORKERS,
+    max_attempts=WEBHOOK_QUEUE_MAX_ATTEMPTS,
+)
@@ -0,0 +1,152 @@
+"""
+Unit tests for services/auto_response_index.py
+
+Tests cover:
+- Exact keyword lookup (case-insensitive) with newest rule first
+- Channel / basic_id filtering and LINE channel list filter
+- Date / time windows (including ranges crossing midnight)
+- Snapshot reuse and invalidation
+"""
+
+import datetime
+import os
+import sys
+from unittest.mock import patch
+
+# config.py 匯入時要求 DB_* 環境變數；engine 只建立不連線
+for _k, _v in {"DB_USER": "u", "DB_PASS": "p", "DB_HOST": "localhost",
+               "DB_NAME": "test", "DB_PORT": "3306"}.items():
+    os.environ.setdefault(_k, _v)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 匯入時會查 information_schema 決定欄位名稱
+with patch("db.table_has_column", return_value=True):
+    from services import auto_response_index as ari  # noqa: E402
+
+T_OLD = datetime.datetime(2025, 1, 1)
+T_NEW = datetime.datetime(2025, 6, 1)
+
+
+def _rule(rid, trigger_type, updated_at=T_OLD, **kw):
+    row = {
+        "id": rid, "trigger_type": trigger_type, "channel_id": None, "channels": None,
+        "trigger_time_start": None, "trigger_time_end": None,
+        "date_range_start": None, "date_range_end": None,
+        "updated_at": updated_at, "created_at": None,
+    }
+    row.update(kw)
+    return row
+
+
+class _FakeDB:
+    def __init__(self, rules, messages, keywords, channels=()):
+        self.rules, self.messages, self.keywords, self.channels = rules, messages, keywords, list(channels)
+        self.calls = 0
+
+    def __call__(self, sql, params=None):
+        self.calls += 1
+        if "FROM auto_responses" in sql:
+            return self.rules
+        if "FROM auto_response_messages" in sql:
+            return self.messages
+        if "FROM auto_response_keywords" in sql:
+            return self.keywords
+        return self.channels
+
+
+def _index(db):
+    idx = ari.AutoResponseIndex(ttl=300)
+    patcher = patch("services.auto_response_index.fetchall", db)
+    patcher.start()
+    return idx, patcher
+
+
+class TestKeywordMatch:
+    def setup_method(self):
+        self.db = _FakeDB(
+            rules=[
+                _rule(1, "keyword", T_OLD),
+                _rule(2, "keyword", T_NEW),
+                _rule(3, "keyword", T_NEW, channel_id="@other"),
+                _rule(4, "keyword", T_NEW, channels='["Facebook"]'),
+            ],
+            messages=[
+                {"rid": 1, "message_content": "old"},
+                {"rid": 2, "message_content": "new-first"},
+                {"rid": 2, "message_content": "new-second"},
+                {"rid": 3, "message_content": "other-oa"},
+                {"rid": 4, "message_content": "fb-only"},
+            ],
+            keywords=[
+                {"rid": 1, "kw": "Hello"}, {"rid": 2, "kw": "hello "},
+                {"rid": 3, "kw": "hello"}, {"rid": 4, "kw": "hello"},
+            ],
+            channels=[{"cid": "C1", "basic_id": "@mine"}],
+        )
+        self.idx, self.patcher = _index(self.db)
+
+    def teardown_method(self):
+        self.patcher.stop()
+
+    def test_newest_rule_first_message_wins(self):
+        rule = self.idx.match_keyword("HELLO", "C1")
+        assert rule.content == "new-first"
+
+    def test_rule_bound_to_basic_id_matches_only_that_channel(self):
+        self.db.rules[2]["channel_id"] = "@mine"
+        self.db.rules[2]["updated_at"] = datetime.datetime(2026, 1, 1)
+        self.idx.invalidate()
+        assert self.idx.match_keyword("hello", "C1").content == "other-oa"
+        assert self.idx.match_keyword("hello", "C2").content == "new-first"
+
+    def test_unknown_keyword(self):
+        assert self.idx.match_keyword("bye", "C1") is None
+
+    def test_snapshot_reused_until_invalidated(self):
+        self.idx.match_keyword("hello", "C1")
+        self.idx.match_always("C1")
+        calls = self.db.calls
+        self.idx.match_keyword("hello", "C1")
+        assert self.db.calls == calls
+        self.idx.invalidate()
+        self.idx.match_keyword("hello", "C1")
+        assert self.db.calls == calls * 2
+
+
+class TestActiveWindows:
+    def _rule(self, **kw):
+        base = dict(id=1, channel_id=None, content="x", sort_key=(T_OLD, 1),
+                    date_start=None, date_end=None, time_start=None, time_end=None)
+        base.update(kw)
+        return ari._Rule(**base)
+
+    def test_date_range_inclusive(self):
+        d = datetime.date(2025, 3, 10).toordinal()
+        rule = self._rule(date_start=d, date_end=d)
+        assert rule.active_at(datetime.datetime(2025, 3, 10, 23, 59))
+        assert not rule.active_at(datetime.datetime(2025, 3, 11, 0, 0))
+
+    def test_time_range_crossing_midnight(self):
+        rule = self._rule(time_start=22 * 3600, time_end=6 * 3600)
+        assert rule.active_at(datetime.datetime(2025, 3, 10, 23, 0))
+        assert rule.active_at(datetime.datetime(2025, 3, 10, 5, 0))
+        assert not rule.active_at(datetime.datetime(2025, 3, 10, 12, 0))
+
+    def test_always_response_skips_inactive_rules(self):
+        db = _FakeDB(
+            rules=[
+                _rule(1, "always", T_NEW, date_range_end=datetime.date(2000, 1, 1)),
+                _rule(2, "follow", T_OLD),
+            ],
+            messages=[{"rid": 1, "message_content": "expired"},
+                      {"rid": 2, "message_content": "fallback"}],
+            keywords=[],
+        )
+        idx, patcher = _index(db)
+        try:
+            assert idx.match_always(None).content == "fallback"
+            assert idx.match_welcome(None) is None
+        finally:
+            patcher.stop()
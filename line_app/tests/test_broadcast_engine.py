@@ -0,0 +1,125 @@
+"""
+Unit tests for services/broadcast_engine.py
+
+Tests cover:
+- Recipient chunking (LINE multicast limit)
+- Multicast vs per-user push modes
+- Per-chunk success/failure accounting
+- Skipping completed chunks / per-chunk progress callback
+- send_status roll-up
+"""
+
+import os
+import sys
+from unittest.mock import Mock, patch
+
+import pytest
+
+# config.py 匯入時要求 DB_* 環境變數；engine 只建立不連線
+for _k, _v in {"DB_USER": "u", "DB_PASS": "p", "DB_HOST": "localhost",
+               "DB_NAME": "test", "DB_PORT": "3306"}.items():
+    os.environ.setdefault(_k, _v)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import broadcast_engine  # noqa: E402
+
+
+def _recipients(n):
+    return [{"line_uid": f"U{i:032d}", "id": i} for i in range(n)]
+
+
+class TestChunking:
+    def test_chunks_respect_multicast_limit(self):
+        chunks = broadcast_engine.chunk_recipients(_recipients(1201), size=1000)
+        assert [len(c) for c in chunks] == [500, 500, 201]
+
+    def test_empty_recipients(self):
+        assert broadcast_engine.chunk_recipients([], size=500) == []
+
+
+@patch("services.broadcast_engine.MulticastRequest", side_effect=lambda **kw: Mock(**kw))
+@patch("services.broadcast_engine.PushMessageRequest", side_effect=lambda **kw: Mock(**kw))
+@patch("services.broadcast_engine._record_chunk")
+class TestRunBroadcast:
+    def test_multicast_sends_one_call_per_chunk(self, mock_record, *_):
+        api = Mock()
+        result = broadcast_engine.run_broadcast(
+            api, _recipients(1050), campaign_id=7, alt_text="hi",
+            messages=["flex"], chunk_size=500, max_workers=3,
+        )
+        assert api.multicast.call_count == 3
+        assert api.push_message.call_count == 0
+        assert result["sent"] == 1050
+        assert result["failed"] == 0
+        assert result["mode"] == "multicast"
+        recorded = sum(len(call.args[2]) for call in mock_record.call_args_list)
+        assert recorded == 1050
+
+    def test_failed_multicast_chunk_counts_all_recipients(self, mock_record, *_):
+        api = Mock()
+        api.multicast.side_effect = [None, RuntimeError("boom")]
+        result = broadcast_engine.run_broadcast(
+            api, _recipients(600), campaign_id=7, alt_text="hi",
+            messages=["flex"], chunk_size=500, max_workers=1,
+        )
+        assert result["sent"] == 500
+        assert result["failed"] == 100
+        assert result["failed_chunks"] == 1
+        assert result["errors"]
+
+    def test_push_mode_builds_per_user_messages(self, mock_record, *_):
+        api = Mock()
+        bad_uid = _recipients(3)[1]["line_uid"]
+
+        def push(req, x_line_retry_key=None):
+            if req.to == bad_uid:
+                raise RuntimeError("blocked")
+
+        api.push_message.side_effect = push
+        build = Mock(side_effect=lambda uid: [f"flex-{uid}"])
+
+        result = broadcast_engine.run_broadcast(
+            api, _recipients(3), campaign_id=7, alt_text="hi",
+            build_messages=build, chunk_size=500,
+        )
+
+        assert build.call_count == 3
+        assert result["sent"] == 2
+        assert result["failed"] == 1
+        assert result["mode"] == "push"
+
+    def test_skips_done_chunks_and_reports_progress(self, mock_record, *_):
+        api = Mock()
+        progress = []
+        result = broadcast_engine.run_broadcast(
+            api, _recipients(1050), campaign_id=7, alt_text="hi",
+            messages=["flex"], chunk_size=500, max_workers=2,
+            skip_chunks={1}, on_chunk_done=lambda idx, r: progress.append((idx, len(r["sent_uids"]))),
+        )
+        assert api.multicast.call_count == 2
+        assert sorted(progress) == [(2, 500), (3, 50)]
+        assert result["sent"] == 550
+        assert result["chunks"] == 3
+
+    def test_requires_messages_or_builder(self, mock_record, *_):
+        with pytest.raises(ValueError):
+            broadcast_engine.run_broadcast(Mock(), _recipients(1), campaign_id=1, alt_text="x")
+
+
+@patch("services.broadcast_engine.execute")
+class TestRollupSendStatus:
+    def test_all_sent(self, mock_execute):
+        status = broadcast_engine.rollup_send_status(1, sent=10, failed=0, errors=[])
+        assert status == "已發送"
+        assert "failure_reason" not in mock_execute.call_args.args[0]
+
+    def test_partial_failure_records_reason(self, mock_execute):
+        status = broadcast_engine.rollup_send_status(1, sent=8, failed=2, errors=["x"])
+        assert status == "已發送"
+        assert "2/10" in mock_execute.call_args.args[1]["reason"]
+
+    def test_all_failed(self, mock_execute):
+        status = broadcast_engine.rollup_send_status(1, sent=0, failed=5, errors=["x"])
+        assert status == "發送失敗"
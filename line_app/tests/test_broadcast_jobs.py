@@ -0,0 +1,113 @@
+"""
+Unit tests for services/broadcast_jobs.py
+
+Tests cover:
+- One active job per campaign
+- Per-chunk progress and idempotent chunk records
+- Lease: running jobs are only reclaimed after the lease expires
+- Resume picks up where the previous run stopped
+"""
+
+import os
+import sys
+import time
+
+# config.py 匯入時要求 DB_* 環境變數；engine 只建立不連線
+for _k, _v in {"DB_USER": "u", "DB_PASS": "p", "DB_HOST": "localhost",
+               "DB_NAME": "test", "DB_PORT": "3306"}.items():
+    os.environ.setdefault(_k, _v)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import broadcast_jobs as jobs_mod  # noqa: E402
+from services.broadcast_jobs import BroadcastJobStore  # noqa: E402
+
+
+def _recipients(n):
+    return [{"line_uid": f"U{i:032d}", "id": i} for i in range(n)]
+
+
+def _store(tmp_path):
+    return BroadcastJobStore(str(tmp_path / "jobs.sqlite3"))
+
+
+class TestCreate:
+    def test_progress_counts_invalid_ids_as_failed(self, tmp_path):
+        store = _store(tmp_path)
+        job = store.create(7, {"title": "hi"}, _recipients(1200), invalid=3, chunk_size=500)
+        assert job["status"] == "queued"
+        assert job["total"] == 1203
+        assert job["failed"] == 3
+        assert job["remaining"] == 1200
+        assert job["chunks"] == 3
+
+    def test_active_job_is_reused_for_same_campaign(self, tmp_path):
+        store = _store(tmp_path)
+        first = store.create(7, {}, _recipients(10), invalid=0, chunk_size=500)
+        again = store.create(7, {}, _recipients(10), invalid=0, chunk_size=500)
+        assert again["job_id"] == first["job_id"]
+
+        store.finish(first["job_id"], "done")
+        fresh = store.create(7, {}, _recipients(10), invalid=0, chunk_size=500)
+        assert fresh["job_id"] != first["job_id"]
+
+
+class TestProgress:
+    def test_record_chunk_is_idempotent(self, tmp_path):
+        store = _store(tmp_path)
+        job_id = store.create(7, {}, _recipients(600), invalid=0, chunk_size=500)["job_id"]
+        store.claim(job_id)
+        store.record_chunk(job_id, 1, sent=499, failed=1, errors=["boom"])
+        store.record_chunk(job_id, 1, sent=499, failed=1, errors=["boom"])
+        job = store.get(job_id)
+        assert (job["sent"], job["failed"], job["remaining"]) == (499, 1, 100)
+        assert job["chunks_done"] == 1
+        assert job["errors"] == ["boom"]
+
+
+class TestLeaseAndResume:
+    def test_running_job_not_reclaimed_until_lease_expires(self, tmp_path, monkeypatch):
+        store = _store(tmp_path)
+        job_id = store.create(7, {}, _recipients(10), invalid=0, chunk_size=5)["job_id"]
+        assert store.claim(job_id) is not None
+        assert store.claim(job_id) is None
+        assert store.claim() is None
+
+        monkeypatch.setattr(jobs_mod, "LEASE_SECONDS", -1)
+        store.record_chunk(job_id, 1, sent=5, failed=0, errors=[])
+        job = store.claim()
+        assert job["job_id"] == job_id
+        assert job["done_chunks"] == {1}
+        assert job["attempts"] == 2
+        assert len(job["recipients"]) == 10
+
+    def test_resume_pending_runs_unfinished_jobs(self, tmp_path):
+        store = _store(tmp_path)
+        job_id = store.create(7, {"title": "hi"}, _recipients(10), invalid=0, chunk_size=5)["job_id"]
+        ran = []
+
+        def runner(job):
+            ran.append((job["job_id"], job["payload"]["title"]))
+            store.finish(job["job_id"], "done")
+
+        assert store.resume_pending(runner) == 1
+        for _ in range(50):
+            if ran:
+                break
+            time.sleep(0.02)
+        assert ran == [(job_id, "hi")]
+        assert store.resume_pending(runner) == 0
+
+    def test_runner_crash_marks_job_failed(self, tmp_path):
+        store = _store(tmp_path)
+        job = store.create(7, {}, _recipients(1), invalid=0, chunk_size=5)
+        claimed = store.claim(job["job_id"])
+
+        def runner(_job):
+            raise RuntimeError("boom")
+
+        store._run(claimed, runner)
+        job = store.get(job["job_id"])
+        assert job["status"] == "failed"
+        assert job["errors"] == ["boom"]
@@ -0,0 +1,94 @@
+"""
+Unit tests for the conversation_thread_summary upkeep in services/conversation_service.py
+
+Tests cover:
+- Per-message summary contribution (broadcast / unread / missing platform)
+- Upsert column order (MySQL applies ON DUPLICATE KEY UPDATE assignments left to right)
+- Duplicate inserts (INSERT IGNORE hit) do not touch the summary
+- AI replies carry reply_to_message_id pointing at the triggering message
+"""
+
+import datetime
+import os
+import sys
+from unittest.mock import MagicMock, patch
+
+# config.py 匯入時要求 DB_* 環境變數；engine 只建立不連線
+for _k, _v in {"DB_USER": "u", "DB_PASS": "p", "DB_HOST": "localhost",
+               "DB_NAME": "test", "DB_PORT": "3306"}.items():
+    os.environ.setdefault(_k, _v)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import conversation_service  # noqa: E402
+
+NOW = datetime.datetime(2026, 1, 1, 12, 0, 0)
+
+
+def test_broadcast_only_advances_last_message_at():
+    p = conversation_service._summary_params("U1", None, "outgoing", "broadcast", False, "sent", NOW)
+    assert p["platform"] == "LINE"
+    assert p["at"] == NOW
+    assert p["nb_at"] is None and p["nb_direction"] is None
+    assert p["unread"] == 0
+
+
+def test_incoming_counts_as_unread_and_gpt_unanswered_is_kept():
+    incoming = conversation_service._summary_params("U1", "LINE", "incoming", "webhook", False, "received", NOW)
+    assert incoming["unread"] == 1 and incoming["nb_direction"] == "incoming"
+
+    reply = conversation_service._summary_params("U1", "LINE", "outgoing", "gpt", True, "sent", NOW)
+    assert reply["unread"] == 0 and reply["nb_unanswered"] == 1
+
+
+def test_recency_columns_are_assigned_before_last_non_broadcast_at():
+    sql = conversation_service._SUMMARY_UPSERT_SQL.split("ON DUPLICATE KEY UPDATE", 1)[1]
+    ts = sql.index("last_non_broadcast_at = IF")
+    for col in ("last_non_broadcast_direction =", "last_non_broadcast_source =", "last_unanswered ="):
+        assert sql.index(col) < ts
+
+
+def _fake_engine(rowcount):
+    conn = MagicMock()
+    conn.execute.return_value.rowcount = rowcount
+    engine = MagicMock()
+    engine.begin.return_value.__enter__.return_value = conn
+    return engine, conn
+
+
+def test_duplicate_insert_skips_summary():
+    engine, conn = _fake_engine(rowcount=0)
+    with patch.object(conversation_service, "engine", engine), \
+            patch.object(conversation_service, "_table_has", return_value=True):
+        conversation_service.insert_conversation_message(
+            thread_id="U1", role="user", direction="incoming", question="hi", message_id="dup",
+        )
+    assert conn.execute.call_count == 1
+
+
+def test_new_message_updates_summary_in_same_transaction():
+    engine, conn = _fake_engine(rowcount=1)
+    with patch.object(conversation_service, "engine", engine), \
+            patch.object(conversation_service, "_table_has", return_value=True):
+        conversation_service.insert_conversation_message(
+            thread_id="U1", role="user", direction="incoming", question="hi",
+        )
+    assert conn.execute.call_count == 2
+    params = conn.execute.call_args_list[1].args[1]
+    assert params["thread_id"] == "U1" and params["unread"] == 1
+    assert params["at"] == conn.execute.call_args_list[0].args[1]["now"]
+
+
+def test_ai_reply_links_triggering_message():
+    engine, conn = _fake_engine(rowcount=1)
+    with patch.object(conversation_service, "engine", engine), \
+            patch.object(conversation_service, "_table_has", return_value=True):
+        conversation_service.insert_conversation_message(
+            thread_id="U1", role="assistant", direction="outgoing", response="抱歉",
+            message_source="gpt", unanswered=True, reply_to_message_id="evt-1",
+        )
+    sql = str(conn.execute.call_args_list[0].args[0])
+    params = conn.execute.call_args_list[0].args[1]
+    assert "reply_to_message_id" in sql
+    assert params["reply_to"] == "evt-1"
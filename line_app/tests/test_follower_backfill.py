@@ -0,0 +1,92 @@
+"""
+Unit tests for services/follower_backfill.py
+
+Tests cover:
+- Token bucket pacing
+- Only followers missing from the DB get profiles fetched and written
+- Batched writes
+- Cursor persistence and resume after restart
+"""
+
+import os
+import sys
+import time
+from unittest.mock import patch
+
+# config.py 匯入時要求 DB_* 環境變數；engine 只建立不連線
+for _k, _v in {"DB_USER": "u", "DB_PASS": "p", "DB_HOST": "localhost",
+               "DB_NAME": "test", "DB_PORT": "3306"}.items():
+    os.environ.setdefault(_k, _v)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# line_sdk 匯入時會查 information_schema 決定欄位名稱
+with patch("db.table_has_column", return_value=True):
+    from services import follower_backfill  # noqa: E402
+
+
+def _pages(pages):
+    """模擬 iter_follower_id_pages：依 start 從對應頁開始"""
+    def fake(line_channel_id, start=None, limit=1000):
+        idx = 0 if start is None else int(start)
+        for i in range(idx, len(pages)):
+            yield pages[i], (str(i + 1) if i + 1 < len(pages) else None)
+    return fake
+
+
+def _backfill(tmp_path, batch_size=500):
+    return follower_backfill.FollowerBackfill(
+        str(tmp_path / "state.json"), rps=10000, workers=4, batch_size=batch_size,
+    )
+
+
+class TestTokenBucket:
+    def test_limits_rate_after_burst(self):
+        bucket = follower_backfill.TokenBucket(rate=50, capacity=1)
+        t0 = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # 1 個突發 + 5 個各需 1/50 秒
+        assert time.monotonic() - t0 >= 0.09
+
+
+@patch("services.follower_backfill.fetch_line_profile", side_effect=lambda uid, line_channel_id=None: (f"n-{uid}", None))
+@patch("services.follower_backfill.bulk_upsert_followers", side_effect=lambda batch, line_channel_id=None: len(batch))
+@patch("services.follower_backfill.get_followers_in_db", side_effect=lambda cid, uids: {u for u in uids if u.endswith("0")})
+class TestRunOne:
+    def test_writes_only_missing_followers_in_batches(self, _, mock_write, mock_fetch, tmp_path):
+        pages = [[f"U{i}" for i in range(10)], [f"U{i}" for i in range(10, 15)]]
+        with patch("services.follower_backfill.iter_follower_id_pages", _pages(pages)):
+            written = _backfill(tmp_path, batch_size=4).run_one("ch1")
+
+        # U0 / U10 已在 DB
+        assert written == 13
+        assert mock_fetch.call_count == 13
+        assert [len(c.args[0]) for c in mock_write.call_args_list] == [4, 4, 1, 4]
+        assert mock_write.call_args_list[0].args[0][0] == ("U1", "n-U1", None)
+        assert all(c.kwargs["line_channel_id"] == "ch1" for c in mock_write.call_args_list)
+
+    def test_resumes_from_saved_cursor(self, _, mock_write, mock_fetch, tmp_path):
+        pages = [["U1"], ["U2"], ["U3"]]
+        bf = _backfill(tmp_path)
+        bf._save_cursor("ch1", "2")
+        with patch("services.follower_backfill.iter_follower_id_pages", _pages(pages)):
+            assert bf.run_one("ch1") == 1
+        assert mock_fetch.call_args.args[0] == "U3"
+        state = bf._load_state()["ch1"]
+        assert state["next"] is None
+        assert "completed_at" in state
+
+    def test_stale_cursor_restarts_from_first_page(self, _, mock_write, mock_fetch, tmp_path):
+        pages = [["U1"], ["U2"]]
+
+        def fake(line_channel_id, start=None, limit=1000):
+            if start == "stale":
+                raise RuntimeError("followers API 400")
+            yield from _pages(pages)(line_channel_id, start, limit)
+
+        bf = _backfill(tmp_path)
+        bf._save_cursor("__default__", "stale")
+        with patch("services.follower_backfill.iter_follower_id_pages", fake):
+            assert bf.run_one(None) == 2
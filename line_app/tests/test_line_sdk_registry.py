@@ -0,0 +1,79 @@
+"""
+Unit tests for the channel registry in services/line_sdk.py
+
+Tests cover:
+- Credential TTL caching (positive and negative)
+- MessagingApi / WebhookHandler reuse and rebuild on token/secret change
+- Explicit invalidation
+"""
+
+import os
+import sys
+from unittest.mock import Mock, patch
+
+# config.py 匯入時要求 DB_* 環境變數；engine 只建立不連線
+for _k, _v in {"DB_USER": "u", "DB_PASS": "p", "DB_HOST": "localhost",
+               "DB_NAME": "test", "DB_PORT": "3306"}.items():
+    os.environ.setdefault(_k, _v)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# line_sdk 匯入時會查 information_schema 決定欄位名稱
+with patch("db.table_has_column", return_value=True):
+    from services import line_sdk  # noqa: E402
+
+
+def _registry(ttl=300, negative_ttl=30):
+    return line_sdk._ChannelRegistry(ttl, negative_ttl)
+
+
+class TestCredentials:
+    def test_second_lookup_hits_cache(self):
+        reg = _registry()
+        loader = Mock(return_value={"token": "t", "secret": "s"})
+        assert reg.credentials("line:1", loader) == {"token": "t", "secret": "s"}
+        assert reg.credentials("line:1", loader)["token"] == "t"
+        assert loader.call_count == 1
+        assert reg.stats()["hits"] == 1
+
+    def test_expired_entry_reloads(self):
+        reg = _registry(ttl=0)
+        loader = Mock(return_value={"token": "t"})
+        reg.credentials("line:1", loader)
+        reg.credentials("line:1", loader)
+        assert loader.call_count == 2
+
+    def test_missing_channel_is_negatively_cached(self):
+        reg = _registry(negative_ttl=30)
+        loader = Mock(return_value=None)
+        assert reg.credentials("line:x", loader) is None
+        assert reg.credentials("line:x", loader) is None
+        assert loader.call_count == 1
+
+    def test_invalidate_forces_reload(self):
+        reg = _registry()
+        loader = Mock(return_value={"token": "t"})
+        reg.credentials("line:1", loader)
+        reg.invalidate("1")
+        reg.credentials("line:1", loader)
+        assert loader.call_count == 2
+
+
+class TestClients:
+    def test_messaging_api_reused_until_token_changes(self):
+        reg = _registry()
+        a = reg.messaging_api("line:1", "tok-a")
+        assert reg.messaging_api("line:1", "tok-a") is a
+        assert reg.messaging_api("line:1", "tok-b") is not a
+
+    def test_handler_registered_once(self):
+        reg = _registry()
+        register = Mock()
+        h = reg.webhook_handler("line:1", "sec", register)
+        assert reg.webhook_handler("line:1", "sec", register) is h
+        assert register.call_count == 1
+
+        reg.invalidate()
+        assert reg.webhook_handler("line:1", "sec", register) is not h
+        assert register.call_count == 2
@@ -0,0 +1,80 @@
+"""
+Unit tests for services/profile_refresh.py
+
+Tests cover:
+- Freshness window hits / misses
+- Synchronous fetch for users without a stored display name
+- Background batch refresh writes only on change
+"""
+
+import os
+import sys
+from unittest.mock import patch
+
+# config.py 匯入時要求 DB_* 環境變數；engine 只建立不連線
+for _k, _v in {"DB_USER": "u", "DB_PASS": "p", "DB_HOST": "localhost",
+               "DB_NAME": "test", "DB_PORT": "3306"}.items():
+    os.environ.setdefault(_k, _v)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# line_sdk 匯入時會查 information_schema 決定欄位名稱
+with patch("db.table_has_column", return_value=True):
+    from services import profile_refresh  # noqa: E402
+
+
+def _refresher(freshness=3600):
+    return profile_refresh.ProfileRefresher(freshness, max_entries=100, batch_size=10)
+
+
+@patch.object(profile_refresh.ProfileRefresher, "_ensure_worker")
+@patch("services.profile_refresh.fetch_line_profile", return_value=("New", "http://pic"))
+class TestResolve:
+    def test_missing_name_fetches_synchronously(self, mock_fetch, _):
+        r = _refresher()
+        assert r.resolve("U1", "ch", None, None) == ("New", "http://pic", True)
+        assert mock_fetch.call_count == 1
+        assert r.is_fresh("U1")
+
+    def test_fresh_profile_skips_api(self, mock_fetch, _):
+        r = _refresher()
+        r.mark_fresh("U1")
+        assert r.resolve("U1", "ch", "Old", "http://old") == ("Old", "http://old", False)
+        assert mock_fetch.call_count == 0
+        assert r.stats()["hit_ratio"] == 1.0
+
+    def test_stale_profile_is_queued(self, mock_fetch, _):
+        r = _refresher(freshness=0)
+        r.mark_fresh("U1")
+        assert r.resolve("U1", "ch", "Old", None)[2] is False
+        assert mock_fetch.call_count == 0
+        assert r.stats()["pending"] == 1
+
+
+@patch("services.profile_refresh.upsert_line_friend")
+@patch("services.profile_refresh.upsert_member", return_value=5)
+@patch("services.profile_refresh.fetch_line_profile", return_value=("New", "http://pic"))
+class TestBackgroundRefresh:
+    @patch("services.profile_refresh.fetch_member_profile",
+           return_value={"line_display_name": "Old", "line_avatar": "http://pic"})
+    def test_changed_name_is_written(self, _, mock_fetch, mock_member, mock_friend):
+        r = _refresher()
+        with patch.object(r, "_ensure_worker"):
+            r.request_refresh("U1", "ch")
+            r.request_refresh("U1", "ch")  # 重複排隊只處理一次
+        assert r.process_pending() == 1
+        mock_member.assert_called_once_with("U1", "New", None, line_channel_id="ch")
+        assert mock_friend.call_args.kwargs["display_name"] == "New"
+        assert r.is_fresh("U1")
+
+    @patch("services.profile_refresh.fetch_member_profile",
+           return_value={"line_display_name": "New", "line_avatar": "http://pic"})
+    def test_unchanged_profile_skips_writes(self, _, mock_fetch, mock_member, mock_friend):
+        r = _refresher()
+        with patch.object(r, "_ensure_worker"):
+            r.request_refresh("U1", "ch")
+        r.process_pending()
+        mock_member.assert_not_called()
+        mock_friend.assert_not_called()
+        assert r.stats()["refreshed"] == 1
@@ -0,0 +1,109 @@
+"""
+Unit tests for services/webhook_queue.py
+
+Tests cover:
+- Dedupe by webhookEventId
+- Per-user ordering (a user's next event waits for the previous one)
+- Retry / failure after max attempts
+- Depth / lag metrics
+"""
+
+import json
+import os
+import sys
+
+# config.py 匯入時要求 DB_* 環境變數；engine 只建立不連線
+for _k, _v in {"DB_USER": "u", "DB_PASS": "p", "DB_HOST": "localhost",
+               "DB_NAME": "test", "DB_PORT": "3306"}.items():
+    os.environ.setdefault(_k, _v)
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.webhook_queue import WebhookQueue  # noqa: E402
+
+
+def _body(*events):
+    return json.dumps({"destination": "Ubot", "events": list(events)})
+
+
+def _event(eid, uid, text="hi"):
+    return {
+        "type": "message",
+        "webhookEventId": eid,
+        "source": {"type": "user", "userId": uid},
+        "message": {"type": "text", "id": eid, "text": text},
+    }
+
+
+def _queue(tmp_path, **kw):
+    return WebhookQueue(str(tmp_path / "q.sqlite3"), **kw)
+
+
+class TestEnqueue:
+    def test_duplicate_event_ids_are_ignored(self, tmp_path):
+        q = _queue(tmp_path)
+        assert q.enqueue_events(_body(_event("e1", "U1"), _event("e2", "U1")), "ch") == 2
+        assert q.enqueue_events(_body(_event("e1", "U1")), "ch") == 0
+        assert q.stats()["pending"] == 2
+
+    def test_empty_body(self, tmp_path):
+        assert _queue(tmp_path).enqueue_events(_body(), "ch") == 0
+
+
+class TestClaimOrdering:
+    def test_same_user_waits_for_previous_event(self, tmp_path):
+        q = _queue(tmp_path)
+        q.enqueue_events(_body(_event("a1", "UA"), _event("a2", "UA"), _event("b1", "UB")), "ch")
+
+        first = q._claim()
+        second = q._claim()
+        assert first["event_id"] == "a1"
+        # a2 被 a1 擋住，輪到其他使用者
+        assert second["event_id"] == "b1"
+        assert q._claim() is None
+
+        q._finish(first, None)
+        assert q._claim()["event_id"] == "a2"
+
+    def test_dispatch_body_contains_single_event(self, tmp_path):
+        q = _queue(tmp_path)
+        q.enqueue_events(_body(_event("e1", "U1", "hello")), "ch")
+        row = q._claim()
+        data = json.loads(q._build_body(row))
+        assert data["destination"] == "Ubot"
+        assert [e["message"]["text"] for e in data["events"]] == ["hello"]
+        assert row["line_channel_id"] == "ch"
+
+
+class TestRetry:
+    def test_failed_event_retries_then_fails(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("services.webhook_queue.RETRY_BACKOFF_SECONDS", 0)
+        q = _queue(tmp_path, max_attempts=2)
+        q.enqueue_events(_body(_event("e1", "U1")), "ch")
+
+        q._finish(q._claim(), "boom")
+        assert q.stats()["pending"] == 1
+
+        q._finish(q._claim(), "boom again")
+        stats = q.stats()
+        assert stats["failed"] == 1
+        assert stats["depth"] == 0
+        assert stats["failed_total"] == 1
+        assert stats["retried_total"] == 1
+
+
+class TestStats:
+    def test_lag_and_depth(self, tmp_path):
+        q = _queue(tmp_path)
+        q.enqueue_events(_body(_event("e1", "U1"), _event("e2", "U2")), "ch")
+        row = q._claim()
+        stats = q.stats()
+        assert stats["depth"] == 2
+        assert stats["processing"] == 1
+        assert stats["oldest_pending_age_seconds"] >= 0
+
+        q._finish(row, None)
+        stats = q.stats()
+        assert stats["processed_total"] == 1
+        assert stats["lag_seconds_p50"] is not None